@@ -0,0 +1,132 @@
+'''
+WtBtAnalyst报告生成的性能对比
+在临时目录里构造回测输出(funds.csv、closes.csv、trades.csv), 每种方式在独立的子进程中执行, 统计耗时和峰值内存:
+1、render_report, 原来的完整报告, 整个工作簿都在内存中
+2、render_report_streaming, constant_memory模式按行写入, 明细超过阈值时写到csv
+原来的方式在百万级平仓记录上耗时很长, 而且超过Excel单表的行数上限, 所以默认只在较小的规模上对比
+用法: python bench_analyst_report.py [平仓记录数, 默认2000000] [完整报告的平仓记录数, 默认200000, 0则跳过]
+'''
+import os
+import shutil
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+import multiprocessing
+
+import numpy as np
+import pandas as pd
+
+from wtpy.apps.WtBtAnalyst import load_strategy_data, render_report, render_report_streaming
+
+CAPITAL = 500000
+
+def gen_outputs(folder:str, count:int, with_trades:bool):
+    rng = np.random.default_rng(20240104)
+    os.makedirs(folder)
+
+    # 每天最多240笔, 从09:30开始每分钟一笔
+    per_day = 240
+    days = pd.bdate_range("2010-01-04", periods=(count + per_day - 1) // per_day)
+    dayIdx = np.arange(count) // per_day
+    minutes = 570 + np.arange(count) % per_day
+    dates = np.asarray(days.strftime("%Y%m%d").astype(np.int64))[dayIdx]
+    opentime = dates * 10000 + (minutes // 60) * 100 + minutes % 60
+    closetime = dates * 10000 + ((minutes + 1) // 60) * 100 + (minutes + 1) % 60
+    direct = np.where(rng.random(count) < 0.5, "LONG", "SHORT")
+    profit = np.round(rng.normal(5, 100, count), 2)
+    fee = np.full(count, 2.0)
+    totalprofit = np.cumsum(profit - fee)
+    barno = np.arange(count) * 3
+    pd.DataFrame({
+        "code": "CFFEX.IF.HOT",
+        "direct": direct,
+        "opentime": opentime,
+        "openprice": 4000.0,
+        "closetime": closetime,
+        "closeprice": 4001.0,
+        "qty": 1,
+        "profit": profit,
+        "maxprofit": np.abs(profit) + 10,
+        "maxloss": -np.abs(profit) - 10,
+        "totalprofit": totalprofit,
+        "entertag": "enter",
+        "exittag": "exit",
+        "openbarno": barno + 1,
+        "closebarno": barno + 2
+    }).to_csv(os.path.join(folder, "closes.csv"), index=False)
+
+    balance = pd.Series(profit - fee).groupby(dayIdx).sum().cumsum().values
+    pd.DataFrame({
+        "date": days.strftime("%Y%m%d").astype(np.int64),
+        "closeprofit": balance,
+        "positionprofit": 0.0,
+        "dynbalance": balance,
+        "fee": 0.0
+    }).to_csv(os.path.join(folder, "funds.csv"), index=False)
+
+    if with_trades:
+        pd.DataFrame({
+            "code": "CFFEX.IF.HOT",
+            "time": np.column_stack([opentime, closetime]).ravel(),
+            "direct": np.repeat(direct, 2),
+            "action": np.tile(["OPEN", "CLOSE"], count),
+            "price": 4000.0,
+            "qty": 1,
+            "tag": "",
+            "fee": 1.0,
+            "barno": np.column_stack([barno + 1, barno + 2]).ravel()
+        }).to_csv(os.path.join(folder, "trades.csv"), index=False)
+
+def peak_rss() -> float:
+    '''
+    当前进程的峰值内存, 单位MB
+    '''
+    if sys.platform == "win32":
+        import psutil
+        return psutil.Process().memory_info().peak_wset / 1024 / 1024
+
+    import resource
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / 1024 / 1024 if sys.platform == "darwin" else rss / 1024
+
+def run_report(folder:str, filename:str, streaming:bool) -> tuple:
+    t0 = time.perf_counter()
+    df_funds, df_closes, df_trades = load_strategy_data(folder, with_trades=not streaming, compact=streaming)
+    if streaming:
+        render_report_streaming(filename, df_funds, df_closes, capital=CAPITAL)
+    else:
+        render_report(filename, df_funds, df_closes, df_trades, capital=CAPITAL)
+    return time.perf_counter() - t0, peak_rss()
+
+def in_subprocess(func, *args):
+    # 每次都用新的子进程, 峰值内存互不影响
+    # 构造数据也放在子进程中, 主进程保持很小, 子进程的峰值内存不会算上从主进程继承的部分
+    ctx = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=1, mp_context=ctx) as executor:
+        return executor.submit(func, *args).result()
+
+def measure(folder:str, filename:str, streaming:bool) -> tuple:
+    return in_subprocess(run_report, folder, filename, streaming)
+
+if __name__ == "__main__":
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 2000000
+    legacy_count = int(sys.argv[2]) if len(sys.argv) > 2 else 200000
+
+    workdir = tempfile.mkdtemp()
+    try:
+        if legacy_count > 0:
+            folder = os.path.join(workdir, "legacy")
+            in_subprocess(gen_outputs, folder, legacy_count, True)
+            t_old, m_old = measure(folder, os.path.join(folder, "full.xlsx"), False)
+            t_new, m_new = measure(folder, os.path.join(folder, "stream.xlsx"), True)
+            print("%d closes, full report:       %.2fs, peak RSS %.0fMB" % (legacy_count, t_old, m_old))
+            print("%d closes, streaming report:  %.2fs, peak RSS %.0fMB, x%.1f" % (legacy_count, t_new, m_new, t_old / t_new))
+
+        folder = os.path.join(workdir, "stream")
+        in_subprocess(gen_outputs, folder, count, False)
+        t_new, m_new = measure(folder, os.path.join(folder, "stream.xlsx"), True)
+        size = sum(os.path.getsize(os.path.join(folder, f)) for f in os.listdir(folder) if f.startswith("stream")) / 1024 / 1024
+        print("%d closes, streaming report:  %.2fs, peak RSS %.0fMB, output %.0fMB" % (count, t_new, m_new, size))
+    finally:
+        shutil.rmtree(workdir)
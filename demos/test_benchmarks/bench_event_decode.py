@@ -0,0 +1,87 @@
+'''
+EventReceiver消息处理的性能对比
+模拟引擎推送的成交/订单/日志消息(日志为gbk编码的中文), 比较每条消息都用chardet检测编码和utf-8优先+学习备用编码两种方式每秒能处理的消息数
+'''
+import json
+import time
+
+import chardet
+
+from wtpy.monitor.EventReceiver import EventReceiver, EventSink
+from wtpy.monitor.EventReceiver import TOPIC_RT_TRADE, TOPIC_RT_ORDER, TOPIC_RT_LOG
+
+class CountingSink(EventSink):
+    def __init__(self):
+        self.count = 0
+
+    def on_order(self, chnl:str, ordInfo:dict):
+        self.count += 1
+
+    def on_trade(self, chnl:str, trdInfo:dict):
+        self.count += 1
+
+    def on_log(self, tag:str, time:int, message:str):
+        self.count += 1
+
+def legacy_decode_bytes(data:bytes):
+    ret = chardet.detect(data)
+    if ret is not None:
+        encoding = ret["encoding"]
+        if encoding is not None:
+            return data.decode(encoding)
+        else:
+            return data.decode()
+    else:
+        return data.decode()
+
+def legacy_on_mq_message(sink:EventSink, topic:bytes, message:bytes, dataLen:int):
+    topic = legacy_decode_bytes(topic)
+    message = legacy_decode_bytes(message[:dataLen])
+    msgObj = json.loads(message)
+    if topic == TOPIC_RT_TRADE:
+        trader = msgObj.pop("trader")
+        sink.on_trade(trader, msgObj)
+    elif topic == TOPIC_RT_ORDER:
+        trader = msgObj.pop("trader")
+        sink.on_order(trader, msgObj)
+    elif topic == TOPIC_RT_LOG:
+        sink.on_log(msgObj["tag"], msgObj["time"], msgObj["message"])
+
+def make_messages(count:int) -> list:
+    messages = list()
+    for i in range(count):
+        kind = i % 3
+        if kind == 0:
+            topic = TOPIC_RT_TRADE
+            data = json.dumps({"trader":"simnow", "code":"SHFE.rb2405", "price":3500.0+i%10, "volume":1, "isbuy":True}).encode("utf-8")
+        elif kind == 1:
+            topic = TOPIC_RT_ORDER
+            data = json.dumps({"trader":"simnow", "code":"SHFE.rb2405", "price":3500.0, "left":1, "state":"pending"}).encode("utf-8")
+        else:
+            topic = TOPIC_RT_LOG
+            data = json.dumps({"tag":"simnow", "time":93000000+i, "message":"订单%d已提交，等待成交回报" % i}, ensure_ascii=False).encode("gbk")
+        messages.append((topic.encode(), data, len(data)))
+    return messages
+
+def bench(handler, messages:list, rounds:int) -> float:
+    t0 = time.perf_counter()
+    for _ in range(rounds):
+        for topic, data, dataLen in messages:
+            handler(topic, data, dataLen)
+    return len(messages) * rounds / (time.perf_counter() - t0)
+
+if __name__ == "__main__":
+    messages = make_messages(3000)
+
+    sink = CountingSink()
+    speed_old = bench(lambda topic, data, dataLen: legacy_on_mq_message(sink, topic, data, dataLen), messages, 1)
+    old_count = sink.count
+
+    sink = CountingSink()
+    receiver = EventReceiver(url="ipc:///tmp/bench_event_decode.ipc", sink=sink)
+    speed_new = bench(receiver.on_mq_message, messages, 10)
+    receiver.release()
+    assert old_count == len(messages) and sink.count == len(messages) * 10
+
+    print("chardet per message: %.0f msgs/s" % speed_old)
+    print("utf-8 first + learned fallback(%s): %.0f msgs/s, x%.1f" % (receiver._decoder.fallback, speed_new, speed_new / speed_old))
@@ -0,0 +1,112 @@
+'''
+WtHotPicker全量重构的性能对比
+在临时目录里生成若干年的快照文件(格式同datakit落地的snapshot), 用WtCacheMonSS分别测试:
+1、不落地缓存, 逐日解析快照(原来的方式)
+2、首次重构, 解析快照并落地缓存
+3、再次重构, 直接读取落地缓存, 多线程提前加载
+另外用一个每次请求延迟20ms的模拟交易所缓存器, 对比逐个拉取和多线程并发拉取的耗时
+所有方式生成的主力切换规则应该完全一致
+'''
+import datetime
+import logging
+import os
+import random
+import shutil
+import tempfile
+import time
+
+from wtpy.apps import WtHotPicker, WtCacheMon, WtCacheMonSS, WtCacheMonExchg
+
+EXCHANGES = {
+    "SHFE": ["rb", "hc", "cu", "al", "zn", "ru", "au", "ag"],
+    "DCE": ["i", "j", "jm", "m", "y", "p", "c", "pp"],
+    "CZCE": ["MA", "TA", "SR", "CF", "RM", "FG", "SA", "OI"]
+}
+
+def gen_snapshots(folder:str, beginDT:datetime.datetime, endDT:datetime.datetime):
+    rnd = random.Random(42)
+    curDT = beginDT
+    while curDT <= endDT:
+        if curDT.weekday() < 5:
+            lines = ["date,exchg,code,open,high,low,close,settle,volume,turnover,openinterest"]
+            for exchg, pids in EXCHANGES.items():
+                for pid in pids:
+                    for i in range(12):
+                        month = (curDT.year*100 + curDT.month + i) if curDT.month + i <= 12 else ((curDT.year+1)*100 + curDT.month + i - 12)
+                        code = pid + (str(month)[3:] if exchg == "CZCE" else str(month)[2:])
+                        close = 3000 + rnd.random()*100
+                        lines.append("%s,%s,%s,%f,%f,%f,%f,%f,%d,%f,%d" % (curDT.strftime("%Y%m%d"), exchg, code,
+                            close, close, close, close, close, rnd.randint(0, 100000), 0, rnd.randint(0, 200000)))
+            f = open(os.path.join(folder, curDT.strftime("%Y%m%d") + ".csv"), "w")
+            f.write("\n".join(lines) + "\n")
+            f.close()
+        curDT += datetime.timedelta(days=1)
+
+class SimulatedExchg(WtCacheMonExchg):
+    '''
+    模拟从交易所官网拉取, 每次请求固定延迟, 数据从快照文件中读取
+    '''
+    def __init__(self, snapshot_path:str, latency:float, **kwargs):
+        WtCacheMonExchg.__init__(self, **kwargs)
+        self.snapshot = WtCacheMonSS(snapshot_path)
+        self.latency = latency
+
+    def fetch(self, exchg:str, curDT:datetime.datetime) -> dict:
+        time.sleep(self.latency)
+        return self.snapshot.get_cache(exchg, curDT)
+
+    def getShfeData(self, curDT:datetime.datetime) -> dict:
+        return self.fetch("SHFE", curDT)
+
+    def getDceData(self, curDT:datetime.datetime) -> dict:
+        return self.fetch("DCE", curDT)
+
+    def getCzceData(self, curDT:datetime.datetime) -> dict:
+        return self.fetch("CZCE", curDT)
+
+def rebuild(cacher:WtCacheMon, beginDT:datetime.datetime, endDT:datetime.datetime, workdir:str):
+    picker = WtHotPicker(markerFile=os.path.join(workdir, "marker.json"), hotFile=os.path.join(workdir, "hots.json"), secFile=os.path.join(workdir, "seconds.json"))
+    picker.set_cacher(cacher)
+    t0 = time.perf_counter()
+    hots, secs = picker.execute_rebuild(beginDT, endDT, exchanges=list(EXCHANGES.keys()))
+    return time.perf_counter() - t0, hots, secs
+
+if __name__ == "__main__":
+    logging.disable(logging.INFO)
+
+    workdir = tempfile.mkdtemp()
+    cwd = os.getcwd()
+    os.chdir(workdir)   # execute_rebuild会在当前目录写hotmap.json和secmap.json
+    try:
+        ssdir = os.path.join(workdir, "snapshots") + os.sep
+        os.mkdir(ssdir)
+        beginDT = datetime.datetime(2019, 1, 1)
+        endDT = datetime.datetime(2021, 12, 31)
+        gen_snapshots(ssdir, beginDT, endDT)
+
+        cachedir = os.path.join(workdir, "cache")
+        t_old, hots0, secs0 = rebuild(WtCacheMonSS(ssdir), beginDT, endDT, workdir)
+        t_cold, hots1, secs1 = rebuild(WtCacheMonSS(ssdir, cache_path=cachedir), beginDT, endDT, workdir)
+        t_warm, hots2, secs2 = rebuild(WtCacheMonSS(ssdir, cache_path=cachedir, workers=4), beginDT, endDT, workdir)
+        assert hots0 == hots1 == hots2 and secs0 == secs1 == secs2
+
+        print("rebuild %s-%s, %d exchanges" % (beginDT.strftime("%Y%m%d"), endDT.strftime("%Y%m%d"), len(EXCHANGES)))
+        print("parse snapshots:             %.2fs" % t_old)
+        print("parse + write disk cache:    %.2fs" % t_cold)
+        print("disk cache, 4 workers:       %.2fs, x%.1f" % (t_warm, t_old / t_warm))
+
+        # 模拟远程拉取只跑一年, 逐个拉取太慢
+        endDT = datetime.datetime(2019, 12, 31)
+        remotedir = os.path.join(workdir, "remote")
+        t_seq, hots3, secs3 = rebuild(SimulatedExchg(ssdir, 0.02), beginDT, endDT, workdir)
+        t_par, hots4, secs4 = rebuild(SimulatedExchg(ssdir, 0.02, cache_path=remotedir, workers=8, rate_limit=200), beginDT, endDT, workdir)
+        t_hit, hots5, secs5 = rebuild(SimulatedExchg(ssdir, 0.02, cache_path=remotedir, workers=8), beginDT, endDT, workdir)
+        assert hots3 == hots4 == hots5 and secs3 == secs4 == secs5
+
+        print("remote fetch(20ms), %s-%s" % (beginDT.strftime("%Y%m%d"), endDT.strftime("%Y%m%d")))
+        print("sequential:                  %.2fs" % t_seq)
+        print("8 workers, 200 req/s:        %.2fs, x%.1f" % (t_par, t_seq / t_par))
+        print("disk cache hit:              %.2fs, x%.1f" % (t_hit, t_seq / t_hit))
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(workdir)
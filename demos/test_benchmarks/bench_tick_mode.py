@@ -0,0 +1,55 @@
+'''
+tick推送模式的性能对比
+直接构造WTSTickStruct, 模拟底层推送, 比较dict/只读视图/numpy缓冲区三种模式下每秒能处理的tick数
+'''
+import time
+from ctypes import pointer
+
+from wtpy import CtaContext, BaseCtaStrategy, WTSTickStruct
+from wtpy.WtDataDefs import TICK_MODE_DICT, TICK_MODE_VIEW, TICK_MODE_NUMPY
+
+class DummyEngine:
+    is_backtest = True
+
+class StraTickReader(BaseCtaStrategy):
+    '''
+    只读取几个常用字段, 模拟一般策略的on_tick
+    '''
+    def __init__(self, name:str):
+        BaseCtaStrategy.__init__(self, name)
+        self.total = 0.0
+
+    def on_tick(self, context:CtaContext, stdCode:str, newTick):
+        self.total += newTick["price"] + newTick["bid_price_0"] + newTick["ask_price_0"]
+
+def make_ticks(count:int) -> list:
+    ticks = list()
+    for i in range(count):
+        tick = WTSTickStruct()
+        tick.exchg = b"SHFE"
+        tick.code = ("rb%04d" % (2400 + i)).encode("utf-8")
+        tick.price = 3500.0 + i
+        tick.bid_price_0 = tick.price - 1
+        tick.ask_price_0 = tick.price + 1
+        tick.action_date = 20240102
+        tick.action_time = 93000000
+        ticks.append(("SHFE.rb.%04d" % (2400 + i), pointer(tick)))
+    return ticks
+
+def bench(mode:int, ticks:list, rounds:int) -> float:
+    stra = StraTickReader("bench")
+    ctx = CtaContext(1, stra, None, DummyEngine())
+    ctx.stra_set_tick_mode(mode)
+
+    t0 = time.perf_counter()
+    for _ in range(rounds):
+        for stdCode, tick in ticks:
+            ctx.on_tick(stdCode, tick)
+    elapse = time.perf_counter() - t0
+    return len(ticks)*rounds/elapse
+
+if __name__ == "__main__":
+    ticks = make_ticks(300)
+    rounds = 1000
+    for name, mode in [("dict", TICK_MODE_DICT), ("view", TICK_MODE_VIEW), ("numpy", TICK_MODE_NUMPY)]:
+        print("%-6s %12.0f ticks/s" % (name, bench(mode, ticks, rounds)))
@@ -0,0 +1,112 @@
+'''
+逐笔/逐日统计的性能对比
+构造100万条平仓记录, 比较iterrows逐行统计和numpy统计核心的耗时, 并校验两者结果一致
+'''
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+from wtpy.apps.WtBtAnalyst import calc_trade_stats, calc_drawdowns
+
+def make_closes(count:int) -> pd.DataFrame:
+    rng = np.random.default_rng(20240102)
+    openbarno = np.cumsum(rng.integers(1, 20, count))
+    closebarno = openbarno + rng.integers(1, 50, count)
+    profit = np.round(rng.normal(10, 500, count), 2)
+    profit[rng.random(count) < 0.01] = 0
+    return pd.DataFrame({
+        "profit": profit,
+        "openbarno": openbarno,
+        "closebarno": closebarno
+    })
+
+def make_netvals(count:int) -> pd.Series:
+    rng = np.random.default_rng(20240103)
+    return pd.Series(np.cumprod(1 + rng.normal(0.0003, 0.01, count)))
+
+def legacy_trade_stats(df_closes:pd.DataFrame) -> dict:
+    df_wins = df_closes[df_closes["profit"] > 0]
+    df_loses = df_closes[df_closes["profit"] <= 0]
+    wintimes = len(df_wins)
+    losetimes = len(df_loses)
+
+    max_consecutive_wins = 0
+    max_consecutive_loses = 0
+    consecutive_wins = 0
+    consecutive_loses = 0
+    for idx, row in df_closes.iterrows():
+        profit = row["profit"]
+        if profit > 0:
+            consecutive_wins += 1
+            consecutive_loses = 0
+        else:
+            consecutive_wins = 0
+            consecutive_loses += 1
+
+        max_consecutive_wins = max(max_consecutive_wins, consecutive_wins)
+        max_consecutive_loses = max(max_consecutive_loses, consecutive_loses)
+
+    return {
+        "wintimes": wintimes,
+        "losetimes": losetimes,
+        "winamout": df_wins["profit"].sum(),
+        "loseamount": df_loses["profit"].sum(),
+        "avg_hold_win": (df_wins["closebarno"] - df_wins["openbarno"]).sum() / wintimes,
+        "avg_hold_lose": (df_loses["closebarno"] - df_loses["openbarno"]).sum() / losetimes,
+        "max_consecutive_wins": max_consecutive_wins,
+        "max_consecutive_loses": max_consecutive_loses
+    }
+
+def legacy_drawdowns(ayNetVals:pd.Series) -> dict:
+    maxub = ayNetVals[0]
+    minub = maxub
+    mdd = 0.0
+    mup = 0.0
+    for idx in range(1, len(ayNetVals)):
+        maxub = max(maxub, ayNetVals[idx])
+        minub = min(minub, ayNetVals[idx])
+        profit = (ayNetVals[idx] - ayNetVals[idx - 1]) / ayNetVals[idx - 1]
+        falldown = (ayNetVals[idx] - maxub) / maxub
+        riseup = (ayNetVals[idx] - minub) / minub
+        if profit <= 0:
+            mdd = max(mdd, abs(falldown))
+        else:
+            mup = max(mup, abs(riseup))
+
+    upper = np.maximum.accumulate(ayNetVals)
+    down_time = [0]
+    for i in range(1, len(upper)):
+        if upper[i] > upper[i - 1]:
+            down_time.append(0)
+        else:
+            down_time.append(down_time[i - 1] + 1)
+
+    return {
+        "max_falldown": mdd,
+        "max_profratio": mup,
+        "max_dd_duration": max(down_time)
+    }
+
+def timeit(func, *args):
+    t0 = time.perf_counter()
+    ret = func(*args)
+    return ret, time.perf_counter() - t0
+
+if __name__ == "__main__":
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+    df_closes = make_closes(count)
+    netvals = make_netvals(count)
+
+    old, t_old = timeit(legacy_trade_stats, df_closes)
+    new, t_new = timeit(calc_trade_stats, df_closes["profit"], df_closes["closebarno"] - df_closes["openbarno"])
+    for key in old:
+        assert np.isclose(old[key], new[key]), key
+    print("trade stats of %d closes: iterrows %.3fs, numpy %.3fs, x%.1f" % (count, t_old, t_new, t_old / t_new))
+
+    old, t_old = timeit(legacy_drawdowns, netvals)
+    new, t_new = timeit(calc_drawdowns, netvals)
+    for key in old:
+        assert old[key] == new[key], key
+    print("drawdowns of %d netvals: loop %.3fs, numpy %.3fs, x%.1f" % (count, t_old, t_new, t_old / t_new))
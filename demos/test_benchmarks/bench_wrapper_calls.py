@@ -0,0 +1,58 @@
+'''
+WtBtWrapper调用开销的性能对比
+不初始化回测引擎, 直接调用底层接口, 比较每次调用都重新编码字符串、新建回调和使用编码缓存、预建回调两种方式的单次调用耗时
+模拟策略在每根K线里反复调用get_bars/get_position/get_price的场景
+'''
+import time
+
+from wtpy.WtCoreDefs import CB_STRATEGY_GET_BAR, CB_STRATEGY_GET_TICK, CB_STRATEGY_GET_POSITION
+from wtpy.wrapper.WtBtWrapper import WtBtWrapper
+
+class NullEngine:
+    '''
+    没有策略的引擎, 底层回调找不到策略环境直接返回
+    '''
+    def get_context(self, id:int):
+        return None
+
+CODES = ["SHFE.rb.HOT", "SHFE.hc.HOT", "DCE.i.HOT", "DCE.j.HOT", "CZCE.MA.HOT", "CFFEX.IF.HOT"]
+
+def legacy_calls(wrapper:WtBtWrapper):
+    api = wrapper.api
+    return {
+        "cta_get_bars": lambda code: api.cta_get_bars(0, bytes(code, encoding = "utf8"), bytes("m5", encoding = "utf8"), 10, True, CB_STRATEGY_GET_BAR(wrapper.on_stra_get_bar)),
+        "cta_get_ticks": lambda code: api.cta_get_ticks(0, bytes(code, encoding = "utf8"), 10, CB_STRATEGY_GET_TICK(wrapper.on_stra_get_tick)),
+        "cta_get_all_position": lambda code: api.cta_get_all_position(0, CB_STRATEGY_GET_POSITION(wrapper.on_stra_get_position)),
+        "cta_get_position": lambda code: api.cta_get_position(0, bytes(code, encoding = "utf8"), False, bytes("", encoding = "utf8")),
+        "cta_get_price": lambda code: api.cta_get_price(bytes(code, encoding = "utf8")),
+        "cta_set_position": lambda code: api.cta_set_position(0, bytes(code, encoding = "utf8"), 0, bytes("enter", encoding = "utf8"), 0.0, 0.0)
+    }
+
+def current_calls(wrapper:WtBtWrapper):
+    return {
+        "cta_get_bars": lambda code: wrapper.cta_get_bars(0, code, "m5", 10, True),
+        "cta_get_ticks": lambda code: wrapper.cta_get_ticks(0, code, 10),
+        "cta_get_all_position": lambda code: wrapper.cta_get_all_position(0),
+        "cta_get_position": lambda code: wrapper.cta_get_position(0, code),
+        "cta_get_price": lambda code: wrapper.cta_get_price(code),
+        "cta_set_position": lambda code: wrapper.cta_set_position(0, code, 0, "enter")
+    }
+
+def bench(func, rounds:int) -> float:
+    t0 = time.perf_counter()
+    for _ in range(rounds):
+        for code in CODES:
+            func(code)
+    return (time.perf_counter() - t0) * 1e9 / (rounds * len(CODES))
+
+if __name__ == "__main__":
+    wrapper = WtBtWrapper(NullEngine())
+    old = legacy_calls(wrapper)
+    new = current_calls(wrapper)
+
+    rounds = 20000
+    print("%-24s%12s%12s%8s" % ("call", "legacy(ns)", "cached(ns)", "x"))
+    for name in old:
+        t_old = bench(old[name], rounds)
+        t_new = bench(new[name], rounds)
+        print("%-24s%12.0f%12.0f%8.1f" % (name, t_old, t_new, t_old / t_new))
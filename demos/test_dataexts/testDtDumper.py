@@ -12,10 +12,12 @@ class MyDataDumper(BaseExtDataDumper):
         加载历史K线（回测、实盘）
         @stdCode    合约代码，格式如CFFEX.IF.2106
         @period     周期，m1/m5/d1
-        @bars       回调函数，WTSBarStruct的指针
+        @bars       NpTypeBar格式的只读记录数组, 只在回调期间有效
         @count      数据条数
         '''
         print("dumping %s bars of %s via extended dumper" % (period, stdCode))
+        if count > 0:
+            print("last bar: %d %d, close %f" % (bars.date[-1], bars.time[-1], bars.close[-1]))
         return True
 
     def dump_his_ticks(self, stdCode:str, uDate:int, ticks, count:int) -> bool:
@@ -23,10 +25,12 @@ class MyDataDumper(BaseExtDataDumper):
         加载历史K线（只在回测有效，实盘只提供当日落地的）
         @stdCode    合约代码，格式如CFFEX.IF.2106
         @uDate      日期，格式如yyyymmdd
-        @ticks      回调函数，WTSTickStruct的指针
+        @ticks      NpTypeTick格式的只读记录数组, 只在回调期间有效
         @count      数据条数
         '''
         print("dumping ticks on %d of %s via extended dumper" % (uDate, stdCode))
+        if count > 0:
+            print("last tick: %d, price %f" % (ticks.action_time[-1], ticks.price[-1]))
         return True
 
 def test_ext_dumper():
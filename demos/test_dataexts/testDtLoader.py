@@ -1,7 +1,5 @@
 import time
 from wtpy.ExtModuleDefs import BaseExtDataLoader
-from ctypes import POINTER
-from wtpy.WtCoreDefs import WTSBarStruct, WTSTickStruct
 
 import pandas as pd
 
@@ -38,20 +36,10 @@ class MyDataLoader(BaseExtDataLoader):
         })
         df['date'] = df['date'].astype('datetime64').dt.strftime('%Y%m%d').astype('int64')
         df['time'] = (df['date'] - 19900000) * 10000 + df['time'].str.replace(':', '').str[:-2].astype('int')
-
-        BUFFER = WTSBarStruct * len(df)
-        buffer = BUFFER()
-
-        def assign(procession, buffer):
-            tuple(map(lambda x: setattr(buffer[x[0]], procession.name, x[1]), enumerate(procession)))
-
-        df.apply(assign, buffer=buffer)
         print(df)
-        print(buffer[0].to_dict())
-        print(buffer[-1].to_dict())
 
-        feeder(buffer, len(df))
-        return True
+        # 列名和NpTypeBar一致, 直接交给feeder, 不用逐条填充WTSBarStruct
+        return self.feed_bars(feeder, df)
 
     def load_his_ticks(self, stdCode: str, uDate: int, feeder) -> bool:
         '''
@@ -63,42 +51,36 @@ class MyDataLoader(BaseExtDataLoader):
         print("loading ticks on %d of %s from extended loader" % (uDate, stdCode))
 
         df = pd.read_csv('../storage/csv/rb主力连续_20201030.csv')
-        BUFFER = WTSTickStruct * len(df)
-        buffer = BUFFER()
 
         tags = ["一", "二", "三", "四", "五"]
 
-        for i in range(len(df)):
-            curTick = buffer[i]
-
-            curTick.exchg = b"SHFE"
-            curTick.code = b"SHFE.rb.HOT"
-
-            curTick.price = float(df[i]["最新价"])
-            curTick.open = float(df[i]["今开盘"])
-            curTick.high = float(df[i]["最高价"])
-            curTick.low = float(df[i]["最低价"])
-            curTick.settle = float(df[i]["本次结算价"])
-
-            curTick.total_volume = float(df[i]["数量"])
-            curTick.total_turnover = float(df[i]["成交额"])
-            curTick.open_interest = float(df[i]["持仓量"])
-
-            curTick.trading_date = int(df[i]["交易日"])
-            curTick.action_date = int(df[i]["业务日期"])
-            curTick.action_time = int(df[i]["最后修改时间"].replace(":", "")) * 1000 + int(df[i]["最后修改毫秒"])
-
-            curTick.pre_close = float(df[i]["昨收盘"])
-            curTick.pre_settle = float(df[i]["上次结算价"])
-            curTick.pre_interest = float(df[i]["昨持仓量"])
+        # 按列转成NpTypeTick的字段, 没有的字段填0
+        ticks = pd.DataFrame({
+            "exchg": "SHFE",
+            "code": "SHFE.rb.HOT",
+            "price": df["最新价"],
+            "open": df["今开盘"],
+            "high": df["最高价"],
+            "low": df["最低价"],
+            "settle_price": df["本次结算价"],
+            "total_volume": df["数量"],
+            "total_turnover": df["成交额"],
+            "open_interest": df["持仓量"],
+            "trading_date": df["交易日"],
+            "action_date": df["业务日期"],
+            "action_time": df["最后修改时间"].str.replace(":", "").astype(int) * 1000 + df["最后修改毫秒"],
+            "pre_close": df["昨收盘"],
+            "pre_settle": df["上次结算价"],
+            "pre_interest": df["昨持仓量"]
+        })
 
-            for x in range(5):
-                curTick.bid_prices[x] = float(df[i]["申买价" + tags[x]])
-                curTick.bid_qty[x] = float(df[i]["申买量" + tags[x]])
-                curTick.ask_prices[x] = float(df[i]["申卖价" + tags[x]])
-                curTick.ask_qty[x] = float(df[i]["申卖量" + tags[x]])
+        for x in range(5):
+            ticks["bid_price_%d" % x] = df["申买价" + tags[x]]
+            ticks["bid_qty_%d" % x] = df["申买量" + tags[x]]
+            ticks["ask_price_%d" % x] = df["申卖价" + tags[x]]
+            ticks["ask_qty_%d" % x] = df["申卖量" + tags[x]]
 
-        feeder(buffer, len(df))
+        return self.feed_ticks(feeder, ticks)
 
 
 def test_in_bt():
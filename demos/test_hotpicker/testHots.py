@@ -18,8 +18,9 @@ def rebuild_hot_rules():
     '''
     重构全部的主力合约切换规则
     '''
-    # 从交易所官网拉取行情快照
-    cacher = WtCacheMonExchg()  
+    # 从交易所官网拉取行情快照, 拉取过的快照落地到cache_path, 下次重构直接读取
+    # 周末和holidayfile中的节假日不拉取, 4个线程并发拉取, 每秒最多5个请求
+    cacher = WtCacheMonExchg(cache_path="./snapshot_cache/", holidayfile="../common/holidays.json", workers=4, rate_limit=5)
 
     # 从datakit落地的行情快照直接读取
     # cacher = WtCacheMonSS("../storage/his/snapshot/")
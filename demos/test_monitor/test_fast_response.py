@@ -0,0 +1,45 @@
+'''
+FastJSONResponse序列化列式数据的检查
+结构化数组按字段取出来的列是带步长的视图, orjson和标准json两种序列化方式都要能输出
+用法: python test_fast_response.py, 或者用pytest执行
+'''
+import json
+
+import numpy as np
+
+from wtpy.WtDataDefs import NpTypeBar
+import wtpy.monitor.FastResponse as FastResponse
+from wtpy.monitor.FastResponse import FastJSONResponse, np_to_columns
+
+def make_bars(count:int) -> np.ndarray:
+    npBars = np.zeros(count, dtype=NpTypeBar)
+    npBars["date"] = 20240104
+    npBars["time"] = np.arange(count) + 1401040930
+    npBars["close"] = np.arange(count) * 0.5 + 4000
+    return npBars
+
+def check_columnar(npBars:np.ndarray):
+    content = json.loads(FastJSONResponse({"bars": np_to_columns(npBars)}).body)
+    assert content["bars"]["close"] == npBars["close"].tolist()
+    assert content["bars"]["time"] == npBars["time"].tolist()
+
+    # 直接放不连续的视图, 也要能序列化
+    content = json.loads(FastJSONResponse({"close": npBars["close"]}).body)
+    assert content["close"] == npBars["close"].tolist()
+
+def test_columnar_orjson():
+    check_columnar(make_bars(3))
+
+def test_columnar_json():
+    # 模拟没有安装orjson的情况
+    orjson = FastResponse.orjson
+    FastResponse.orjson = None
+    try:
+        check_columnar(make_bars(3))
+    finally:
+        FastResponse.orjson = orjson
+
+if __name__ == "__main__":
+    test_columnar_orjson()
+    test_columnar_json()
+    print("orjson: %s, all passed" % ("installed" if FastResponse.orjson is not None else "not installed"))
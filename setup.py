@@ -38,6 +38,7 @@ REQUIRED = [
 # What packages are optional?
 EXTRAS = {
     # 'fancy feature': ['django'],
+    'monitor': ['orjson>=3.8.0', 'brotli>=1.0.9'],
 }
 
 # The rest you shouldn't have to touch too much :)
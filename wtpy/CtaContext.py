@@ -1,9 +1,11 @@
 from wtpy.ProductMgr import ProductInfo
 from wtpy.SessionMgr import SessionInfo
 from wtpy.ContractMgr import ContractInfo
-from wtpy.WtDataDefs import WtNpTicks, WtNpKline
+from wtpy.WtDataDefs import WtNpTicks, WtNpKline, WtTickView, WtNpTickBuffer
+from wtpy.WtDataDefs import TICK_MODE_DICT, TICK_MODE_VIEW, TICK_MODE_NUMPY
 from wtpy.WtCoreDefs import WTSBarStruct, WTSTickStruct
 from ctypes import POINTER
+import numpy as np
 
 class CtaContext:
     '''
@@ -23,6 +25,10 @@ class CtaContext:
         self.__tick_cache__ = dict()    #tTick缓存, 每次都重新去拉取, 这个只做中转用, 不在python里维护副本
         self.__sname__ = stra.name()    
         self.__engine__ = engine          #交易环境
+        self.__tick_mode__ = TICK_MODE_DICT   #tick推送模式
+        self.__tick_buffer__:WtNpTickBuffer = None
+        self.__inc_bars__ = False       #是否启用增量K线缓存
+        self.__inc_bar_cache__ = dict() #增量K线缓存, 只拉取上次调用以后新闭合的K线
         self.__pos_cache__ = None
 
         self.__alias__()
@@ -57,6 +63,7 @@ class CtaContext:
         self.get_last_entrytime = self.stra_get_last_entrytime
         self.get_last_exittime = self.stra_get_last_exittime
         self.get_position = self.stra_get_position
+        self.get_positions = self.stra_get_positions
         self.get_position_avgpx = self.stra_get_position_avgpx
         self.get_position_profit = self.stra_get_position_profit
         self.get_price = self.stra_get_price
@@ -67,7 +74,10 @@ class CtaContext:
         self.get_time = self.stra_get_time
         self.log_text = self.stra_log_text
         self.prepare_bars = self.stra_prepare_bars
+        self.set_incremental_bars = self.stra_set_incremental_bars
         self.set_position = self.stra_set_position
+        self.set_positions = self.stra_set_positions
+        self.set_tick_mode = self.stra_set_tick_mode
         self.sub_ticks = self.stra_sub_ticks
         self.sub_bar_events = self.stra_sub_bar_events
         pass
@@ -131,7 +141,13 @@ class CtaContext:
         '''
         tick回调事件响应
         '''
-        self.__stra_info__.on_tick(self, stdCode, newTick.contents.to_dict())
+        if self.__tick_mode__ == TICK_MODE_VIEW:
+            tick = WtTickView(newTick.contents)
+        elif self.__tick_mode__ == TICK_MODE_NUMPY:
+            tick = self.__tick_buffer__.update(stdCode, newTick)
+        else:
+            tick = newTick.contents.to_dict()
+        self.__stra_info__.on_tick(self, stdCode, tick)
 
     def on_bar(self, stdCode:str, period:str, newBar:POINTER(WTSBarStruct)):
         '''
@@ -268,6 +284,8 @@ class CtaContext:
         @isMain 是否是主K线
         '''
         key = "%s#%s" % (stdCode, period)
+        if self.__inc_bars__:
+            return self.__get_bars_incremental__(key, stdCode, period, count, isMain)
 
         cnt =  self.__wrapper__.cta_get_bars(self.__id__, stdCode, period, count, isMain)
         if cnt == 0:
@@ -277,6 +295,61 @@ class CtaContext:
 
         return npBars
 
+    def __get_bars_incremental__(self, key:str, stdCode:str, period:str, count:int, isMain:bool) -> WtNpKline:
+        '''
+        增量拉取K线
+        第一次拉取全部count条K线, 拷贝到固定容量的滚动缓存中
+        之后每次先拉取少量K线, 和缓存中最新的K线时间有重叠就只合并新的部分, 没有重叠则加倍再拉
+        '''
+        npCache = self.__inc_bar_cache__.get(key)
+        if npCache is None or npCache.capacity != count or len(npCache) == 0:
+            cnt = self.__wrapper__.cta_get_bars(self.__id__, stdCode, period, count, isMain)
+            if cnt == 0:
+                return None
+
+            npBars = self.__bar_cache__[key]
+            npCache = WtNpKline(npBars.is_day, capacity=count, ring=True)
+            npCache.append(npBars.ndarray)
+            self.__inc_bar_cache__[key] = npCache
+            self.__bar_cache__[key] = npCache
+            return npCache
+
+        field = "date" if npCache.is_day else "time"
+        lastTime = npCache.ndarray[field][-1]
+        fetchCnt = min(2, count)
+        while True:
+            cnt = self.__wrapper__.cta_get_bars(self.__id__, stdCode, period, fetchCnt, isMain)
+            if cnt == 0:
+                return None
+
+            newBars = self.__bar_cache__[key].ndarray
+            newTimes = newBars[field]
+            if newTimes[0] <= lastTime or cnt < fetchCnt or fetchCnt >= count:
+                break
+            fetchCnt = min(2*fetchCnt, count)
+
+        if newTimes[0] > lastTime:
+            # 新拉取的K线和缓存没有重叠, 直接整体替换
+            npCache.pop(len(npCache))
+        else:
+            # 最后几条K线可能是未闭合的, 和新拉取的重叠部分全部用新数据覆盖
+            curTimes = npCache.ndarray[field]
+            npCache.pop(len(curTimes) - int(np.searchsorted(curTimes, newTimes[0], side="left")))
+        npCache.append(newBars)
+        self.__bar_cache__[key] = npCache
+        return npCache
+
+    def stra_set_incremental_bars(self, bEnabled:bool = True):
+        '''
+        设置是否启用增量K线缓存, 一般在on_init调用
+        启用以后stra_get_bars每次只拉取新闭合的K线, 返回的是同一个滚动更新的WtNpKline对象
+        closes/highs等字段都是缓存上的视图, 如果要跨周期保存, 需要自行拷贝
+        @bEnabled   是否启用
+        '''
+        self.__inc_bars__ = bEnabled
+        if not bEnabled:
+            self.__inc_bar_cache__.clear()
+
     def stra_get_ticks(self, stdCode:str, count:int) -> WtNpTicks:
         '''
         获取tick数据
@@ -290,6 +363,19 @@ class CtaContext:
         np_ticks = self.__tick_cache__[stdCode]
         return np_ticks
 
+    def stra_set_tick_mode(self, mode:int = TICK_MODE_DICT):
+        '''
+        设置tick推送模式, 一般在on_init调用
+        @mode   推送模式, 0-dict(默认), 1-WTSTickStruct上的只读视图, 2-按合约复用的NpTypeTick缓冲区中的记录
+                后两种模式不会每笔tick都构造dict, 但是推送的对象只在当次回调内有效, 需要保存的话要自行拷贝
+        '''
+        if mode not in (TICK_MODE_DICT, TICK_MODE_VIEW, TICK_MODE_NUMPY):
+            raise ValueError("Unsupported tick mode: %s" % (mode))
+
+        self.__tick_mode__ = mode
+        if mode == TICK_MODE_NUMPY and self.__tick_buffer__ is None:
+            self.__tick_buffer__ = WtNpTickBuffer()
+
     def stra_sub_ticks(self, stdCode:str):
         '''
         订阅实时行情
@@ -366,6 +452,37 @@ class CtaContext:
         '''
         self.__wrapper__.cta_exit_short(self.__id__, stdCode, qty, usertag, limitprice, stopprice)
 
+    def stra_get_positions(self, codes:list, bonlyvalid:bool = False, usertag:str = "") -> np.ndarray:
+        '''
+        批量读取仓位, 适合横截面策略一次读取一篮子代码的仓位
+        @codes      合约/股票代码列表
+        @bonlyvalid 只读可用持仓, 默认为False
+        @usertag    入场标记
+        @return     和codes一一对应的仓位数组, 正为多仓, 负为空仓
+        '''
+        return self.__wrapper__.cta_get_positions(self.__id__, list(codes), bonlyvalid, usertag)
+
+    def stra_set_positions(self, targets, qtys = None, usertag:str = "", limitprice:float = 0.0, stopprice:float = 0.0):
+        '''
+        批量设置仓位
+        @targets    {代码:目标仓位}字典, 或者代码列表
+        @qtys       targets为代码列表时, 和代码一一对应的目标仓位, 可以是list或者numpy数组
+        @usertag    入场标记
+        @limitprice 限价, 对所有代码都生效
+        @stopprice  止损价, 对所有代码都生效
+        '''
+        if isinstance(targets, dict):
+            codes = list(targets.keys())
+            qtys = list(targets.values())
+        else:
+            codes = list(targets)
+
+        # 统一转成python的float, numpy的整数类型ctypes不认
+        qtys = np.asarray(qtys, dtype=np.float64).tolist()
+        if len(codes) != len(qtys):
+            raise ValueError("length of codes and qtys mismatch: %d vs %d" % (len(codes), len(qtys)))
+        self.__wrapper__.cta_set_positions(self.__id__, codes, qtys, usertag, limitprice, stopprice)
+
     def stra_get_last_entrytime(self, stdCode:str) -> int:
         '''
         获取当前持仓最后一次进场时间
@@ -1,4 +1,54 @@
+from ctypes import POINTER, addressof
 
+import numpy as np
+import pandas as pd
+
+from wtpy.WtCoreDefs import WTSBarStruct, WTSTickStruct
+from wtpy.WtDataDefs import NpTypeBar, NpTypeTick
+
+def to_np_array(data, dtype:np.dtype) -> np.ndarray:
+    '''
+    把数据转成dtype格式的连续数组\n
+    已经是同样格式的连续数组时直接返回, 不做拷贝
+    @data   numpy结构化数组, 或者列名和dtype字段名一致的DataFrame, 缺少的列填0
+    @dtype  NpTypeBar或者NpTypeTick
+    '''
+    if isinstance(data, pd.DataFrame):
+        ret = np.zeros(len(data), dtype=dtype)
+        for name in dtype.names:
+            if name in data.columns:
+                ret[name] = data[name].values
+        return ret
+
+    return np.ascontiguousarray(data, dtype=dtype)
+
+def view_as_np_array(ptr, count:int, dtype:np.dtype, struct) -> np.ndarray:
+    '''
+    把C接口传过来的结构体指针包装成只读的numpy记录数组, 不做拷贝\n
+    返回的数组只在回调期间有效, 需要保留的话要自己copy一份
+    @ptr    结构体指针, 如POINTER(WTSBarStruct)
+    @count  数据条数
+    @dtype  和结构体内存布局一致的dtype
+    @struct 结构体类型
+    '''
+    if count <= 0 or not ptr:
+        return np.zeros(0, dtype=dtype).view(np.recarray)
+
+    c_array = (struct*count).from_address(addressof(ptr.contents))
+    ret = np.frombuffer(c_array, dtype=dtype, count=count).view(np.recarray)
+    ret.flags.writeable = False
+    return ret
+
+def group_adj_factors(df:pd.DataFrame) -> tuple:
+    '''
+    把全市场的复权因子整理成按合约分组的数组, 用于BaseExtDataLoader.feed_grouped_adj_factors
+    @df     包含code、date、factor三列的DataFrame, code为标准代码, 如SSE.STK.600000
+    @return (codes, offsets, dates, factors), 第i个合约的数据是dates[offsets[i]:offsets[i+1]]
+    '''
+    df = df.sort_values(["code", "date"], kind="stable")
+    codes, starts = np.unique(df["code"].values, return_index=True)
+    offsets = np.append(starts, len(df))
+    return codes.tolist(), offsets, df["date"].values.astype(np.uint32), df["factor"].values.astype(np.float64)
 
 class BaseExtParser:
     '''
@@ -98,6 +148,36 @@ class BaseExtDataLoader:
     def __init__(self):
         pass
 
+    def feed_bars(self, feeder, bars) -> bool:
+        '''
+        把K线交给feeder, 一般在load_final_his_bars/load_raw_his_bars中调用\n
+        NpTypeBar和WTSBarStruct的内存布局一致, 连续的NpTypeBar数组直接传内存, 不做拷贝
+        @feeder 回调函数, 即load_final_his_bars/load_raw_his_bars传进来的feeder
+        @bars   NpTypeBar格式的numpy数组, 或者列名和NpTypeBar一致的DataFrame, 分钟线的time格式为(date-19900000)*10000+HHMM
+        @return 是否有数据
+        '''
+        bars = to_np_array(bars, NpTypeBar)
+        if len(bars) == 0:
+            return False
+
+        feeder(bars.ctypes.data_as(POINTER(WTSBarStruct)), len(bars))
+        return True
+
+    def feed_ticks(self, feeder, ticks) -> bool:
+        '''
+        把tick交给feeder, 一般在load_his_ticks中调用\n
+        NpTypeTick和WTSTickStruct的内存布局一致, 连续的NpTypeTick数组直接传内存, 不做拷贝
+        @feeder 回调函数, 即load_his_ticks传进来的feeder
+        @ticks  NpTypeTick格式的numpy数组, 或者列名和NpTypeTick一致的DataFrame
+        @return 是否有数据
+        '''
+        ticks = to_np_array(ticks, NpTypeTick)
+        if len(ticks) == 0:
+            return False
+
+        feeder(ticks.ctypes.data_as(POINTER(WTSTickStruct)), len(ticks))
+        return True
+
     def load_final_his_bars(self, stdCode:str, period:str, feeder) -> bool:
         '''
         加载最终历史K线（回测、实盘）
@@ -133,24 +213,75 @@ class BaseExtDataLoader:
         '''
         加载的权因子
         @stdCode    合约代码，格式如CFFEX.IF.2106，如果stdCode为空，则是加载全部除权数据，如果stdCode不为空，则按需加载
-         @feeder     回调函数，feed_adj_factors(stdCode:str, dates:list, factors:list)
+         @feeder     回调函数，feed_adj_factors(stdCode:str, dates, factors)，dates和factors可以是list或者numpy数组
+        全部加载时可以用feed_grouped_adj_factors一次提交
         '''
         return False
 
+    def feed_grouped_adj_factors(self, feeder, codes:list, offsets, dates, factors) -> int:
+        '''
+        一次提交多个合约的复权因子, 一般在load_adj_factors加载全部除权数据时调用\n
+        第i个合约的数据是dates[offsets[i]:offsets[i+1]]和factors[offsets[i]:offsets[i+1]], 切片直接引用原数组, 不做拷贝
+        @feeder     回调函数, 即load_adj_factors传进来的feeder
+        @codes      合约代码列表, 长度为n
+        @offsets    每个合约数据的起始位置, 长度为n+1, 最后一个是数据总条数
+        @dates      全部合约的日期, 格式如20230104
+        @factors    全部合约的复权因子
+        @return     提交的合约数
+        '''
+        offsets = np.asarray(offsets, dtype=np.int64).tolist()
+        if len(offsets) != len(codes) + 1:
+            raise ValueError("offsets should have %d items, %d given" % (len(codes) + 1, len(offsets)))
+
+        dates = np.ascontiguousarray(dates, dtype=np.uint32)
+        factors = np.ascontiguousarray(factors, dtype=np.float64)
+        count = 0
+        for idx, stdCode in enumerate(codes):
+            sIdx = offsets[idx]
+            eIdx = offsets[idx + 1]
+            if eIdx <= sIdx:
+                continue
+
+            feeder(stdCode, dates[sIdx:eIdx], factors[sIdx:eIdx])
+            count += 1
+        return count
+
 class BaseExtDataDumper:
 
-    def __init__(self, id:str):
+    def __init__(self, id:str, rawPointer:bool = False):
+        '''
+        构造函数
+        @id         落地器ID
+        @rawPointer 为True时dump_his_bars/dump_his_ticks收到的是原始的结构体指针, 否则是numpy记录数组
+        '''
         self.__id__ = id
+        self.__raw_pointer__ = rawPointer
 
     def id(self):
         return self.__id__
 
+    def on_dump_his_bars(self, stdCode:str, period:str, bars, count:int) -> bool:
+        '''
+        底层回调入口, 把指针包装成NpTypeBar的视图以后交给dump_his_bars
+        '''
+        if not self.__raw_pointer__:
+            bars = view_as_np_array(bars, count, NpTypeBar, WTSBarStruct)
+        return self.dump_his_bars(stdCode, period, bars, count)
+
+    def on_dump_his_ticks(self, stdCode:str, uDate:int, ticks, count:int) -> bool:
+        '''
+        底层回调入口, 把指针包装成NpTypeTick的视图以后交给dump_his_ticks
+        '''
+        if not self.__raw_pointer__:
+            ticks = view_as_np_array(ticks, count, NpTypeTick, WTSTickStruct)
+        return self.dump_his_ticks(stdCode, uDate, ticks, count)
+
     def dump_his_bars(self, stdCode:str, period:str, bars, count:int) -> bool:
         '''
         加载历史K线（回测、实盘）
         @stdCode    合约代码，格式如CFFEX.IF.2106
         @period     周期，m1/m5/d1
-        @bars       回调函数，WTSBarStruct的指针
+        @bars       NpTypeBar格式的只读记录数组, 直接引用底层内存, 只在回调期间有效; rawPointer为True时是WTSBarStruct的指针
         @count      数据条数
         '''
         return True
@@ -160,7 +291,7 @@ class BaseExtDataDumper:
         加载历史K线（只在回测有效，实盘只提供当日落地的）
         @stdCode    合约代码，格式如CFFEX.IF.2106
         @uDate      日期，格式如yyyymmdd
-        @ticks      回调函数，WTSTickStruct的指针
+        @ticks      NpTypeTick格式的只读记录数组, 直接引用底层内存, 只在回调期间有效; rawPointer为True时是WTSTickStruct的指针
         @count      数据条数
         '''
         return True
\ No newline at end of file
@@ -1,7 +1,8 @@
 from ctypes import POINTER
 from wtpy.SessionMgr import SessionInfo
 from wtpy.WtCoreDefs import WTSBarStruct, WTSOrdDtlStruct, WTSOrdQueStruct, WTSTickStruct, WTSTransStruct
-from wtpy.WtDataDefs import WtNpKline, WtNpOrdDetails, WtNpOrdQueues, WtNpTicks, WtNpTransactions
+from wtpy.WtDataDefs import WtNpKline, WtNpOrdDetails, WtNpOrdQueues, WtNpTicks, WtNpTransactions, WtTickView, WtNpTickBuffer
+from wtpy.WtDataDefs import TICK_MODE_DICT, TICK_MODE_VIEW, TICK_MODE_NUMPY
 
 class HftContext:
     '''
@@ -24,6 +25,8 @@ class HftContext:
         self.__trans_cache__ = dict()   #逐笔成交缓存
         self.__sname__ = stra.name()    
         self.__engine__ = engine          #交易环境
+        self.__tick_mode__ = TICK_MODE_DICT   #tick推送模式
+        self.__tick_buffer__:WtNpTickBuffer = None
 
         self.is_backtest = self.__engine__.is_backtest
 
@@ -70,7 +73,13 @@ class HftContext:
         '''
         tick回调事件响应
         '''
-        self.__stra_info__.on_tick(self, stdCode, newTick.contents.to_dict())
+        if self.__tick_mode__ == TICK_MODE_VIEW:
+            tick = WtTickView(newTick.contents)
+        elif self.__tick_mode__ == TICK_MODE_NUMPY:
+            tick = self.__tick_buffer__.update(stdCode, newTick)
+        else:
+            tick = newTick.contents.to_dict()
+        self.__stra_info__.on_tick(self, stdCode, tick)
 
     def on_order_queue(self, stdCode:str, newOrdQue:POINTER(WTSOrdQueStruct)):
         '''
@@ -342,6 +351,19 @@ class HftContext:
             return None
         return self.__engine__.getSessionByCode(stdCode)
 
+    def stra_set_tick_mode(self, mode:int = TICK_MODE_DICT):
+        '''
+        设置tick推送模式, 一般在on_init调用
+        @mode   推送模式, 0-dict(默认), 1-WTSTickStruct上的只读视图, 2-按合约复用的NpTypeTick缓冲区中的记录
+                后两种模式不会每笔tick都构造dict, 但是推送的对象只在当次回调内有效, 需要保存的话要自行拷贝
+        '''
+        if mode not in (TICK_MODE_DICT, TICK_MODE_VIEW, TICK_MODE_NUMPY):
+            raise ValueError("Unsupported tick mode: %s" % (mode))
+
+        self.__tick_mode__ = mode
+        if mode == TICK_MODE_NUMPY and self.__tick_buffer__ is None:
+            self.__tick_buffer__ = WtNpTickBuffer()
+
     def stra_sub_ticks(self, stdCode:str):
         '''
         订阅实时行情数据
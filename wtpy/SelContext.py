@@ -1,6 +1,8 @@
 from ctypes import POINTER
 from wtpy.WtCoreDefs import WTSBarStruct, WTSTickStruct
-from wtpy.WtDataDefs import WtNpKline, WtNpTicks
+from wtpy.WtDataDefs import WtNpKline, WtNpTicks, WtTickView, WtNpTickBuffer
+from wtpy.WtDataDefs import TICK_MODE_DICT, TICK_MODE_VIEW, TICK_MODE_NUMPY
+import numpy as np
 
 class SelContext:
     '''
@@ -20,6 +22,8 @@ class SelContext:
         self.__tick_cache__ = dict()    #tTick缓存，每次都重新去拉取，这个只做中转用，不在python里维护副本
         self.__sname__ = stra.name()    
         self.__engine__ = engine          #交易环境
+        self.__tick_mode__ = TICK_MODE_DICT   #tick推送模式
+        self.__tick_buffer__:WtNpTickBuffer = None
         self.__pos_cache__ = None
 
         self.is_backtest = self.__engine__.is_backtest
@@ -48,6 +52,7 @@ class SelContext:
         self.get_last_entrytime = self.stra_get_last_entrytime
         self.get_last_exittime = self.stra_get_last_exittime
         self.get_position = self.stra_get_position
+        self.get_positions = self.stra_get_positions
         self.get_position_avgpx = self.stra_get_position_avgpx
         self.get_position_profit = self.stra_get_position_profit
         self.get_price = self.stra_get_price
@@ -59,6 +64,8 @@ class SelContext:
         self.log_text = self.stra_log_text
         self.prepare_bars = self.stra_prepare_bars
         self.set_position = self.stra_set_position
+        self.set_positions = self.stra_set_positions
+        self.set_tick_mode = self.stra_set_tick_mode
         self.sub_ticks = self.stra_sub_ticks
         pass
 
@@ -115,7 +122,13 @@ class SelContext:
         self.__bar_cache__[key] = npBars
 
     def on_tick(self, stdCode:str, newTick:POINTER(WTSTickStruct)):
-        self.__stra_info__.on_tick(self, stdCode, newTick.contents.to_dict())
+        if self.__tick_mode__ == TICK_MODE_VIEW:
+            tick = WtTickView(newTick.contents)
+        elif self.__tick_mode__ == TICK_MODE_NUMPY:
+            tick = self.__tick_buffer__.update(stdCode, newTick)
+        else:
+            tick = newTick.contents.to_dict()
+        self.__stra_info__.on_tick(self, stdCode, tick)
 
     def on_bar(self, stdCode:str, period:str, newBar:POINTER(WTSBarStruct)):
         '''
@@ -265,6 +278,19 @@ class SelContext:
         np_ticks = self.__tick_cache__[stdCode]
         return np_ticks
 
+    def stra_set_tick_mode(self, mode:int = TICK_MODE_DICT):
+        '''
+        设置tick推送模式, 一般在on_init调用
+        @mode   推送模式, 0-dict(默认), 1-WTSTickStruct上的只读视图, 2-按合约复用的NpTypeTick缓冲区中的记录
+                后两种模式不会每笔tick都构造dict, 但是推送的对象只在当次回调内有效, 需要保存的话要自行拷贝
+        '''
+        if mode not in (TICK_MODE_DICT, TICK_MODE_VIEW, TICK_MODE_NUMPY):
+            raise ValueError("Unsupported tick mode: %s" % (mode))
+
+        self.__tick_mode__ = mode
+        if mode == TICK_MODE_NUMPY and self.__tick_buffer__ is None:
+            self.__tick_buffer__ = WtNpTickBuffer()
+
     def stra_sub_ticks(self, stdCode:str):
         '''
         订阅实时行情
@@ -290,6 +316,35 @@ class SelContext:
         '''
         self.__wrapper__.sel_set_position(self.__id__, stdCode, qty, usertag)
 
+    def stra_get_positions(self, codes:list, bonlyvalid:bool = False, usertag:str = "") -> np.ndarray:
+        '''
+        批量读取仓位, 适合横截面策略一次读取一篮子代码的仓位
+        @codes      合约/股票代码列表
+        @bonlyvalid 只读可用持仓, 默认为False
+        @usertag    入场标记
+        @return     和codes一一对应的仓位数组, 正为多仓, 负为空仓
+        '''
+        return self.__wrapper__.sel_get_positions(self.__id__, list(codes), bonlyvalid, usertag)
+
+    def stra_set_positions(self, targets, qtys = None, usertag:str = ""):
+        '''
+        批量设置仓位
+        @targets    {代码:目标仓位}字典, 或者代码列表
+        @qtys       targets为代码列表时, 和代码一一对应的目标仓位, 可以是list或者numpy数组
+        @usertag    入场标记
+        '''
+        if isinstance(targets, dict):
+            codes = list(targets.keys())
+            qtys = list(targets.values())
+        else:
+            codes = list(targets)
+
+        # 统一转成python的float, numpy的整数类型ctypes不认
+        qtys = np.asarray(qtys, dtype=np.float64).tolist()
+        if len(codes) != len(qtys):
+            raise ValueError("length of codes and qtys mismatch: %d vs %d" % (len(codes), len(qtys)))
+        self.__wrapper__.sel_set_positions(self.__id__, codes, qtys, usertag)
+
     def stra_get_last_entrytime(self, stdCode:str) -> int:
         '''
         获取当前持仓最后一次进场时间
@@ -3,7 +3,7 @@ import numpy as np
 import pandas as pd
 
 import numpy as np
-from ctypes import POINTER, addressof
+from ctypes import POINTER, addressof, memmove
 
 from wtpy.WtCoreDefs import WTSBarStruct, WTSTickStruct
 
@@ -34,24 +34,89 @@ NpTypeOrdQue = np.dtype([('exchg','S16'),('code','S32'),('trading_date','u4'),('
 NpTypeOrdDtl = np.dtype([('exchg','S16'),('code','S32'),('trading_date','u4'),('action_date','u4'),('action_time','u4'),\
                 ('reserve1','u4'),('index','u8'),('price','d'),('volume','u4'),('side','u4'),('otype','u4'),('reserve2','u4')])
 
-class WtNpKline:
+# tick推送模式
+TICK_MODE_DICT  = 0     # 转成dict推送, 默认模式, 兼容老的策略
+TICK_MODE_VIEW  = 1     # 直接推送WTSTickStruct内存上的只读视图, 不做任何拷贝
+TICK_MODE_NUMPY = 2     # 拷贝到按合约复用的NpTypeTick缓冲区, 推送其中的一条记录
+
+class WtTickView:
     '''
-    基于numpy.ndarray的K线数据容器
-    提供一些常用的属性和方法
+    基于WTSTickStruct内存的只读tick视图
+    字段按需读取, 支持tick["price"]和tick.price两种访问方式, 和dict模式下的策略写法兼容
+    注意: 视图引用的是底层的内存, 只在on_tick回调内有效, 如果要保存, 请调用to_dict
     '''
-    __type__:np.dtype = NpTypeBar
-    def __init__(self, isDay:bool = False, forceCopy:bool = False):
+    __slots__ = ("__tick__",)
+
+    def __init__(self, tick:WTSTickStruct):
+        object.__setattr__(self, "__tick__", tick)
+
+    def __getitem__(self, key:str):
+        try:
+            return getattr(self.__tick__, key)
+        except AttributeError:
+            raise KeyError(key)
+
+    def __getattr__(self, key:str):
+        return getattr(self.__tick__, key)
+
+    def __setattr__(self, key:str, val):
+        raise AttributeError("WtTickView is read-only")
+
+    def __contains__(self, key:str) -> bool:
+        return hasattr(self.__tick__, key)
+
+    def get(self, key:str, defVal = None):
+        return getattr(self.__tick__, key, defVal)
+
+    def keys(self) -> list:
+        return [i[0] for i in WTSTickStruct._fields_]
+
+    def to_dict(self) -> dict:
+        return self.__tick__.to_dict()
+
+class WtNpTickBuffer:
+    '''
+    按合约复用的NpTypeTick缓冲区
+    每个合约只分配一次内存, 新的tick直接整块拷贝进去, 返回的是缓冲区中记录的引用
+    同一个合约的下一笔tick到来时, 之前返回的记录会被覆盖
+    '''
+    def __init__(self):
+        self.__buffers__:dict = dict()
+
+    def update(self, stdCode:str, newTick:POINTER(WTSTickStruct)) -> np.void:
+        buf = self.__buffers__.get(stdCode)
+        if buf is None:
+            buf = np.zeros(1, dtype=NpTypeTick)
+            self.__buffers__[stdCode] = buf
+
+        # NpTypeTick和WTSTickStruct的内存布局是一致的, 直接整块拷贝
+        memmove(buf.ctypes.data, addressof(newTick.contents), NpTypeTick.itemsize)
+        return buf[0]
+
+class WtNpContainer:
+    '''
+    基于numpy.ndarray的数据容器基类
+    只有一块数据的时候, 直接引用(或拷贝一次)底层的内存
+    多次set_data的时候, 数据会拷贝到预分配的缓冲区中, 每条数据只拷贝一次, 不再反复concatenate
+    ring模式下只保留最新的capacity条数据, 可以用作滚动窗口
+    '''
+    __type__:np.dtype = None
+    __struct__ = None
+    def __init__(self, forceCopy:bool = False, capacity:int = 0, ring:bool = False):
         '''
-        基于numpy.ndarray的K线数据容器
-        @isDay      是否是日线数据, 主要用于控制bartimes的生成机制
         @forceCopy  是否强制拷贝, 如果为True, 则会拷贝一份数据, 否则会直接引用内存中的数据
-                    强制拷贝主要用于WtDtHelper的read_dsb_bars和read_dmb_bars接口, 因为这两个接口返回的数据是临时的, 调用结束就会释放
+        @capacity   预分配的容量, 一般由on_data_count传入的数据总条数决定, ring模式下为窗口大小
+        @ring       是否是固定容量的环形缓冲区, 超出容量的老数据会被丢弃
         '''
+        if ring and capacity <= 0:
+            raise ValueError("capacity must be positive in ring mode")
+
         self.__data__:np.ndarray = None
-        self.__isDay__:bool = isDay
         self.__force_copy__:bool = forceCopy
-        self.__bartimes__:np.ndarray = None
-        self.__df__:pd.DataFrame = None
+        self.__buffer__:np.ndarray = None
+        self.__size__:int = 0
+        self.__capacity__:int = capacity
+        self.__ring__:bool = ring
 
     def __len__(self):
         if self.__data__ is None:
@@ -61,35 +126,171 @@ class WtNpKline:
     
     def __getitem__(self, index:int):
         if self.__data__ is None:
-            raise IndexError("No data in WtNpKline")
+            raise IndexError("No data in %s" % (self.__class__.__name__))
         
         return self.__data__[index]
 
-    def set_day_flag(self, isDay:bool):
-        if self.__isDay__ != isDay:
-            self.__isDay__ = isDay
-            self.__bartimes__ = None
-            self.__df__ = None
+    @property
+    def capacity(self) -> int:
+        return self.__capacity__
+
+    def reserve(self, count:int):
+        '''
+        预留容量, ring模式下容量固定, 不做处理
+        @count  预计的数据总条数
+        '''
+        if self.__ring__ or count <= self.__capacity__:
+            return
+        
+        self.__capacity__ = count
+        if self.__buffer__ is not None and len(self.__buffer__) < count:
+            self.__grow__(count)
 
-    def set_data(self, firstBar, count:int):
-        BarList = WTSBarStruct*count
-        if self.__force_copy__:
-            c_array = BarList.from_buffer_copy(BarList.from_address(addressof(firstBar.contents)))
+    def set_data(self, firstItem, count:int):
+        if count <= 0:
+            return
+
+        if isinstance(firstItem, np.ndarray):
+            # 已经是numpy数组了, 如数据落地器收到的视图
+            data = np.asarray(firstItem[:count], dtype=self.__type__)
+            if self.__data__ is None and not self.__ring__ and count >= self.__capacity__:
+                self.__data__ = data.copy() if self.__force_copy__ else data
+                self.__data__.flags.writeable = self.__force_copy__
+                self.__on_data_changed__()
+            else:
+                self.append(data)
+            return
+
+        if self.__data__ is None and not self.__ring__ and count >= self.__capacity__:
+            # 一次就是全部数据, 直接引用底层内存, 或者拷贝一次
+            DataList = self.__struct__*count
+            if self.__force_copy__:
+                c_array = DataList.from_buffer_copy(DataList.from_address(addressof(firstItem.contents)))
+            else:
+                c_array = DataList.from_buffer(DataList.from_address(addressof(firstItem.contents)))
+
+            self.__data__ = np.frombuffer(c_array, dtype=self.__type__, count=count)
+            self.__data__.flags.writeable = False
         else:
-            c_array = BarList.from_buffer(BarList.from_address(addressof(firstBar.contents)))
-        npAy = np.frombuffer(c_array, dtype=self.__type__, count=count)
+            self.__append__(addressof(firstItem.contents), count)
 
-        # 这里有点不高效，需要拼接的地方，主要是WtDtServo的场景，这里慢点没关系
-        if self.__data__ is not None:
-            self.__data__ = np.concatenate((self.__data__, npAy))
-            self.__data__.flags.writeable = self.__force_copy__
+        self.__on_data_changed__()
+
+    def __on_data_changed__(self):
+        '''
+        数据变化以后, 子类在这里清理派生数据的缓存
+        '''
+        pass
+
+    def __grow__(self, capacity:int):
+        buffer = np.empty(capacity, dtype=self.__type__)
+        if self.__size__ > 0:
+            buffer[:self.__size__] = self.__buffer__[:self.__size__]
+        self.__buffer__ = buffer
+
+    def __append__(self, address:int, count:int):
+        itemSize = self.__type__.itemsize
+        if self.__buffer__ is None:
+            # 第一次需要拼接的时候才分配缓冲区, 已经引用的数据拷贝进来
+            # ring模式分配两倍容量, 这样最新的数据始终是连续的, 不用每次都挪动
+            if self.__ring__:
+                cap = 2*self.__capacity__
+            else:
+                cap = max(self.__capacity__, len(self) + count)
+            self.__buffer__ = np.empty(cap, dtype=self.__type__)
+            self.__size__ = 0
+            if self.__data__ is not None:
+                old = self.__data__[-self.__capacity__:] if self.__ring__ else self.__data__
+                self.__size__ = len(old)
+                self.__buffer__[:self.__size__] = old
+
+        if self.__ring__:
+            cap = self.__capacity__
+            if count >= cap:
+                # 新数据就超过了窗口, 只保留最新的部分
+                address += (count - cap)*itemSize
+                count = cap
+                self.__size__ = 0
+            elif self.__size__ + count > len(self.__buffer__):
+                # 缓冲区写满了, 把窗口内还要保留的数据挪到最前面
+                keep = min(cap - count, self.__size__)
+                self.__buffer__[:keep] = self.__buffer__[self.__size__-keep:self.__size__]
+                self.__size__ = keep
+        elif self.__size__ + count > len(self.__buffer__):
+            # 容量不够的时候按倍数扩容, 保证均摊下来每条数据只拷贝常数次
+            self.__grow__(max(self.__size__ + count, 2*len(self.__buffer__)))
+
+        memmove(self.__buffer__.ctypes.data + self.__size__*itemSize, address, count*itemSize)
+        self.__size__ += count
+        self.__refresh_view__()
+
+    def __refresh_view__(self):
+        start = max(0, self.__size__ - self.__capacity__) if self.__ring__ else 0
+        self.__data__ = self.__buffer__[start:self.__size__]
+        self.__data__.flags.writeable = self.__force_copy__
+
+    def append(self, data:np.ndarray):
+        '''
+        追加一段同样结构的ndarray, 数据会拷贝到内部的缓冲区中
+        @data   要追加的数据, dtype要和容器一致
+        '''
+        if len(data) == 0:
+            return
+
+        data = np.ascontiguousarray(data, dtype=self.__type__)
+        self.__append__(data.ctypes.data, len(data))
+        self.__on_data_changed__()
+
+    def pop(self, count:int = 1):
+        '''
+        丢弃最新的count条数据, 主要用于用新数据覆盖未闭合的K线
+        @count  丢弃的条数
+        '''
+        count = min(count, len(self))
+        if count <= 0:
+            return
+
+        if self.__buffer__ is None:
+            self.__data__ = self.__data__[:len(self.__data__)-count]
         else:
-            self.__data__ = npAy
-            self.__data__.flags.writeable = False
+            self.__size__ -= count
+            self.__refresh_view__()
+        self.__on_data_changed__()
 
     @property
     def ndarray(self) -> np.ndarray:
         return self.__data__
+
+class WtNpKline(WtNpContainer):
+    '''
+    基于numpy.ndarray的K线数据容器
+    提供一些常用的属性和方法
+    '''
+    __type__:np.dtype = NpTypeBar
+    __struct__ = WTSBarStruct
+    def __init__(self, isDay:bool = False, forceCopy:bool = False, capacity:int = 0, ring:bool = False):
+        '''
+        基于numpy.ndarray的K线数据容器
+        @isDay      是否是日线数据, 主要用于控制bartimes的生成机制
+        @forceCopy  是否强制拷贝, 如果为True, 则会拷贝一份数据, 否则会直接引用内存中的数据
+                    强制拷贝主要用于WtDtHelper的read_dsb_bars和read_dmb_bars接口, 因为这两个接口返回的数据是临时的, 调用结束就会释放
+        @capacity   预分配的容量, ring模式下为滚动窗口的大小
+        @ring       是否只保留最新的capacity条K线
+        '''
+        WtNpContainer.__init__(self, forceCopy=forceCopy, capacity=capacity, ring=ring)
+        self.__isDay__:bool = isDay
+        self.__bartimes__:np.ndarray = None
+        self.__df__:pd.DataFrame = None
+
+    def set_day_flag(self, isDay:bool):
+        if self.__isDay__ != isDay:
+            self.__isDay__ = isDay
+            self.__bartimes__ = None
+            self.__df__ = None
+
+    def __on_data_changed__(self):
+        self.__bartimes__ = None
+        self.__df__ = None
     
     @property
     def opens(self) -> np.ndarray:
@@ -137,51 +338,28 @@ class WtNpKline:
             self.__df__["bartime"] = self.__df__.index
         return self.__df__
     
-class WtNpTicks:
+class WtNpTicks(WtNpContainer):
     '''
     基于numpy.ndarray的tick数据容器
     提供一些常用的属性和方法
     '''
     __type__:np.dtype = NpTypeTick
-    def __init__(self, forceCopy:bool = False):
+    __struct__ = WTSTickStruct
+    def __init__(self, forceCopy:bool = False, capacity:int = 0, ring:bool = False):
         '''
         基于numpy.ndarray的tick数据容器
         @forceCopy  是否强制拷贝, 如果为True, 则会拷贝一份数据, 否则会直接引用内存中的数据
                     强制拷贝主要用于WtDtHelper的read_dsb_ticks和read_dmb_ticks接口, 因为这两个接口返回的数据是临时的, 调用结束就会释放
+        @capacity   预分配的容量, ring模式下为滚动窗口的大小
+        @ring       是否只保留最新的capacity条tick
         '''
-        self.__data__:np.ndarray = None
+        WtNpContainer.__init__(self, forceCopy=forceCopy, capacity=capacity, ring=ring)
         self.__times__:np.ndarray = None
-        self.__force_copy__:bool = forceCopy
         self.__df__:pd.DataFrame = None
 
-    def __len__(self):
-        if self.__data__ is None:
-            return 0
-        
-        return len(self.__data__)
-    
-    def __getitem__(self, index:int):
-        if self.__data__ is None:
-            raise IndexError("No data in WtNpTicks")
-        
-        return self.__data__[index]
-
-    def set_data(self, firstTick, count:int):
-        BarList = WTSTickStruct*count
-        if self.__force_copy__:
-            c_array = BarList.from_buffer_copy(BarList.from_address(addressof(firstTick.contents)))
-        else:
-            c_array = BarList.from_buffer(BarList.from_address(addressof(firstTick.contents)))
-
-        npAy = np.frombuffer(c_array, dtype=self.__type__, count=count)
-        # 这里有点不高效，需要拼接的地方主要是WtDtServo的场景，这里慢点没关系
-        # 一旦触发拼接逻辑，都会拷贝一次
-        if self.__data__ is not None:
-            self.__data__ = np.concatenate((self.__data__, npAy))
-            self.__data__.flags.writeable = self.__force_copy__
-        else:
-            self.__data__ = npAy
-            self.__data__.flags.writeable = False
+    def __on_data_changed__(self):
+        self.__times__ = None
+        self.__df__ = None
 
     @property
     def times(self) -> np.ndarray:
@@ -199,154 +377,57 @@ class WtNpTicks:
             self.__df__.drop(columns=["reserve"], inplace=True)
             self.__df__["time"] = self.__df__.index
         return self.__df__
-
-    @property
-    def ndarray(self) -> np.ndarray:
-        return self.__data__
     
-class WtNpTransactions:
+class WtNpTransactions(WtNpContainer):
     '''
     基于numpy.ndarray的逐笔成交数据容器
     提供一些常用的属性和方法
     '''
     __type__:np.dtype = NpTypeTrans
-    def __init__(self, forceCopy:bool = False):
+    __struct__ = WTSTransStruct
+    def __init__(self, forceCopy:bool = False, capacity:int = 0, ring:bool = False):
         '''
         基于numpy.ndarray的逐笔成交数据容器
         @forceCopy  是否强制拷贝, 如果为True, 则会拷贝一份数据, 否则会直接引用内存中的数据
                     强制拷贝主要用于WtDtHelper的read_dsb_trans和read_dmb_trans接口, 因为这两个接口返回的数据是临时的, 调用结束就会释放
+        @capacity   预分配的容量, ring模式下为滚动窗口的大小
+        @ring       是否只保留最新的capacity条数据
         '''
-        self.__data__:np.ndarray = None
-        self.__force_copy__:bool = forceCopy
-
-    def __len__(self):
-        if self.__data__ is None:
-            return 0
-        
-        return len(self.__data__)
+        WtNpContainer.__init__(self, forceCopy=forceCopy, capacity=capacity, ring=ring)
     
-    def __getitem__(self, index:int):
-        if self.__data__ is None:
-            raise IndexError("No data in WtNpTransactions")
-        
-        return self.__data__[index]
-
-    def set_data(self, firstItem, count:int):
-        DataList = WTSTransStruct*count
-        if self.__force_copy__:
-            c_array = DataList.from_buffer_copy(DataList.from_address(addressof(firstItem.contents)))
-        else:
-            c_array = DataList.from_buffer(DataList.from_address(addressof(firstItem.contents)))
-        
-        npAy = np.frombuffer(c_array, dtype=self.__type__, count=count)
-        # 这里有点不高效，需要拼接的地方主要是WtDtServo的场景，这里慢点没关系
-        # 一旦触发拼接逻辑，都会拷贝一次
-        if self.__data__ is not None:
-            self.__data__ = np.concatenate((self.__data__, npAy))
-            self.__data__.flags.writeable = self.__force_copy__
-        else:
-            self.__data__ = npAy
-            self.__data__.flags.writeable = False
-
-    @property
-    def ndarray(self) -> np.ndarray:
-        return self.__data__
-    
-class WtNpOrdDetails:
+class WtNpOrdDetails(WtNpContainer):
     '''
     基于numpy.ndarray的逐笔委托数据容器
     提供一些常用的属性和方法
     '''
     __type__:np.dtype = NpTypeOrdDtl
-    def __init__(self, forceCopy:bool = False):
+    __struct__ = WTSOrdDtlStruct
+    def __init__(self, forceCopy:bool = False, capacity:int = 0, ring:bool = False):
         '''
         基于numpy.ndarray的逐笔委托数据容器
         @forceCopy  是否强制拷贝, 如果为True, 则会拷贝一份数据, 否则会直接引用内存中的数据
                     强制拷贝主要用于WtDtHelper的read_dsb_trans和read_dmb_trans接口, 因为这两个接口返回的数据是临时的, 调用结束就会释放
+        @capacity   预分配的容量, ring模式下为滚动窗口的大小
+        @ring       是否只保留最新的capacity条数据
         '''
-        self.__data__:np.ndarray = None
-        self.__force_copy__:bool = forceCopy
-
-    def __len__(self):
-        if self.__data__ is None:
-            return 0
-        
-        return len(self.__data__)
+        WtNpContainer.__init__(self, forceCopy=forceCopy, capacity=capacity, ring=ring)
     
-    def __getitem__(self, index:int):
-        if self.__data__ is None:
-            raise IndexError("No data in WtNpOrdDetails")
-        
-        return self.__data__[index]
-
-    def set_data(self, firstItem, count:int):
-        DataList = WTSOrdDtlStruct*count
-        if self.__force_copy__:
-            c_array = DataList.from_buffer_copy(DataList.from_address(addressof(firstItem.contents)))
-        else:
-            c_array = DataList.from_buffer(DataList.from_address(addressof(firstItem.contents)))
-
-        npAy = np.frombuffer(c_array, dtype=self.__type__, count=count)
-        # 这里有点不高效，需要拼接的地方主要是WtDtServo的场景，这里慢点没关系
-        # 一旦触发拼接逻辑，都会拷贝一次
-        if self.__data__ is not None:
-            self.__data__ = np.concatenate((self.__data__, npAy))
-            self.__data__.flags.writeable = self.__force_copy__
-        else:
-            self.__data__ = npAy
-            self.__data__.flags.writeable = False
-
-    @property
-    def ndarray(self) -> np.ndarray:
-        return self.__data__
-    
-class WtNpOrdQueues:
+class WtNpOrdQueues(WtNpContainer):
     '''
     基于numpy.ndarray的委托队列数据容器
     提供一些常用的属性和方法
     '''
     __type__:np.dtype = NpTypeOrdQue
-    def __init__(self, forceCopy:bool = False):
+    __struct__ = WTSOrdQueStruct
+    def __init__(self, forceCopy:bool = False, capacity:int = 0, ring:bool = False):
         '''
         基于numpy.ndarray的委托队列数据容器
         @forceCopy  是否强制拷贝, 如果为True, 则会拷贝一份数据, 否则会直接引用内存中的数据
                     强制拷贝主要用于WtDtHelper的read_dsb_trans和read_dmb_trans接口, 因为这两个接口返回的数据是临时的, 调用结束就会释放
+        @capacity   预分配的容量, ring模式下为滚动窗口的大小
+        @ring       是否只保留最新的capacity条数据
         '''
-        self.__data__:np.ndarray = None
-        self.__force_copy__:bool = forceCopy
-
-    def __len__(self):
-        if self.__data__ is None:
-            return 0
-        
-        return len(self.__data__)
-    
-    def __getitem__(self, index:int):
-        if self.__data__ is None:
-            raise IndexError("No data in WtNpOrdQueues")
-        
-        return self.__data__[index]
-
-    def set_data(self, firstItem, count:int):
-        DataList = WTSOrdQueStruct*count
-        if self.__force_copy__:
-            c_array = DataList.from_buffer_copy(DataList.from_address(addressof(firstItem.contents)))
-        else:
-            c_array = DataList.from_buffer(DataList.from_address(addressof(firstItem.contents)))
-
-        npAy = np.frombuffer(c_array, dtype=self.__type__, count=count)
-        # 这里有点不高效，需要拼接的地方主要是WtDtServo的场景，这里慢点没关系
-        # 一旦触发拼接逻辑，都会拷贝一次
-        if self.__data__ is not None:
-            self.__data__ = np.concatenate((self.__data__, npAy))
-            self.__data__.flags.writeable = self.__force_copy__
-        else:
-            self.__data__ = npAy
-            self.__data__.flags.writeable = False
-
-    @property
-    def ndarray(self) -> np.ndarray:
-        return self.__data__
+        WtNpContainer.__init__(self, forceCopy=forceCopy, capacity=capacity, ring=ring)
     
 class WtBarCache:
     def __init__(self, isDay:bool = False, forceCopy:bool = False):
@@ -357,16 +438,16 @@ class WtBarCache:
 
     def on_read_bar(self, firstItem:POINTER(WTSBarStruct), count:int, isLast:bool):
         if self.records is None:
-            self.records = WtNpKline(isDay=self.__is_day__, forceCopy=self.__force_copy__)
+            self.records = WtNpKline(isDay=self.__is_day__, forceCopy=self.__force_copy__, capacity=self.__total_count__)
 
-        # 多次set_data，会在内部自动concatenate
+        # 多次set_data，会拷贝到按总条数预分配的缓冲区中
         self.records.set_data(firstItem, count)
 
     def on_data_count(self, count:int):
-        # 其实这里最好的处理方式是能够直接将底层的内存块拷贝，拼接成一块大的内存块
-        # 但是暂时没想好怎么处理，所以只能多次set_data了，会损失一些性能，但是比以前快
+        # 总条数用于预分配缓冲区，后面每一块数据都只拷贝一次
         self.__total_count__ = count
-        pass
+        if self.records is not None:
+            self.records.reserve(count)
 
 class WtTickCache:
     def __init__(self, forceCopy:bool = False):
@@ -376,13 +457,13 @@ class WtTickCache:
 
     def on_read_tick(self, firstItem:POINTER(WTSTickStruct), count:int, isLast:bool):
         if self.records is None:
-            self.records = WtNpTicks(forceCopy=self.__force_copy__)
+            self.records = WtNpTicks(forceCopy=self.__force_copy__, capacity=self.__total_count__)
 
-        # 多次set_data，会在内部自动concatenate
+        # 多次set_data，会拷贝到按总条数预分配的缓冲区中
         self.records.set_data(firstItem, count)
 
     def on_data_count(self, count:int):
-        # 其实这里最好的处理方式是能够直接将底层的内存块拷贝，拼接成一块大的内存块
-        # 但是暂时没想好怎么处理，所以只能多次set_data了，会损失一些性能，但是比以前快
+        # 总条数用于预分配缓冲区，后面每一块数据都只拷贝一次
         self.__total_count__ = count
-        pass
\ No newline at end of file
+        if self.records is not None:
+            self.records.reserve(count)
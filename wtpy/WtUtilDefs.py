@@ -13,3 +13,50 @@ def deprecated(func):
         print(msg)
         return func(*args, **kwargs)
     return wrapper
+
+
+class CodeCache:
+    '''
+    短字符串和C字符串的双向缓存\n
+    合约代码、K线周期、用户标记这类字符串会反复传给底层或者从底层回调回来, 缓存以后不用每次都重新编码/解码
+    '''
+
+    def __init__(self, capacity:int = 65536, encoding:str = "utf8"):
+        '''
+        @capacity   单向最多缓存的字符串个数, 超过以后清空重建, 防止用户标记之类的字符串无限增长
+        @encoding   编码方式
+        '''
+        self.capacity = capacity
+        self.encoding = encoding
+        self.__encoded__ = dict()
+        self.__decoded__ = dict()
+
+    def encode(self, s:str) -> bytes:
+        '''
+        str转成传给底层的bytes
+        '''
+        try:
+            return self.__encoded__[s]
+        except KeyError:
+            pass
+
+        ret = bytes(s, encoding = self.encoding)
+        if len(self.__encoded__) >= self.capacity:
+            self.__encoded__.clear()
+        self.__encoded__[s] = ret
+        return ret
+
+    def decode(self, b:bytes) -> str:
+        '''
+        底层回调的bytes转成str
+        '''
+        try:
+            return self.__decoded__[b]
+        except KeyError:
+            pass
+
+        ret = bytes.decode(b, self.encoding)
+        if len(self.__decoded__) >= self.capacity:
+            self.__decoded__.clear()
+        self.__decoded__[b] = ret
+        return ret
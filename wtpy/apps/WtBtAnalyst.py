@@ -7,6 +7,7 @@ from datetime import datetime
 import math
 import os
 import json
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from xlsxwriter import Workbook
 
 
@@ -105,7 +106,7 @@ class Calculate():
 
     # 单笔最大回撤
     def single_largest_maxdrawdown(self):
-        single_largest_mdd = self.ret[self.ret.apply(lambda x: x < 0)]
+        single_largest_mdd = self.ret[self.ret < 0]
         if len(single_largest_mdd) == 0:
             single_largest_mxd = 0
             return single_largest_mxd
@@ -166,6 +167,122 @@ def fmtNAN(val, defVal=0):
     return val
 
 
+def calc_streaks(profits) -> tuple:
+    '''
+    计算最大连续盈利次数和最大连续亏损次数\n
+    profit>0视为盈利, 其余(含0和nan)视为亏损\n
+    @profits    逐笔盈亏序列, 可以是Series或者ndarray
+    @return     (最大连续盈利次数, 最大连续亏损次数)
+    '''
+    ayWins = np.asarray(profits) > 0
+    if len(ayWins) == 0:
+        return 0, 0
+
+    # 每一段连续同号序列的起点和长度
+    starts = np.flatnonzero(np.concatenate(([True], ayWins[1:] != ayWins[:-1])))
+    lengths = np.diff(np.append(starts, len(ayWins)))
+    flags = ayWins[starts]
+
+    max_wins = int(lengths[flags].max()) if flags.any() else 0
+    max_loses = int(lengths[~flags].max()) if not flags.all() else 0
+    return max_wins, max_loses
+
+
+def calc_drawdowns(netvals) -> dict:
+    '''
+    根据净值序列计算回撤相关指标\n
+    @netvals    每日净值序列
+    @return     peak-峰值序列, drawdown-回撤序列, down_time-衰落时间序列,
+                max_falldown-最大回撤, max_profratio-最大上涨, max_dd_duration-最长衰落时间
+    '''
+    ayNetVals = np.asarray(netvals, dtype=float)
+    count = len(ayNetVals)
+    if count == 0:
+        empty = np.zeros(0)
+        return {
+            "peak": empty,
+            "drawdown": empty,
+            "down_time": np.zeros(0, dtype=np.int64),
+            "max_falldown": 0.0,
+            "max_profratio": 0.0,
+            "max_dd_duration": 0
+        }
+
+    peak = np.maximum.accumulate(ayNetVals)
+    trough = np.minimum.accumulate(ayNetVals)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        drawdown = 1 - ayNetVals / peak
+        profit = np.diff(ayNetVals) / ayNetVals[:-1]
+        falldown = np.abs((ayNetVals[1:] - peak[1:]) / peak[1:])
+        riseup = np.abs((ayNetVals[1:] - trough[1:]) / trough[1:])
+
+    # 当日亏损时统计回撤, 当日盈利时统计上涨, fmax会忽略nan
+    isDown = profit <= 0
+    mdd = float(np.fmax.reduce(falldown[isDown], initial=0.0))
+    mup = float(np.fmax.reduce(riseup[~isDown], initial=0.0))
+
+    # 衰落时间: 距离上一次创新高的天数
+    idx = np.arange(count)
+    newHigh = np.concatenate(([True], peak[1:] > peak[:-1]))
+    down_time = idx - np.maximum.accumulate(np.where(newHigh, idx, 0))
+
+    return {
+        "peak": peak,
+        "drawdown": drawdown,
+        "down_time": down_time,
+        "max_falldown": mdd,
+        "max_profratio": mup,
+        "max_dd_duration": int(down_time.max())
+    }
+
+
+def calc_trade_stats(profits, holds) -> dict:
+    '''
+    逐笔交易盈亏统计\n
+    profit>0视为盈利, 其余视为亏损\n
+    @profits    逐笔盈亏序列
+    @holds      逐笔持仓周期序列, 如K线根数或者持仓时长
+    @return     统计结果
+    '''
+    ayProfits = np.asarray(profits, dtype=float)
+    ayHolds = np.asarray(holds)
+    winMask = ayProfits > 0
+    loseMask = ~winMask
+
+    ayWinProfits = ayProfits[winMask]
+    ayLoseProfits = ayProfits[loseMask]
+
+    totaltimes = len(ayProfits)  # 总交易次数
+    wintimes = len(ayWinProfits)  # 盈利次数
+    losetimes = len(ayLoseProfits)  # 亏损次数
+    winamout = ayWinProfits.sum()  # 毛盈利
+    loseamount = ayLoseProfits.sum()  # 毛亏损
+    trdnetprofit = winamout + loseamount  # 交易净盈亏
+    avgprof_win = (winamout / wintimes) if wintimes > 0 else 0  # 单次盈利均值
+    avgprof_lose = (loseamount / losetimes) if losetimes > 0 else 0  # 单次亏损均值
+    max_consecutive_wins, max_consecutive_loses = calc_streaks(winMask)
+
+    return {
+        "totaltimes": totaltimes,
+        "wintimes": wintimes,
+        "losetimes": losetimes,
+        "winamout": winamout,
+        "loseamount": loseamount,
+        "trdnetprofit": trdnetprofit,
+        "winrate": (wintimes / totaltimes) if totaltimes > 0 else 0,  # 胜率
+        "avgprof": (trdnetprofit / totaltimes) if totaltimes > 0 else 0,  # 单次平均盈亏
+        "avgprof_win": avgprof_win,
+        "avgprof_lose": avgprof_lose,
+        "winloseratio": abs(avgprof_win / avgprof_lose) if avgprof_lose != 0 else "N/A",  # 单次盈亏均值比
+        "largest_profit": ayWinProfits.max() if wintimes > 0 else np.nan,  # 单笔最大盈利交易
+        "largest_loss": ayLoseProfits.min() if losetimes > 0 else np.nan,  # 单笔最大亏损交易
+        "avg_hold_win": ayHolds[winMask].sum() / wintimes if wintimes > 0 else "N/A",  # 盈利交易的平均持仓周期
+        "avg_hold_lose": ayHolds[loseMask].sum() / losetimes if losetimes > 0 else "N/A",  # 亏损交易的平均持仓周期
+        "max_consecutive_wins": max_consecutive_wins,  # 最大连续盈利次数
+        "max_consecutive_loses": max_consecutive_loses  # 最大连续亏损次数
+    }
+
+
 def continue_trading_analysis(data, x_value) -> dict:
     '''
     连续交易分析
@@ -263,7 +380,7 @@ def extreme_trading(data, time_of_std=1):
     sin_profit_mistd_win = avgprof_win - (df_wins_std * time_of_std)
     sin_profit_mistd_lose = avgprof_lose - (df_loses_std * time_of_std)
     # 极端交易数量
-    extreme_result = data[data['profit'].apply(lambda x: x > sin_profit_plstd or x < sin_profit_mistd)]
+    extreme_result = data[(data['profit'] > sin_profit_plstd) | (data['profit'] < sin_profit_mistd)]
     extreme_num = len(extreme_result)
     extreme_num_win = len(extreme_result[extreme_result['profit'] > 0])
     extreme_num_lose = len(extreme_result[extreme_result['profit'] < 0])
@@ -364,10 +481,10 @@ def stat_closes_by_day(df_closes: df, capital) -> df:
     按天统计平仓数据
     '''
     df_closes['day'] = df_closes['opentime']
-    df_closes['win'] = df_closes['profit'].apply(lambda x: 1 if x > 0 else 0)
+    df_closes['win'] = (df_closes['profit'] > 0).astype(int)
     df_closes['times'] = 1
-    df_closes['gross_profit'] = df_closes['profit'].apply(lambda x: x if x > 0 else 0)
-    df_closes['gross_loss'] = df_closes['profit'].apply(lambda x: x if x < 0 else 0)
+    df_closes['gross_profit'] = df_closes['profit'].where(df_closes['profit'] > 0, 0)
+    df_closes['gross_loss'] = df_closes['profit'].where(df_closes['profit'] < 0, 0)
     profit = df_closes.groupby(df_closes['day'])[['win', 'times', 'profit', 'gross_profit', 'gross_loss']].sum()
     profit['win_rate'] = profit['win'] / profit['times']
     profit['profit_ratio'] = profit['profit'] * 100.0 / capital
@@ -380,10 +497,10 @@ def stat_closes_by_month(df_closes: df, capital) -> df:
     按月统计平仓数据
     '''
     df_closes['month'] = df_closes['opentime'].apply(lambda x: x.strftime("%Y/%m"))
-    df_closes['win'] = df_closes['profit'].apply(lambda x: 1 if x > 0 else 0)
+    df_closes['win'] = (df_closes['profit'] > 0).astype(int)
     df_closes['times'] = 1
-    df_closes['gross_profit'] = df_closes['profit'].apply(lambda x: x if x > 0 else 0)
-    df_closes['gross_loss'] = df_closes['profit'].apply(lambda x: x if x < 0 else 0)
+    df_closes['gross_profit'] = df_closes['profit'].where(df_closes['profit'] > 0, 0)
+    df_closes['gross_loss'] = df_closes['profit'].where(df_closes['profit'] < 0, 0)
     profit = df_closes.groupby(df_closes['month'])[['win', 'times', 'profit', 'gross_profit', 'gross_loss']].sum()
     profit['win_rate'] = profit['win'] / profit['times']
     profit['profit_ratio'] = profit['profit'] * 100.0 / capital
@@ -396,10 +513,10 @@ def stat_closes_by_year(df_closes: df, capital) -> df:
     按年统计平仓数据
     '''
     df_closes['year'] = df_closes['opentime'].apply(lambda x: x.strftime("%Y"))
-    df_closes['win'] = df_closes['profit'].apply(lambda x: 1 if x > 0 else 0)
+    df_closes['win'] = (df_closes['profit'] > 0).astype(int)
     df_closes['times'] = 1
-    df_closes['gross_profit'] = df_closes['profit'].apply(lambda x: x if x > 0 else 0)
-    df_closes['gross_loss'] = df_closes['profit'].apply(lambda x: x if x < 0 else 0)
+    df_closes['gross_profit'] = df_closes['profit'].where(df_closes['profit'] > 0, 0)
+    df_closes['gross_loss'] = df_closes['profit'].where(df_closes['profit'] < 0, 0)
     profit = df_closes.groupby(df_closes['year'])[['win', 'times', 'profit', 'gross_profit', 'gross_loss']].sum()
     profit['win_rate'] = profit['win'] / profit['times']
     profit['profit_ratio'] = profit['profit'] * 100.0 / capital
@@ -536,19 +653,19 @@ def performance_summary(input_data, input_data1, capital=500000, rf=0.00, period
     # 指标class
     factors = Calculate(ret, mar, rf, period, trade, capital, ret_day, trade_day)
     # 毛利
-    profit = input_data[input_data['profit'].apply(lambda x: x >= 0)]
+    profit = input_data[input_data['profit'] >= 0]
     total_profit = 0 if len(profit) == 0 else profit['profit'].sum()
     # 毛损
-    loss = input_data[input_data['profit'].apply(lambda x: x < 0)]
+    loss = input_data[input_data['profit'] < 0]
     total_loss = 0 if len(loss) == 0 else loss['profit'].sum()
     # 净利
     net_profit = total_profit + total_loss
     input_data1['adjust_profit'] = (input_data1['profit'] - input_data1['transaction_fee']) if len(input_data1) > 0 else 0
     # 调整毛利
-    adjust_profit = input_data1[input_data1['adjust_profit'].apply(lambda x: x >= 0)]
+    adjust_profit = input_data1[input_data1['adjust_profit'] >= 0]
     total_adjust_profit = 0 if len(adjust_profit) == 0 else adjust_profit['adjust_profit'].sum()
     # 调整毛损
-    adjust_loss = input_data1[input_data1['adjust_profit'].apply((lambda x: x < 0))]
+    adjust_loss = input_data1[input_data1['adjust_profit'] < 0]
     total_adjust_loss = 0 if len(adjust_loss) == 0 else adjust_loss['adjust_profit'].sum()
     # 调整净利
     adjust_net_profit = total_adjust_profit + total_adjust_loss
@@ -561,7 +678,7 @@ def performance_summary(input_data, input_data1, capital=500000, rf=0.00, period
     # 已付手续费
     paid_trading_fee = input_data1['transaction_fee'].sum() if len(input_data1) > 0 else 0
     # 单笔最大亏损
-    single_loss = input_data[input_data['profit'].apply(lambda x: x < 0)]
+    single_loss = input_data[input_data['profit'] < 0]
     single_largest_loss = 0 if len(single_loss) == 0 else abs(single_loss['profit'].min())
     # 平仓交易最大亏损
     trading_loss = single_largest_loss
@@ -598,19 +715,16 @@ def do_trading_analyze(df_closes, df_funds):
     df_wins = df_closes[df_closes["profit"] > 0]
     df_loses = df_closes[df_closes["profit"] <= 0]
 
-    ay_WinnerBarCnts = df_wins["closebarno"] - df_wins["openbarno"]
-    ay_LoserBarCnts = df_loses["closebarno"] - df_loses["openbarno"]
-
-    total_winbarcnts = ay_WinnerBarCnts.sum()
-    total_losebarcnts = ay_LoserBarCnts.sum()
+    total_fee = df_closes['fee'].sum()  # 手续费
 
-    total_fee = df_closes['fee'].sum()
+    ay_HoldBarCnts = df_closes["closebarno"] - df_closes["openbarno"]
+    trd_stats = calc_trade_stats(df_closes["profit"], ay_HoldBarCnts)
 
-    totaltimes = len(df_closes)  # 总交易次数
-    wintimes = len(df_wins)  # 盈利次数
-    losetimes = len(df_loses)  # 亏损次数
-    winamout = df_wins["profit"].sum()  # 毛盈利
-    loseamount = df_loses["profit"].sum()  # 毛亏损
+    totaltimes = trd_stats["totaltimes"]  # 总交易次数
+    wintimes = trd_stats["wintimes"]  # 盈利次数
+    losetimes = trd_stats["losetimes"]  # 亏损次数
+    winamout = trd_stats["winamout"]  # 毛盈利
+    loseamount = trd_stats["loseamount"]  # 毛亏损
     trdnetprofit = winamout + loseamount  # 交易净盈亏
     accnetprofit = trdnetprofit - total_fee  # 账户净盈亏
     winrate = (wintimes / totaltimes) if totaltimes > 0 else 0  # 胜率
@@ -620,11 +734,11 @@ def do_trading_analyze(df_closes, df_funds):
     winloseratio = abs(avgprof_win / avgprof_lose) if avgprof_lose != 0 else "N/A"  # 单次盈亏均值比
 
     # 单笔最大盈利交易
-    largest_profit = df_wins['profit'].max()
+    largest_profit = trd_stats["largest_profit"]
     # 单笔最大亏损交易
-    largest_loss = df_loses['profit'].min()
+    largest_loss = trd_stats["largest_loss"]
     # 交易的平均持仓K线根数
-    avgtrd_hold_bar = 0 if totaltimes == 0 else ((df_closes['closebarno'] - df_closes['openbarno']).sum()) / totaltimes
+    avgtrd_hold_bar = 0 if totaltimes == 0 else ay_HoldBarCnts.sum() / totaltimes
     # 平均空仓K线根数
     avb = (df_closes['openbarno'] - df_closes['closebarno'].shift(1).fillna(value=0))
     avgemphold_bar = 0 if len(df_closes) == 0 else avb.sum() / len(df_closes)
@@ -636,26 +750,11 @@ def do_trading_analyze(df_closes, df_funds):
     loss_holdbar_situ = (df_loses['openbarno'].shift(-1) - df_loses['closebarno']).dropna()
     lossempty_avgholdbar = 0 if len(df_loses) == 0 or len(df_loses) == 1 else loss_holdbar_situ.sum() / (len(df_loses) - 1)
 
-    max_consecutive_wins = 0  # 最大连续盈利次数
-    max_consecutive_loses = 0  # 最大连续亏损次数
-
-    avg_bars_in_winner = total_winbarcnts / wintimes if wintimes > 0 else "N/A"
-    avg_bars_in_loser = total_losebarcnts / losetimes if losetimes > 0 else "N/A"
-
-    consecutive_wins = 0
-    consecutive_loses = 0
-
-    for idx, row in df_closes.iterrows():
-        profit = row["profit"]
-        if profit > 0:
-            consecutive_wins += 1
-            consecutive_loses = 0
-        else:
-            consecutive_wins = 0
-            consecutive_loses += 1
+    max_consecutive_wins = trd_stats["max_consecutive_wins"]  # 最大连续盈利次数
+    max_consecutive_loses = trd_stats["max_consecutive_loses"]  # 最大连续亏损次数
 
-        max_consecutive_wins = max(max_consecutive_wins, consecutive_wins)
-        max_consecutive_loses = max(max_consecutive_loses, consecutive_loses)
+    avg_bars_in_winner = trd_stats["avg_hold_win"]
+    avg_bars_in_loser = trd_stats["avg_hold_lose"]
 
     summary = dict()
 
@@ -686,9 +785,10 @@ def do_trading_analyze(df_closes, df_funds):
     return summary
 
 
-def trading_analyze(workbook: Workbook, df_closes, df_funds, capital=500000):
+def trading_analyze(workbook: Workbook, df_closes, df_funds, capital=500000, metrics: dict = None):
     '''
     交易分析
+    @metrics    calc_strategy_metrics的结果, 传了就直接用其中的交易分析, 不再重新计算
     '''
     res = average_profit(df_closes)
     rr = res.get('连续盈利次数')
@@ -753,15 +853,15 @@ def trading_analyze(workbook: Workbook, df_closes, df_funds, capital=500000):
     })
     worksheet = workbook.add_worksheet('交易分析')
 
-    df_closes['fee'] = df_closes['profit'] - df_closes['totalprofit'] + df_closes['totalprofit'].shift(1).fillna(value=0)
-    trade_s = do_trading_analyze(df_closes, df_funds)
-    data_1 = df_closes[df_closes['direct'].apply(lambda x: 'LONG' in x)]
-    trade_s_long = do_trading_analyze(data_1, df_funds)
-    data_2 = df_closes[df_closes['direct'].apply(lambda x: 'SHORT' in x)]
-    trade_s_short = do_trading_analyze(data_2, df_funds)
-    trade_s = trade_s.merge(trade_s_long, how='inner', on='index')
-    trade_s = trade_s.merge(trade_s_short, how='inner', on='index')
-    trade_s.columns = ['类别', '所有交易', '多头', '空头']
+    if metrics is None:
+        metrics = calc_strategy_metrics(df_funds, df_closes, capital=capital)
+    trdana = metrics["trdana"]
+    trade_s = pd.DataFrame({
+        '类别': [label for key, label in TRADE_LABELS],
+        '所有交易': [trdana["all"][key] for key, label in TRADE_LABELS],
+        '多头': [trdana["long"][key] for key, label in TRADE_LABELS],
+        '空头': [trdana["short"][key] for key, label in TRADE_LABELS]
+    })
     trade_s.fillna(value=0, inplace=True)
 
     worksheet.write_row('A1', ['总体交易分析'], title_format)
@@ -1254,22 +1354,9 @@ def summary_analyze(df_funds: df, capital=5000000, rf=0, period=240) -> dict:
         sr = 9999.0
 
     # 计算最大回撤和最大上涨
-    maxub = ayNetVals[0]
-    minub = maxub
-    mdd = 0.0
-    midd = 0.0
-    mup = 0.0
-    for idx in range(1, len(ayNetVals)):
-        maxub = max(maxub, ayNetVals[idx])
-        minub = min(minub, ayNetVals[idx])
-        profit = (ayNetVals[idx] - ayNetVals[idx - 1]) / ayNetVals[idx - 1]
-        falldown = (ayNetVals[idx] - maxub) / maxub
-        riseup = (ayNetVals[idx] - minub) / minub
-        if profit <= 0:
-            midd = max(midd, abs(profit))
-            mdd = max(mdd, abs(falldown))
-        else:
-            mup = max(mup, abs(riseup))
+    dd_stats = calc_drawdowns(ayNetVals)
+    mdd = dd_stats["max_falldown"]
+    mup = dd_stats["max_profratio"]
     # 索提诺比率
     if down_delta != 0.0:
         sortino = (ar - rf) / down_delta
@@ -1294,20 +1381,24 @@ def summary_analyze(df_funds: df, capital=5000000, rf=0, period=240) -> dict:
         "down_std": down_delta * 100,
         "sharpe_ratio": sr,
         "sortino_ratio": sortino,
-        "calmar_ratio": calmar
+        "calmar_ratio": calmar,
+        "max_dd_duration": dd_stats["max_dd_duration"]
     }
 
 
-def funds_analyze(workbook: Workbook, df_funds: df, capital=5000000, rf=0, period=240):
+def funds_analyze(workbook: Workbook, df_funds: df, capital=5000000, rf=0, period=240, summary: dict = None):
     '''
     逐日资金分析
+    @summary    summary_analyze的结果, 传了就直接用来输出绩效概览, 不再重新计算
     '''
     init_capital = capital
-    annual_days = period
     days = len(df_funds)
 
     # 先做资金统计吧
     print("anayzing fund data……")
+    if summary is None:
+        summary = summary_analyze(df_funds.copy(), capital=capital, rf=rf, period=period)
+
     df_funds["dynbalance"] += init_capital
     ayBal = df_funds["dynbalance"]  # 每日期末动态权益
 
@@ -1316,49 +1407,11 @@ def funds_analyze(workbook: Workbook, df_funds: df, capital=5000000, rf=0, perio
     ayPreBal = np.insert(ayPreBal, 0, init_capital)  # 每日期初权益
     df_funds["prebalance"] = ayPreBal
 
-    # 统计期末权益大于期初权益的天数，即盈利天数
-    windays = len(df_funds[df_funds["dynbalance"] > df_funds["prebalance"]])
-
     # 每日净值
     ayNetVals = (ayBal / init_capital)
-
-    ar = math.pow(ayNetVals.iloc[-1], annual_days / days) - 1  # 年化收益率=总收益率^(年交易日天数/统计天数)
     ayDailyReturn = ayBal / ayPreBal - 1  # 每日收益率
-    delta = fmtNAN(ayDailyReturn.std(axis=0) * math.pow(annual_days, 0.5), 0)  # 年化标准差=每日收益率标准差*根号下(年交易日天数)
-    down_delta = fmtNAN(ayDailyReturn[ayDailyReturn < 0].std(axis=0) * math.pow(annual_days, 0.5), 0)  # 下行标准差=每日亏损收益率标准差*根号下(年交易日天数)
-
-    # sharpe率
-    if delta != 0.0:
-        sr = (ar - rf) / delta
-    else:
-        sr = 9999.0
-
-    # 计算最大回撤和最大上涨
-    maxub = ayNetVals[0]
-    minub = maxub
-    mdd = 0.0
-    midd = 0.0
-    mup = 0.0
-    for idx in range(1, len(ayNetVals)):
-        maxub = max(maxub, ayNetVals[idx])
-        minub = min(minub, ayNetVals[idx])
-        profit = (ayNetVals[idx] - ayNetVals[idx - 1]) / ayNetVals[idx - 1]
-        falldown = (ayNetVals[idx] - maxub) / maxub
-        riseup = (ayNetVals[idx] - minub) / minub
-        if profit <= 0:
-            midd = max(midd, abs(profit))
-            mdd = max(mdd, abs(falldown))
-        else:
-            mup = max(mup, abs(riseup))
-    # 索提诺比率
-    if down_delta != 0.0:
-        sortino = (ar - rf) / down_delta
-    else:
-        sortino = 0.0
-    if mdd != 0.0:
-        calmar = ar / mdd
-    else:
-        calmar = 999999.0
+    # 逐日的峰值和回撤
+    dd_stats = calc_drawdowns(ayNetVals)
 
     # 输出到excel
     sheetName = '逐日绩效概览'
@@ -1418,9 +1471,10 @@ def funds_analyze(workbook: Workbook, df_funds: df, capital=5000000, rf=0, perio
 
     key_indicator = ['交易天数', '累积收益（%）', '年化收益率（%）', '胜率（%）', '最大回撤（%）', '最大上涨（%）', '标准差（%）',
                      '下行波动率（%）', 'Sharpe比率', 'Sortino比率', 'Calmar比率']
-    key_data = [(ayNetVals.iloc[-1] - 1) * 100, ar * 100, (windays / days) * 100, mdd * 100, mup * 100, delta * 100, down_delta * 100, sr, sortino, calmar]
+    key_data = [summary[key] for key in ["total_return", "annual_return", "win_rate", "max_falldown", "max_profratio", "std",
+                                         "down_std", "sharpe_ratio", "sortino_ratio", "calmar_ratio"]]
     worksheet.write_row('A2', key_indicator, indicator_format)
-    worksheet.write_column('A3', [days], fund_data_format)
+    worksheet.write_column('A3', [summary["days"]], fund_data_format)
     worksheet.write_row('B3', key_data, fund_data_format_3)
 
     #   画图   #
@@ -1500,40 +1554,30 @@ def funds_analyze(workbook: Workbook, df_funds: df, capital=5000000, rf=0, perio
     worksheet.write_column('H3', ayBal - ayPreBal, profit_format)
     worksheet.write_column('I3', ayDailyReturn, percent_format)
     #  计算峰值
-    upper = np.maximum.accumulate(ayNetVals)
-    worksheet.write_column('J3', upper, fund_data_format_4)
+    worksheet.write_column('J3', dd_stats["peak"], fund_data_format_4)
     #  回撤指标
-    temp = 1 - (ayNetVals) / (np.maximum.accumulate(ayNetVals))
+    temp = dd_stats["drawdown"]
     worksheet.write_column('K3', temp, percent_format)
     worksheet.write_column('L3', np.maximum.accumulate(temp), percent_format)
     worksheet.write_column('M3', np.minimum.accumulate(ayDailyReturn), percent_format)
     #  计算衰落时间
-    down_time = [0]
-    for i in range(1, len(upper)):
-        if upper[i] > upper[i - 1]:
-            down_time.append(0)
-        else:
-            l = down_time[i - 1]
-            down_time.append(l + 1)
-    worksheet.write_column('N3', down_time, fund_data_format)
+    worksheet.write_column('N3', dd_stats["down_time"], fund_data_format)
 
 
 def do_trading_analyze2(df_closes, df_funds):
     df_wins = df_closes[df_closes["profit"] > 0]
     df_loses = df_closes[df_closes["profit"] <= 0]
 
-    ay_WinnerBarCnts = df_wins["closebarno"] - df_wins["openbarno"]
-    ay_LoserBarCnts = df_loses["closebarno"] - df_loses["openbarno"]
-    total_winbarcnts = ay_WinnerBarCnts.sum()
-    total_losebarcnts = ay_LoserBarCnts.sum()
-
     total_fee = df_closes['fee'].sum()  # 手续费
 
-    totaltimes = len(df_closes)  # 总交易次数
-    wintimes = len(df_wins)  # 盈利次数
-    losetimes = len(df_loses)  # 亏损次数
-    winamout = float(df_wins["profit"].sum())  # 毛盈利
-    loseamount = float(df_loses["profit"].sum())  # 毛亏损
+    ay_HoldBarCnts = df_closes["closebarno"] - df_closes["openbarno"]
+    trd_stats = calc_trade_stats(df_closes["profit"], ay_HoldBarCnts)
+
+    totaltimes = trd_stats["totaltimes"]  # 总交易次数
+    wintimes = trd_stats["wintimes"]  # 盈利次数
+    losetimes = trd_stats["losetimes"]  # 亏损次数
+    winamout = float(trd_stats["winamout"])  # 毛盈利
+    loseamount = float(trd_stats["loseamount"])  # 毛亏损
     trdnetprofit = winamout + loseamount  # 交易净盈亏
     accnetprofit = trdnetprofit - total_fee  # 账户净盈亏
     winrate = (wintimes / totaltimes) if totaltimes > 0 else 0  # 胜率
@@ -1543,11 +1587,11 @@ def do_trading_analyze2(df_closes, df_funds):
     winloseratio = abs(avgprof_win / avgprof_lose) if avgprof_lose != 0 else "N/A"  # 单次盈亏均值比
 
     # 单笔最大盈利交易
-    largest_profit = float(df_wins['profit'].max())
+    largest_profit = float(trd_stats["largest_profit"])
     # 单笔最大亏损交易
-    largest_loss = float(df_loses['profit'].min())
+    largest_loss = float(trd_stats["largest_loss"])
     # 交易的平均持仓K线根数
-    avgtrd_hold_bar = 0 if totaltimes == 0 else ((df_closes['closebarno'] - df_closes['openbarno']).sum()) / totaltimes
+    avgtrd_hold_bar = 0 if totaltimes == 0 else ay_HoldBarCnts.sum() / totaltimes
     # 平均空仓K线根数
     avb = (df_closes['openbarno'] - df_closes['closebarno'].shift(1).fillna(value=0))
     avgemphold_bar = 0 if len(df_closes) == 0 else avb.sum() / len(df_closes)
@@ -1558,30 +1602,18 @@ def do_trading_analyze2(df_closes, df_funds):
     # 两笔亏损交易之间的平均空仓K线根数
     loss_holdbar_situ = (df_loses['openbarno'].shift(-1) - df_loses['closebarno']).dropna()
     lossempty_avgholdbar = 0 if len(df_loses) == 0 or len(df_loses) == 1 else loss_holdbar_situ.sum() / (len(df_loses) - 1)
-    max_consecutive_wins = 0  # 最大连续盈利次数
-    max_consecutive_loses = 0  # 最大连续亏损次数
 
-    avg_bars_in_winner = total_winbarcnts / wintimes if wintimes > 0 else "N/A"
-    avg_bars_in_loser = total_losebarcnts / losetimes if losetimes > 0 else "N/A"
+    max_consecutive_wins = trd_stats["max_consecutive_wins"]  # 最大连续盈利次数
+    max_consecutive_loses = trd_stats["max_consecutive_loses"]  # 最大连续亏损次数
 
-    consecutive_wins = 0
-    consecutive_loses = 0
-
-    for idx, row in df_closes.iterrows():
-        profit = row["profit"]
-        if profit > 0:
-            consecutive_wins += 1
-            consecutive_loses = 0
-        else:
-            consecutive_wins = 0
-            consecutive_loses += 1
-
-        max_consecutive_wins = max(max_consecutive_wins, consecutive_wins)
-        max_consecutive_loses = max(max_consecutive_loses, consecutive_loses)
+    avg_bars_in_winner = trd_stats["avg_hold_win"]
+    avg_bars_in_loser = trd_stats["avg_hold_lose"]
 
     summary = dict()
 
     summary["total_trades"] = totaltimes
+    summary["wintimes"] = wintimes
+    summary["losetimes"] = losetimes
     summary["profit"] = float(winamout)
     summary["loss"] = float(loseamount)
     summary["net_profit"] = float(trdnetprofit)
@@ -1606,6 +1638,580 @@ def do_trading_analyze2(df_closes, df_funds):
     return summary
 
 
+# 指标缓存文件, 和回测输出放在同一个目录下
+METRICS_FILE = "metrics.json"
+
+# 指标缓存的版本, 指标的内容有变化时递增, 旧版本的缓存会重新计算
+METRICS_VERSION = 2
+
+# 指标计算依赖的输入文件
+INPUT_FILES = ["funds.csv", "closes.csv", "trades.csv"]
+
+# 流式报告中明细超过该行数时写到外部文件, Excel单个工作表最多1048576行
+DETAIL_LIMIT = 100000
+
+# 外部明细文件分块生成和写入时每块的行数
+DETAIL_CHUNK = 100000
+
+# 流式报告中每条曲线最多使用的点数
+CHART_POINTS = 5000
+
+# 交易分析指标的显示名称, 顺序即报告中的顺序
+TRADE_LABELS = [
+    ("total_trades", "交易总数量"),
+    ("wintimes", "盈利交易次数"),
+    ("losetimes", "亏损交易次数"),
+    ("profit", "毛盈利"),
+    ("loss", "毛亏损"),
+    ("net_profit", "交易净盈亏"),
+    ("fee", "手续费"),
+    ("accnet_profit", "账户净盈亏"),
+    ("winrate", "% 胜率"),
+    ("avgprof", "单次平均盈亏"),
+    ("avgprof_win", "单次盈利均值"),
+    ("avgprof_lose", "单次亏损均值"),
+    ("winloseratio", "单次盈亏均值比"),
+    ("largest_profit", "单笔最大盈利交易"),
+    ("largest_loss", "单笔最大亏损交易"),
+    ("max_consecutive_wins", "最大连续盈利次数"),
+    ("max_consecutive_loses", "最大连续亏损次数"),
+    ("avg_bars_in_winner", "盈利交易的平均持仓K线根数"),
+    ("avg_bars_in_loser", "亏损交易的平均持仓K线根数"),
+    ("avgtrd_hold_bar", "交易的平均持仓K线根数"),
+    ("avgemphold_bar", "平均空仓K线根数"),
+    ("winempty_avgholdbar", "两笔盈利交易之间的平均空仓K线根数"),
+    ("lossempty_avgholdbar", "两笔亏损交易之间的平均空仓K线根数")
+]
+
+# 资金分析指标的显示名称
+SUMMARY_LABELS = [
+    ("days", "交易天数"),
+    ("total_return", "累积收益（%）"),
+    ("annual_return", "年化收益率（%）"),
+    ("win_rate", "胜率（%）"),
+    ("max_falldown", "最大回撤（%）"),
+    ("max_profratio", "最大上涨（%）"),
+    ("std", "标准差（%）"),
+    ("down_std", "下行波动率（%）"),
+    ("sharpe_ratio", "Sharpe比率"),
+    ("sortino_ratio", "Sortino比率"),
+    ("calmar_ratio", "Calmar比率"),
+    ("max_dd_duration", "最长衰落时间")
+]
+
+
+def input_signature(folder: str) -> dict:
+    '''
+    输入文件的签名, 由文件大小和修改时间组成, 文件不存在记为None
+    '''
+    sig = dict()
+    for name in INPUT_FILES:
+        filepath = os.path.join(folder, name)
+        if os.path.exists(filepath):
+            st = os.stat(filepath)
+            sig[name] = [st.st_size, st.st_mtime_ns]
+        else:
+            sig[name] = None
+    return sig
+
+
+def load_metrics(filename: str, key: dict) -> dict:
+    '''
+    读取指标缓存, 缓存不存在或者key不一致时返回None
+    '''
+    if not os.path.exists(filename):
+        return None
+
+    try:
+        f = open(filename, "r")
+        content = json.loads(f.read())
+        f.close()
+    except Exception:
+        return None
+
+    if content.get("key") != key:
+        return None
+    return content.get("metrics")
+
+
+def save_metrics(filename: str, key: dict, metrics: dict):
+    '''
+    保存指标缓存, 先写临时文件再替换, 避免中途退出留下不完整的缓存
+    '''
+    tmpfile = filename + ".tmp"
+    f = open(tmpfile, "w")
+    f.write(json.dumps({"key": key, "metrics": metrics}, indent=4, ensure_ascii=True))
+    f.close()
+    os.replace(tmpfile, filename)
+
+
+def load_strategy_data(folder: str, with_trades: bool = True, compact: bool = False) -> tuple:
+    '''
+    读取策略的回测输出, 每个文件只读一次
+    @with_trades    是否读取成交明细, 只有完整的Excel报告才用得到
+    @compact        平仓记录的文本列是否读成category, 可以大幅减少内存, 但是完整的Excel报告不支持
+    @return (df_funds, df_closes, df_trades), 不读成交明细时df_trades为None
+    '''
+    df_funds = pd.read_csv(os.path.join(folder, "funds.csv"))
+    dtypes = {col: 'category' for col in ['code', 'direct', 'entertag', 'exittag']} if compact else None
+    df_closes = pd.read_csv(os.path.join(folder, "closes.csv"), dtype=dtypes)
+    df_trades = pd.read_csv(os.path.join(folder, "trades.csv")) if with_trades else None
+    return df_funds, df_closes, df_trades
+
+
+def calc_strategy_metrics(df_funds: df, df_closes: df, capital, rf=0, period=240) -> dict:
+    '''
+    计算策略的核心指标, 手续费和多空拆分只计算一次, 不修改传入的数据
+    @return {"begin_date", "end_date", "summary"-资金概要, "trdana"-全部、多头、空头的交易分析}
+    '''
+    # 只复制交易分析用到的列, 平仓记录很多时可以少占不少内存
+    totalprofit = df_closes['totalprofit']
+    direct = df_closes['direct']
+    df_closes = df_closes[['profit', 'openbarno', 'closebarno']].copy()
+    df_closes['fee'] = df_closes['profit'] - totalprofit + totalprofit.shift(1).fillna(value=0)
+    df_long = df_closes[direct.str.contains('LONG').values]
+    df_short = df_closes[direct.str.contains('SHORT').values]
+
+    return {
+        "begin_date": int(df_funds['date'].iloc[0]),
+        "end_date": int(df_funds['date'].iloc[-1]),
+        "summary": summary_analyze(df_funds.copy(), capital=capital, rf=rf, period=period),
+        "trdana": {
+            "all": do_trading_analyze2(df_closes, df_funds),
+            "long": do_trading_analyze2(df_long, df_funds),
+            "short": do_trading_analyze2(df_short, df_funds)
+        }
+    }
+
+
+def render_report(filename: str, df_funds: df, df_closes: df, df_trades: df, capital, rf=0, period=240, metrics: dict = None):
+    '''
+    生成Excel报告, 各个分析函数会修改传入的数据, 所以都传副本
+    @metrics    calc_strategy_metrics的结果, 交易分析和资金概要直接使用, 为None时重新计算
+    '''
+    if metrics is None:
+        metrics = calc_strategy_metrics(df_funds, df_closes, capital=capital, rf=rf, period=period)
+
+    workbook = Workbook(filename)
+    strategy_analyze(workbook, df_closes.copy(), df_trades.copy(), df_funds.copy(), capital=capital, rf=rf, period=period)
+    output_closes(workbook, df_closes.copy(), capital=capital)
+    trading_analyze(workbook, df_closes.copy(), df_funds.copy(), capital=capital, metrics=metrics)
+    funds_analyze(workbook, df_funds.copy(), capital=capital, rf=rf, period=period, summary=metrics["summary"])
+    workbook.close()
+
+
+def sample_index(count: int, points: int) -> np.ndarray:
+    '''
+    均匀抽取作图用的下标, 首尾两个点总是保留
+    '''
+    if count <= points:
+        return np.arange(count)
+    return np.unique(np.linspace(0, count - 1, points).astype(np.int64))
+
+
+def to_datetimes(ayTime) -> np.ndarray:
+    '''
+    把YYYYMMDDHHMM格式的整数时间转成datetime64, 只解析不重复的日期, 比逐个strptime快得多
+    '''
+    ayTime = np.asarray(ayTime, dtype=np.int64)
+    dates, inverse = np.unique(ayTime // 10000, return_inverse=True)
+    days = pd.to_datetime(dates.astype(str), format='%Y%m%d').values
+    minutes = (ayTime % 10000 // 100) * 60 + ayTime % 100
+    return days[inverse] + minutes.astype('timedelta64[m]')
+
+
+def make_closes_detail(df_closes: df, capital, start: int = 1) -> df:
+    '''
+    生成交易列表明细, 列和output_closes一致
+    @start  第一条记录的编号, 分块生成时使用
+    '''
+    direct = df_closes['direct'].astype('category')
+    direct = direct.cat.rename_categories(lambda x: '多' if x == 'LONG' else '空' if x == 'SHORT' else x)
+    return pd.DataFrame({
+        '编号': np.arange(start, start + len(df_closes)),
+        '代码': df_closes['code'].values,
+        '方向': direct.values,
+        '进场时间': to_datetimes(df_closes['opentime']),
+        '进场价格': df_closes['openprice'].values,
+        '进场标记': df_closes['entertag'].values,
+        '出场时间': to_datetimes(df_closes['closetime']),
+        '出场价格': df_closes['closeprice'].values,
+        '出场标记': df_closes['exittag'].values,
+        '盈利¤': df_closes['profit'].values,
+        '盈利%': df_closes['profit'].values * 100 / capital,
+        '累计盈利¤': df_closes['totalprofit'].values,
+        '累计盈利%': df_closes['totalprofit'].values * 100 / capital,
+        '潜在盈利¤': df_closes['maxprofit'].values,
+        '潜在盈利%': df_closes['maxprofit'].values * 100 / capital,
+        '潜在亏损¤': df_closes['maxloss'].values,
+        '潜在亏损%': df_closes['maxloss'].values * 100 / capital,
+        '累计权益': df_closes['totalprofit'].values + capital,
+        '平仓K线编号': df_closes['closebarno'].values
+    })
+
+
+def make_funds_detail(df_funds: df, capital) -> df:
+    '''
+    生成逐日绩效明细, 列和funds_analyze一致
+    '''
+    ayBal = df_funds['dynbalance'].values + capital
+    ayPreBal = np.insert(ayBal[:-1], 0, capital)
+    ayNetVals = ayBal / capital
+    ayDailyReturn = ayBal / ayPreBal - 1
+    dd_stats = calc_drawdowns(ayNetVals)
+    return pd.DataFrame({
+        '日期': pd.to_datetime(df_funds['date'].astype(str), format='%Y%m%d').values,
+        '统计时间': np.arange(len(df_funds)),
+        '初始资金': capital,
+        '出入金': '/',
+        '当前权益': ayBal,
+        '累计盈亏': ayBal - capital,
+        '累计净值': ayNetVals,
+        '当日盈亏': ayBal - ayPreBal,
+        '当日盈亏比例': ayDailyReturn,
+        '峰值': dd_stats["peak"],
+        '当日累计回撤': dd_stats["drawdown"],
+        '历史最大累计回撤': np.maximum.accumulate(dd_stats["drawdown"]),
+        '最大单日回撤': np.minimum.accumulate(ayDailyReturn),
+        '衰落时间': dd_stats["down_time"]
+    })
+
+
+def stat_closes_by_periods(df_closes: df, capital) -> tuple:
+    '''
+    按日、月、年统计平仓数据, 先按日聚合再汇总到月和年, 结果和stat_closes_by_day等一致
+    @return (按日, 按月, 按年), 都是倒序排列
+    '''
+    profit = df_closes['profit']
+    data = pd.DataFrame({
+        'win': (profit > 0).astype(int),
+        'times': 1,
+        'profit': profit,
+        'gross_profit': profit.where(profit > 0, 0),
+        'gross_loss': profit.where(profit < 0, 0)
+    })
+    day = pd.to_datetime((df_closes['opentime'] // 10000).astype(str), format='%Y%m%d')
+    by_day = data.groupby(day.values).sum()
+
+    results = list()
+    for keys in [by_day.index, by_day.index.strftime("%Y/%m"), by_day.index.strftime("%Y")]:
+        res = by_day.groupby(keys).sum()
+        res['win_rate'] = res['win'] / res['times']
+        res['profit_ratio'] = res['profit'] * 100.0 / capital
+        results.append(res[['profit', 'gross_profit', 'gross_loss', 'times', 'win_rate', 'profit_ratio']].iloc[::-1])
+    return tuple(results)
+
+
+def write_rows(worksheet, row: int, df_data: df, formats: list) -> int:
+    '''
+    逐行把DataFrame写入工作表, 满足constant_memory模式下按行顺序写入的要求
+    @row        起始行, 从0开始
+    @formats    每一列的格式
+    @return     写完以后的下一行
+    '''
+    # 数值列直接调用write_number, 日期列先整列转成Excel的日期序数, 省去逐个单元格的类型判断
+    columns = list()
+    writers = list()
+    for col in df_data.columns:
+        ay = df_data[col]
+        if pd.api.types.is_datetime64_any_dtype(ay):
+            ay = (ay - pd.Timestamp(1899, 12, 30)) / pd.Timedelta(days=1)
+            writers.append(worksheet.write_number)
+        elif pd.api.types.is_numeric_dtype(ay):
+            writers.append(worksheet.write_number)
+        else:
+            ay = ay.astype(object).where(ay.notna(), '')
+            writers.append(worksheet.write)
+        columns.append(ay.tolist())
+
+    for values in zip(*columns):
+        for col, value in enumerate(values):
+            writers[col](row, col, value, formats[col])
+        row += 1
+    return row
+
+
+def write_detail_file(chunks, filename: str, fmt: str = "csv") -> str:
+    '''
+    把明细写到外部文件, 支持csv和parquet\n
+    csv和pyarrow写parquet时都是逐块追加写入, 不需要一次性生成全部明细\n
+    没有安装pyarrow时用pandas默认的parquet引擎(如fastparquet), 这时会先合并全部数据块再写入
+    @chunks     明细数据块, 可以是DataFrame的生成器
+    @filename   不带扩展名的文件名
+    @return     实际写入的文件名
+    '''
+    if fmt == "parquet":
+        filename += ".parquet"
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            pd.concat(chunks, ignore_index=True).to_parquet(filename, index=False)
+            return filename
+
+        writer = None
+        try:
+            for chunk in chunks:
+                if writer is None:
+                    table = pa.Table.from_pandas(chunk, preserve_index=False)
+                    writer = pq.ParquetWriter(filename, table.schema)
+                else:
+                    # 后面的数据块按第一块的结构转换, 避免某一块整列为空时类型不一致
+                    table = pa.Table.from_pandas(chunk, schema=writer.schema, preserve_index=False)
+                writer.write_table(table)
+        finally:
+            if writer is not None:
+                writer.close()
+    elif fmt == "csv":
+        filename += ".csv"
+        f = open(filename, "w", encoding="utf-8-sig", newline="")
+        for idx, chunk in enumerate(chunks):
+            chunk.to_csv(f, index=False, header=(idx == 0))
+        f.close()
+    else:
+        raise Exception("Unrecognized detail format %s" % (fmt))
+    return filename
+
+
+def render_report_streaming(filename: str, df_funds: df, df_closes: df, capital, rf=0, period=240, metrics: dict = None,
+                            detail_limit: int = DETAIL_LIMIT, detail_format: str = "csv", chart_points: int = CHART_POINTS) -> dict:
+    '''
+    生成流式Excel报告, 适合平仓记录非常多的长周期回测\n
+    工作簿使用constant_memory模式, 所有内容都按行顺序写入, 写过的行会立即落盘\n
+    交易列表和逐日绩效明细超过detail_limit行时写到外部文件, 工作簿中只保留概要、周期统计和抽样后的曲线图
+    @metrics        calc_strategy_metrics的结果, 为None时重新计算
+    @detail_limit   明细写入工作簿的最大行数
+    @detail_format  外部明细文件的格式, csv或者parquet
+    @chart_points   每条曲线最多使用的点数
+    @return         外部明细文件, {工作表名: 文件名}
+    '''
+    if metrics is None:
+        metrics = calc_strategy_metrics(df_funds, df_closes, capital=capital, rf=rf, period=period)
+
+    # 交易列表超过阈值时分块生成并写到外部文件, 不在内存中保留完整的明细
+    details = dict()
+    basename = os.path.splitext(filename)[0]
+    df_closes_detail = None
+    if len(df_closes) > detail_limit:
+        chunks = (make_closes_detail(df_closes.iloc[i:i + DETAIL_CHUNK], capital, i + 1) for i in range(0, len(df_closes), DETAIL_CHUNK))
+        details['交易列表'] = write_detail_file(chunks, basename + "_closes", detail_format)
+    else:
+        df_closes_detail = make_closes_detail(df_closes, capital)
+
+    df_funds_detail = make_funds_detail(df_funds, capital)
+    if len(df_funds_detail) > detail_limit:
+        details['逐日绩效分析'] = write_detail_file([df_funds_detail], basename + "_funds", detail_format)
+
+    workbook = Workbook(filename, {'constant_memory': True, 'nan_inf_to_errors': True})
+    title_format = workbook.add_format({
+        'font_size': 16,
+        'bold': True,
+        'align': 'left',
+        'valign': 'vcenter'
+    })
+    index_format = workbook.add_format({
+        'font_size': 12,
+        'bold': True,
+        'align': 'left',
+        'valign': 'vcenter'
+    })
+    value_format = workbook.add_format({
+        'align': 'right',
+        'valign': 'vcenter'
+    })
+    time_format = workbook.add_format({
+        'num_format': 'yyyy/mm/dd HH:MM',
+        'align': 'right',
+        'valign': 'vcenter'
+    })
+    date_format = workbook.add_format({
+        'num_format': 'yyyy/mm/dd',
+        'align': 'right',
+        'valign': 'vcenter'
+    })
+    percent_format = workbook.add_format({
+        'num_format': '0.00%',
+        'align': 'right',
+        'valign': 'vcenter'
+    })
+
+    # 策略分析: 交易概要、资金概要、外部明细文件和曲线图
+    worksheet = workbook.add_worksheet('策略分析')
+    worksheet.write_row(0, 0, ['策略绩效概要'], title_format)
+    worksheet.write_row(2, 1, ['所有交易', '多头交易', '空头交易'], index_format)
+    row = 3
+    trdana = metrics["trdana"]
+    for key, label in TRADE_LABELS:
+        worksheet.write(row, 0, label, index_format)
+        worksheet.write_row(row, 1, [trdana["all"][key], trdana["long"][key], trdana["short"][key]], value_format)
+        row += 1
+
+    row += 1
+    worksheet.write_row(row, 0, ['资金绩效概要'], title_format)
+    row += 2
+    for key, label in SUMMARY_LABELS:
+        worksheet.write(row, 0, label, index_format)
+        worksheet.write(row, 1, metrics["summary"][key], value_format)
+        row += 1
+
+    if len(details) > 0:
+        row += 1
+        worksheet.write_row(row, 0, ['明细文件'], title_format)
+        row += 2
+        for sheetName in details:
+            worksheet.write_row(row, 0, [sheetName, details[sheetName]], value_format)
+            row += 1
+
+    row += 1
+    idx_closes = sample_index(len(df_closes), chart_points)
+    idx_funds = sample_index(len(df_funds_detail), chart_points)
+    charts = [
+        ('详细权益曲线', '平仓K线编号', 'A', 'B', len(idx_closes)),
+        ('累计净值', '日期', 'D', 'E', len(idx_funds))
+    ]
+    for title, xname, catCol, valCol, length in charts:
+        worksheet.write_row(row, 0, [title], title_format)
+        chart_col = workbook.add_chart({'type': 'line'})
+        chart_col.add_series({
+            'name': title,
+            'categories': '=作图数据!$%s$2:$%s$%d' % (catCol, catCol, length + 1),
+            'values': '=作图数据!$%s$2:$%s$%d' % (valCol, valCol, length + 1),
+            'line': {'color': 'red', 'width': 1}
+        })
+        chart_col.set_title({'name': title})
+        chart_col.set_x_axis({'name': xname})
+        worksheet.insert_chart(row + 2, 0, chart_col, {'x_scale': 1.8, 'y_scale': 1.8})
+        row += 30
+
+    # 作图数据: 抽样后的平仓权益和每日净值
+    worksheet = workbook.add_worksheet('作图数据')
+    worksheet.write_row(0, 0, ['平仓K线编号', '累计权益', '', '日期', '累计净值'], index_format)
+    ayBarNo = df_closes['closebarno'].values[idx_closes].tolist()
+    ayEquity = (df_closes['totalprofit'].values[idx_closes] + capital).tolist()
+    ayDates = df_funds_detail['日期'].iloc[idx_funds].tolist()
+    ayNetVals = df_funds_detail['累计净值'].values[idx_funds].tolist()
+    for i in range(max(len(idx_closes), len(idx_funds))):
+        if i < len(idx_closes):
+            worksheet.write_row(i + 1, 0, [ayBarNo[i], ayEquity[i]], value_format)
+        if i < len(idx_funds):
+            worksheet.write(i + 1, 3, ayDates[i], date_format)
+            worksheet.write(i + 1, 4, ayNetVals[i], value_format)
+
+    # 周期分析, 行数只和交易天数有关, 直接写入工作簿
+    worksheet = workbook.add_worksheet('周期分析')
+    headers = ['期间', '盈利(¤)', '盈利(%)', '毛利', '毛损', '交易次数', '胜率(%)']
+    formats = [index_format] + [value_format] * 6
+    row = 0
+    stats = stat_closes_by_periods(df_closes, capital)
+    for title, res in zip(['日度绩效分析', '月度绩效分析', '年度绩效分析'], stats):
+        worksheet.write_row(row, 0, [title], title_format)
+        worksheet.write_row(row + 2, 0, headers, index_format)
+        res = pd.DataFrame({
+            '期间': res.index,
+            'profit': res['profit'].values,
+            'profit_ratio': res['profit_ratio'].values,
+            'gross_profit': res['gross_profit'].values,
+            'gross_loss': res['gross_loss'].values,
+            'times': res['times'].values,
+            'win_rate': res['win_rate'].values * 100
+        })
+        row = write_rows(worksheet, row + 3, res, [date_format if title == '日度绩效分析' else index_format] + formats[1:]) + 1
+
+    # 明细没有超过阈值的才写入工作簿
+    if df_closes_detail is not None:
+        worksheet = workbook.add_worksheet('交易列表')
+        worksheet.write_row(0, 0, ['交易列表'], title_format)
+        worksheet.write_row(2, 0, list(df_closes_detail.columns), index_format)
+        formats = [value_format] * len(df_closes_detail.columns)
+        formats[3] = formats[6] = time_format
+        write_rows(worksheet, 3, df_closes_detail, formats)
+
+    if '逐日绩效分析' not in details:
+        worksheet = workbook.add_worksheet('逐日绩效分析')
+        worksheet.write_row(0, 0, list(df_funds_detail.columns), index_format)
+        formats = [value_format] * len(df_funds_detail.columns)
+        formats[0] = date_format
+        for col in [8, 10, 11, 12]:
+            formats[col] = percent_format
+        write_rows(worksheet, 1, df_funds_detail, formats)
+
+    workbook.close()
+    return details
+
+
+def analyze_strategy(sname: str, sInfo: dict, excel: bool = True, outFolder: str = '', use_cache: bool = True,
+                     streaming: bool = False, detail_limit: int = DETAIL_LIMIT, detail_format: str = "csv") -> dict:
+    '''
+    分析单个策略, 可以在子进程中执行\n
+    输入文件和参数都没有变化时直接使用缓存的指标, 报告已经存在的话也不再重新生成
+    @sname      策略名称
+    @sInfo      策略信息, 即add_strategy保存的字典
+    @excel      是否生成Excel报告
+    @outFolder  报告输出目录
+    @use_cache  是否使用指标缓存
+    @streaming  是否生成流式报告, 见render_report_streaming
+    @detail_limit   流式报告中明细写入工作簿的最大行数
+    @detail_format  流式报告中外部明细文件的格式, csv或者parquet
+    @return     指标字典
+    '''
+    folder = os.path.join(sInfo["folder"], sname)
+    init_capital = sInfo["cap"]
+    annual_days = sInfo["atd"]
+    rf = sInfo["rf"]
+
+    key = {
+        "version": METRICS_VERSION,
+        "inputs": input_signature(folder),
+        "cap": init_capital,
+        "rf": rf,
+        "atd": annual_days
+    }
+    cacheFile = os.path.join(folder, METRICS_FILE)
+    metrics = load_metrics(cacheFile, key) if use_cache else None
+
+    dirty = False
+    frames = None
+    with_trades = excel and not streaming
+    if metrics is None:
+        frames = load_strategy_data(folder, with_trades, not with_trades)
+        metrics = calc_strategy_metrics(frames[0], frames[1], capital=init_capital, rf=rf, period=annual_days)
+        metrics["report"] = None
+        dirty = True
+
+        sumObj = metrics["summary"].copy()
+        sumObj["name"] = sname
+        f = open(os.path.join(folder, "summary.json"), "w")
+        f.write(json.dumps(sumObj, indent=4, ensure_ascii=True))
+        f.close()
+
+    if excel:
+        filename = os.path.join(outFolder, 'Strategy[%s]_PnLAnalyzing_%s_%s.xlsx' % (sname, metrics["begin_date"], metrics["end_date"]))
+        report = {
+            "file": filename,
+            "streaming": streaming,
+            "detail_limit": detail_limit if streaming else 0,
+            "detail_format": detail_format if streaming else ""
+        }
+        cached = metrics["report"]
+        if not isinstance(cached, dict) or any(cached.get(k) != report[k] for k in report) \
+                or not all(os.path.exists(item) for item in [filename] + list(cached["details"].values())):
+            if frames is None:
+                frames = load_strategy_data(folder, with_trades, not with_trades)
+            if streaming:
+                report["details"] = render_report_streaming(filename, frames[0], frames[1], capital=init_capital, rf=rf, period=annual_days,
+                                                            metrics=metrics, detail_limit=detail_limit, detail_format=detail_format)
+            else:
+                render_report(filename, *frames, capital=init_capital, rf=rf, period=annual_days, metrics=metrics)
+                report["details"] = {}
+            metrics["report"] = report
+            dirty = True
+
+    if dirty:
+        save_metrics(cacheFile, key, metrics)
+
+    return metrics
+
+
 class WtBtAnalyst:
 
     def __init__(self):
@@ -1636,20 +2242,15 @@ class WtBtAnalyst:
             if len(outFileName) == 0:
                 outFileName = 'Strategy[%s]_PnLAnalyzing_%s_%s.xlsx' % (sname, df_funds['date'][0], df_funds['date'].iloc[-1])
 
-            workbook = Workbook(outFileName)
             init_capital = sInfo["cap"]
             annual_days = sInfo["atd"]
             rf = sInfo["rf"]
 
-            strategy_analyze(workbook, df_closes.copy(), df_trades.copy(), df_funds.copy(), capital=init_capital, rf=rf, period=annual_days)
-            output_closes(workbook, df_closes.copy(), capital=init_capital)
-            trading_analyze(workbook, df_closes.copy(), df_funds.copy(), capital=init_capital)
-            funds_analyze(workbook, df_funds.copy(), capital=init_capital, rf=rf, period=annual_days)
-
-            workbook.close()
+            metrics = calc_strategy_metrics(df_funds, df_closes, capital=init_capital, rf=rf, period=annual_days)
+            render_report(outFileName, df_funds, df_closes, df_trades, capital=init_capital, rf=rf, period=annual_days, metrics=metrics)
 
             filename = os.path.join(folder, "summary.json")
-            sumObj = summary_analyze(df_funds, capital=init_capital, rf=rf, period=annual_days)
+            sumObj = metrics["summary"].copy()
             sumObj["name"] = sname
             f = open(filename, "w")
             f.write(json.dumps(sumObj, indent=4, ensure_ascii=True))
@@ -1657,6 +2258,48 @@ class WtBtAnalyst:
 
             print("PnL analyzing of strategy %s done" % (sname))
 
+    def run_parallel(self, outFolder: str = '', workers: int = 0, excel: bool = True, use_cache: bool = True,
+                     streaming: bool = False, detail_limit: int = DETAIL_LIMIT, detail_format: str = "csv") -> dict:
+        '''
+        多进程并行分析全部策略, 每个策略的输入文件只读一次\n
+        指标缓存在策略目录下的metrics.json中, 输入文件和参数都没变的策略直接读缓存
+        @outFolder  Excel报告的输出目录, 默认为当前目录, 文件名格式同run_new
+        @workers    进程数, 为0则取CPU核数和策略数中较小的一个
+        @excel      是否生成Excel报告, 为False时只计算指标
+        @use_cache  是否使用指标缓存
+        @streaming  是否生成流式报告, 平仓记录很多的长周期回测建议打开
+        @detail_limit   流式报告中明细写入工作簿的最大行数, 超过的写到外部文件
+        @detail_format  流式报告中外部明细文件的格式, csv或者parquet
+        @return     {策略名: 指标字典}
+        '''
+        if len(self.__strategies__.keys()) == 0:
+            raise Exception("strategies is empty")
+
+        if workers <= 0:
+            workers = min(os.cpu_count() or 1, len(self.__strategies__))
+
+        results = dict()
+        if workers == 1:
+            for sname in self.__strategies__:
+                results[sname] = analyze_strategy(sname, self.__strategies__[sname], excel, outFolder, use_cache,
+                                                  streaming, detail_limit, detail_format)
+                print("PnL analyzing of strategy %s done" % (sname))
+            return results
+
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = dict()
+            for sname in self.__strategies__:
+                fut = executor.submit(analyze_strategy, sname, self.__strategies__[sname], excel, outFolder, use_cache,
+                                      streaming, detail_limit, detail_format)
+                futures[fut] = sname
+
+            for fut in as_completed(futures):
+                sname = futures[fut]
+                results[sname] = fut.result()
+                print("PnL analyzing of strategy %s done" % (sname))
+
+        return results
+
     def run(self, outFileName: str = ''):
         if len(self.__strategies__.keys()) == 0:
             raise Exception("strategies is empty")
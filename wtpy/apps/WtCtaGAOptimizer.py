@@ -1,6 +1,7 @@
 # -*- encoding: utf-8 -*-
 
 import multiprocessing
+import multiprocessing.util
 import time
 import json
 import yaml
@@ -17,7 +18,7 @@ from deap import creator, base, tools, algorithms
 
 from wtpy import WtBtEngine, EngineType
 from wtpy.apps import WtBtAnalyst
-from wtpy.apps.WtBtAnalyst import summary_analyze
+from wtpy.apps.WtBtAnalyst import summary_analyze, calc_trade_stats
 
 
 def fmtNAN(val, defVal=0):
@@ -27,6 +28,56 @@ def fmtNAN(val, defVal=0):
     return val
 
 
+# 工作进程内共用的回测引擎，由进程池的initializer创建，每个进程只初始化一次
+_worker_engine_ = None
+
+
+def get_worker_engine(env_params: dict) -> WtBtEngine:
+    '''
+    获取当前进程的回测引擎，第一次调用时创建并初始化\n
+    基础文件只加载一次，后续的个体评估都复用这个引擎\n
+
+    @env_params 回测环境参数
+    '''
+    global _worker_engine_
+    if _worker_engine_ is not None:
+        return _worker_engine_
+
+    is_yaml = True
+    fname = "logcfg_tpl.yaml"
+    if not os.path.exists(fname):
+        is_yaml = True
+        fname = "logcfg_tpl.json"
+
+    if not os.path.exists(fname):
+        content = "{}"
+    else:
+        f = open(fname, "r")
+        content = f.read()
+        f.close()
+        content = content.replace("$NAME$", multiprocessing.current_process().name)
+        if is_yaml:
+            content = json.dumps(yaml.full_load(content))
+
+    engine = WtBtEngine(eType=EngineType.ET_CTA, logCfg=content, isFile=False)
+    engine.init(env_params["deps_dir"], env_params["cfgfile"])
+    engine.configBTStorage(mode=env_params["storage_type"], path=env_params["storage_path"],
+                           storage=env_params["storage"])
+    # 进程退出时释放回测框架
+    multiprocessing.util.Finalize(None, engine.release_backtest, exitpriority=10)
+    _worker_engine_ = engine
+    return engine
+
+
+def init_ga_worker(env_params: dict):
+    '''
+    进程池initializer，在工作进程启动时初始化回测引擎\n
+
+    @env_params 回测环境参数
+    '''
+    get_worker_engine(env_params)
+
+
 class ParamInfo:
     '''
     参数信息类
@@ -99,7 +150,11 @@ class WtCtaGAOptimizer:
 
         self.cpp_stra_module = None
 
-        self.cache_dict = multiprocessing.Manager().dict()  # 缓存中间结果
+        # 适应度缓存，key为规整后的参数元组，跨进程共享，重复的个体不再回测
+        self.cache_dict = multiprocessing.Manager().dict()
+        self.cache_file = None  # 缓存落地文件，为None则不落地
+        self.cache_hits = 0  # 缓存命中次数
+        self.evaluations = 0  # 实际回测次数
 
     def add_mutable_param(self, name: str, start_val, end_val, step_val, ndigits=1):
         '''
@@ -180,15 +235,14 @@ class WtCtaGAOptimizer:
                 individual[i] = settings[i]
         return individual,
 
-    def evaluate_func(self, start_time, end_time, cache_dict: dict, params, capital = 5000000, rf = 0, period = 240):
-        """
-        适应度函数
-        :return:
-        """
-        # 参数传递可能出现异常
-        # 比如[(k1, 0.1), (k2, 0.1)]可能在编码出新的参数组时变为[[(k1, 0.1), (k2, 0.2)], (k2, 0.3)]的情况
-        tmp_params = dict()
+    def __normalize_params__(self, params, start_time, end_time):
+        '''
+        规整个体的参数\n
+        参数传递可能出现异常，比如[(k1, 0.1), (k2, 0.1)]可能在编码出新的参数组时变为[[(k1, 0.1), (k2, 0.2)], (k2, 0.3)]的情况\n
 
+        @params     个体，实际为参数列表
+        @return     (参数字典, 缓存key)，参数为空时返回(None, None)
+        '''
         temp = []
         [[temp.append(jj) for jj in ii] if isinstance(ii, list) else temp.append(ii) for ii in params]
         names = [itm[0] for itm in temp]
@@ -198,12 +252,38 @@ class WtCtaGAOptimizer:
             temp = [temp[i] for i in indexes]
 
         if len(temp) < 1:
-            print(f"Empty parameters: {params}")
-            return 0,
+            return None, None
 
+        tmp_params = dict()
         for cell in temp:
             tmp_params[cell[0]] = cell[1]
 
+        key = (start_time, end_time, tuple(sorted(tmp_params.items())))
+        return tmp_params, key
+
+    def __calc_fitness__(self, summary: dict) -> tuple:
+        '''
+        根据汇总结果计算适应值
+        '''
+        if self.optimizing_target_func:
+            return self.optimizing_target_func(summary)  # tuple类型
+        else:
+            return summary[self.optimizing_target],
+
+    def evaluate_func(self, start_time, end_time, cache_dict: dict, params, capital = 5000000, rf = 0, period = 240):
+        """
+        适应度函数
+        :return:
+        """
+        tmp_params, cache_key = self.__normalize_params__(params, start_time, end_time)
+        if tmp_params is None:
+            print(f"Empty parameters: {params}")
+            return 0,
+
+        cached = cache_dict.get(cache_key)
+        if cached is not None:
+            return cached["fitness"]
+
         # strategy name
         strName = [self.name_prefix[:-1]]
         [strName.extend([key, tmp_params[key]]) for key in tmp_params.keys()]
@@ -211,25 +291,10 @@ class WtCtaGAOptimizer:
         strName = [str(item) for item in strName]
         strName = "_".join(strName)
 
-        is_yaml = True
-        fname = "logcfg_tpl.yaml"
-        if not os.path.exists(fname):
-            is_yaml = True
-            fname = "logcfg_tpl.json"
-
-        f = open(fname, "r")
-        content = f.read()
-        f.close()
-        content = content.replace("$NAME$", strName)
-        if is_yaml:
-            content = json.dumps(yaml.full_load(content))
-
-        engine = WtBtEngine(eType=EngineType.ET_CTA, logCfg=content, isFile=False)
-        engine.init(self.env_params["deps_dir"], self.env_params["cfgfile"])
-        print(f'engine initialized with strategy {strName}...')
+        # 复用工作进程的回测引擎，不再每个个体都重新加载基础文件
+        engine = get_worker_engine(self.env_params)
+        print(f'{multiprocessing.current_process().name} backtesting strategy {strName}...')
         engine.configBacktest(int(start_time), int(end_time))
-        engine.configBTStorage(mode=self.env_params["storage_type"], path=self.env_params["storage_path"],
-                               storage=self.env_params["storage"])
 
         time_range = (int(start_time), int(end_time))
 
@@ -246,23 +311,89 @@ class WtCtaGAOptimizer:
 
         engine.commitBTConfig()
         engine.run_backtest()
-        engine.release_backtest()
 
         summary = self.__ayalyze_result__(strName, time_range, tmp_params, capital, rf, period)
+        result = self.__calc_fitness__(summary)
 
-        if self.optimizing_target_func:
-            result = self.optimizing_target_func(summary)  # tuple类型
-        else:
-            result = summary[self.optimizing_target],
+        # 完整的汇总结果直接放到缓存里返回给主进程，汇总时不用再读summary.json
+        summary.update({self.optimizing_target: result[0]})
+        cache_dict[cache_key] = {"fitness": result, "summary": summary}
 
-        # if strName not in cache_dict.keys():  # 缓存结果
-        #     tmp_params.update({self.optimizing_target: result[0]})
-        #     cache_dict[strName] = tmp_params
+        return result
 
-        tmp_params.update({self.optimizing_target: result[0]})
-        cache_dict[strName] = tmp_params
+    def __cached_map__(self, pool, time_range: tuple, func, individuals):
+        '''
+        带缓存的map\n
+        同一代中重复的个体只回测一次，之前评估过的个体直接从缓存中取适应值\n
 
-        return result
+        @pool       进程池
+        @time_range 回测区间
+        @func       适应度函数
+        @individuals 待评估的个体
+        '''
+        individuals = list(individuals)
+        keys = [self.__normalize_params__(ind, time_range[0], time_range[1])[1] for ind in individuals]
+
+        tasks = dict()
+        for key, ind in zip(keys, individuals):
+            if key is None or key in tasks or key in self.cache_dict:
+                continue
+            tasks[key] = ind
+
+        results = dict(zip(tasks.keys(), pool.map(func, tasks.values())))
+        self.evaluations += len(tasks)
+        self.cache_hits += len([key for key in keys if key is not None]) - len(tasks)
+        self.__save_cache__(tasks.keys())
+
+        fitnesses = list()
+        for key in keys:
+            if key is None:
+                fitnesses.append((0,))
+            elif key in results:
+                fitnesses.append(results[key])
+            else:
+                fitnesses.append(self.cache_dict[key]["fitness"])
+        return fitnesses
+
+    def __load_cache__(self):
+        '''
+        从缓存文件中加载之前评估过的个体，用于中断后续跑
+        '''
+        if self.cache_file is None or not os.path.exists(self.cache_file):
+            return
+
+        cnt = 0
+        f = open(self.cache_file, "r", encoding="utf-8")
+        for line in f:
+            line = line.strip()
+            if len(line) == 0:
+                continue
+            try:
+                item = json.loads(line)
+            except json.JSONDecodeError:
+                # 中断时可能留下写了一半的行
+                continue
+            start_time, end_time, params = item["key"]
+            key = (start_time, end_time, tuple(tuple(cell) for cell in params))
+            self.cache_dict[key] = {"fitness": tuple(item["fitness"]), "summary": item["summary"]}
+            cnt += 1
+        f.close()
+        print(f"从{self.cache_file}加载了{cnt}条缓存的评估结果")
+
+    def __save_cache__(self, keys):
+        '''
+        将新评估的个体追加到缓存文件
+        '''
+        if self.cache_file is None:
+            return
+
+        f = open(self.cache_file, "a", encoding="utf-8")
+        for key in keys:
+            if key not in self.cache_dict:
+                continue
+            item = self.cache_dict[key]
+            f.write(json.dumps({"key": key, "fitness": item["fitness"], "summary": item["summary"]}, ensure_ascii=False) + "\n")
+        f.close()
 
     def set_strategy(self, typeName: type, name_prefix: str):
         '''
@@ -349,7 +480,7 @@ class WtCtaGAOptimizer:
         f.close()
         return param_group
 
-    def __ayalyze_result__(self, strName: str, time_range: tuple, params: dict, capital = 5000000, rf = 0, period = 240):
+    def __ayalyze_result__(self, strName: str, time_range: tuple, params: dict, capital = 5000000, rf = 0, period = 240, bWriteSummary: bool = True):
         folder = "./outputs_bt/%s/" % (strName)
 
         try:
@@ -359,49 +490,28 @@ class WtCtaGAOptimizer:
             df_closes = read_closes(folder + "closes.csv")
             df_funds = read_funds(folder + "funds.csv")
 
-        df_wins = df_closes[df_closes["profit"] > 0]
-        df_loses = df_closes[df_closes["profit"] <= 0]
-
-        ay_WinnerBarCnts = df_wins["closebarno"] - df_wins["openbarno"]
-        ay_LoserBarCnts = df_loses["closebarno"] - df_loses["openbarno"]
-
-        total_winbarcnts = ay_WinnerBarCnts.sum()
-        total_losebarcnts = ay_LoserBarCnts.sum()
-
         total_fee = df_funds.iloc[-1]["fee"]
 
-        totaltimes = len(df_closes)  # 总交易次数
-        wintimes = len(df_wins)  # 盈利次数
-        losetimes = len(df_loses)  # 亏损次数
-        winamout = df_wins["profit"].sum()  # 毛盈利
-        loseamount = df_loses["profit"].sum()  # 毛亏损
-        trdnetprofit = winamout + loseamount  # 交易净盈亏
+        trd_stats = calc_trade_stats(df_closes["profit"], df_closes["closebarno"] - df_closes["openbarno"])
+
+        totaltimes = trd_stats["totaltimes"]  # 总交易次数
+        wintimes = trd_stats["wintimes"]  # 盈利次数
+        losetimes = trd_stats["losetimes"]  # 亏损次数
+        winamout = trd_stats["winamout"]  # 毛盈利
+        loseamount = trd_stats["loseamount"]  # 毛亏损
+        trdnetprofit = trd_stats["trdnetprofit"]  # 交易净盈亏
         accnetprofit = trdnetprofit - total_fee  # 账户净盈亏
-        winrate = wintimes / totaltimes if totaltimes > 0 else 0  # 胜率
-        avgprof = trdnetprofit / totaltimes if totaltimes > 0 else 0  # 单次平均盈亏
-        avgprof_win = winamout / wintimes if wintimes > 0 else 0  # 单次盈利均值
-        avgprof_lose = loseamount / losetimes if losetimes > 0 else 0  # 单次亏损均值
-        winloseratio = abs(avgprof_win / avgprof_lose) if avgprof_lose != 0 else "N/A"  # 单次盈亏均值比
-
-        max_consecutive_wins = 0  # 最大连续盈利次数
-        max_consecutive_loses = 0  # 最大连续亏损次数
-
-        avg_bars_in_winner = total_winbarcnts / wintimes if wintimes > 0 else "N/A"
-        avg_bars_in_loser = total_losebarcnts / losetimes if losetimes > 0 else "N/A"
-
-        consecutive_wins = 0
-        consecutive_loses = 0
-        for idx, row in df_closes.iterrows():
-            profit = row["profit"]
-            if profit > 0:
-                consecutive_wins += 1
-                consecutive_loses = 0
-            else:
-                consecutive_wins = 0
-                consecutive_loses += 1
+        winrate = trd_stats["winrate"]  # 胜率
+        avgprof = trd_stats["avgprof"]  # 单次平均盈亏
+        avgprof_win = trd_stats["avgprof_win"]  # 单次盈利均值
+        avgprof_lose = trd_stats["avgprof_lose"]  # 单次亏损均值
+        winloseratio = trd_stats["winloseratio"]  # 单次盈亏均值比
+
+        max_consecutive_wins = trd_stats["max_consecutive_wins"]  # 最大连续盈利次数
+        max_consecutive_loses = trd_stats["max_consecutive_loses"]  # 最大连续亏损次数
 
-            max_consecutive_wins = max(max_consecutive_wins, consecutive_wins)
-            max_consecutive_loses = max(max_consecutive_loses, consecutive_loses)
+        avg_bars_in_winner = trd_stats["avg_hold_win"]
+        avg_bars_in_loser = trd_stats["avg_hold_lose"]
 
         # 逐日绩效分析
         summary_by_day = summary_analyze(df_funds, capital, rf, period)
@@ -433,9 +543,10 @@ class WtCtaGAOptimizer:
         summary["平均盈利周期"] = avg_bars_in_winner
         summary["平均亏损周期"] = avg_bars_in_loser
 
-        f = open(folder + "summary.json", mode="w")
-        f.write(json.dumps(obj=summary, indent=4))
-        f.close()
+        if bWriteSummary:
+            f = open(folder + "summary.json", mode="w")
+            f.write(json.dumps(obj=summary, indent=4))
+            f.close()
 
         return summary
 
@@ -448,7 +559,8 @@ class WtCtaGAOptimizer:
         def generate_parameter():
             return choice(settings)
 
-        pool = multiprocessing.Pool(self.worker_num)  # 多线程设置
+        # 每个工作进程启动时初始化一次回测引擎
+        pool = multiprocessing.Pool(self.worker_num, initializer=init_ga_worker, initargs=(self.env_params,))
         toolbox = base.Toolbox()
         toolbox.register("individual", tools.initIterate, creator.Individual, generate_parameter)
         toolbox.register("population", tools.initRepeat, list, toolbox.individual)
@@ -457,7 +569,7 @@ class WtCtaGAOptimizer:
         toolbox.register("mate", tools.cxTwoPoint)
         toolbox.register("mutate", self.mututate_individual, indpb=0.05)
         toolbox.register("select", tools.selNSGA2)
-        toolbox.register("map", pool.map)  # 多线程优化，可能会报错
+        toolbox.register("map", self.__cached_map__, pool, (params["start_time"], params["end_time"]))  # 多进程优化，跳过已评估的个体
         # seed(12555888)  # 固定随机数种子
 
         pop = toolbox.population(self.population_size)
@@ -483,8 +595,12 @@ class WtCtaGAOptimizer:
         _, logbook = algorithms.eaMuPlusLambda(pop, toolbox, self.MU, self.lambda_, self.cx_prb, self.mut_prb,
                                                self.ngen_size, stats, verbose=False, halloffame=hof)
 
+        pool.close()
+        pool.join()
+
         end = time.perf_counter()
         print(f"算法优化完成，耗时: {end - begin: .2f} 秒")
+        print(f"实际回测次数: {self.evaluations}, 缓存命中次数: {self.cache_hits}")
         print("*" * 50)
 
         # # 处理结果
@@ -494,47 +610,20 @@ class WtCtaGAOptimizer:
         # return
 
     def go(self, out_marker_file: str = "strategies.json",
-           out_summary_file: str = "total_summary.csv", capital = 5000000, rf = 0, period = 240):
+           out_summary_file: str = "total_summary.csv", capital = 5000000, rf = 0, period = 240, cache_file: str = None):
         '''
         启动优化器\n
         @markerfile 标记文件名，回测完成以后分析会用到
+        @cache_file 适应度缓存文件，每一代评估完追加写入，再次启动时会先加载，中断以后可以接着跑
         '''
+        self.cache_file = cache_file
+        self.__load_cache__()
+
         params = self.gen_params(out_marker_file)
         self.run_ga_optimizer(params, capital, rf, period)
 
-        # 获取所有的值
-        results = list(self.cache_dict.values())
-        header = list(results[0].keys())
-        data = [list(itm.values()) for itm in results]
-        df_results = pd.DataFrame(data, columns=header)
-        df_results = df_results[["name", self.optimizing_target]]
-
-        # 开始汇总回测结果
-        f = open(out_marker_file, "r")
-        content = f.read()
-        f.close()
-
-        obj_stras = json.loads(content)
-        total_summary = list()
-        for straName in obj_stras:
-            filename = "./outputs_bt/%s/summary.json" % (straName)
-            if not os.path.exists(filename):
-                # print("%s不存在，请检查数据" % (filename))
-                continue
-
-            f = open(filename, "r")
-            content = f.read()
-            f.close()
-            obj_summary = json.loads(content)
-            total_summary.append(obj_summary)
-
-        df_summary = df(total_summary)
-
-        # 汇总结果
-        if self.optimizing_target not in df_summary.columns.tolist():
-            df_summary = pd.merge(df_summary, df_results, how="inner", on="name")
-        else:
-            df_summary = pd.merge(df_summary, df_results, how='inner', on=['name', self.optimizing_target])
+        # 汇总结果，每个个体的汇总数据都在缓存里，不需要再读取summary.json
+        df_summary = df([item["summary"] for item in self.cache_dict.values()])
         df_summary.sort_values(by=self.optimizing_target, ascending=False, inplace=True)
         df_summary.reset_index(inplace=True, drop=True)
 
@@ -544,7 +633,7 @@ class WtCtaGAOptimizer:
 
     def analyze(self, out_marker_file: str = "strategies.json", out_summary_file: str = "total_summary.csv", capital = 5000000, rf = 0, period = 240):
         # 获取所有的值
-        results = list(self.cache_dict.values())
+        results = [item["summary"] for item in self.cache_dict.values()]
         header = list(results[0].keys())
         data = [list(itm.values()) for itm in results]
         df_results = pd.DataFrame(data, columns=header)
@@ -1,4 +1,5 @@
 import multiprocessing
+import queue
 import time
 import json
 import yaml
@@ -6,13 +7,16 @@ import datetime
 import ctypes
 
 import os
+import csv
 import math
+import shutil
+from collections import deque, defaultdict
 import pandas as pd
 from pandas import DataFrame as df
 
 from wtpy import WtBtEngine,EngineType
 from wtpy.apps import WtBtAnalyst
-from wtpy.apps.WtBtAnalyst import summary_analyze
+from wtpy.apps.WtBtAnalyst import summary_analyze, calc_trade_stats
 from wtpy.WtMsgQue import WtMsgQue,WtMQServer
 
 def fmtNAN(val, defVal = 0):
@@ -48,63 +52,99 @@ class OptimizeNotifier:
         }
         self.publish("OPT_STOP", json.dumps(data))
 
-    def on_state(self, pgroups:int, done:int, progress:float, elapse:float):
+    def on_state(self, pgroups:int, done:int, progress:float, elapse:float, workers:dict = None):
         data = {
             "pgroups": pgroups,
             "done": done,
             "progress":progress,
             "elapse":int(elapse)
         }
+        if workers is not None:
+            data["workers"] = workers
         self.publish("OPT_STATE", json.dumps(data))
 
-def ayalyze_result(strName:str, time_range:tuple, params:dict, capital = 5000000, rf = 0, period = 240):
+class SummaryWriter:
+    '''
+    汇总结果写入器\n
+    每收到一个回测结果就追加一行到汇总文件，不需要等全部回测结束，也不用再逐个读取summary.json\n
+    表头为所有结果字段的并集，后面的结果出现新字段时，会带上新字段重写已经写入的内容
+    '''
+    def __init__(self, filename:str):
+        self.filename = filename
+        self.count = 0
+        self._file = None
+        self._fields = None
+        self._writer:csv.DictWriter = None
+
+    def _open(self, rows:list = None):
+        # 和DataFrame.to_csv一样，第一列为序号
+        self._file = open(self.filename, "w", newline="", encoding="utf-8-sig")
+        self._writer = csv.DictWriter(self._file, fieldnames=self._fields)
+        self._writer.writeheader()
+        if rows is not None:
+            self._writer.writerows(rows)
+
+    def _expand(self, fields:list):
+        # 读回已经写入的内容，带上新的字段重写
+        self._file.close()
+        f = open(self.filename, "r", newline="", encoding="utf-8-sig")
+        rows = list(csv.DictReader(f))
+        f.close()
+        self._fields = self._fields + fields
+        self._open(rows)
+
+    def write(self, summary:dict):
+        if self._writer is None:
+            self._fields = [""] + list(summary.keys())
+            self._open()
+        else:
+            fields = [key for key in summary.keys() if key not in self._fields]
+            if len(fields) > 0:
+                self._expand(fields)
+
+        row = {"":self.count}
+        row.update(summary)
+        self._writer.writerow(row)
+        self._file.flush()
+        self.count += 1
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+def ayalyze_result(strName:str, time_range:tuple, params:dict, capital = 5000000, rf = 0, period = 240, bWriteSummary:bool = True) -> dict:
+    '''
+    分析单个回测的结果\n
+    @bWriteSummary  是否将结果写到回测目录下的summary.json
+    @return         汇总结果
+    '''
     folder = "./outputs_bt/%s/" % (strName)
     df_closes = pd.read_csv(folder + "closes.csv")
     df_funds = pd.read_csv(folder + "funds.csv")
 
-    df_wins = df_closes[df_closes["profit"]>0]
-    df_loses = df_closes[df_closes["profit"]<=0]
+    total_fee = df_funds.iloc[-1]["fee"]
 
-    ay_WinnerBarCnts = df_wins["closebarno"]-df_wins["openbarno"]
-    ay_LoserBarCnts = df_loses["closebarno"]-df_loses["openbarno"]
+    trd_stats = calc_trade_stats(df_closes["profit"], df_closes["closebarno"] - df_closes["openbarno"])
 
-    total_winbarcnts = ay_WinnerBarCnts.sum()
-    total_losebarcnts = ay_LoserBarCnts.sum()
+    totaltimes = trd_stats["totaltimes"]  # 总交易次数
+    wintimes = trd_stats["wintimes"]  # 盈利次数
+    losetimes = trd_stats["losetimes"]  # 亏损次数
+    winamout = trd_stats["winamout"]  # 毛盈利
+    loseamount = trd_stats["loseamount"]  # 毛亏损
+    trdnetprofit = trd_stats["trdnetprofit"]  # 交易净盈亏
+    accnetprofit = trdnetprofit - total_fee  # 账户净盈亏
+    winrate = trd_stats["winrate"]  # 胜率
+    avgprof = trd_stats["avgprof"]  # 单次平均盈亏
+    avgprof_win = trd_stats["avgprof_win"]  # 单次盈利均值
+    avgprof_lose = trd_stats["avgprof_lose"]  # 单次亏损均值
+    winloseratio = trd_stats["winloseratio"]  # 单次盈亏均值比
 
-    total_fee = df_funds.iloc[-1]["fee"]
+    max_consecutive_wins = trd_stats["max_consecutive_wins"]  # 最大连续盈利次数
+    max_consecutive_loses = trd_stats["max_consecutive_loses"]  # 最大连续亏损次数
 
-    totaltimes = len(df_closes) # 总交易次数
-    wintimes = len(df_wins)     # 盈利次数
-    losetimes = len(df_loses)   # 亏损次数
-    winamout = df_wins["profit"].sum()      #毛盈利
-    loseamount = df_loses["profit"].sum()   #毛亏损
-    trdnetprofit = winamout + loseamount    #交易净盈亏
-    accnetprofit = trdnetprofit - total_fee #账户净盈亏
-    winrate = wintimes / totaltimes if totaltimes>0 else 0      # 胜率
-    avgprof = trdnetprofit/totaltimes if totaltimes>0 else 0    # 单次平均盈亏
-    avgprof_win = winamout/wintimes if wintimes>0 else 0        # 单次盈利均值
-    avgprof_lose = loseamount/losetimes if losetimes>0 else 0   # 单次亏损均值
-    winloseratio = abs(avgprof_win/avgprof_lose) if avgprof_lose!=0 else "N/A"   # 单次盈亏均值比
-        
-    max_consecutive_wins = 0    # 最大连续盈利次数
-    max_consecutive_loses = 0   # 最大连续亏损次数
-    
-    avg_bars_in_winner = total_winbarcnts/wintimes if wintimes>0 else "N/A"
-    avg_bars_in_loser = total_losebarcnts/losetimes if losetimes>0 else "N/A"
-
-    consecutive_wins = 0
-    consecutive_loses = 0
-    for idx, row in df_closes.iterrows():
-        profit = row["profit"]
-        if profit > 0:
-            consecutive_wins += 1
-            consecutive_loses = 0
-        else:
-            consecutive_wins = 0
-            consecutive_loses += 1
-        
-        max_consecutive_wins = max(max_consecutive_wins, consecutive_wins)
-        max_consecutive_loses = max(max_consecutive_loses, consecutive_loses)
+    avg_bars_in_winner = trd_stats["avg_hold_win"]
+    avg_bars_in_loser = trd_stats["avg_hold_lose"]
 
     # 逐日绩效分析
     summary_by_day = summary_analyze(df_funds, capital, rf, period)
@@ -136,17 +176,18 @@ def ayalyze_result(strName:str, time_range:tuple, params:dict, capital = 5000000
     summary["平均盈利周期"] = avg_bars_in_winner
     summary["平均亏损周期"] = avg_bars_in_loser
 
-    f = open(folder+"summary.json", mode="w")
-    f.write(json.dumps(obj=summary, indent=4))
-    f.close()
+    if bWriteSummary:
+        f = open(folder+"summary.json", mode="w")
+        f.write(json.dumps(obj=summary, indent=4))
+        f.close()
 
-    return
+    return summary
 
-def start_task_group(env_params, gpName:str, params:list, counter, capital = 5000000, rf = 0, period = 240, 
-    strategy_type = None, cpp_stra_module = None, cpp_stra_type = None):
+def create_bt_engine(env_params, gpName:str) -> WtBtEngine:
     '''
-    启动多个回测任务，来回测一组参数，这里共用一个engine，因此可以避免多次io
-    @params 参数组
+    创建并初始化回测引擎, 一个工作进程只创建一次
+    @env_params 回测环境参数
+    @gpName     工作进程名称, 用于替换日志配置模板中的$NAME$
     '''
     is_yaml = True
     fname = "./logcfg_tpl.yaml"
@@ -154,8 +195,6 @@ def start_task_group(env_params, gpName:str, params:list, counter, capital = 500
         is_yaml = True
         fname = "./logcfg_tpl.json"
 
-    print(f"{gpName} 共有{len(params)}组参数，开始回测...")
-
     if not os.path.exists(fname):
         content = "{}"
     else:
@@ -179,31 +218,219 @@ def start_task_group(env_params, gpName:str, params:list, counter, capital = 500
             env_params["deps_files"]["sessionfile"], env_params["deps_files"]["holidayfile"],
             env_params["deps_files"]["hotfile"], env_params["deps_files"]["secondfile"])
     engine.configBTStorage(mode=env_params["storage_type"], path=env_params["storage_path"], storage=env_params["storage"])
+    return engine
+
+def run_task(engine:WtBtEngine, param:dict, capital = 5000000, rf = 0, period = 240, 
+    strategy_type = None, cpp_stra_module = None, cpp_stra_type = None, keep_outputs:bool = True) -> dict:
+    '''
+    用已经初始化好的engine回测一组参数
+    @param          参数组, 会被修改, 调用方需要自己保留副本
+    @keep_outputs   是否保留回测输出目录, 为False时分析完就删除closes.csv等文件, 也不再写summary.json
+    @return         汇总结果
+    '''
+    name = param["name"]
+    
+    engine.configBacktest(param["start_time"], param["end_time"])
+    time_range = (param["start_time"], param["end_time"])
+    # 去掉多余的参数
+    param.pop("start_time")
+    param.pop("end_time")
+    if cpp_stra_module is not None:
+        param.pop("name")
+        engine.setExternalCtaStrategy(name, cpp_stra_module, cpp_stra_type, param)
+    else:
+        straInfo = strategy_type(**param)
+        engine.set_cta_strategy(straInfo)
+    engine.commitBTConfig()
+    engine.run_backtest()
+    summary = ayalyze_result(name, time_range, param, capital, rf, period, bWriteSummary=keep_outputs)
+    if not keep_outputs:
+        shutil.rmtree(f"./outputs_bt/{name}/", ignore_errors=True)
+    return summary
+
+def start_task_group(env_params, gpName:str, params:list, counter, capital = 5000000, rf = 0, period = 240, 
+    strategy_type = None, cpp_stra_module = None, cpp_stra_type = None):
+    '''
+    启动多个回测任务，来回测一组参数，这里共用一个engine，因此可以避免多次io
+    @params 参数组
+    '''
+    print(f"{gpName} 共有{len(params)}组参数，开始回测...")
+
+    engine = create_bt_engine(env_params, gpName)
     # 遍历参数组
     total = len(params)
     cnt = 0
     for param in params:
         cnt += 1
         print(f"{gpName} 正在回测{cnt}/{total}")
-        name = param["name"]
-        
-        engine.configBacktest(param["start_time"], param["end_time"])
-        time_range = (param["start_time"], param["end_time"])
-        # 去掉多余的参数
-        param.pop("start_time")
-        param.pop("end_time")
-        if cpp_stra_module is not None:
-            param.pop("name")
-            engine.setExternalCtaStrategy(name, cpp_stra_module, cpp_stra_type, param)
-        else:
-            straInfo = strategy_type(**param)
-            engine.set_cta_strategy(straInfo)
-        engine.commitBTConfig()
-        engine.run_backtest()
-        ayalyze_result(name, time_range, param, capital, rf, period)
+        run_task(engine, param, capital, rf, period, strategy_type, cpp_stra_module, cpp_stra_type)
         counter.value += 1
     engine.release_backtest()
 
+def start_task_worker(env_params, gpName:str, task_queue, state_queue, batch_size:int = 1, capital = 5000000, rf = 0, period = 240, 
+    strategy_type = None, cpp_stra_module = None, cpp_stra_type = None, keep_outputs:bool = True):
+    '''
+    工作进程入口，向主进程申请任务并回测，直到收到结束标记，整个过程共用一个engine
+    @task_queue     本进程的任务队列，主进程分配的任务会放到这里，None为结束标记
+    @state_queue    所有进程共用的状态队列，用于申请任务和汇报进度，回测结果也通过它直接返回给主进程
+    @batch_size     每次申请的任务数
+    @keep_outputs   是否保留每个回测的输出文件
+    '''
+    engine = create_bt_engine(env_params, gpName)
+    while True:
+        state_queue.put(("ready", gpName, batch_size))
+        tasks = task_queue.get()
+        if tasks is None:
+            break
+
+        for idx, param in tasks:
+            state_queue.put(("start", gpName, idx))
+            print(f"{gpName} 正在回测{param['name']}")
+            summary = run_task(engine, param, capital, rf, period, strategy_type, cpp_stra_module, cpp_stra_type, keep_outputs)
+            state_queue.put(("done", gpName, (idx, summary)))
+    engine.release_backtest()
+
+class OptimizeWorker:
+    '''
+    主进程中记录的工作进程状态
+    '''
+    def __init__(self, name:str, process:multiprocessing.Process, task_queue):
+        self.name = name
+        self.process = process
+        self.task_queue = task_queue
+        self.held = set()       # 已经分配给该进程但还没完成的任务
+        self.running = None     # 正在回测的任务
+        self.waiting = 0        # 申请了但是还没分配到的任务数
+        self.done = 0           # 已完成的任务数
+        self.started = False    # 是否已经初始化完成并申请过任务
+        self.start_time = time.time()
+
+    def assign(self, tasks:list, pending):
+        batch = list()
+        while len(batch) < self.waiting and len(pending) > 0:
+            idx = pending.popleft()
+            batch.append((idx, tasks[idx]))
+            self.held.add(idx)
+
+        if len(batch) > 0:
+            self.waiting = 0
+            self.task_queue.put(batch)
+
+    @property
+    def speed(self) -> float:
+        '''
+        吞吐量，单位为任务数/分钟
+        '''
+        elapse = time.time() - self.start_time
+        return round(self.done*60/elapse, 2) if elapse > 0 else 0
+
+def schedule_tasks(tasks:list, start_worker, worker_num:int, writer:SummaryWriter, max_retries:int = 1, 
+    notifier:OptimizeNotifier = None, stime:datetime.datetime = None):
+    '''
+    启动工作进程并调度任务，CTA和HFT优化器共用\n
+    所有任务放在主进程的待分配队列里，工作进程空闲了就来申请，回测慢的参数组不会拖住其他进程\n
+    工作进程崩溃时，分配给它的任务重新放回队列，并启动新的工作进程补位
+    @tasks          全部参数组
+    @start_worker   启动工作进程的函数，格式如start_worker(work_id:int, state_queue) -> OptimizeWorker
+    @worker_num     同时运行的工作进程数
+    @writer         汇总结果写入器
+    @max_retries    工作进程崩溃时，正在回测的任务最多重试的次数
+    @notifier       进度通知器
+    @stime          开始时间，用于计算进度通知中的耗时
+    '''
+    if stime is None:
+        stime = datetime.datetime.now()
+
+    total_size = len(tasks)
+    pending = deque(range(total_size))
+    retries = defaultdict(int)
+    failed = list()
+    finished = 0
+    startup_failures = 0
+
+    state_queue = multiprocessing.Queue()
+    workers = dict()
+    work_id = 0
+    for i in range(min(worker_num, total_size)):
+        work_id += 1
+        worker = start_worker(work_id, state_queue)
+        workers[worker.name] = worker
+
+    last_notify = 0
+    while finished + len(failed) < total_size:
+        try:
+            evt, work_name, data = state_queue.get(timeout=0.5)
+        except queue.Empty:
+            evt = None
+
+        if evt is not None:
+            worker = workers.get(work_name)
+            if worker is None:
+                continue
+
+            if evt == "ready":
+                worker.started = True
+                worker.waiting = data
+                worker.assign(tasks, pending)
+            elif evt == "start":
+                worker.running = data
+            elif evt == "done":
+                idx, summary = data
+                worker.held.discard(idx)
+                worker.running = None
+                worker.done += 1
+                finished += 1
+                writer.write(summary)
+        else:
+            # 状态队列空了再检查进程是否存活，避免漏掉退出前发出的消息
+            for worker in list(workers.values()):
+                if worker.process.is_alive():
+                    continue
+
+                workers.pop(worker.name)
+                print(f"{worker.name} 异常退出(exitcode: {worker.process.exitcode})，{len(worker.held)}个任务重新分配")
+                for idx in sorted(worker.held, reverse=True):
+                    if idx == worker.running:
+                        retries[idx] += 1
+                        if retries[idx] > max_retries:
+                            print(f"{tasks[idx]['name']} 重试{max_retries}次后仍然失败，放弃")
+                            failed.append(idx)
+                            continue
+                    pending.appendleft(idx)
+
+                if not worker.started:
+                    startup_failures += 1
+                    if startup_failures > worker_num:
+                        # 引擎都初始化不起来，重启也没有意义，剩下的任务全部放弃
+                        print("工作进程多次启动失败，请检查回测环境配置")
+                        failed.extend(pending)
+                        pending.clear()
+                        break
+
+                if finished + len(failed) < total_size:
+                    work_id += 1
+                    worker = start_worker(work_id, state_queue)
+                    workers[worker.name] = worker
+
+            for worker in workers.values():
+                if worker.waiting > 0:
+                    worker.assign(tasks, pending)
+
+        if notifier is not None and time.time() - last_notify >= 0.5:
+            last_notify = time.time()
+            elapse = datetime.datetime.now() - stime
+            states = {w.name:{"done":w.done, "speed":w.speed} for w in workers.values()}
+            notifier.on_state(total_size, finished, finished*100/total_size, int(elapse.total_seconds()*1000), states)
+
+    for worker in workers.values():
+        worker.task_queue.put(None)
+    for worker in workers.values():
+        worker.process.join()
+        print(f"{worker.name} 结束工作了，共完成{worker.done}个任务，{worker.speed}个/分钟")
+
+    if len(failed) > 0:
+        print(f"共有{len(failed)}组参数回测失败")
+
 class ParamInfo:
     '''
     参数信息类
@@ -238,13 +465,17 @@ class WtCtaOptimizer:
     参数优化器\n
     主要用于做策略参数优化的
     '''
-    def __init__(self, worker_num:int = 8, notifier:OptimizeNotifier = None):
+    def __init__(self, worker_num:int = 8, notifier:OptimizeNotifier = None, batch_size:int = 1, max_retries:int = 1):
         '''
         构造函数\n
 
         @worker_num 工作进程个数，默认为8，可以根据CPU核心数设置
+        @batch_size 工作进程每次申请的任务数，默认为1，单个回测很快的时候可以调大，减少进程间通信
+        @max_retries 工作进程崩溃时，正在回测的任务最多重试的次数
         '''
         self.worker_num = worker_num
+        self.batch_size = max(1, batch_size)
+        self.max_retries = max_retries
         self.running_worker = 0
         self.mutable_params = dict()
         self.fixed_params = dict()
@@ -427,86 +658,49 @@ class WtCtaOptimizer:
         f.close()
         return param_groups
 
-    def go(self, order_by_field:str = "", out_marker_file:str = "strategies.json", out_summary_file:str = "total_summary.csv", capital = 5000000, rf = 0, period = 240):
+    def go(self, order_by_field:str = "", out_marker_file:str = "strategies.json", out_summary_file:str = "total_summary.csv", capital = 5000000, rf = 0, period = 240, keep_outputs:bool = True):
         '''
         启动优化器\n
         @order_by_field     参数排序字段
         @markerfile         标记文件名，回测完成以后分析会用到
+        @out_summary_file   汇总文件，回测结果由工作进程直接返回，边回测边写入
+        @keep_outputs       是否保留每个回测的输出目录和summary.json，参数组很多的时候可以关掉以减少文件读写\n
+                            analyze和analyzer要读取这些输出，关掉以后不能再调用，汇总结果以out_summary_file为准
         '''
         self.tasks = self.__gen_tasks__(out_marker_file, order_by_field)
         if self.notifier is not None:
             self.notifier.on_start(len(self.tasks))
         
         stime = datetime.datetime.now()
-        self.counter = multiprocessing.Manager().Value(ctypes.c_int, 0)
-        pool = []
         total_size = len(self.tasks)
-        gpSize = math.floor(total_size / self.worker_num)
-        leftSz = total_size % self.worker_num
-        if gpSize == 0:
-            gpSize = 1
-        work_id = 0
-        max_cnt = min(self.worker_num,total_size)
-        fromIdx = 0
-        for i in range(max_cnt):
-            work_id = i + 1
-            work_name = f"Worker[{work_id}]"
-            thisCnt = gpSize
-            if leftSz > 0:
-                thisCnt += 1
-                leftSz -= 1
-
-            params = self.tasks[fromIdx: fromIdx + thisCnt]
-            p = multiprocessing.Process(
-                target=start_task_group, 
-                args=(self.env_params, work_name, params, self.counter, capital, rf, period, self.strategy_type, self.cpp_stra_module, self.cpp_stra_type), 
-                name=work_name)
-            p.start()
-            print(f"{work_name} 开始工作")
-            pool.append(p)
-
-            fromIdx += thisCnt
-        
-        alive_cnt = len(pool)
-        while alive_cnt > 0:
-            for task in pool:
-                if not task.is_alive():
-                    pool.remove(task)
-                    alive_cnt -= 1
-                    print(f"{task.name} 结束工作了(剩余{alive_cnt})")
-
-            if self.notifier is not None:
-                elapse = datetime.datetime.now() - stime
-                self.notifier.on_state(total_size, self.counter.value, self.counter.value*100/total_size, int(elapse.total_seconds()*1000))            
-            time.sleep(0.5)
-
-        #开始汇总回测结果
-        f = open(out_marker_file, "r")
-        content = f.read()
-        f.close()
-
-        obj_stras = json.loads(content)
-        total_summary = list()
-        for straName in obj_stras:
-            filename = f"./outputs_bt/{straName}/summary.json"
-            if not os.path.exists(filename):
-                print(f"{filename}不存在，请检查数据")
-                continue
-                
-            f = open(filename, "r")
-            content = f.read()
-            f.close()
-            obj_summary = json.loads(content)
-            total_summary.append(obj_summary)
-
-        df_summary = df(total_summary)
-        # df_summary = df_summary.drop(labels=["name"], axis='columns')
-        df_summary.to_csv(out_summary_file, encoding='utf-8-sig')
+        writer = SummaryWriter(out_summary_file)
+        try:
+            self.__run_workers__(stime, capital, rf, period, writer, keep_outputs)
+        finally:
+            writer.close()
 
         if self.notifier is not None:
             elapse = datetime.datetime.now() - stime
             self.notifier.on_stop(total_size, elapse.total_seconds()*1000) 
 
+    def __start_worker__(self, work_id:int, state_queue, capital, rf, period, keep_outputs:bool) -> OptimizeWorker:
+        work_name = f"Worker[{work_id}]"
+        task_queue = multiprocessing.Queue()
+        p = multiprocessing.Process(
+            target=start_task_worker, 
+            args=(self.env_params, work_name, task_queue, state_queue, self.batch_size, capital, rf, period, self.strategy_type, self.cpp_stra_module, self.cpp_stra_type, keep_outputs), 
+            name=work_name)
+        p.start()
+        print(f"{work_name} 开始工作")
+        return OptimizeWorker(work_name, p, task_queue)
+
+    def __run_workers__(self, stime:datetime.datetime, capital, rf, period, writer:SummaryWriter, keep_outputs:bool):
+        '''
+        启动工作进程并调度任务，见schedule_tasks
+        '''
+        start_worker = lambda work_id, state_queue: self.__start_worker__(work_id, state_queue, capital, rf, period, keep_outputs)
+        schedule_tasks(self.tasks, start_worker, self.worker_num, writer, self.max_retries, self.notifier, stime)
+
     def analyze(self, out_marker_file:str = "strategies.json", out_summary_file:str = "total_summary.csv"):
         #开始汇总回测结果
         f = open(out_marker_file, "r")
@@ -531,12 +725,19 @@ class WtCtaOptimizer:
             obj_summary = json.loads(content)
             total_summary.append(obj_summary)
 
+        if len(total_summary) == 0:
+            raise Exception("没有找到任何回测输出，如果go时keep_outputs为False，汇总结果已经写到go的out_summary_file中")
+
         df_summary = df(total_summary)
         df_summary = df_summary.drop(labels=["name"], axis='columns')
         df_summary.to_csv(out_summary_file)
 
     def analyzer(self, out_marker_file:str = "strategies.json", init_capital=500000, rf=0.02, annual_trading_days=240):
         for straname in json.load(open(out_marker_file, mode='r')).keys():
+            if not os.path.exists("./outputs_bt/%s/" % (straname)):
+                print("%s的回测输出不存在，需要在go时设置keep_outputs为True" % (straname))
+                continue
+
             try:
                 analyst = WtBtAnalyst()
                 analyst.add_strategy(straname, folder=f"./outputs_bt/{straname}/", init_capital=init_capital, rf=rf, annual_trading_days=annual_trading_days)
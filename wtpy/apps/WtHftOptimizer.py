@@ -12,12 +12,15 @@ import yaml
 
 import os
 import math
+import shutil
 import numpy as np
 import pandas as pd
 from pandas import DataFrame as df
 import datetime
 from wtpy import WtBtEngine,EngineType
 from wtpy.apps import WtBtAnalyst
+from wtpy.apps.WtBtAnalyst import calc_trade_stats
+from wtpy.apps.WtCtaOptimizer import SummaryWriter, OptimizeNotifier, OptimizeWorker, schedule_tasks
 
 def fmtNAN(val, defVal = 0):
     if math.isnan(val):
@@ -25,6 +28,167 @@ def fmtNAN(val, defVal = 0):
 
     return val
 
+def analyze_result(strName:str, time_range:tuple, params:dict, bWriteSummary:bool = True) -> dict:
+    '''
+    分析单个回测的结果\n
+    @bWriteSummary  是否将结果写到回测目录下的summary.json
+    @return         汇总结果
+    '''
+    folder = "./outputs_bt/%s/" % (strName)
+    df_closes = pd.read_csv(folder + "closes.csv",encoding="gbk")
+    df_funds = pd.read_csv(folder + "funds.csv")
+    
+    df_closes["opentime"] = pd.to_datetime(df_closes["opentime"].astype("str"), format="%Y%m%d%H%M%S%f")
+    df_closes["closetime"] = pd.to_datetime(df_closes["closetime"].astype("str"), format="%Y%m%d%H%M%S%f")
+    df_closes["holdperiod"] = (df_closes["closetime"] - df_closes["opentime"]).dt.total_seconds()
+    
+    total_fee = df_funds.iloc[-1]["fee"]
+
+    trd_stats = calc_trade_stats(df_closes["profit"], df_closes["holdperiod"])
+
+    totaltimes = trd_stats["totaltimes"]  # 总交易次数
+    wintimes = trd_stats["wintimes"]  # 盈利次数
+    losetimes = trd_stats["losetimes"]  # 亏损次数
+    winamout = trd_stats["winamout"]  # 毛盈利
+    loseamount = trd_stats["loseamount"]  # 毛亏损
+    trdnetprofit = trd_stats["trdnetprofit"]  # 交易净盈亏
+    accnetprofit = trdnetprofit - total_fee  # 账户净盈亏
+    winrate = trd_stats["winrate"]  # 胜率
+    avgprof = trd_stats["avgprof"]  # 单次平均盈亏
+    avgprof_win = trd_stats["avgprof_win"]  # 单次盈利均值
+    avgprof_lose = trd_stats["avgprof_lose"]  # 单次亏损均值
+    winloseratio = trd_stats["winloseratio"]  # 单次盈亏均值比
+
+    max_consecutive_wins = trd_stats["max_consecutive_wins"]  # 最大连续盈利次数
+    max_consecutive_loses = trd_stats["max_consecutive_loses"]  # 最大连续亏损次数
+
+    avg_time_in_winner = trd_stats["avg_hold_win"]
+    avg_time_in_loser = trd_stats["avg_hold_lose"]
+
+    total_fee = df_funds["fee"].sum()
+    yearRet = round(df_funds["closeprofit"].mean() * 244.0,3) 
+    vol = (df_funds["closeprofit"].std() * np.sqrt(244)).round(3)
+    sr = yearRet / vol
+    sr = sr.round(3)
+    df_funds["dd"] = (df_funds['dynbalance'].rolling(len(df_funds)+1,min_periods=1).max()- df_funds['dynbalance'])
+    maxdd = df_funds["dd"].max()
+    maxdd_t = df_funds[df_funds['dd']==maxdd]["date"].values[0]
+    maxdd = maxdd + 0.1
+    cr = yearRet/ maxdd
+    cr = np.round(cr,3)
+    
+    summary = params.copy()
+    summary["开始时间"] = time_range[0]
+    summary["结束时间"] = time_range[1]
+    summary["总交易次数"] = totaltimes
+    summary["手续费"] = total_fee
+    summary["盈利次数"] = wintimes
+    summary["亏损次数"] = losetimes
+    summary["毛盈利"] = float(winamout)
+    summary["毛亏损"] = float(loseamount)
+    summary["交易净盈亏"] = float(trdnetprofit)
+    summary["胜率"] = winrate*100
+    summary["单次平均盈亏"] = avgprof
+    summary["单次盈利均值"] = avgprof_win
+    summary["单次亏损均值"] = avgprof_lose
+    summary["单次盈亏均值比"] = winloseratio
+    summary["最大连续盈利次数"] = max_consecutive_wins
+    summary["最大连续亏损次数"] = max_consecutive_loses
+    summary["平均盈利周期(s)"] = avg_time_in_winner
+    summary["平均亏损周期(s)"] = avg_time_in_loser
+    summary["平均账户收益率"] = accnetprofit/totaltimes
+    summary["年均收入"] = yearRet
+    summary["波动率"] = vol
+    summary["夏普"] = sr
+    summary["最大回撤"] = maxdd
+    summary["最大回撤发生时间"] = str(maxdd_t)
+    summary["卡玛"] = cr
+
+    if bWriteSummary:
+        f = open(folder+"summary.json", mode="w")
+        f.write(json.dumps(obj=summary, indent=4))
+        f.close()
+
+    return summary
+
+def create_hft_engine(env_params, gpName:str) -> WtBtEngine:
+    '''
+    创建并初始化HFT回测引擎, 一个工作进程只创建一次
+    @env_params 回测环境参数
+    @gpName     工作进程名称, 用于替换日志配置模板中的$NAME$
+    '''
+    is_yaml = True
+    fname = "logcfg_tpl.yaml"
+    if not os.path.exists(fname):
+        is_yaml = False
+        fname = "logcfg_tpl.json"
+
+    if not os.path.exists(fname):
+        content = "{}"
+    else:
+        f = open(fname, "r")
+        content =f.read()
+        f.close()
+        content = content.replace("$NAME$", gpName)
+        if is_yaml:
+            content = json.dumps(yaml.full_load(content))
+
+    engine = WtBtEngine(eType=EngineType.ET_HFT, logCfg=content, isFile=False)
+    # 配置类型的参数相对固定
+    engine.init(env_params["deps_dir"], env_params["cfgfile"])
+    engine.configBTStorage(mode=env_params["storage_type"], path=env_params["storage_path"], storage=env_params["storage"])
+    return engine
+
+def run_hft_task(engine:WtBtEngine, param:dict, strategy_type = None, cpp_stra_module = None, cpp_stra_type = None, keep_outputs:bool = True) -> dict:
+    '''
+    用已经初始化好的engine回测一组参数
+    @param          参数组, 会被修改, 调用方需要自己保留副本
+    @keep_outputs   是否保留回测输出目录, 为False时分析完就删除closes.csv等文件, 也不再写summary.json
+    @return         汇总结果
+    '''
+    name = param["name"]
+
+    engine.configBacktest(param["start_time"], param["end_time"])
+    time_range = (param["start_time"], param["end_time"])
+    # 去掉多余的参数
+    param.pop("start_time")
+    param.pop("end_time")
+    if cpp_stra_module is not None:
+        param.pop("name")
+        engine.setExternalHftStrategy(name, cpp_stra_module, cpp_stra_type, param)
+    else:
+        straInfo = strategy_type(**param)
+        engine.set_hft_strategy(straInfo)
+    engine.commitBTConfig()
+    engine.run_backtest()
+    summary = analyze_result(name, time_range, param, bWriteSummary=keep_outputs)
+    if not keep_outputs:
+        shutil.rmtree("./outputs_bt/%s/" % (name), ignore_errors=True)
+    return summary
+
+def start_hft_worker(env_params, gpName:str, task_queue, state_queue, batch_size:int = 1, 
+    strategy_type = None, cpp_stra_module = None, cpp_stra_type = None, keep_outputs:bool = True):
+    '''
+    工作进程入口，向主进程申请任务并回测，直到收到结束标记，整个过程共用一个HFT引擎
+    @task_queue     本进程的任务队列，主进程分配的任务会放到这里，None为结束标记
+    @state_queue    所有进程共用的状态队列，用于申请任务和汇报进度，回测结果也通过它直接返回给主进程
+    @batch_size     每次申请的任务数
+    @keep_outputs   是否保留每个回测的输出文件
+    '''
+    engine = create_hft_engine(env_params, gpName)
+    while True:
+        state_queue.put(("ready", gpName, batch_size))
+        tasks = task_queue.get()
+        if tasks is None:
+            break
+
+        for idx, param in tasks:
+            state_queue.put(("start", gpName, idx))
+            print("%s 正在回测%s" % (gpName, param["name"]))
+            summary = run_hft_task(engine, param, strategy_type, cpp_stra_module, cpp_stra_type, keep_outputs)
+            state_queue.put(("done", gpName, (idx, summary)))
+    engine.release_backtest()
+
 class ParamInfo:
     '''
     参数信息类
@@ -59,19 +223,27 @@ class WtHftOptimizer:
     参数优化器\n
     主要用于做策略参数优化的
     '''
-    def __init__(self, worker_num:int = 8):
+    def __init__(self, worker_num:int = 8, notifier:OptimizeNotifier = None, batch_size:int = 1, max_retries:int = 1):
         '''
         构造函数\n
 
-        @worker_num 工作进程个数，默认为8，可以根据CPU核心数设置
+        @worker_num 工作进程个数，默认为8，可以根据CPU核心数设置，同时运行的进程数不会超过这个值
+        @notifier   进度通知器，回测过程中会推送进度和每个工作进程的吞吐量
+        @batch_size 工作进程每次申请的任务数，默认为1，单个回测很快的时候可以调大，减少进程间通信
+        @max_retries 工作进程崩溃时，正在回测的任务最多重试的次数
         '''
         self.worker_num = worker_num
+        self.batch_size = max(1, batch_size)
+        self.max_retries = max_retries
         self.running_worker = 0
         self.mutable_params = dict()
         self.fixed_params = dict()
         self.env_params = dict()
 
         self.cpp_stra_module = None
+        self.cpp_stra_type = None
+
+        self.notifier = notifier
         return
 
     def add_mutable_param(self, name:str, start_val, end_val, step_val, ndigits = 1):
@@ -221,248 +393,49 @@ class WtHftOptimizer:
         f.close()
         return param_groups
 
-    def __ayalyze_result__(self, strName:str, time_range:tuple, params:dict):
-        folder = "./outputs_bt/%s/" % (strName)
-        df_closes = pd.read_csv(folder + "closes.csv",encoding="gbk")
-        df_funds = pd.read_csv(folder + "funds.csv")
-        
-        df_closes["opentime"] = df_closes["opentime"].astype("str").apply(lambda dt: datetime.datetime.strptime(dt,"%Y%m%d%H%M%S%f"))
-        df_closes["closetime"] = df_closes["closetime"].astype("str").apply(lambda dt: datetime.datetime.strptime(dt,"%Y%m%d%H%M%S%f"))
-        df_closes["holdperiod"] = (df_closes["closetime"] - df_closes["opentime"]).astype('timedelta64[s]')
-        
-        df_wins = df_closes[df_closes["profit"]>0]
-        df_loses = df_closes[df_closes["profit"]<=0]
-
-        total_win_holdperiod = df_wins["holdperiod"].sum()
-        total_lose_holdperiod = df_loses["holdperiod"].sum()
-
-        total_fee = df_funds.iloc[-1]["fee"]
-
-        totaltimes = len(df_closes) # 总交易次数
-        wintimes = len(df_wins)     # 盈利次数
-        losetimes = len(df_loses)   # 亏损次数
-        winamout = df_wins["profit"].sum()      #毛盈利
-        loseamount = df_loses["profit"].sum()   #毛亏损
-        trdnetprofit = winamout + loseamount    #交易净盈亏
-        accnetprofit = trdnetprofit - total_fee #账户净盈亏
-        winrate = wintimes / totaltimes if totaltimes>0 else 0      # 胜率
-        avgprof = trdnetprofit/totaltimes if totaltimes>0 else 0    # 单次平均盈亏
-        avgprof_win = winamout/wintimes if wintimes>0 else 0        # 单次盈利均值
-        avgprof_lose = loseamount/losetimes if losetimes>0 else 0   # 单次亏损均值
-        winloseratio = abs(avgprof_win/avgprof_lose) if avgprof_lose!=0 else "N/A"   # 单次盈亏均值比
-            
-        max_consecutive_wins = 0    # 最大连续盈利次数
-        max_consecutive_loses = 0   # 最大连续亏损次数
-        
-        avg_time_in_winner = total_win_holdperiod/wintimes if wintimes>0 else "N/A"
-        avg_time_in_loser = total_lose_holdperiod/losetimes if losetimes>0 else "N/A"
-
-        consecutive_wins = 0
-        consecutive_loses = 0
-        for idx, row in df_closes.iterrows():
-            profit = row["profit"]
-            if profit > 0:
-                consecutive_wins += 1
-                consecutive_loses = 0
-            else:
-                consecutive_wins = 0
-                consecutive_loses += 1
-            
-            max_consecutive_wins = max(max_consecutive_wins, consecutive_wins)
-            max_consecutive_loses = max(max_consecutive_loses, consecutive_loses)
-
-        total_fee = df_funds["fee"].sum()
-        yearRet = round(df_funds["closeprofit"].mean() * np.float(244),3) 
-        vol = (df_funds["closeprofit"].std() * np.sqrt(244)).round(3)
-        sr = yearRet / vol
-        sr = sr.round(3)
-        df_funds["dd"] = (df_funds['dynbalance'].rolling(len(df_funds)+1,min_periods=1).max()- df_funds['dynbalance'])
-        maxdd = df_funds["dd"].max()
-        maxdd_t = df_funds[df_funds['dd']==maxdd]["date"].values[0]
-        maxdd = maxdd + 0.1
-        cr = yearRet/ maxdd
-        cr = np.round(cr,3)
-        
-        summary = params.copy()
-        summary["开始时间"] = time_range[0]
-        summary["结束时间"] = time_range[1]
-        summary["总交易次数"] = totaltimes
-        summary["手续费"] = total_fee
-        summary["盈利次数"] = wintimes
-        summary["亏损次数"] = losetimes
-        summary["毛盈利"] = float(winamout)
-        summary["毛亏损"] = float(loseamount)
-        summary["交易净盈亏"] = float(trdnetprofit)
-        summary["胜率"] = winrate*100
-        summary["单次平均盈亏"] = avgprof
-        summary["单次盈利均值"] = avgprof_win
-        summary["单次亏损均值"] = avgprof_lose
-        summary["单次盈亏均值比"] = winloseratio
-        summary["最大连续盈利次数"] = max_consecutive_wins
-        summary["最大连续亏损次数"] = max_consecutive_loses
-        summary["平均盈利周期(s)"] = avg_time_in_winner
-        summary["平均亏损周期(s)"] = avg_time_in_loser
-        summary["平均账户收益率"] = accnetprofit/totaltimes
-        summary["年均收入"] = yearRet
-        summary["波动率"] = vol
-        summary["夏普"] = sr
-        summary["最大回撤"] = maxdd
-        summary["最大回撤发生时间"] = str(maxdd_t)
-        summary["卡玛"] = cr
-
-        f = open(folder+"summary.json", mode="w")
-        f.write(json.dumps(obj=summary, indent=4))
-        f.close()
-
-        return
-
-    def __execute_task__(self, params:dict):
-        '''
-        执行单个回测任务\n
+    def __ayalyze_result__(self, strName:str, time_range:tuple, params:dict, bWriteSummary:bool = True) -> dict:
+        return analyze_result(strName, time_range, params, bWriteSummary)
 
-        @params kv形式的参数
-        '''
-        name = params["name"]
-        
-        is_yaml = True
-        fname = "logcfg_tpl.yaml"
-        if not os.path.exists(fname):
-            is_yaml = True
-            fname = "logcfg_tpl.json"
-
-        f = open(fname, "r")
-        content =f.read()
-        f.close()
-        content = content.replace("$NAME$", name)
-        if is_yaml:
-            content = json.dumps(yaml.full_load(content))
-        engine = WtBtEngine(eType=EngineType.ET_HFT, logCfg=content, isFile=False)
-        engine.init(self.env_params["deps_dir"], self.env_params["cfgfile"])
-        engine.configBacktest(params["start_time"], params["end_time"])
-        engine.configBTStorage(mode=self.env_params["storage_type"], path=self.env_params["storage_path"], storage=self.env_params["storage"])
-
-        time_range = (params["start_time"], params["end_time"])
-
-        # 去掉多余的参数
-        params.pop("start_time")
-        params.pop("end_time")
-        
-        if self.cpp_stra_module is not None:
-            params.pop("name")
-            engine.setExternalHftStrategy(name, self.cpp_stra_module, self.cpp_stra_type, params)
-        else:
-            straInfo = self.strategy_type(**params)
-            engine.set_hft_strategy(straInfo)
-
-        engine.commitBTConfig()
-        engine.run_backtest()
-        engine.release_backtest()
-
-        self.__ayalyze_result__(name, time_range, params)
-
-    def __start_task__(self, params:dict):
-        '''
-        启动单个回测任务\n
-        这里用线程启动子进程的目的是为了可以控制总的工作进程个数\n
-        可以在线程中join等待子进程结束，再更新running_worker变量\n
-        如果在__execute_task__中修改running_worker，因为在不同进程中，数据并不同步\n
-
-        @params kv形式的参数
-        '''
-        p = multiprocessing.Process(target=self.__execute_task__, args=(params,))
+    def __start_worker__(self, work_id:int, state_queue, keep_outputs:bool) -> OptimizeWorker:
+        work_name = "Worker[%d]" % (work_id)
+        task_queue = multiprocessing.Queue()
+        p = multiprocessing.Process(
+            target=start_hft_worker, 
+            args=(self.env_params, work_name, task_queue, state_queue, self.batch_size, self.strategy_type, self.cpp_stra_module, self.cpp_stra_type, keep_outputs), 
+            name=work_name)
         p.start()
-        p.join()
-        self.running_worker -= 1
-        print("工作进程%d个" % (self.running_worker))
-        
-    def __start_task_group__(self, params:list):
-        '''
-        启动多个回测任务，来回测一组参数，这里共用一个engine，因此可以避免多次io
-        @params 参数组
-        '''
-        is_yaml = True
-        fname = "logcfg_tpl.yaml"
-        if not os.path.exists(fname):
-            is_yaml = True
-            fname = "logcfg_tpl.json"
+        print("%s 开始工作" % (work_name))
+        return OptimizeWorker(work_name, p, task_queue)
 
-        f = open(fname, "r")
-        content =f.read()
-        f.close()
-        engine = WtBtEngine(eType=EngineType.ET_CTA, logCfg=content, isFile=False)
-        # 配置类型的参数相对固定
-        engine.init(self.env_params["deps_dir"], self.env_params["cfgfile"])
-        engine.configBTStorage(mode=self.env_params["storage_type"], path=self.env_params["storage_path"], storage=self.env_params["storage"])
-        # 遍历参数组
-        for param in params:
-            name = param["name"]
-            param_content = content.replace("$NAME$", name)
-            if is_yaml:
-                param_content = json.dumps(yaml.full_load(param_content))
-            
-            engine.configBacktest(param["start_time"], param["end_time"])
-            time_range = (param["start_time"], param["end_time"])
-            # 去掉多余的参数
-            param.pop("start_time")
-            param.pop("end_time")
-            if self.cpp_stra_module is not None:
-                param.pop("name")
-                engine.setExternalCtaStrategy(name, self.cpp_stra_module, self.cpp_stra_type, param)
-            else:
-                straInfo = self.strategy_type(**param)
-                engine.set_cta_strategy(straInfo)
-            engine.commitBTConfig()
-            engine.run_backtest()
-            self.__ayalyze_result__(name, time_range, param)
-        engine.release_backtest()
-
-    def go(self, interval:float = 0.2, out_marker_file:str = "strategies.json", out_summary_file:str = "total_summary.csv"):
+    def go(self, interval:float = 0.2, out_marker_file:str = "strategies.json", out_summary_file:str = "total_summary.csv", keep_outputs:bool = True):
         '''
         启动优化器\n
-        @interval   时间间隔，单位秒
+        最多启动worker_num个常驻的工作进程，每个进程只创建一次HFT引擎，空闲了就向主进程申请任务，直到全部回测完成
+        @interval   兼容保留，已不再使用
         @markerfile 标记文件名，回测完成以后分析会用到
+        @out_summary_file   汇总文件，回测结果由工作进程直接返回，边回测边写入
+        @keep_outputs       是否保留每个回测的输出目录和summary.json\n
+                            analyze和analyzer要读取这些输出，关掉以后不能再调用，汇总结果以out_summary_file为准
         '''
         self.tasks = self.__gen_tasks__(out_marker_file)
-        pool = []
-        total_size = len(self.tasks)
-        one_size = round(total_size / self.worker_num)
-        work_id = 0
-        for i in range(0,total_size,one_size):
-            work_id += 1
-            params = self.tasks[i:i+one_size]
-            p = multiprocessing.Process(target=self.__start_task_group__, args=(params,))
-            p.start()
-            print("工人%d开始工作" % (work_id))
-            pool.append(p)
-        
-        work_id = 0
-        for task in pool:
-            work_id += 1
-            task.join()
-            print("工人%d结束工作" % (work_id))
+        if self.notifier is not None:
+            self.notifier.on_start(len(self.tasks))
 
-        #开始汇总回测结果
-        f = open(out_marker_file, "r")
-        content = f.read()
-        f.close()
+        stime = datetime.datetime.now()
+        total_size = len(self.tasks)
+        writer = SummaryWriter(out_summary_file)
+        try:
+            start_worker = lambda work_id, state_queue: self.__start_worker__(work_id, state_queue, keep_outputs)
+            schedule_tasks(self.tasks, start_worker, self.worker_num, writer, self.max_retries, self.notifier, stime)
+        finally:
+            writer.close()
 
-        obj_stras = json.loads(content)
-        total_summary = list()
-        for straName in obj_stras:
-            filename = "./outputs_bt/%s/summary.json" % (straName)
-            if not os.path.exists(filename):
-                print("%s不存在，请检查数据" % (filename))
-                continue
-                
-            f = open(filename, "r")
-            content = f.read()
-            f.close()
-            obj_summary = json.loads(content)
-            total_summary.append(obj_summary)
+        if writer.count < total_size:
+            print("共有%d组参数没有回测结果，请检查数据" % (total_size - writer.count))
 
-        df_summary = df(total_summary)
-        # df_summary = df_summary.drop(labels=["name"], axis='columns')
-        df_summary.to_csv(out_summary_file, encoding='utf-8-sig')
+        if self.notifier is not None:
+            elapse = datetime.datetime.now() - stime
+            self.notifier.on_stop(total_size, elapse.total_seconds()*1000)
 
     def analyze(self, out_marker_file:str = "strategies.json", out_summary_file:str = "total_summary.csv"):
         #开始汇总回测结果
@@ -488,12 +461,19 @@ class WtHftOptimizer:
             obj_summary = json.loads(content)
             total_summary.append(obj_summary)
 
+        if len(total_summary) == 0:
+            raise Exception("没有找到任何回测输出，如果go时keep_outputs为False，汇总结果已经写到go的out_summary_file中")
+
         df_summary = df(total_summary)
         df_summary = df_summary.drop(labels=["name"], axis='columns')
         df_summary.to_csv(out_summary_file)
 
     def analyzer(self, out_marker_file:str = "strategies.json", init_capital=500000, rf=0.02, annual_trading_days=240):
         for straname in json.load(open(out_marker_file, mode='r')).keys():
+            if not os.path.exists("./outputs_bt/%s/" % (straname)):
+                print("%s的回测输出不存在，需要在go时设置keep_outputs为True" % (straname))
+                continue
+
             try:
                 analyst = WtBtAnalyst()
                 analyst.add_strategy(straname, folder="./outputs_bt/%s/"%straname, init_capital=init_capital, rf=rf, annual_trading_days=annual_trading_days)
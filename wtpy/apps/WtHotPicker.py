@@ -4,6 +4,11 @@ import time
 import json
 import os
 import logging
+import threading
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
 
 import urllib.request
 import io
@@ -108,16 +113,228 @@ def httpPost(url, datas, encoding='utf-8'):
     except:
         return ""
 
+# 落地缓存的快照格式, 每个交易所每天一个文件, 按列存储
+# 文件头是int32的记录数和每个文本字段的宽度, 后面依次是各列的数据
+# 代码、品种和月份都是ASCII, 按定长字节串保存, 数值按float64保存
+SNAPSHOT_TEXT_FIELDS = ["code", "pid", "month"]
+SNAPSHOT_VALUE_FIELDS = ["close", "volume", "hold"]
+
+def save_day_items(filename:str, items:dict):
+    '''
+    把一个交易所一天的快照数据按列保存成二进制文件
+    '''
+    values = list(items.values())
+    columns = list()
+    for field in SNAPSHOT_TEXT_FIELDS:
+        columns.append(np.array([str(getattr(item, field)).encode("ascii") for item in values], dtype="S"))
+    for field in SNAPSHOT_VALUE_FIELDS:
+        columns.append(np.array([getattr(item, field) for item in values], dtype="<f8"))
+    header = np.array([len(values)] + [col.itemsize for col in columns[:len(SNAPSHOT_TEXT_FIELDS)]], dtype="<i4")
+
+    folder = os.path.dirname(filename)
+    if not os.path.exists(folder):
+        os.makedirs(folder, exist_ok=True)
+
+    # 先写临时文件再改名, 并发读取的时候不会读到写了一半的文件
+    tmpfile = "%s.%d.tmp" % (filename, threading.get_ident())
+    f = open(tmpfile, "wb")
+    f.write(header.tobytes())
+    for col in columns:
+        f.write(col.tobytes())
+    f.close()
+    os.replace(tmpfile, filename)
+
+def load_day_items(filename:str) -> dict:
+    '''
+    读取save_day_items保存的快照数据, 文件不存在或者已损坏返回None
+    '''
+    if not os.path.exists(filename):
+        return None
+
+    f = open(filename, "rb")
+    content = f.read()
+    f.close()
+
+    try:
+        header = np.frombuffer(content, dtype="<i4", count=1 + len(SNAPSHOT_TEXT_FIELDS)).tolist()
+        count = header[0]
+        offset = 4*len(header)
+        columns = list()
+        for width in header[1:]:
+            columns.append(np.frombuffer(content, dtype="S%d" % width, count=count, offset=offset).astype(str).tolist())
+            offset += width*count
+        for field in SNAPSHOT_VALUE_FIELDS:
+            columns.append(np.frombuffer(content, dtype="<f8", count=count, offset=offset).tolist())
+            offset += 8*count
+    except Exception:
+        return None
+
+    # 长度对不上说明文件不完整
+    if offset != len(content):
+        return None
+
+    items = dict()
+    for code, pid, month, close, volume, hold in zip(*columns):
+        day = DayData()
+        day.code = code
+        day.pid = pid
+        day.month = month
+        day.close = close
+        day.volume = volume
+        day.hold = hold
+        items[code] = day
+    return items
+
+def load_holidays(holidayfile:str) -> set:
+    '''
+    读取节假日文件, 格式同common/holidays.json, 所有模板的节假日合并到一起
+    '''
+    content = readFileContent(holidayfile)
+    if len(content) == 0:
+        return set()
+
+    holidays = set()
+    for days in json.loads(content).values():
+        holidays.update(str(day) for day in days)
+    return holidays
+
+class RateLimiter:
+    '''
+    简单的限速器, 保证相邻两次请求的间隔不小于1/rate秒, 多线程共用
+    '''
+    def __init__(self, rate:float):
+        self.interval = 1.0/rate if rate > 0 else 0
+        self.__next_time__ = 0
+        self.__lock__ = threading.Lock()
+
+    def acquire(self):
+        if self.interval == 0:
+            return
+
+        with self.__lock__:
+            now = time.monotonic()
+            waitSecs = self.__next_time__ - now
+            self.__next_time__ = max(now, self.__next_time__) + self.interval
+
+        if waitSecs > 0:
+            time.sleep(waitSecs)
+
 class WtCacheMon:
     '''
-    缓存管理器基类
+    缓存管理器基类\n
+    内存中只保留最近访问的若干天, 设置了缓存目录的话, 加载过的快照会按交易所和日期落地, 下次直接读取
     '''
-    def __init__(self):
-        self.day_cache = dict()
+    def __init__(self, cache_path:str = None, holidayfile:str = None, workers:int = 1, rate_limit:float = 0, max_cached_days:int = 64):
+        '''
+        @cache_path         快照落地缓存的目录, 为None则不落地
+        @holidayfile        节假日文件, 周末和节假日直接跳过, 为None则只跳过周末
+        @workers            并发加载的线程数
+        @rate_limit         每秒最多的远程请求数, 0为不限制, 只对从交易所官网拉取有效
+        @max_cached_days    内存中最多缓存的天数
+        '''
+        self.day_cache = OrderedDict()
+        self.cache_path = cache_path
+        self.holidays = load_holidays(holidayfile) if holidayfile is not None else set()
+        self.workers = max(1, workers)
+        self.max_cached_days = max(1, max_cached_days)
+        self.limiter = RateLimiter(rate_limit)
+        self.__lock__ = threading.Lock()
+
+    def set_rate_limit(self, rate_limit:float):
+        '''
+        设置每秒最多的远程请求数, 0为不限制
+        '''
+        self.limiter = RateLimiter(rate_limit)
+
+    def is_trading_day(self, curDT:datetime.datetime) -> bool:
+        '''
+        是否是交易日, 周末和节假日不是
+        '''
+        return curDT.weekday() < 5 and curDT.strftime('%Y%m%d') not in self.holidays
 
     def get_cache(self, exchg, curDT:datetime.datetime):
         pass
 
+    def get_mem_cache(self, dtStr:str, exchg:str):
+        '''
+        读取内存中缓存的数据
+        @return (是否命中, 快照数据)
+        '''
+        with self.__lock__:
+            if dtStr not in self.day_cache or exchg not in self.day_cache[dtStr]:
+                return False, None
+
+            self.day_cache.move_to_end(dtStr)
+            return True, self.day_cache[dtStr][exchg]
+
+    def set_mem_cache(self, dtStr:str, exchg:str, items:dict):
+        '''
+        写入内存缓存, 超过最大天数的时候淘汰最久没有访问的日期
+        '''
+        with self.__lock__:
+            if dtStr not in self.day_cache:
+                self.day_cache[dtStr] = dict()
+            self.day_cache[dtStr][exchg] = items
+            self.day_cache.move_to_end(dtStr)
+
+            while len(self.day_cache) > self.max_cached_days:
+                self.day_cache.popitem(last=False)
+
+    def get_cache_file(self, exchg:str, dtStr:str) -> str:
+        return os.path.join(self.cache_path, exchg, dtStr + ".snp")
+
+    def load_disk_cache(self, exchg:str, dtStr:str) -> dict:
+        '''
+        读取落地的快照数据, 没有设置缓存目录或者没有落地过返回None
+        '''
+        if self.cache_path is None:
+            return None
+        return load_day_items(self.get_cache_file(exchg, dtStr))
+
+    def save_disk_cache(self, exchg:str, dtStr:str, items:dict):
+        '''
+        快照数据落地, 没有数据的不落地, 下次还会重新拉取
+        '''
+        if self.cache_path is None or items is None or len(items) == 0:
+            return
+        save_day_items(self.get_cache_file(exchg, dtStr), items)
+
+    def iter_caches(self, exchanges:list, beginDT:datetime.datetime, endDT:datetime.datetime):
+        '''
+        按日期顺序遍历区间内每个交易日各交易所的快照数据\n
+        workers大于1的时候, 后面若干天的数据会在后台线程中提前并发加载
+
+        @exchanges  交易所代码列表
+        @beginDT    开始日期
+        @endDT      截止日期
+        @return     迭代器, 每次返回(日期, {交易所代码: 快照数据})
+        '''
+        dates = list()
+        curDT = beginDT
+        while curDT <= endDT:
+            if self.is_trading_day(curDT):
+                dates.append(curDT)
+            curDT = curDT + datetime.timedelta(days=1)
+
+        if self.workers <= 1:
+            for curDT in dates:
+                yield curDT, {exchg: self.get_cache(exchg, curDT) for exchg in exchanges}
+            return
+
+        # 提前加载的天数不能超过内存缓存的一半, 否则还没用到就被淘汰了
+        window = max(1, min(self.workers*2, self.max_cached_days//2))
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            pending = deque()
+            idx = 0
+            while idx < len(dates) or len(pending) > 0:
+                while idx < len(dates) and len(pending) < window:
+                    curDT = dates[idx]
+                    idx += 1
+                    pending.append((curDT, [executor.submit(self.get_cache, exchg, curDT) for exchg in exchanges]))
+
+                curDT, futures = pending.popleft()
+                yield curDT, {exchg: future.result() for exchg, future in zip(exchanges, futures)}
+
 class WtCacheMonExchg(WtCacheMon):
     '''
     交易所行情缓存器
@@ -390,29 +607,36 @@ class WtCacheMonExchg(WtCacheMon):
 
     def cache_by_date(self, exchg:str, curDT:datetime.datetime):
         '''
-        缓存指定日期指定交易所的行数据
+        缓存指定日期指定交易所的行数据\n
+        先读落地的缓存, 没有再从交易所官网拉取, 拉取受rate_limit限速
 
         @exchg  交易所代码
         @curDT  指定日期
+        @return {合约代码: DayData}, 没有数据返回None
         '''
         dtStr = curDT.strftime('%Y%m%d')
 
-        if dtStr not in self.day_cache:
-            self.day_cache[dtStr] = dict()
-
-        cacheItem = self.day_cache[dtStr]
-        if exchg == 'CFFEX':
-            cacheItem[exchg] = WtCacheMonExchg.getCffexData(curDT)
-        elif exchg  == 'SHFE':
-            cacheItem[exchg] = WtCacheMonExchg.getShfeData(curDT)
-        elif exchg  == 'DCE':
-            cacheItem[exchg] = WtCacheMonExchg.getDceData(curDT)
-        elif exchg  == 'CZCE':
-            cacheItem[exchg] = WtCacheMonExchg.getCzceData(curDT)
-        elif exchg  == 'INE':
-            cacheItem[exchg] = WtCacheMonExchg.getIneData(curDT)
-        else:
-            raise Exception("未知交易所代码" + exchg)
+        items = self.load_disk_cache(exchg, dtStr)
+        if items is None:
+            if exchg == 'CFFEX':
+                fetcher = self.getCffexData
+            elif exchg  == 'SHFE':
+                fetcher = self.getShfeData
+            elif exchg  == 'DCE':
+                fetcher = self.getDceData
+            elif exchg  == 'CZCE':
+                fetcher = self.getCzceData
+            elif exchg  == 'INE':
+                fetcher = self.getIneData
+            else:
+                raise Exception("未知交易所代码" + exchg)
+
+            self.limiter.acquire()
+            items = fetcher(curDT)
+            self.save_disk_cache(exchg, dtStr, items)
+
+        self.set_mem_cache(dtStr, exchg, items)
+        return items
 
     def get_cache(self, exchg:str, curDT:datetime.datetime):
         '''
@@ -421,16 +645,15 @@ class WtCacheMonExchg(WtCacheMon):
         @exchg  交易所代码
         @curDT  指定日期
         '''
-        dtStr = curDT.strftime('%Y%m%d')
-        if dtStr not in self.day_cache or exchg not in self.day_cache[dtStr]:
-            self.cache_by_date(exchg, curDT)
-
-        if dtStr not in self.day_cache:
+        if not self.is_trading_day(curDT):
             return None
 
-        if exchg not in self.day_cache[dtStr]:
-            return None
-        return self.day_cache[dtStr][exchg]
+        dtStr = curDT.strftime('%Y%m%d')
+        bHit, items = self.get_mem_cache(dtStr, exchg)
+        if bHit:
+            return items
+
+        return self.cache_by_date(exchg, curDT)
 
 class WtCacheMonSS(WtCacheMon):
     '''
@@ -439,15 +662,21 @@ class WtCacheMonSS(WtCacheMon):
     一般目录为"数据存储目录/his/snapshots/xxxxxxx.csv"
     '''
 
-    def __init__(self, snapshot_path:str):
-        WtCacheMon.__init__(self)
+    def __init__(self, snapshot_path:str, cache_path:str = None, holidayfile:str = None, workers:int = 1, max_cached_days:int = 64):
+        '''
+        @snapshot_path      快照文件目录
+        其他参数同WtCacheMon
+        '''
+        WtCacheMon.__init__(self, cache_path=cache_path, holidayfile=holidayfile, workers=workers, max_cached_days=max_cached_days)
         self.snapshot_path = snapshot_path
+        self.__parse_lock__ = threading.Lock()
 
     def cache_snapshot(self, curDT:datetime):
         '''
-        缓存指定日期的快照数据
+        读取指定日期的快照文件, 有缓存目录的话按交易所落地
 
         @curDT  指定的日期
+        @return {交易所代码: {合约代码: DayData}}
         '''
         dtStr = curDT.strftime('%Y%m%d')
 
@@ -455,10 +684,7 @@ class WtCacheMonSS(WtCacheMon):
         content = readFileContent(filename)
         lines = content.split("\n")
 
-        if dtStr not in self.day_cache:
-            self.day_cache[dtStr] = dict()
-
-        cacheItem = self.day_cache[dtStr]
+        cacheItem = dict()
         for idx in range(1, len(lines)):
             line = lines[idx]
             if len(line) == 0:
@@ -486,6 +712,10 @@ class WtCacheMonSS(WtCacheMon):
                     day.month = "1" + day.month
             cacheItem[exchg][day.code] = day
 
+        for exchg in cacheItem:
+            self.save_disk_cache(exchg, dtStr, cacheItem[exchg])
+        return cacheItem
+
     def get_cache(self, exchg, curDT:datetime):
         '''
         获取指定日期的某个交易所合约的快照数据
@@ -494,16 +724,32 @@ class WtCacheMonSS(WtCacheMon):
         @curDT  指定日期
         '''
 
-        dtStr = curDT.strftime('%Y%m%d')
-        if dtStr not in self.day_cache:
-            self.cache_snapshot(curDT)
-
-        if dtStr not in self.day_cache:
+        if not self.is_trading_day(curDT):
             return None
 
-        if exchg not in self.day_cache[dtStr]:
-            return None
-        return self.day_cache[dtStr][exchg]
+        dtStr = curDT.strftime('%Y%m%d')
+        bHit, items = self.get_mem_cache(dtStr, exchg)
+        if bHit:
+            return items
+
+        items = self.load_disk_cache(exchg, dtStr)
+        if items is not None:
+            self.set_mem_cache(dtStr, exchg, items)
+            return items
+
+        # 一个快照文件包含全部交易所, 同一天只解析一次
+        with self.__parse_lock__:
+            bHit, items = self.get_mem_cache(dtStr, exchg)
+            if bHit:
+                return items
+
+            cacheItem = self.cache_snapshot(curDT)
+            for key in cacheItem:
+                self.set_mem_cache(dtStr, key, cacheItem[key])
+            # 当天没有这个交易所的数据, 也记下来, 不用重复解析
+            if exchg not in cacheItem:
+                self.set_mem_cache(dtStr, exchg, None)
+            return cacheItem.get(exchg)
 
 class WtMailNotifier:
     '''
@@ -670,6 +916,10 @@ class WtHotPicker:
         curDT = beginDT
 
         while curDT <= endDT:
+            if not cacheMon.is_trading_day(curDT):
+                curDT = curDT + datetime.timedelta(days=1)
+                continue
+
             hots = {}
             seconds = {}
             logging.info("[%s]开始拉取%s数据" % (exchg, curDT.strftime('%Y%m%d')))
@@ -838,7 +1088,8 @@ class WtHotPicker:
         @beginDate  开始日期
         @endDate    截止日期
         @exchanges  要重构的交易所列表
-        @wait       每个日期切换是否等待，等待时间1s，主要针对从交易所官网拉取，防止被拉黑名单
+        @wait       是否限速，主要针对从交易所官网拉取，防止被拉黑名单\n
+                    缓存器没有设置rate_limit的时候, 按每秒一个日期限速, 读取落地缓存不受限制
         '''
         if endDate is None:
             endDate = datetime.datetime.now()
@@ -856,12 +1107,14 @@ class WtHotPicker:
             self.current_hots[exchg] = dict()
             self.current_secs[exchg] = dict()
         
+        cacheMon = self.cache_monitor
+        if wait and cacheMon.limiter.interval == 0:
+            cacheMon.set_rate_limit(len(exchanges))
+
         hot_changes = dict()
         sec_changes = dict()
-        curDate = beginDate
-        while curDate <= endDate:
-            if wait:
-                time.sleep(1)
+        # 按日期顺序处理, 后面日期的快照由缓存器提前并发加载
+        for curDate, dayItems in cacheMon.iter_caches(exchanges, beginDate, endDate):
             for exchg in exchanges:
                 alg = 1 if exchg=='CFFEX' else 0    # 中金所的换月算法和其他交易所不同
                 hotRules,secRules = self.pick_exchg_hots(exchg, curDate, curDate, alg=alg)
@@ -880,8 +1133,6 @@ class WtHotPicker:
                         sec_changes[exchg] = dict()
                     sec_changes[exchg].update(secRules)
 
-            curDate = curDate + datetime.timedelta(days=1)
-
         #日期标记要保存
         marker = dict()
         marker["date"] = int(endDate.strftime('%Y%m%d'))
@@ -1,11 +1,15 @@
-from wtpy.apps.datahelper.DHDefs import BaseDataHelper, DBHelper
-from wtpy.WtCoreDefs import WTSBarStruct
+from wtpy.apps.datahelper.DHDefs import BaseDataHelper, DBHelper, make_bar_records, make_np_bars, np_bars_to_struct
 import baostock as bs
+import pandas as pd
 from datetime import datetime, timedelta
+import threading
 import json
 import os
 import logging
 
+# baostock全局共用一个连接, 查询不能并发, 多线程导出时只有查询是串行的
+bs_lock = threading.Lock()
+
 def transCodes(codes:list) -> list:
     ret = list()
     for code in codes:
@@ -28,6 +32,23 @@ def to_float(v:str, defVal:float = 0) -> float:
     except:
         return defVal
 
+def to_floats(col:pd.Series, defVal:float = 0):
+    '''
+    to_float的向量化版本, 空字符串或者无法解析的都用defVal替换
+    '''
+    return pd.to_numeric(col.str.strip(), errors="coerce").fillna(defVal).values
+
+def query_bars(code:str, fields:str, start_date:str, end_date:str, freq:str) -> pd.DataFrame:
+    '''
+    查询K线并一次性取出全部数据, 出错返回None
+    '''
+    with bs_lock:
+        rs = bs.query_history_k_data_plus(code=code, fields=fields, start_date=start_date, end_date=end_date, frequency=freq)
+        if rs.error_code != '0':
+            logging.error("Error occured: %s" % (rs.error_msg))
+            return None
+        return rs.get_data()
+
 class DHBaostock(BaseDataHelper):
 
     def __init__(self):
@@ -146,7 +167,7 @@ class DHBaostock(BaseDataHelper):
         f.write(json.dumps(stocks, sort_keys=True, indent=4, ensure_ascii=False))
         f.close()
 
-    def dmpBarsToFile(self, folder:str, codes:list, start_date:datetime=None, end_date:datetime=None, period:str="day"):
+    def dmpBarsToFile(self, folder:str, codes:list, start_date:datetime=None, end_date:datetime=None, period:str="day", workers:int=1):
         codes = transCodes(codes)
 
         if start_date is None:
@@ -174,38 +195,33 @@ class DHBaostock(BaseDataHelper):
         else:
             raise Exception("Baostock has only bars of frequency day and min5")
 
-        count = 0
         length = len(codes)
-        for code in codes:
+        def dump(item):
+            count, code = item
             exchg = code[:2]
             if exchg == 'sh':
                 exchg = 'SSE'
             else:
                 exchg = 'SZSE'
-            count += 1
             
             logging.info("Fetching %s bars of %s(%d/%s)..." % (period, code, count, length))
-            rs = bs.query_history_k_data_plus(code=code, fields=fields, start_date=start_date, end_date=end_date, frequency=freq)
-            content = "date,time,open,high,low,close,volume,turnover\n"
-            if rs.error_code != '0':
-                logging.error("Error occured: %s" % (rs.error_msg))
-                continue
+            df_bars = query_bars(code, fields, start_date, end_date, freq)
+            if df_bars is None:
+                return
 
-            while rs.next():
-                items = rs.get_row_data().copy()
-                if isDay:
-                    items.insert(1, "0")
-                else:
-                    time = items[1][-9:-3]
-                    items[1] = time[:2]+":"+time[2:4]+":"+time[4:]
-                content += ",".join(items) + "\n"
+            if isDay:
+                df_bars.insert(1, "time", "0")
+            else:
+                time = df_bars["time"].str[-9:-3]
+                df_bars["time"] = time.str[:2] + ":" + time.str[2:4] + ":" + time.str[4:]
+            df_bars.columns = ["date","time","open","high","low","close","volume","turnover"]
 
             filename = "%s.%s_%s.csv" % (exchg, code[3:], filetag)
             filepath = os.path.join(folder, filename)
             logging.info("Writing bars into file %s..." % (filepath))
-            f = open(filepath, "w", encoding="utf-8")
-            f.write(content)
-            f.close()
+            df_bars.to_csv(filepath, index=False)
+
+        self.__run_tasks__(dump, list(enumerate(codes, 1)), workers)
 
     def dmpAdjFactorsToDB(self, dbHelper:DBHelper, codes:list):
         codes = transCodes(codes)
@@ -244,7 +260,8 @@ class DHBaostock(BaseDataHelper):
         logging.info("Writing adjust factors into database...")
         dbHelper.writeFactors(stocks)
 
-    def dmpBarsToDB(self, dbHelper:DBHelper, codes:list, start_date:datetime=None, end_date:datetime=None, period:str="day"):
+
+    def dmpBarsToDB(self, dbHelper:DBHelper, codes:list, start_date:datetime=None, end_date:datetime=None, period:str="day", workers:int=1):
         codes = transCodes(codes)
 
         if start_date is None:
@@ -269,53 +286,36 @@ class DHBaostock(BaseDataHelper):
         else:
             raise Exception("Baostock has only bars of frequency day and min5")
 
-        count = 0
         length = len(codes)
-        for code in codes:
+        def dump(item):
+            count, code = item
             exchg = code[:2]
             if exchg == 'sh':
                 exchg = 'SSE'
             else:
                 exchg = 'SZSE'
-            count += 1
             
             logging.info("Fetching %s bars of %s(%d/%s)..." % (period, code, count, length))
-            rs = bs.query_history_k_data_plus(code=code, fields=fields, start_date=start_date, end_date=end_date, frequency=freq)
+            df_bars = query_bars(code, fields, start_date, end_date, freq)
             bars = []
-            while (rs.error_code == '0') & rs.next():
-                items = rs.get_row_data()
-                if isDay:
-                    bars.append({
-                        "exchange":exchg,
-                        "code":code[3:],
-                        "date": int(items[0].replace("-","")),
-                        "time": 0,
-                        "open": to_float(items[1]),
-                        "high": to_float(items[2]),
-                        "low": to_float(items[3]),
-                        "close": to_float(items[4]),
-                        "volume": to_float(items[5]),
-                        "turnover": to_float(items[6])
-                    })
-                else:
-                    time = int(items[1][-9:-5])
-                    bars.append({
-                        "exchange":exchg,
-                        "code":code[3:],
-                        "date": int(items[0].replace("-","")),
-                        "time": time,
-                        "open": to_float(items[2]),
-                        "high": to_float(items[3]),
-                        "low": to_float(items[4]),
-                        "close": to_float(items[5]),
-                        "volume": to_float(items[6]),
-                        "turnover": to_float(items[7])
-                    })
+            if df_bars is not None:
+                bars = make_bar_records(exchg, code[3:], {
+                    "date": df_bars["date"].str.replace("-","").astype(int).values,
+                    "time": 0 if isDay else df_bars["time"].str[-9:-5].astype(int).values,
+                    "open": to_floats(df_bars["open"]),
+                    "high": to_floats(df_bars["high"]),
+                    "low": to_floats(df_bars["low"]),
+                    "close": to_floats(df_bars["close"]),
+                    "volume": to_floats(df_bars["volume"]),
+                    "turnover": to_floats(df_bars["amount"])
+                })
 
             logging.info("Writing bars into database...")
             dbHelper.writeBars(bars, period)
 
-    def dmpBars(self, codes:list, cb, start_date:datetime=None, end_date:datetime=None, period:str="day"):
+        self.__run_tasks__(dump, list(enumerate(codes, 1)), workers)
+
+    def dmpBars(self, codes:list, cb, start_date:datetime=None, end_date:datetime=None, period:str="day", workers:int=1):
         codes = transCodes(codes)
 
         if start_date is None:
@@ -340,58 +340,28 @@ class DHBaostock(BaseDataHelper):
         else:
             raise Exception("Baostock has only bars of frequency day and min5")
 
-        count = 0
         length = len(codes)
-        for code in codes:
+        def dump(item):
+            count, code = item
             exchg = code[:2]
             if exchg == 'sh':
                 exchg = 'SSE'
             else:
                 exchg = 'SZSE'
-            count += 1
             
             logging.info("Fetching %s bars of %s(%d/%s)..." % (period, code, count, length))
-            rs = bs.query_history_k_data_plus(code=code, fields=fields, start_date=start_date, end_date=end_date, frequency=freq)
-            bastList = []
-            if rs.error_code != '0':
-                logging.error("Error occured: %s" % (rs.error_msg))
-                continue
+            df_bars = query_bars(code, fields, start_date, end_date, freq)
+            if df_bars is None:
+                return
 
-            while rs.next():
-                items = rs.get_row_data().copy()
-                curBar = WTSBarStruct()
-                curBar.date = int(items[0].replace("-",""))
-                if isDay:
-                    curBar.time = 0
-                    curBar.open = to_float(items[1])
-                    curBar.high = to_float(items[2])
-                    curBar.low = to_float(items[3])
-                    curBar.close = to_float(items[4])
-                    curBar.volume = to_float(items[5].strip())
-                    curBar.turnover = to_float(items[6])
-                else:
-                    curBar.time = int(items[1][-9:-5]) + (curBar.date-19900000)*10000
-                    curBar.open = to_float(items[2])
-                    curBar.high = to_float(items[3])
-                    curBar.low = to_float(items[4])
-                    curBar.close = to_float(items[5])
-                    curBar.volume = to_float(items[6])
-                    curBar.turnover = to_float(items[7])
-                bastList.append(curBar)
-            
-            from ctypes import addressof
-            BUFFER = WTSBarStruct*len(bastList)
-            buffer = BUFFER()
-            for i in range(len(bastList)):
-                curBar = buffer[i]
-                srcBar = bastList[i]
-                curBar.date = srcBar.date
-                curBar.time = srcBar.time
-                curBar.open = srcBar.open
-                curBar.high = srcBar.high
-                curBar.low = srcBar.low
-                curBar.close = srcBar.close
-                curBar.volume = srcBar.volume
-                curBar.turnover = srcBar.turnover
-            cb(exchg, code[3:], buffer, len(bastList), period)
-                
+            dates = df_bars["date"].str.replace("-","").astype(int).values
+            if isDay:
+                times = 0
+            else:
+                times = df_bars["time"].str[-9:-5].astype(int).values + (dates-19900000)*10000
+            npBars = make_np_bars(dates, times,
+                to_floats(df_bars["open"]), to_floats(df_bars["high"]), to_floats(df_bars["low"]), to_floats(df_bars["close"]),
+                to_floats(df_bars["volume"]), to_floats(df_bars["amount"]))
+            cb(exchg, code[3:], np_bars_to_struct(npBars), len(npBars), period)
+
+        self.__run_tasks__(dump, list(enumerate(codes, 1)), workers)
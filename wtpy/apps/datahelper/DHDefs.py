@@ -1,4 +1,62 @@
 from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from wtpy.WtCoreDefs import WTSBarStruct
+from wtpy.WtDataDefs import NpTypeBar
+
+def make_np_bars(dates, times, opens, highs, lows, closes, volumes, turnovers, interests = None, settles = None) -> np.ndarray:
+    '''
+    按列构造NpTypeBar格式的K线数组, 内存布局和WTSBarStruct一致
+    @dates  日期, 格式如20230104
+    @times  时间, 日线为0, 分钟线为(date-19900000)*10000+HHMM
+    其他参数为对应的价格和数量, 可以是数组、Series或者标量
+    '''
+    npBars = np.zeros(len(dates), dtype=NpTypeBar)
+    npBars["date"] = dates
+    npBars["time"] = times
+    npBars["open"] = opens
+    npBars["high"] = highs
+    npBars["low"] = lows
+    npBars["close"] = closes
+    npBars["volume"] = volumes
+    npBars["turnover"] = turnovers
+    if interests is not None:
+        npBars["open_interest"] = interests
+    if settles is not None:
+        npBars["settle"] = settles
+    return npBars
+
+def np_bars_to_struct(npBars:np.ndarray):
+    '''
+    把NpTypeBar数组包装成WTSBarStruct数组, 共用同一块内存, 不做拷贝\n
+    返回的对象可以直接作为firstBar交给WtDataHelper.store_bars等接口
+    '''
+    return (WTSBarStruct*len(npBars)).from_buffer(npBars)
+
+def to_date_time(dts) -> tuple:
+    '''
+    把日期时间序列转成整数形式的日期和时间
+    @dts    datetime序列, 或者pandas可以解析的日期时间字符串序列
+    @return (日期数组, 格式如20230104, 时间数组, 格式如930)
+    '''
+    dts = pd.DatetimeIndex(pd.to_datetime(dts))
+    dates = np.asarray(dts.year*10000 + dts.month*100 + dts.day, dtype=np.int64)
+    times = np.asarray(dts.hour*100 + dts.minute, dtype=np.int64)
+    return dates, times
+
+def make_bar_records(exchg:str, code:str, columns:dict) -> list:
+    '''
+    按列的K线数据转成DBHelper.writeBars需要的字典列表
+    @exchg      交易所代码
+    @code       合约代码
+    @columns    {字段名: 数组}, 字段名和writeBars的一致, 标量会扩展成整列
+    '''
+    fields = ["exchange", "code"] + list(columns.keys())
+    values = [col.tolist() for col in np.broadcast_arrays(*[np.asarray(col) for col in columns.values()])]
+    return [dict(zip(fields, (exchg, code) + item)) for item in zip(*values)]
 
 class DBHelper:
 
@@ -11,11 +69,13 @@ class DBHelper:
         '''
         pass
 
-    def writeBars(self, bars:list, period="day"):
+    def writeBars(self, bars:list, period="day", exchg:str=None, code:str=None):
         '''
         将K线存储到数据库中
-        @bars   K线序列
+        @bars   K线序列, 字典列表, 或者NpTypeBar格式的numpy数组
         @period K线周期
+        @exchg  交易所代码, bars为numpy数组时必须指定
+        @code   合约代码, bars为numpy数组时必须指定
         '''
         pass
 
@@ -33,6 +93,20 @@ class BaseDataHelper:
         self.isAuthed = False
         pass
 
+    def __run_tasks__(self, func, items:list, workers:int = 1):
+        '''
+        对每个元素执行func, workers大于1时用有界的线程池并发执行\n
+        全部执行完才返回, 任意一个出错都会抛出异常
+        '''
+        if workers <= 1:
+            for item in items:
+                func(item)
+            return
+
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            for _ in executor.map(func, items):
+                pass
+
     def __check__(self):
         if not self.isAuthed:
             raise Exception("This module has not authorized yet!")
@@ -60,7 +134,7 @@ class BaseDataHelper:
         '''
         pass
 
-    def dmpBarsToFile(self, folder:str, codes:list, start_date:datetime=None, end_date:datetime=None, period="day"):
+    def dmpBarsToFile(self, folder:str, codes:list, start_date:datetime=None, end_date:datetime=None, period="day", workers:int=1):
         '''
         将K线导出到指定的目录下的csv文件，文件名格式如SSE.600000_d.csv
         @folder 要输出的文件夹
@@ -68,6 +142,7 @@ class BaseDataHelper:
         @start_date 开始日期，datetime类型，传None则自动设置为1990-01-01
         @end_date   结束日期，datetime类型，传None则自动设置为当前日期
         @period K线周期，支持day、min1、min5
+        @workers    同时处理的代码数，大于1时多个代码并发拉取和写入
         '''
         pass
 
@@ -79,7 +154,7 @@ class BaseDataHelper:
         '''
         pass
 
-    def dmpBarsToDB(self, dbHelper:DBHelper, codes:list, start_date:datetime=None, end_date:datetime=None, period:str="day"):
+    def dmpBarsToDB(self, dbHelper:DBHelper, codes:list, start_date:datetime=None, end_date:datetime=None, period:str="day", workers:int=1):
         '''
         将K线导出到数据库
         @dbHelper 数据库辅助模块
@@ -87,11 +162,12 @@ class BaseDataHelper:
         @start_date 开始日期，datetime类型，传None则自动设置为1990-01-01
         @end_date   结束日期，datetime类型，传None则自动设置为当前日期
         @period K线周期，支持day、min1、min5
+        @workers    同时处理的代码数，大于1时多个代码并发拉取和写入
         '''
         pass
 
 
-    def dmpBars(self, codes:list, cb, start_date:datetime=None, end_date:datetime=None, period:str="day"):
+    def dmpBars(self, codes:list, cb, start_date:datetime=None, end_date:datetime=None, period:str="day", workers:int=1):
         '''
         将K线导出到指定的目录下的csv文件，文件名格式如SSE.600000_d.csv
         @cb     回调函数，格式如cb(exchg:str, code:str, firstBar:POINTER(WTSBarStruct), count:int, period:str)
@@ -99,5 +175,6 @@ class BaseDataHelper:
         @start_date 开始日期，datetime类型，传None则自动设置为1990-01-01
         @end_date   结束日期，datetime类型，传None则自动设置为当前日期
         @period K线周期，支持day、min1、min5
+        @workers    同时处理的代码数，大于1时cb会在多个线程中被调用
         '''
         pass
\ No newline at end of file
@@ -1,6 +1,6 @@
-from wtpy.apps.datahelper.DHDefs import BaseDataHelper, DBHelper
-from wtpy.WtCoreDefs import WTSBarStruct
+from wtpy.apps.datahelper.DHDefs import BaseDataHelper, DBHelper, make_bar_records, make_np_bars, np_bars_to_struct, to_date_time
 import rqdatac as rq
+import pandas as pd
 from datetime import datetime, timedelta
 import json
 import os
@@ -145,7 +145,7 @@ class DHRqData(BaseDataHelper):
         f.write(json.dumps(stocks, sort_keys=True, indent=4, ensure_ascii=False))
         f.close()
 
-    def dmpBarsToFile(self, folder:str, codes:list, start_date:datetime=None, end_date:datetime=None, period:str="day"):
+    def dmpBarsToFile(self, folder:str, codes:list, start_date:datetime=None, end_date:datetime=None, period:str="day", workers:int=1):
         if start_date is None:
             start_date = datetime(year=1990, month=1, day=1)
         
@@ -168,46 +168,38 @@ class DHRqData(BaseDataHelper):
         else:
             raise Exception("Unrecognized period")
         
-        count = 0
         length = len(codes)
-        for stdCode in codes:
-            count += 1
+        def dump(item):
+            count, stdCode = item
             rq_code = stdCodeToRQ(stdCode)
             
             logging.info("Fetching %s bars of %s(%d/%s)..." % (period, stdCode, count, length))
             df_bars = rq.get_price(order_book_ids = rq_code,start_date=start_date, end_date=end_date,frequency=freq,adjust_type='none',expect_df=True)
-            content = "date,time,open,high,low,close,volume,turnover,hold\n"
-            total_nums = len(df_bars)
-            cur_num = 0
-            for idx, row in df_bars.iterrows():
-                trade_date = row.name[1].to_pydatetime()
-                date = trade_date.strftime("%Y-%m-%d")
-                if isDay:
-                    time = '0'
-                else:
-                    time = trade_date.strftime("%H:%M:%S")
-                o = str(row["open"])
-                h = str(row["high"])
-                l = str(row["low"])
-                c = str(row["close"])
-                v = str(row["volume"])
-                t = str(row["total_turnover"])
-                items = [date, time, o, h, l, c, v, t]
-                if "open_interest" in row:
-                    items.append(str(row["open_interest"]))
-
-                content += ",".join(items) + "\n"
-
-                cur_num += 1
-                if cur_num % 500 == 0:
-                    logging.info("Processing bars %d/%d..." % (cur_num, total_nums))
+            if df_bars is None:
+                logging.info(f"{period} bars of {stdCode} not exist...")
+                return
+
+            # 索引是(order_book_id, datetime)
+            trade_dates = df_bars.index.get_level_values(1)
+            content = pd.DataFrame({
+                "date": trade_dates.strftime("%Y-%m-%d"),
+                "time": '0' if isDay else trade_dates.strftime("%H:%M:%S"),
+                "open": df_bars["open"].values,
+                "high": df_bars["high"].values,
+                "low": df_bars["low"].values,
+                "close": df_bars["close"].values,
+                "volume": df_bars["volume"].values,
+                "turnover": df_bars["total_turnover"].values
+            }, index=range(len(df_bars)))
+            if "open_interest" in df_bars.columns:
+                content["hold"] = df_bars["open_interest"].values
 
             filename = "%s_%s.csv" % (stdCode, filetag)
             filepath = os.path.join(folder, filename)
             logging.info("Writing bars into file %s..." % (filepath))
-            f = open(filepath, "w", encoding="utf-8")
-            f.write(content)
-            f.close()
+            content.to_csv(filepath, index=False)
+
+        self.__run_tasks__(dump, list(enumerate(codes, 1)), workers)
 
     def dmpAdjFactorsToDB(self, dbHelper:DBHelper, codes:list):
         stocks = {
@@ -239,7 +231,8 @@ class DHRqData(BaseDataHelper):
         logging.info("Writing adjust factors into database...")
         dbHelper.writeFactors(stocks)
 
-    def dmpBarsToDB(self, dbHelper:DBHelper, codes:list, start_date:datetime=None, end_date:datetime=None, period:str="day"):
+
+    def dmpBarsToDB(self, dbHelper:DBHelper, codes:list, start_date:datetime=None, end_date:datetime=None, period:str="day", workers:int=1):
         if start_date is None:
             start_date = datetime(year=1990, month=1, day=1)
         
@@ -258,55 +251,45 @@ class DHRqData(BaseDataHelper):
         else:
             raise Exception("Unrecognized period")
         
-        count = 0
         length = len(codes)
-        for stdCode in codes:
+        def dump(item):
+            count, stdCode = item
             items = stdCode.split(".")
             exchg = items[0]
             code = stdCode[(len(exchg)+1):]
             rq_code = stdCodeToRQ(stdCode)
-            count += 1
             
             logging.info("Fetching %s bars of %s(%d/%s)..." % (period, stdCode, count, length))
             df_bars = rq.get_price(order_book_ids = rq_code,start_date=start_date, end_date=end_date,frequency=freq,adjust_type='none',expect_df=True)
-            bars = list()
-            total_nums = len(df_bars)
-            cur_num = 0
-            for idx, row in df_bars.iterrows():
-                trade_date = row.name[1].to_pydatetime()
-                date = int(trade_date.strftime("%Y%m%d"))
-                if isDay:
-                    time = 0
-                else:
-                    time = int(trade_date.strftime("%H%M"))
-                curBar = {
-                    "exchange":exchg,
-                    "code": code,
-                    "date": date,
-                    "time": time,
-                    "open": row["open"],
-                    "high": row["open"],
-                    "low": row["open"],
-                    "close": row["open"],
-                    "volume": row["volume"],
-                    "turnover": row["total_turnover"]
-                }
-
-                if "settlement" in row:
-                    curBar["settle"] = row["settlement"]
-
-                if "open_interest" in row:
-                    curBar["interest"] = row["open_interest"]
-
-                bars.append(curBar)
-                cur_num += 1
-                if cur_num % 500 == 0:
-                    logging.info("Processing bars %d/%d..." % (cur_num, total_nums))
-
+            if df_bars is None:
+                logging.info(f"{period} bars of {stdCode} not exist...")
+                return
+
+            dates, times = to_date_time(df_bars.index.get_level_values(1))
+            columns = {
+                "date": dates,
+                "time": 0 if isDay else times,
+                "open": df_bars["open"].values,
+                "high": df_bars["high"].values,
+                "low": df_bars["low"].values,
+                "close": df_bars["close"].values,
+                "volume": df_bars["volume"].values,
+                "turnover": df_bars["total_turnover"].values
+            }
+
+            if "settlement" in df_bars.columns:
+                columns["settle"] = df_bars["settlement"].values
+
+            if "open_interest" in df_bars.columns:
+                columns["interest"] = df_bars["open_interest"].values
+
+            bars = make_bar_records(exchg, code, columns)
             logging.info("Writing bars into database...")
             dbHelper.writeBars(bars, period)
 
-    def dmpBars(self, codes:list, cb, start_date:datetime=None, end_date:datetime=None, period:str="day"):
+        self.__run_tasks__(dump, list(enumerate(codes, 1)), workers)
+
+    def dmpBars(self, codes:list, cb, start_date:datetime=None, end_date:datetime=None, period:str="day", workers:int=1):
         if start_date is None:
             start_date = datetime(year=1990, month=1, day=1)
         
@@ -325,41 +308,28 @@ class DHRqData(BaseDataHelper):
         else:
             raise Exception("Unrecognized period")
         
-        count = 0
         length = len(codes)
-        for stdCode in codes:
-            count += 1
+        def dump(item):
+            count, stdCode = item
             rq_code = stdCodeToRQ(stdCode)
             
             logging.info("Fetching %s bars of %s(%d/%s)..." % (period, stdCode, count, length))
             df_bars = rq.get_price(order_book_ids = rq_code,start_date=start_date, end_date=end_date,frequency=freq,adjust_type='none',expect_df=True)
             if df_bars is None:
                 logging.info(f"{period} bars of {stdCode} not exist...")
-                continue
-
-            total_nums = len(df_bars)
-            BUFFER = WTSBarStruct*len(df_bars)
-            buffer = BUFFER()
-            cur_num = 0
-            for idx, row in df_bars.iterrows():
-                curBar = buffer[cur_num]
-                trade_date = row.name[1].to_pydatetime()
-                curBar.date = int(trade_date.strftime("%Y%m%d"))
-                if isDay:
-                    curBar.time = 0
-                else:
-                    curBar.time = int(trade_date.strftime("%H%M")) + (curBar.date-19900000)*10000
-                curBar.open = row["open"]
-                curBar.high = row["high"]
-                curBar.low = row["low"]
-                curBar.close = row["close"]
-                curBar.volume = row["volume"]
-                curBar.turnover = row["total_turnover"]
-                if "open_interest" in row:
-                    curBar.open_interest = row["open_interest"]
-                cur_num += 1
-                if cur_num % 500 == 0:
-                    logging.info("Processing bars %d/%d..." % (cur_num, total_nums))
+                return
+
+            dates, times = to_date_time(df_bars.index.get_level_values(1))
+            if isDay:
+                times = 0
+            else:
+                times = times + (dates-19900000)*10000
+            interests = df_bars["open_interest"].values if "open_interest" in df_bars.columns else None
+            npBars = make_np_bars(dates, times,
+                df_bars["open"].values, df_bars["high"].values, df_bars["low"].values, df_bars["close"].values,
+                df_bars["volume"].values, df_bars["total_turnover"].values, interests)
 
             ay = stdCode.split(".")
-            cb(ay[0], stdCode, buffer, total_nums, period)
\ No newline at end of file
+            cb(ay[0], stdCode, np_bars_to_struct(npBars), len(npBars), period)
+
+        self.__run_tasks__(dump, list(enumerate(codes, 1)), workers)
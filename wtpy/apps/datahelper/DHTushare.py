@@ -1,5 +1,6 @@
-from wtpy.apps.datahelper.DHDefs import BaseDataHelper, DBHelper
+from wtpy.apps.datahelper.DHDefs import BaseDataHelper, DBHelper, make_bar_records, to_date_time
 import tushare as ts
+import pandas as pd
 from datetime import datetime
 import json
 import os
@@ -168,7 +169,7 @@ class DHTushare(BaseDataHelper):
         f.write(json.dumps(stocks, sort_keys=True, indent=4, ensure_ascii=False))
         f.close()
 
-    def __dmp_bars_to_file_from_pro__(self, folder:str, codes:list, start_date:datetime=None, end_date:datetime=None, period:str="day"):
+    def __dmp_bars_to_file_from_pro__(self, folder:str, codes:list, start_date:datetime=None, end_date:datetime=None, period:str="day", workers:int=1):
         if start_date is None:
             start_date = datetime(year=1990, month=1, day=1)
         
@@ -198,9 +199,9 @@ class DHTushare(BaseDataHelper):
             start_date = start_date.strftime("%Y-%m-%d") + " 09:00:00"
             end_date = end_date.strftime("%Y-%m-%d") + " 15:15:00"
 
-        count = 0
         length = len(codes)
-        for stdCode in codes:
+        def dump(item):
+            count, stdCode = item
             ts_code = transCode(stdCode)
             exchg = stdCode.split(".")[0]
             code = stdCode[-6:]
@@ -209,39 +210,36 @@ class DHTushare(BaseDataHelper):
                     asset_type =  "I"
             elif exchg not in ['SSE','SZSE']:
                 asset_type = "FT"
-            count += 1
             
             logging.info(f"Fetching {period} bars of {code}({count}/{length})...")
             df_bars = ts.pro_bar(api=self.api, ts_code=ts_code, start_date=start_date, end_date=end_date, freq=freq, asset=asset_type)
             df_bars = df_bars.iloc[::-1]
-            content = "date,time,open,high,low,close,volume,turnover\n"
-            for idx, row in df_bars.iterrows():
-                if isDay:
-                    trade_date = row["trade_date"]
-                    date = trade_date + ''
-                    time = '0'
-                else:
-                    trade_time = row["trade_time"]
-                    date = trade_time.split(' ')[0]
-                    time = trade_time.split(' ')[1]
-                o = str(row["open"])
-                h = str(row["high"])
-                l = str(row["low"])
-                c = str(row["close"])
-                v = str(row["vol"]*100)
-                t = str(row["amount"]*100)
-                items = [date, time, o, h, l, c, v, t]
-
-                content += ",".join(items) + "\n"
+            if isDay:
+                dates = df_bars["trade_date"].values
+                times = '0'
+            else:
+                trade_time = df_bars["trade_time"]
+                dates = trade_time.str[:10].values
+                times = trade_time.str[11:].values
+            content = pd.DataFrame({
+                "date": dates,
+                "time": times,
+                "open": df_bars["open"].values,
+                "high": df_bars["high"].values,
+                "low": df_bars["low"].values,
+                "close": df_bars["close"].values,
+                "volume": df_bars["vol"].values*100,
+                "turnover": df_bars["amount"].values*100
+            }, index=range(len(df_bars)))
 
             filename = f"{stdCode}_{filetag}.csv"
             filepath = os.path.join(folder, filename)
             logging.info(f"Writing bars into file {filepath}...")
-            f = open(filepath, "w", encoding="utf-8")
-            f.write(content)
-            f.close()
+            content.to_csv(filepath, index=False)
+
+        self.__run_tasks__(dump, list(enumerate(codes, 1)), workers)
 
-    def __dmp_bars_to_file_from_old__(self, folder:str, codes:list, start_date:datetime=None, end_date:datetime=None, period:str="day"):
+    def __dmp_bars_to_file_from_old__(self, folder:str, codes:list, start_date:datetime=None, end_date:datetime=None, period:str="day", workers:int=1):
         if start_date is None:
             start_date = datetime(year=1990, month=1, day=1)
         
@@ -264,47 +262,45 @@ class DHTushare(BaseDataHelper):
         start_date = start_date.strftime("%Y-%m-%d")
         end_date = end_date.strftime("%Y-%m-%d")
 
-        count = 0
         length = len(codes)
-        for stdCode in codes:
+        def dump(item):
+            count, stdCode = item
             exchg = stdCode.split(".")[0]
             code = stdCode[-6:]
-            count += 1
             if (exchg == 'SSE' and code[0] == '0') | (exchg == 'SZSE' and code[:3] == '399'):
                 raise Exception("Old api only supports stocks")
             
             logging.info(f"Fetching {period} bars of {code}({count}/{length})...")
             df_bars = ts.get_k_data(code, start=start_date, end=end_date, ktype=freq)
-            content = "date,time,open,high,low,close,volume\n"
-            for idx, row in df_bars.iterrows():
-                if isDay:
-                    date = row["date"]
-                    time = '0'
-                else:
-                    trade_time = row["date"]
-                    date = trade_time.split(' ')[0]
-                    time = trade_time.split(' ')[1] + ":00"
-                o = str(row["open"])
-                h = str(row["high"])
-                l = str(row["low"])
-                c = str(row["close"])
-                v = str(row["volume"])
-                items = [date, time, o, h, l, c, v]
-
-                content += ",".join(items) + "\n"
+            if isDay:
+                dates = df_bars["date"].values
+                times = '0'
+            else:
+                trade_time = df_bars["date"]
+                dates = trade_time.str[:10].values
+                times = (trade_time.str[11:] + ":00").values
+            content = pd.DataFrame({
+                "date": dates,
+                "time": times,
+                "open": df_bars["open"].values,
+                "high": df_bars["high"].values,
+                "low": df_bars["low"].values,
+                "close": df_bars["close"].values,
+                "volume": df_bars["volume"].values
+            }, index=range(len(df_bars)))
 
             filename = f"{stdCode}_{filetag}.csv"
             filepath = os.path.join(folder, filename)
             logging.info(f"Writing bars into file {filepath}...")
-            f = open(filepath, "w", encoding="utf-8")
-            f.write(content)
-            f.close()
+            content.to_csv(filepath, index=False)
 
-    def dmpBarsToFile(self, folder:str, codes:list, start_date:datetime=None, end_date:datetime=None, period:str="day"):
+        self.__run_tasks__(dump, list(enumerate(codes, 1)), workers)
+
+    def dmpBarsToFile(self, folder:str, codes:list, start_date:datetime=None, end_date:datetime=None, period:str="day", workers:int=1):
         if self.use_pro:
-            self.__dmp_bars_to_file_from_pro__(folder=folder, codes=codes, start_date=start_date, end_date=end_date, period=period)
+            self.__dmp_bars_to_file_from_pro__(folder=folder, codes=codes, start_date=start_date, end_date=end_date, period=period, workers=workers)
         else:
-            self.__dmp_bars_to_file_from_old__(folder=folder, codes=codes, start_date=start_date, end_date=end_date, period=period)
+            self.__dmp_bars_to_file_from_old__(folder=folder, codes=codes, start_date=start_date, end_date=end_date, period=period, workers=workers)
 
     def dmpAdjFactorsToDB(self, dbHelper:DBHelper, codes:list):
         stocks = {
@@ -343,7 +339,8 @@ class DHTushare(BaseDataHelper):
         logging.info("Writing adjust factors into database...")
         dbHelper.writeFactors(stocks)
 
-    def __dmp_bars_to_db_from_pro__(self, dbHelper:DBHelper, codes:list, start_date:datetime=None, end_date:datetime=None, period:str="day"):
+
+    def __dmp_bars_to_db_from_pro__(self, dbHelper:DBHelper, codes:list, start_date:datetime=None, end_date:datetime=None, period:str="day", workers:int=1):
         if start_date is None:
             start_date = datetime(year=1990, month=1, day=1)
         
@@ -373,9 +370,9 @@ class DHTushare(BaseDataHelper):
             start_date = start_date.strftime("%Y-%m-%d") + " 09:00:00"
             end_date = end_date.strftime("%Y-%m-%d") + " 15:15:00"
 
-        count = 0
         length = len(codes)
-        for stdCode in codes:
+        def dump(item):
+            count, stdCode = item
             ts_code = transCode(stdCode)
             exchg = stdCode.split(".")[0]
             code = stdCode[-6:]
@@ -384,47 +381,31 @@ class DHTushare(BaseDataHelper):
                     asset_type =  "I"
             elif exchg not in ['SSE','SZSE']:
                 asset_type = "FT"
-            count += 1
             
             logging.info(f"Fetching {period} bars of {code}({count}/{length})...")
             df_bars = ts.pro_bar(api=self.api, ts_code=ts_code, start_date=start_date, end_date=end_date, freq=freq, asset=asset_type)
-            bars = []
-            for idx, row in df_bars.iterrows():          
-                if isDay:
-                    trade_date = row["trade_date"]
-                    bars.append({
-                        "exchange":exchg,
-                        "code": code,
-                        "date": int(trade_date),
-                        "time": 0,
-                        "open": row["open"],
-                        "high": row["high"],
-                        "low": row["low"],
-                        "close": row["close"],
-                        "volume": row["vol"]*100,
-                        "turnover": row["amount"]*100
-                    })
-                else:
-                    trade_time = row["trade_time"]
-                    date = int(trade_time.split(' ')[0].replace("-",""))
-                    time = int(trade_time.split(' ')[1].replace(":","")[:4])
-                    bars.append({
-                        "exchange":exchg,
-                        "code":code,
-                        "date": date,
-                        "time": time,
-                        "open": row["open"],
-                        "high": row["high"],
-                        "low": row["low"],
-                        "close": row["close"],
-                        "volume": row["vol"]*100,
-                        "turnover": row["amount"]*100
-                    })
+            if isDay:
+                dates = df_bars["trade_date"].astype(int).values
+                times = 0
+            else:
+                dates, times = to_date_time(df_bars["trade_time"])
+            bars = make_bar_records(exchg, code, {
+                "date": dates,
+                "time": times,
+                "open": df_bars["open"].values,
+                "high": df_bars["high"].values,
+                "low": df_bars["low"].values,
+                "close": df_bars["close"].values,
+                "volume": df_bars["vol"].values*100,
+                "turnover": df_bars["amount"].values*100
+            })
 
             logging.info("Writing bars into database...")
             dbHelper.writeBars(bars, period)
 
-    def __dmp_bars_to_db_from_old__(self, dbHelper:DBHelper, codes:list, start_date:datetime=None, end_date:datetime=None, period:str="day"):
+        self.__run_tasks__(dump, list(enumerate(codes, 1)), workers)
+
+    def __dmp_bars_to_db_from_old__(self, dbHelper:DBHelper, codes:list, start_date:datetime=None, end_date:datetime=None, period:str="day", workers:int=1):
         if start_date is None:
             start_date = datetime(year=1990, month=1, day=1)
         
@@ -444,53 +425,36 @@ class DHTushare(BaseDataHelper):
         start_date = start_date.strftime("%Y-%m-%d")
         end_date = end_date.strftime("%Y-%m-%d")
 
-        count = 0
         length = len(codes)
-        for stdCode in codes:
+        def dump(item):
+            count, stdCode = item
             exchg = stdCode.split(".")[0]
             code = stdCode[-6:]
             if (exchg == 'SSE' and code[0] == '0') | (exchg == 'SZSE' and code[:3] == '399'):
                 raise Exception("Old api only supports stocks")
-            count += 1
             
             logging.info(f"Fetching {period} bars of {code}({count}/{length})...")
             df_bars = ts.get_k_data(code, start=start_date, end=end_date, ktype=freq)
-            bars = []
-            for idx, row in df_bars.iterrows():          
-                if isDay:
-                    trade_date = row["date"]
-                    bars.append({
-                        "exchange":exchg,
-                        "code": code,
-                        "date": int(trade_date.replace('-','')),
-                        "time": 0,
-                        "open": row["open"],
-                        "high": row["high"],
-                        "low": row["low"],
-                        "close": row["close"],
-                        "volume": row["volume"]
-                    })
-                else:
-                    trade_time = row["date"]
-                    date = int(trade_time.split(' ')[0].replace("-",""))
-                    time = int(trade_time.split(' ')[1].replace(":",""))
-                    bars.append({
-                        "exchange":exchg,
-                        "code":code,
-                        "date": date,
-                        "time": time,
-                        "open": row["open"],
-                        "high": row["high"],
-                        "low": row["low"],
-                        "close": row["close"],
-                        "volume": row["volume"]
-                    })
+            dates, times = to_date_time(df_bars["date"])
+            if isDay:
+                times = 0
+            bars = make_bar_records(exchg, code, {
+                "date": dates,
+                "time": times,
+                "open": df_bars["open"].values,
+                "high": df_bars["high"].values,
+                "low": df_bars["low"].values,
+                "close": df_bars["close"].values,
+                "volume": df_bars["volume"].values
+            })
 
             logging.info("Writing bars into database...")
             dbHelper.writeBars(bars, period)
 
-    def dmpBarsToDB(self, dbHelper:DBHelper, codes:list, start_date:datetime=None, end_date:datetime=None, period:str="day"):
+        self.__run_tasks__(dump, list(enumerate(codes, 1)), workers)
+
+    def dmpBarsToDB(self, dbHelper:DBHelper, codes:list, start_date:datetime=None, end_date:datetime=None, period:str="day", workers:int=1):
         if self.use_pro:
-            self.__dmp_bars_to_db_from_pro__(dbHelper=dbHelper, codes=codes, start_date=start_date, end_date=end_date, period=period)
+            self.__dmp_bars_to_db_from_pro__(dbHelper=dbHelper, codes=codes, start_date=start_date, end_date=end_date, period=period, workers=workers)
         else:
-            self.__dmp_bars_to_db_from_old__(dbHelper=dbHelper, codes=codes, start_date=start_date, end_date=end_date, period=period)
\ No newline at end of file
+            self.__dmp_bars_to_db_from_old__(dbHelper=dbHelper, codes=codes, start_date=start_date, end_date=end_date, period=period, workers=workers)
@@ -1,10 +1,44 @@
 from wtpy.apps.datahelper.DHDefs import DBHelper
+from itertools import islice, repeat
+import numpy as np
 import pymysql
+import threading
 import math
 import os
 
+DAY_COLUMNS = ["exchange","`code`","`date`","open","high","low","close","settle","volume","turnover","interest","diff_interest"]
+MIN_COLUMNS = ["exchange","`code`","`date`","`time`","open","high","low","close","volume","turnover","interest","diff_interest"]
+
+def make_replace_sql(tbname:str, columns:list) -> str:
+    return "REPLACE INTO %s(%s) VALUES(%s)" % (tbname, ",".join(columns), ",".join(["%s"]*len(columns)))
+
+def dict_bars_to_rows(bars:list, isDay:bool):
+    '''
+    字典形式的K线转成插入用的行, 缺失的字段用0填充
+    '''
+    for curBar in bars:
+        if isDay:
+            yield (curBar["exchange"], curBar["code"], curBar["date"], curBar["open"], curBar["high"], curBar["low"], curBar["close"],
+                curBar.get("settle", 0), curBar.get("volume", 0), curBar.get("turnover", 0), curBar.get("interest", 0), curBar.get("diff_interest", 0))
+        else:
+            barTime = (curBar["date"] - 19900000)*10000 + curBar["time"]
+            yield (curBar["exchange"], curBar["code"], curBar["date"], barTime, curBar["open"], curBar["high"], curBar["low"], curBar["close"],
+                curBar.get("volume", 0), curBar.get("turnover", 0), curBar.get("interest", 0), curBar.get("diff_interest", 0))
+
+def np_bars_to_rows(bars:np.ndarray, exchg:str, code:str, isDay:bool):
+    '''
+    NpTypeBar数组转成插入用的行, 分钟线的time字段已经是(date-19900000)*10000+HHMM的格式
+    '''
+    fields = ["date","open","high","low","close","settle","volume","turnover","open_interest","diff"]
+    if not isDay:
+        fields = ["date","time","open","high","low","close","volume","turnover","open_interest","diff"]
+    return zip(repeat(exchg), repeat(code), *[bars[field].tolist() for field in fields])
+
 class MysqlHelper(DBHelper):
-    def __init__(self, host:str, user:str, pwd:str, dbname:str, port:int=3306):
+    def __init__(self, host:str, user:str, pwd:str, dbname:str, port:int=3306, batch_size:int=5000):
+        '''
+        @batch_size 每次executemany提交的行数
+        '''
         self.params = {
             "host":host,
             'user':user,
@@ -12,18 +46,42 @@ class MysqlHelper(DBHelper):
             'database':dbname,
             'port':port
         }
-        self.conn:pymysql.Connection = None
+        self.batch_size = batch_size
+        # 每个线程复用自己的连接, pymysql的连接不能跨线程共用
+        self.__local__ = threading.local()
     
-    def __get_conn__(self):
-        if self.conn is None:
-            self.conn = pymysql.connect(**self.params)
+    def __get_conn__(self) -> pymysql.Connection:
+        conn = getattr(self.__local__, "conn", None)
+        if conn is None:
+            conn = pymysql.connect(**self.params)
+            self.__local__.conn = conn
         
         try:
-            self.conn.ping()
+            conn.ping()
         except:
-            self.conn = pymysql.connect(**self.params)
+            conn = pymysql.connect(**self.params)
+            self.__local__.conn = conn
 
-        return self.conn 
+        return conn
+
+    def __execute_many__(self, sql:str, rows):
+        '''
+        按batch_size分批executemany, 全部写完以后一次提交, 出错则回滚
+        '''
+        rows = iter(rows)
+        conn = self.__get_conn__()
+        cursor = conn.cursor()
+        try:
+            batch = list(islice(rows, self.batch_size))
+            while len(batch) > 0:
+                cursor.executemany(sql, batch)
+                batch = list(islice(rows, self.batch_size))
+            conn.commit()
+        except:
+            conn.rollback()
+            raise
+        finally:
+            cursor.close()
 
     def initDB(self):
         paths = os.path.split(__file__)
@@ -43,96 +101,20 @@ class MysqlHelper(DBHelper):
         conn.commit()
         cursor.close()
 
-    def writeBars(self, bars:list, period="day"):
-        count = 0
-        sql = ""
+    def writeBars(self, bars, period="day", exchg:str=None, code:str=None):
         isDay = (period=='day')
         tbname = "tb_kline_%s" % (period)
-        for curBar in bars:
-            if count == 0:
-                if isDay:
-                    sql = "REPLACE INTO %s(exchange,`code`,`date`,open,high,low,close,settle,volume,turnover,interest,diff_interest) VALUES" % (tbname)
-                else:
-                    sql = "REPLACE INTO %s(exchange,`code`,`date`,`time`,open,high,low,close,volume,turnover,interest,diff_interest) VALUES" % (tbname)
-            
-            if isDay:
-                subsql = "('%s','%s',%d,%f,%f,%f,%f," % (curBar["exchange"], curBar["code"], curBar["date"], curBar["open"], curBar["high"], curBar["low"], curBar["close"])
-                if "settle" in curBar:
-                    subsql += str(curBar["settle"]) + ","
-                else:
-                    subsql += "0,"
-                if "volume" in curBar:
-                    subsql += str(curBar["volume"]) + ","
-                else:
-                    subsql += "0,"
-                if "turnover" in curBar:
-                    subsql += str(curBar["turnover"]) + ","
-                else:
-                    subsql += "0,"
-                if "interest" in curBar:
-                    subsql += str(curBar["interest"]) + ","
-                else:
-                    subsql += "0,"
-                if "diff_interest" in curBar:
-                    subsql += str(curBar["diff_interest"]) + ","
-                else:
-                    subsql += "0,"
-                subsql = subsql[:-1] + "),"
-                sql += subsql
-            else:
-                barTime = (curBar["date"] - 19900000)*10000 + curBar["time"]
-                subsql = "('%s','%s',%d,%d,%f,%f,%f,%f," % (curBar["exchange"], curBar["code"], curBar["date"], barTime, curBar["open"], curBar["high"], curBar["low"], curBar["close"])
-                if "volume" in curBar:
-                    subsql += str(curBar["volume"]) + ","
-                else:
-                    subsql += "0,"
-                if "turnover" in curBar:
-                    subsql += str(curBar["turnover"]) + ","
-                else:
-                    subsql += "0,"
-                if "interest" in curBar:
-                    subsql += str(curBar["interest"]) + ","
-                else:
-                    subsql += "0,"
-                if "diff_interest" in curBar:
-                    subsql += str(curBar["diff_interest"]) + ","
-                else:
-                    subsql += "0,"
-                subsql = subsql[:-1] + "),"
-                sql += subsql
-
-            count += 1
-            if count == 500:
-                count = 0
-                sql = sql[:-1] + ";"
-                conn = self.__get_conn__()
-                cursor = conn.cursor()
-                cursor.execute(sql)
-                conn.commit()
-                cursor.close()
-
-        # 循环完了，再做一次提交
-        if count > 0:
-            sql = sql[:-1] + ";"
-            conn = self.__get_conn__()
-            cursor = conn.cursor()
-            cursor.execute(sql)
-            conn.commit()
-            cursor.close()
+        sql = make_replace_sql(tbname, DAY_COLUMNS if isDay else MIN_COLUMNS)
+        if isinstance(bars, np.ndarray):
+            if exchg is None or code is None:
+                raise Exception("exchg and code are required when bars is a NpTypeBar array")
+            rows = np_bars_to_rows(bars, exchg, code, isDay)
+        else:
+            rows = dict_bars_to_rows(bars, isDay)
 
+        self.__execute_many__(sql, rows)
 
     def writeFactors(self, factors:dict):
-        for exchg in factors:
-            codelist = factors[exchg]
-            for code in codelist:
-                items = codelist[code]
-                sql = 'REPLACE INTO tb_adj_factors(exchange,`code`,`date`,factor) VALUES'
-                for item in items:
-                    sql += "('%s','%s',%d,%f)," % (exchg, code, item["date"], item["factor"])
-
-                sql = sql[:-1] + ";"
-                conn = self.__get_conn__()
-                cursor = conn.cursor()
-                cursor.execute(sql)
-                conn.commit()
-                cursor.close()
\ No newline at end of file
+        sql = make_replace_sql("tb_adj_factors", ["exchange","`code`","`date`","factor"])
+        rows = ((exchg, code, item["date"], item["factor"]) for exchg in factors for code in factors[exchg] for item in factors[exchg][code])
+        self.__execute_many__(sql, rows)
@@ -4,6 +4,9 @@ import os
 import sqlite3
 import hashlib
 import datetime
+import locale
+import threading
+from collections import OrderedDict
 from .WtLogger import WtLogger
 
 def backup_file(filename):
@@ -20,10 +23,181 @@ def backup_file(filename):
     import shutil
     shutil.copy(filename, target)
 
+class CsvTailReader:
+    '''
+    csv文件的增量读取器\n
+    记录已经读取到的字节偏移和文件的inode, 每次只解析新追加的内容\n
+    文件被截断或者被替换(inode变化)时, 清空已解析的数据从头读取
+    '''
+
+    def __init__(self, filename:str, parser, encoding:str = None, errors:str = "strict"):
+        '''
+        @filename   文件路径
+        @parser     行解析函数, 参数为按逗号拆分的字段列表, 返回None则跳过该行
+        @encoding   文件编码, 默认和open的默认编码一致
+        @errors     解码出错的处理方式
+        '''
+        self.filename = filename
+        self.items = list()
+        self.__parser__ = parser
+        self.__encoding__ = encoding if encoding is not None else locale.getpreferredencoding(False)
+        self.__errors__ = errors
+        self.__offset__ = 0
+        self.__inode__ = None
+        self.__mtime__ = None
+        self.__tail__ = b""     # 已读内容的最后一段, 用于校验文件是否被重写
+        self.__lock__ = threading.Lock()
+
+    def reset(self):
+        '''
+        清空已解析的数据, 下次从头读取
+        '''
+        self.items = list()
+        self.__offset__ = 0
+        self.__inode__ = None
+        self.__mtime__ = None
+        self.__tail__ = b""
+
+    def __read_from__(self, offset:int) -> bytes:
+        f = open(self.filename, "rb")
+        f.seek(offset)
+        data = f.read()
+        f.close()
+        return data
+
+    def update(self) -> list:
+        '''
+        解析新追加的行, 返回全部已解析的数据
+        '''
+        with self.__lock__:
+            try:
+                st = os.stat(self.filename)
+            except OSError:
+                return self.items
+
+            if st.st_ino != self.__inode__ or st.st_size < self.__offset__:
+                # 文件被替换或者被截断了, 从头读
+                self.reset()
+                self.__inode__ = st.st_ino
+
+            if st.st_size == self.__offset__ and st.st_mtime_ns == self.__mtime__:
+                return self.items
+
+            # 把已读内容的最后一段一起读出来, 对不上说明文件被重写了(inode可能被复用)
+            sigLen = len(self.__tail__)
+            data = self.__read_from__(self.__offset__ - sigLen)
+            if data[:sigLen] != self.__tail__:
+                self.reset()
+                self.__inode__ = st.st_ino
+                data = self.__read_from__(0)
+            else:
+                data = data[sigLen:]
+            self.__mtime__ = st.st_mtime_ns
+
+            # 最后一行可能还没有写完, 只处理到最后一个换行符
+            end = data.rfind(b"\n")
+            if end < 0:
+                return self.items
+            data = data[:end+1]
+
+            lines = data.decode(self.__encoding__, self.__errors__).replace("\r\n", "\n").split("\n")[:-1]
+            # 第一行是表头
+            if self.__offset__ == 0:
+                lines = lines[1:]
+            self.__offset__ += len(data)
+            self.__tail__ = (self.__tail__ + data)[-64:]
+
+            for line in lines:
+                try:
+                    item = self.__parser__((line + "\n").split(","))
+                except (ValueError, IndexError):
+                    continue
+
+                if item is not None:
+                    self.items.append(item)
+
+            return self.items
+
+    @property
+    def rows(self) -> int:
+        '''
+        缓存的数据条数, 用于估算占用的内存
+        '''
+        return len(self.items)
+
+def count_records(obj) -> int:
+    '''
+    统计json对象中dict和list的个数, 一条记录通常是一个dict, 和csv的一行大致相当
+    '''
+    count = 0
+    stack = [obj]
+    while len(stack) > 0:
+        item = stack.pop()
+        if isinstance(item, dict):
+            count += 1
+            stack.extend(item.values())
+        elif isinstance(item, list):
+            count += 1
+            stack.extend(item)
+    return count
+
+class JsonFileReader:
+    '''
+    json文件的读取器\n
+    记录文件的大小、修改时间和inode, 文件没有变化就直接返回上次解析的结果\n
+    解析失败(比如文件正在写入)时返回上次成功解析的结果, 下次再重新读取
+    '''
+
+    def __init__(self, filename:str):
+        self.filename = filename
+        self.data = None
+        self.__stat__ = None
+        self.__rows__ = 1
+        self.__lock__ = threading.Lock()
+
+    def update(self):
+        '''
+        返回文件的解析结果, 文件不存在或者从来没有解析成功过则返回None
+        '''
+        with self.__lock__:
+            try:
+                st = os.stat(self.filename)
+            except OSError:
+                return self.data
+
+            stat = (st.st_size, st.st_mtime_ns, st.st_ino)
+            if stat == self.__stat__:
+                return self.data
+
+            try:
+                f = open(self.filename, "r")
+                content = f.read()
+                f.close()
+                self.data = json.loads(content)
+                self.__stat__ = stat
+                self.__rows__ = max(1, count_records(self.data))
+            except Exception:
+                pass
+
+            return self.data
+
+    @property
+    def rows(self) -> int:
+        '''
+        缓存的记录数, 和csv读取器一起参与缓存上限的计算
+        '''
+        return self.__rows__
+
 class DataMgr:
 
-    def __init__(self, datafile:str="mondata.db", logger:WtLogger=None):
+    def __init__(self, datafile:str="mondata.db", logger:WtLogger=None, max_cached_rows:int = 2000000):
+        '''
+        @max_cached_rows    所有组合的文件缓存加起来最多保留的数据条数, 超过了就淘汰最久没有访问的文件
+        '''
         self.__grp_cache__ = dict()
+        self.__file_cache__ = OrderedDict()     # 文件路径 -> CsvTailReader/JsonFileReader, 按访问顺序排列
+        self.__max_cached_rows__ = max_cached_rows
+        self.__cache_lock__ = threading.Lock()
         self.__logger__ = logger
 
         self.__db_conn__ = sqlite3.connect(datafile, check_same_thread=False)
@@ -155,63 +329,86 @@ class DataMgr:
             self.__db_conn__.commit()
 
     def __check_cache__(self, grpid, grpInfo):
-        now = datetime.datetime.now()
-        if grpid not in self.__grp_cache__:
-            self.__grp_cache__[grpid] = dict()
-            self.__grp_cache__[grpid]["cachetime"] = None
-        else:
-            cache_time = self.__grp_cache__[grpid]["cachetime"]
-            bNeedReset = False
-            if cache_time is None or "strategies" not in self.__grp_cache__[grpid]:
-                bNeedReset = True
-            else:
-                td = now - cache_time
-                if td.total_seconds() >= 60:# 上次缓存时间超过60s，则重新读取
-                    bNeedReset = True
-
-            if bNeedReset:
-                self.__grp_cache__[grpid] = dict()
-                self.__grp_cache__[grpid]["cachetime"] = None
-
-        if "strategies" not in self.__grp_cache__[grpid]:
-            filepath = "./generated/marker.json"
-            filepath = os.path.join(grpInfo["path"], filepath)
-            if not os.path.exists(filepath):
-                pass
-            else:
-                try:
-                    f = open(filepath, "r")
-                    content = f.read()
-                    marker = json.loads(content)
-                    f.close()
-
-                    self.__grp_cache__[grpid] = {
-                        "strategies":marker["marks"],
-                        "channels":marker["channels"]
-                    } 
+        '''
+        检查组合的策略、通道和执行器列表, marker.json有变化才重新读取
+        '''
+        filepath = "./generated/marker.json"
+        filepath = os.path.join(grpInfo["path"], filepath)
+        marker = self.__read_json__(filepath)
 
-                    if "executers" in marker:
-                        self.__grp_cache__[grpid]["executers"] = marker["executers"]
-                    else:
-                        self.__grp_cache__[grpid]["executers"] = []
+        gpCache = self.__grp_cache__.get(grpid)
+        if gpCache is not None and gpCache["marker"] is marker:
+            return
 
-                except:
-                    self.__grp_cache__[grpid] = {
-                        "strategies":[],
-                        "channels":[],
-                        "executers":[]
-                    } 
+        if marker is None:
+            self.__grp_cache__[grpid] = {"marker":None}
+            return
 
-            if "strategies" in self.__grp_cache__[grpid]:
-                self.__grp_cache__[grpid]["strategies"].sort()
+        try:
+            gpCache = {
+                "marker":marker,
+                "strategies":sorted(marker["marks"]),
+                "channels":sorted(marker["channels"]),
+                "executers":sorted(marker["executers"]) if "executers" in marker else []
+            }
+        except:
+            gpCache = {
+                "marker":marker,
+                "strategies":[],
+                "channels":[],
+                "executers":[]
+            }
+        self.__grp_cache__[grpid] = gpCache
+
+    def __get_reader__(self, filepath:str, factory):
+        '''
+        从文件缓存中取出读取器, 没有就新建一个, 同时维护LRU顺序
+        '''
+        with self.__cache_lock__:
+            reader = self.__file_cache__.get(filepath)
+            if reader is None:
+                reader = factory()
+                self.__file_cache__[filepath] = reader
+            else:
+                self.__file_cache__.move_to_end(filepath)
+            return reader
+
+    def __trim_cache__(self):
+        '''
+        缓存的总条数超过上限的时候, 从最久没有访问的文件开始淘汰
+        '''
+        with self.__cache_lock__:
+            total = sum(reader.rows for reader in self.__file_cache__.values())
+            while total > self.__max_cached_rows__ and len(self.__file_cache__) > 1:
+                filepath, reader = self.__file_cache__.popitem(last=False)
+                total -= reader.rows
+
+    def __tail_csv__(self, filepath:str, parser, encoding:str = None, errors:str = "strict") -> list:
+        '''
+        增量读取csv文件, 返回全部已解析的数据, 文件不存在则返回None\n
+        @filepath   文件路径
+        @parser     行解析函数
+        '''
+        if not os.path.exists(filepath):
+            return None
 
-            if "channels" in self.__grp_cache__[grpid]:
-                self.__grp_cache__[grpid]["channels"].sort()
+        reader = self.__get_reader__(filepath, lambda: CsvTailReader(filepath, parser, encoding, errors))
+        items = reader.update()
+        self.__trim_cache__()
+        return items
 
-            if "executers" in self.__grp_cache__[grpid]:
-                self.__grp_cache__[grpid]["executers"].sort()
+    def __read_json__(self, filepath:str):
+        '''
+        读取json文件, 文件没有变化就直接返回上次的解析结果, 文件不存在或者解析失败则返回None\n
+        返回的对象是缓存里的, 调用方不要修改
+        '''
+        if not os.path.exists(filepath):
+            return None
 
-            self.__grp_cache__[grpid]["cachetime"] = now
+        reader = self.__get_reader__(filepath, lambda: JsonFileReader(filepath))
+        data = reader.update()
+        self.__trim_cache__()
+        return data
 
     def get_groups(self, tpfilter:str=''):
         ret = []
@@ -443,32 +640,9 @@ class DataMgr:
         if straid not in self.__grp_cache__[grpid]["strategies"]:
             return []
 
-        if "trades" not in self.__grp_cache__[grpid]:
-            self.__grp_cache__[grpid]["trades"] = dict()
-        
-        if straid not in self.__grp_cache__[grpid]["trades"]:
-            filepath = "./generated/outputs/%s/trades.csv" % (straid)
-            filepath = os.path.join(grpInfo["path"], filepath)
-            if not os.path.exists(filepath):
-                return []
-            else:
-                trdCache = dict()
-                trdCache["file"] = filepath
-                trdCache["lastrow"] = 0
-                trdCache["trades"] = list()
-                self.__grp_cache__[grpid]["trades"][straid] = trdCache
-
-        trdCache = self.__grp_cache__[grpid]["trades"][straid]
-        f = open(trdCache["file"], "r")
-        last_row = trdCache["lastrow"]
-        lines = f.readlines()
-        f.close()
-        lines = lines[1+last_row:]
-
-        for line in lines:
-            cells = line.split(",")
+        def parse(cells):
             if len(cells) > 10:
-                continue
+                return None
 
             tItem = {
                 "strategy":straid,
@@ -484,11 +658,38 @@ class DataMgr:
 
             if len(cells) > 7:
                 tItem["fee"] = float(cells[7])
+            return tItem
 
-            trdCache["trades"].append(tItem)
-            trdCache["lastrow"] += 1
-        
-        return trdCache["trades"][-limit:]
+        filepath = "./generated/outputs/%s/trades.csv" % (straid)
+        filepath = os.path.join(grpInfo["path"], filepath)
+        trades = self.__tail_csv__(filepath, parse)
+        if trades is None:
+            return []
+
+        return trades[-limit:]
+
+    def __funds_parser__(self, straid:str):
+        '''
+        策略funds.csv的行解析函数
+        '''
+        def parse(cells):
+            if len(cells) > 10:
+                return None
+
+            tItem = {
+                "strategy":straid,
+                "date": int(cells[0]),
+                "closeprofit": float(cells[1]),
+                "dynprofit": float(cells[2]),
+                "dynbalance": float(cells[3]),
+                "fee": 0
+            }
+
+            if len(cells) > 4:
+                tItem["fee"] = float(cells[4])
+            return tItem
+
+        return parse
 
     def get_funds(self, grpid:str, straid:str):
         if grpid not in self.__config__["groups"]:
@@ -504,50 +705,13 @@ class DataMgr:
             if straid not in self.__grp_cache__[grpid]["strategies"]:
                 return []
 
-            if "funds" not in self.__grp_cache__[grpid]:
-                self.__grp_cache__[grpid]["funds"] = dict()
-            
-            if straid not in self.__grp_cache__[grpid]["funds"]:
-                filepath = "./generated/outputs/%s/funds.csv" % (straid)
-                filepath = os.path.join(grpInfo["path"], filepath)
-                if not os.path.exists(filepath):
-                    return []
-                else:
-                    trdCache = dict()
-                    trdCache["file"] = filepath
-                    trdCache["lastrow"] = 0
-                    trdCache["funds"] = list()
-                    self.__grp_cache__[grpid]["funds"][straid] = trdCache
-
-            trdCache = self.__grp_cache__[grpid]["funds"][straid]
-
-            f = open(trdCache["file"], "r")
-            last_row = trdCache["lastrow"]
-            lines = f.readlines()
-            f.close()
-            lines = lines[1+last_row:]
-
-            for line in lines:
-                cells = line.split(",")
-                if len(cells) > 10:
-                    continue
-
-                tItem = {
-                    "strategy":straid,
-                    "date": int(cells[0]),
-                    "closeprofit": float(cells[1]),
-                    "dynprofit": float(cells[2]),
-                    "dynbalance": float(cells[3]),
-                    "fee": 0
-                }
-
-                if len(cells) > 4:
-                    tItem["fee"] = float(cells[4])
-
-                trdCache["funds"].append(tItem)
-                trdCache["lastrow"] += 1
+            filepath = "./generated/outputs/%s/funds.csv" % (straid)
+            filepath = os.path.join(grpInfo["path"], filepath)
+            funds = self.__tail_csv__(filepath, self.__funds_parser__(straid))
+            if funds is None:
+                return []
 
-            ret = trdCache["funds"].copy()
+            ret = funds.copy()
 
             if len(ret) > 0:
                 last_date = ret[-1]["date"]
@@ -557,10 +721,8 @@ class DataMgr:
             # 这里再更新一条实时数据
             filepath = "./generated/stradata/%s.json" % (straid)
             filepath = os.path.join(grpInfo["path"], filepath)
-            f = open(filepath, "r")
+            json_data = self.__read_json__(filepath)
             try:
-                content = f.read()
-                json_data = json.loads(content)
                 fund = json_data["fund"]
                 if fund["tdate"] > last_date:
                     ret.append({
@@ -573,7 +735,6 @@ class DataMgr:
                     })
             except:
                 pass
-            f.close()
             
             return ret
         else:
@@ -581,23 +742,16 @@ class DataMgr:
             for straid in self.__grp_cache__[grpid]["strategies"]:
                 filepath = "./generated/outputs/%s/funds.csv" % (straid)
                 filepath = os.path.join(grpInfo["path"], filepath)
-                f = open(filepath, "r")
-                lines = f.readlines()
-                f.close()
+                funds = self.__tail_csv__(filepath, self.__funds_parser__(straid))
 
                 filepath = "./generated/stradata/%s.json" % (straid)
                 filepath = os.path.join(grpInfo["path"], filepath)
                 if not os.path.exists(filepath):
                     continue
 
-                f = open(filepath, "r")
-                content = f.read()
-                f.close()
+                json_data = self.__read_json__(filepath)
                 try:
-                    
-                    json_data = json.loads(content)
                     fund = json_data["fund"]
-                    curDate = fund["tdate"]
                     item = {
                         "strategy":straid,
                         "date": fund["tdate"],
@@ -607,15 +761,10 @@ class DataMgr:
                         "fee": fund["total_fees"]
                     }
 
-                    line = lines[-1]
-                    cells = line.split(",")
-                    last_date = int(cells[0])
-                    if last_date == curDate:
-                        line = lines[-1]
-                        cells = line.split(",")
-                    preprof = float(cells[1])
-                    prebalance = float(cells[3])
-                    prefee = float(cells[4])
+                    lastFund = funds[-1]
+                    preprof = lastFund["closeprofit"]
+                    prebalance = lastFund["dynbalance"]
+                    prefee = lastFund["fee"]
 
                     item['profit'] = item['closeprofit']-preprof
                     item['thisfee'] = item['fee'] - prefee
@@ -639,33 +788,8 @@ class DataMgr:
         if straid not in self.__grp_cache__[grpid]["strategies"]:
             return []
 
-        if "signals" not in self.__grp_cache__[grpid]:
-            self.__grp_cache__[grpid]["signals"] = dict()
-        
-        if straid not in self.__grp_cache__[grpid]["signals"]:
-            filepath = "./generated/outputs/%s/signals.csv" % (straid)
-            filepath = os.path.join(grpInfo["path"], filepath)
-            if not os.path.exists(filepath):
-                return []
-            else:
-                trdCache = dict()
-                trdCache["file"] = filepath
-                trdCache["lastrow"] = 0
-                trdCache["signals"] = list()
-                self.__grp_cache__[grpid]["signals"][straid] = trdCache
-
-        trdCache = self.__grp_cache__[grpid]["signals"][straid]
-
-        f = open(trdCache["file"], "r")
-        last_row = trdCache["lastrow"]
-        lines = f.readlines()
-        f.close()
-        lines = lines[1+last_row:]
-
-        for line in lines:
-            cells = line.split(",")
-
-            tItem = {
+        def parse(cells):
+            return {
                 "strategy":straid,
                 "code": cells[0],
                 "target": float(cells[1]),
@@ -674,10 +798,13 @@ class DataMgr:
                 "tag": cells[4]
             }
 
-            trdCache["signals"].append(tItem)
+        filepath = "./generated/outputs/%s/signals.csv" % (straid)
+        filepath = os.path.join(grpInfo["path"], filepath)
+        signals = self.__tail_csv__(filepath, parse)
+        if signals is None:
+            return []
 
-        trdCache["lastrow"] += len(lines)        
-        return trdCache["signals"][-limit:]
+        return signals[-limit:]
 
     def get_rounds(self, grpid:str, straid:str, limit:int = 200):
         if grpid not in self.__config__["groups"]:
@@ -692,32 +819,8 @@ class DataMgr:
         if straid not in self.__grp_cache__[grpid]["strategies"]:
             return []
 
-        if "rounds" not in self.__grp_cache__[grpid]:
-            self.__grp_cache__[grpid]["rounds"] = dict()
-        
-        if straid not in self.__grp_cache__[grpid]["rounds"]:
-            filepath = "./generated/outputs/%s/closes.csv" % (straid)
-            filepath = os.path.join(grpInfo["path"], filepath)
-            if not os.path.exists(filepath):
-                return []
-            else:
-                trdCache = dict()
-                trdCache["file"] = filepath
-                trdCache["lastrow"] = 0
-                trdCache["rounds"] = list()
-                self.__grp_cache__[grpid]["rounds"][straid] = trdCache
-
-        trdCache = self.__grp_cache__[grpid]["rounds"][straid]
-        f = open(trdCache["file"], "r")
-        last_row = trdCache["lastrow"]
-        lines = f.readlines()
-        f.close()
-        lines = lines[1+last_row:]
-
-        for line in lines:
-            cells = line.split(",")
-
-            tItem = {
+        def parse(cells):
+            return {
                 "strategy":straid,
                 "code": cells[0],
                 "direct": cells[1],
@@ -731,10 +834,13 @@ class DataMgr:
                 "exittag": cells[10]
             }
 
-            trdCache["rounds"].append(tItem)
-        trdCache["lastrow"] += len(lines)
-        
-        return trdCache["rounds"][-limit:]
+        filepath = "./generated/outputs/%s/closes.csv" % (straid)
+        filepath = os.path.join(grpInfo["path"], filepath)
+        rounds = self.__tail_csv__(filepath, parse)
+        if rounds is None:
+            return []
+
+        return rounds[-limit:]
 
     def get_positions(self, grpid:str, straid:str):
         if grpid not in self.__config__["groups"]:
@@ -756,11 +862,8 @@ class DataMgr:
             if not os.path.exists(filepath):
                 return []
             
-            f = open(filepath, "r")
+            json_data = self.__read_json__(filepath)
             try:
-                content = f.read()
-                json_data = json.loads(content)
-
                 positions = json_data["positions"]
                 for pItem in positions:
                     tag = "volumn" if "volume" not in pItem else "volume"
@@ -768,6 +871,7 @@ class DataMgr:
                         continue
 
                     for dItem in pItem["details"]:
+                        dItem = dict(dItem)
                         dItem["code"] = pItem["code"]
                         dItem["strategy"] = straid
                         if "volumn" in dItem:
@@ -776,8 +880,6 @@ class DataMgr:
                         ret.append(dItem)
             except:
                 pass
-
-            f.close()
         else:
             for straid in self.__grp_cache__[grpid]["strategies"]:
                 filepath = "./generated/stradata/%s.json" % (straid)
@@ -785,11 +887,8 @@ class DataMgr:
                 if not os.path.exists(filepath):
                     continue
                 
-                f = open(filepath, "r")
+                json_data = self.__read_json__(filepath)
                 try:
-                    content = f.read()
-                    json_data = json.loads(content)
-
                     positions = json_data["positions"]
                     for pItem in positions:
                         tag = "volumn" if "volume" not in pItem else "volume"
@@ -797,6 +896,7 @@ class DataMgr:
                             continue
 
                         for dItem in pItem["details"]:
+                            dItem = dict(dItem)
                             dItem["code"] = pItem["code"]
                             dItem["strategy"] = straid
                             if "volumn" in dItem:
@@ -805,8 +905,6 @@ class DataMgr:
                             ret.append(dItem)
                 except:
                     pass
-
-                f.close()
         return ret
 
     def get_channel_orders(self, grpid:str, chnlid:str, limit:int = 200):
@@ -822,33 +920,8 @@ class DataMgr:
         if chnlid not in self.__grp_cache__[grpid]["channels"]:
             return []
 
-        if "corders" not in self.__grp_cache__[grpid]:
-            self.__grp_cache__[grpid]["corders"] = dict()
-        
-        if chnlid not in self.__grp_cache__[grpid]["corders"]:
-            filepath = "./generated/traders/%s/orders.csv" % (chnlid)
-            filepath = os.path.join(grpInfo["path"], filepath)
-            if not os.path.exists(filepath):
-                return []
-            else:
-                trdCache = dict()
-                trdCache["file"] = filepath
-                trdCache["lastrow"] = 0
-                trdCache["corders"] = list()
-                self.__grp_cache__[grpid]["corders"][chnlid] = trdCache
-
-        trdCache = self.__grp_cache__[grpid]["corders"][chnlid]
-
-        f = open(trdCache["file"], "r",encoding="gb2312",errors="ignore")
-        last_row = trdCache["lastrow"]
-        lines = f.readlines()
-        f.close()
-        lines = lines[1+last_row:]
-
-        for line in lines:
-            cells = line.split(",")
-
-            tItem = {
+        def parse(cells):
+            return {
                 "channel":chnlid,
                 "localid":int(cells[0]),
                 "time":int(cells[2]),
@@ -862,9 +935,13 @@ class DataMgr:
                 "remark": cells[10]
             }
 
-            trdCache["corders"].append(tItem)
-        
-        return trdCache["corders"][-limit:]
+        filepath = "./generated/traders/%s/orders.csv" % (chnlid)
+        filepath = os.path.join(grpInfo["path"], filepath)
+        orders = self.__tail_csv__(filepath, parse, encoding="gb2312", errors="ignore")
+        if orders is None:
+            return []
+
+        return orders[-limit:]
 
     def get_channel_trades(self, grpid:str, chnlid:str, limit:int = 200):
         if grpid not in self.__config__["groups"]:
@@ -879,33 +956,8 @@ class DataMgr:
         if chnlid not in self.__grp_cache__[grpid]["channels"]:
             return []
 
-        if "ctrades" not in self.__grp_cache__[grpid]:
-            self.__grp_cache__[grpid]["ctrades"] = dict()
-        
-        if chnlid not in self.__grp_cache__[grpid]["ctrades"]:
-            filepath = "./generated/traders/%s/trades.csv" % (chnlid)
-            filepath = os.path.join(grpInfo["path"], filepath)
-            if not os.path.exists(filepath):
-                return []
-            else:
-                trdCache = dict()
-                trdCache["file"] = filepath
-                trdCache["lastrow"] = 0
-                trdCache["ctrades"] = list()
-                self.__grp_cache__[grpid]["ctrades"][chnlid] = trdCache
-
-        trdCache = self.__grp_cache__[grpid]["ctrades"][chnlid]
-
-        f = open(trdCache["file"], "r",encoding="gb2312")
-        last_row = trdCache["lastrow"]
-        lines = f.readlines()
-        f.close()
-        lines = lines[1+last_row:]
-
-        for line in lines:
-            cells = line.split(",")
-
-            tItem = {
+        def parse(cells):
+            return {
                 "channel":chnlid,
                 "localid":int(cells[0]),
                 "time":int(cells[2]),
@@ -917,9 +969,13 @@ class DataMgr:
                 "orderid": cells[8]
             }
 
-            trdCache["ctrades"].append(tItem)
-        
-        return trdCache["ctrades"][-limit:]
+        filepath = "./generated/traders/%s/trades.csv" % (chnlid)
+        filepath = os.path.join(grpInfo["path"], filepath)
+        trades = self.__tail_csv__(filepath, parse, encoding="gb2312")
+        if trades is None:
+            return []
+
+        return trades[-limit:]
 
     def get_channel_positions(self, grpid:str, chnlid:str):
         if self.__config__ is None:
@@ -953,19 +1009,15 @@ class DataMgr:
             if not os.path.exists(filepath):
                 return []
             
-            f = open(filepath, "r")
+            json_data = self.__read_json__(filepath)
             try:
-                content = f.read()
-                json_data = json.loads(content)
-
                 positions = json_data["positions"]
                 for pItem in positions:
+                    pItem = dict(pItem)
                     pItem["channel"] = cid
                     ret.append(pItem)
             except:
                 pass
-
-            f.close()
         return ret
 
     def get_channel_funds(self, grpid:str, chnlid:str):
@@ -1000,17 +1052,12 @@ class DataMgr:
             if not os.path.exists(filepath):
                 continue
             
-            f = open(filepath, "r")
+            json_data = self.__read_json__(filepath)
             try:
-                content = f.read()
-                json_data = json.loads(content)
-
                 funds = json_data["funds"]
                 ret[cid] = funds
             except:
                 pass
-
-            f.close()
         return ret
 
     def get_actions(self, sdate, edate):
@@ -1037,32 +1084,8 @@ class DataMgr:
         grpInfo = self.__config__["groups"][grpid]
         self.__check_cache__(grpid, grpInfo)
 
-        if "grptrades" not in self.__grp_cache__[grpid]:
-            self.__grp_cache__[grpid]["grptrades"] = dict()
-        
-        filepath = "./generated/portfolio/trades.csv"
-        filepath = os.path.join(grpInfo["path"], filepath)
-        if not os.path.exists(filepath):
-            return []
-        else:
-            trdCache = dict()
-            trdCache["file"] = filepath
-            trdCache["lastrow"] = 0
-            trdCache["trades"] = list()
-            self.__grp_cache__[grpid]["grptrades"]["cache"] = trdCache
-
-        trdCache = self.__grp_cache__[grpid]["grptrades"]['cache']
-
-        f = open(trdCache["file"], "r")
-        last_row = trdCache["lastrow"]
-        lines = f.readlines()
-        f.close()
-        lines = lines[1+last_row:]
-
-        for line in lines:
-            cells = line.split(",")
-
-            tItem = {
+        def parse(cells):
+            return {
                 "code": cells[0],
                 "time": int(cells[1]),
                 "direction": cells[2],
@@ -1072,10 +1095,13 @@ class DataMgr:
                 "fee": float(cells[6])
             }
 
-            trdCache["trades"].append(tItem)
-            trdCache["lastrow"] += 1
-        
-        return trdCache["trades"]
+        filepath = "./generated/portfolio/trades.csv"
+        filepath = os.path.join(grpInfo["path"], filepath)
+        trades = self.__tail_csv__(filepath, parse)
+        if trades is None:
+            return []
+
+        return trades.copy()
 
     def get_group_rounds(self, grpid:str):
         if grpid not in self.__config__["groups"]:
@@ -1084,32 +1110,8 @@ class DataMgr:
         grpInfo = self.__config__["groups"][grpid]
         self.__check_cache__(grpid, grpInfo)
 
-        if "grprounds" not in self.__grp_cache__[grpid]:
-            self.__grp_cache__[grpid]["grprounds"] = dict()
-        
-        filepath = "./generated/portfolio/closes.csv"
-        filepath = os.path.join(grpInfo["path"], filepath)
-        if not os.path.exists(filepath):
-            return []
-        else:
-            trdCache = dict()
-            trdCache["file"] = filepath
-            trdCache["lastrow"] = 0
-            trdCache["rounds"] = list()
-            self.__grp_cache__[grpid]["grprounds"]["cache"] = trdCache
-
-        trdCache = self.__grp_cache__[grpid]["grprounds"]['cache']
-
-        f = open(trdCache["file"], "r")
-        last_row = trdCache["lastrow"]
-        lines = f.readlines()
-        f.close()
-        lines = lines[1+last_row:]
-
-        for line in lines:
-            cells = line.split(",")
-
-            tItem = {
+        def parse(cells):
+            return {
                 "code": cells[0],
                 "direct": cells[1],
                 "opentime": int(cells[2]),
@@ -1120,10 +1122,13 @@ class DataMgr:
                 "profit": float(cells[7])
             }
 
-            trdCache["rounds"].append(tItem)
-            trdCache["lastrow"] += 1
-        
-        return trdCache["rounds"]
+        filepath = "./generated/portfolio/closes.csv"
+        filepath = os.path.join(grpInfo["path"], filepath)
+        rounds = self.__tail_csv__(filepath, parse)
+        if rounds is None:
+            return []
+
+        return rounds.copy()
 
     def get_group_funds(self, grpid:str):
         if grpid not in self.__config__["groups"]:
@@ -1132,71 +1137,42 @@ class DataMgr:
         grpInfo = self.__config__["groups"][grpid]
         self.__check_cache__(grpid, grpInfo)
 
-        if "grpfunds" not in self.__grp_cache__[grpid]:
-            self.__grp_cache__[grpid]["grpfunds"] = dict()
-        
+        def parse(cells):
+            return {
+                "date": int(cells[0]),
+                "predynbalance": float(cells[1]),
+                "prebalance": float(cells[2]),
+                "balance": float(cells[3]),
+                "closeprofit": float(cells[4]),
+                "dynprofit": float(cells[5]),
+                "fee": float(cells[6]),
+                "maxdynbalance": float(cells[7]),
+                "maxtime": float(cells[8]),
+                "mindynbalance": float(cells[9]),
+                "mintime": float(cells[10]),
+                "mdmaxbalance": float(cells[11]),
+                "mdmaxdate": float(cells[12]),
+                "mdminbalance": float(cells[13]),
+                "mdmindate": float(cells[14])
+            }
+
         filepath = "./generated/portfolio/funds.csv"
         filepath = os.path.join(grpInfo["path"], filepath)
-        if os.path.exists(filepath):
-            trdCache = dict()
-            trdCache["file"] = filepath
-            trdCache["lastrow"] = 0
-            trdCache["funds"] = list()
-            self.__grp_cache__[grpid]["grpfunds"]["cache"] = trdCache
-
-        trdCache = None
-        if "cache" in self.__grp_cache__[grpid]["grpfunds"]:
-            trdCache = self.__grp_cache__[grpid]["grpfunds"]['cache']
+        funds = self.__tail_csv__(filepath, parse)
 
         ret = []
-        if trdCache is not None:
-            f = open(trdCache["file"], "r")
-            last_row = trdCache["lastrow"]
-            lines = f.readlines()
-            f.close()
-            lines = lines[1+last_row:]
-
-            for line in lines:
-                cells = line.split(",")
-
-                tItem = {
-                    "date": int(cells[0]),
-                    "predynbalance": float(cells[1]),
-                    "prebalance": float(cells[2]),
-                    "balance": float(cells[3]),
-                    "closeprofit": float(cells[4]),
-                    "dynprofit": float(cells[5]),
-                    "fee": float(cells[6]),
-                    "maxdynbalance": float(cells[7]),
-                    "maxtime": float(cells[8]),
-                    "mindynbalance": float(cells[9]),
-                    "mintime": float(cells[10]),
-                    "mdmaxbalance": float(cells[11]),
-                    "mdmaxdate": float(cells[12]),
-                    "mdminbalance": float(cells[13]),
-                    "mdmindate": float(cells[14])
-                }
-
-                trdCache["funds"].append(tItem)
-                trdCache["lastrow"] += 1
-            
-            ret = trdCache["funds"].copy()
-
+        last_date = 0
+        if funds is not None:
+            ret = funds.copy()
             if len(ret) > 0:
                 last_date = ret[-1]["date"]
-            else:
-                last_date = 0
-        else:
-            last_date = 0
 
         # 这里再更新一条实时数据
         filepath = "./generated/portfolio/datas.json"
         filepath = os.path.join(grpInfo["path"], filepath)
         if os.path.exists(filepath):
-            f = open(filepath, "r")
+            json_data = self.__read_json__(filepath)
             try:
-                content = f.read()
-                json_data = json.loads(content)
                 fund = json_data["fund"]
                 if fund["date"] > last_date:
                     ret.append({
@@ -1218,7 +1194,6 @@ class DataMgr:
                     })
             except:
                 pass
-            f.close()
         return ret
 
     def get_group_positions(self, grpid:str):
@@ -1234,23 +1209,19 @@ class DataMgr:
             return []
         else:
             ret = list()
-            f = open(filepath, "r")
+            json_data = self.__read_json__(filepath)
             try:
-                content = f.read()
-                json_data = json.loads(content)
-
                 positions = json_data["positions"]
                 for pItem in positions:
                     if pItem["volume"] == 0:
                         continue
 
                     for dItem in pItem["details"]:
+                        dItem = dict(dItem)
                         dItem["code"] = pItem["code"]
                         ret.append(dItem)
             except:
                 pass
-
-            f.close()
             return ret
 
     def get_group_performances(self, grpid:str):
@@ -1266,11 +1237,8 @@ class DataMgr:
             return {}
         else:
             perf = dict()
-            f = open(filepath, "r")
+            json_data = self.__read_json__(filepath)
             try:
-                content = f.read()
-                json_data = json.loads(content)
-
                 positions = json_data["positions"]
                 for pItem in positions:
                     code = pItem['code']
@@ -1293,8 +1261,6 @@ class DataMgr:
                     
             except:
                 pass
-
-            f.close()
             return perf
 
     def get_group_filters(self, grpid:str):
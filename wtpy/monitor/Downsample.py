@@ -0,0 +1,175 @@
+'''
+图表数据降采样
+K线按桶合并成OHLC, 资金曲线用LTTB抽点并保留极值, 标记和指标对齐到同样的桶
+这样不管回测区间多长, 传给前端的数据量都只和图表的点数有关
+'''
+import numpy as np
+
+# 合并K线时需要累加的字段, 其他字段取桶内最后一根
+SUM_FIELDS = ("volume", "turnover", "diff")
+
+def bucket_starts(count:int, max_points:int) -> np.ndarray:
+    '''
+    把count条数据均匀切成max_points个桶
+    @return 每个桶的起始下标
+    '''
+    return np.unique(np.linspace(0, count, max_points + 1).astype(np.int64)[:-1])
+
+def clip_bars(columns:dict, stime:int = None, etime:int = None):
+    '''
+    按bartime截取视口内的K线
+    @columns    列式的K线数据, 必须有bartime列
+    @stime      开始时间, 为None则不限制
+    @etime      结束时间, 为None则不限制
+    @return     (截取后的列式数据, 截取用的布尔掩码), 不需要截取时掩码为None
+    '''
+    if stime is None and etime is None:
+        return columns, None
+
+    bartimes = columns["bartime"]
+    mask = np.ones(len(bartimes), dtype=bool)
+    if stime is not None:
+        mask &= (bartimes >= stime)
+    if etime is not None:
+        mask &= (bartimes <= etime)
+    return {key: col[mask] for key, col in columns.items()}, mask
+
+def downsample_bars(columns:dict, max_points:int):
+    '''
+    把K线合并成不超过max_points根
+    @columns    列式的K线数据, 包含open/high/low/close等字段, 每一列都是numpy数组
+    @max_points 最多输出的K线条数, 小于等于0则不合并
+    @return     (合并后的列式数据, 每个桶最后一根K线的下标), 不需要合并时下标为None
+    '''
+    count = len(next(iter(columns.values()))) if len(columns) > 0 else 0
+    if max_points <= 0 or count <= max_points:
+        return columns, None
+
+    starts = bucket_starts(count, max_points)
+    ends = np.append(starts[1:], count) - 1
+
+    ret = dict()
+    for key, col in columns.items():
+        if key == "open":
+            ret[key] = col[starts]
+        elif key == "high":
+            ret[key] = np.maximum.reduceat(col, starts)
+        elif key == "low":
+            ret[key] = np.minimum.reduceat(col, starts)
+        elif key in SUM_FIELDS:
+            ret[key] = np.add.reduceat(col, starts)
+        else:
+            # bartime、close等取桶内最后一根, 和K线的收盘时间保持一致
+            ret[key] = col[ends]
+    return ret, ends
+
+def align_marks(marks:list, bartimes:np.ndarray) -> list:
+    '''
+    把图表标记挪到所在桶的bartime上
+    @marks      标记列表, 每个标记有bartime字段
+    @bartimes   降采样以后的bartime, 升序
+    '''
+    if marks is None or len(marks) == 0 or len(bartimes) == 0:
+        return marks
+
+    markTimes = np.array([mark["bartime"] for mark in marks], dtype=np.int64)
+    # 每个桶的bartime是桶内最后一根K线的时间, 所以第一个不小于标记时间的桶就是标记所在的桶
+    idx = np.minimum(np.searchsorted(bartimes, markTimes, side="left"), len(bartimes) - 1)
+    newTimes = bartimes[idx].tolist()
+
+    ret = list()
+    for mark, bartime in zip(marks, newTimes):
+        mark = dict(mark)
+        mark["bartime"] = bartime
+        ret.append(mark)
+    return ret
+
+def align_index(index:list, count:int, mask:np.ndarray = None, ends:np.ndarray = None) -> list:
+    '''
+    指标线的数值按K线同样的方式截取和抽样
+    @index  图表指标, 格式同btchart.json中的index, 指标线的数值在values里
+    @count  原始K线条数, 只有数值个数和K线条数一致的指标线才处理
+    @mask   K线截取用的布尔掩码
+    @ends   K线合并时每个桶最后一根的下标
+    '''
+    if index is None or (mask is None and ends is None):
+        return index
+
+    ret = list()
+    for iInfo in index:
+        iInfo = dict(iInfo)
+        lines = list()
+        for lInfo in iInfo.get("lines", []):
+            lInfo = dict(lInfo)
+            if "values" in lInfo and len(lInfo["values"]) == count:
+                values = np.asarray(lInfo["values"])
+                if mask is not None:
+                    values = values[mask]
+                if ends is not None:
+                    values = values[ends]
+                lInfo["values"] = values.tolist()
+            lines.append(lInfo)
+        iInfo["lines"] = lines
+        ret.append(iInfo)
+    return ret
+
+def lttb_indices(y:np.ndarray, max_points:int, x:np.ndarray = None) -> np.ndarray:
+    '''
+    Largest-Triangle-Three-Buckets抽点, 保留曲线的形状
+    @y          曲线的纵坐标
+    @max_points 最多保留的点数
+    @x          曲线的横坐标, 为None则用下标
+    @return     保留的点的下标, 升序
+    '''
+    count = len(y)
+    if max_points <= 0 or count <= max_points:
+        return np.arange(count)
+    if max_points < 3:
+        return np.array([0, count - 1])[:max_points]
+
+    y = np.asarray(y, dtype=np.float64)
+    x = np.arange(count, dtype=np.float64) if x is None else np.asarray(x, dtype=np.float64)
+
+    # 首尾两个点固定保留, 中间的点分成max_points-2个桶
+    edges = np.linspace(1, count - 1, max_points - 1).astype(np.int64)
+    selected = np.empty(max_points, dtype=np.int64)
+    selected[0] = 0
+    selected[-1] = count - 1
+
+    a = 0
+    nBuckets = max_points - 2
+    for i in range(nBuckets):
+        lo = edges[i]
+        hi = edges[i + 1]
+        nlo = hi
+        nhi = edges[i + 2] if i + 2 <= nBuckets else count
+        avgX = x[nlo:nhi].mean()
+        avgY = y[nlo:nhi].mean()
+
+        # 和上一个选中点、下一个桶的均值点组成的三角形面积最大的点
+        area = np.abs((x[a] - avgX) * (y[lo:hi] - y[a]) - (x[a] - x[lo:hi]) * (avgY - y[a]))
+        a = lo + int(np.argmax(area))
+        selected[i + 1] = a
+
+    return selected
+
+def downsample_curve(rows:list, field:str, max_points:int) -> list:
+    '''
+    逐行的曲线数据用LTTB抽点, 最高点和最低点一定会保留
+    @rows       逐行的数据, 每一行是一个字典
+    @field      用来抽点的字段, 如资金曲线的dynbalance
+    @max_points 最多保留的点数, 小于等于0则不抽点
+    '''
+    if rows is None or max_points <= 0 or len(rows) <= max_points:
+        return rows
+
+    y = np.array([row[field] for row in rows], dtype=np.float64)
+    if max_points < 4:
+        # 点数太少, 不够LTTB加上极值点, 按极值点、首尾的顺序保留
+        idx = list(dict.fromkeys([int(np.argmax(y)), int(np.argmin(y)), 0, len(y) - 1]))[:max_points]
+        return [rows[i] for i in sorted(idx)]
+
+    # 留两个位置给极值点
+    idx = lttb_indices(y, max_points - 2)
+    idx = np.union1d(idx, [np.argmax(y), np.argmin(y)])
+    return [rows[i] for i in idx.tolist()]
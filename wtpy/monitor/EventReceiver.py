@@ -29,6 +29,14 @@ class EventSink:
         pass
 
 def decode_bytes(data:bytes):
+    '''
+    解码字节串, 先按utf-8解码, 失败了再用chardet检测编码
+    '''
+    try:
+        return data.decode("utf-8")
+    except UnicodeDecodeError:
+        pass
+
     ret = chardet.detect(data)
     if ret is not None:
         encoding = ret["encoding"]
@@ -38,7 +46,40 @@ def decode_bytes(data:bytes):
             return data.decode()
     else:
         return data.decode()
-    
+
+class MsgDecoder:
+    '''
+    消息解码器\n
+    先按utf-8解码, 失败了再用之前学到的编码(如gbk), 都不行才用chardet检测, 检测到的编码会记下来供后面的消息使用\n
+    每个接收端一个, 不同的消息源可以用不同的编码
+    '''
+    def __init__(self, fallback:str = None):
+        '''
+        @fallback   预设的备用编码, 为None则由chardet检测
+        '''
+        self.fallback = fallback
+
+    def decode(self, data:bytes) -> str:
+        try:
+            return data.decode("utf-8")
+        except UnicodeDecodeError:
+            pass
+
+        if self.fallback is not None:
+            try:
+                return data.decode(self.fallback)
+            except UnicodeDecodeError:
+                pass
+
+        ret = chardet.detect(data)
+        encoding = ret["encoding"] if ret is not None else None
+        if encoding is None:
+            return data.decode("utf-8", errors="replace")
+
+        message = data.decode(encoding, errors="replace")
+        self.fallback = encoding
+        return message
+
 mq = None
 
 class EventReceiver(WtMQClient):
@@ -57,34 +98,55 @@ class EventReceiver(WtMQClient):
         self._stopped = False
         self._worker = None
         self._sink = sink
+        self._decoder = MsgDecoder()
+
+        # 直接按原始的topic字节分发, 不用再解码topic
+        self._handlers = {
+            TOPIC_RT_TRADE.encode(): self.__on_trade__,
+            TOPIC_RT_ORDER.encode(): self.__on_order__,
+            TOPIC_RT_NOTIFY.encode(): self.__on_notify__,
+            TOPIC_RT_LOG.encode(): self.__on_log__,
+            TOPIC_TIMEOUT.encode(): self.__on_timeout__
+        }
+
+    def __on_trade__(self, message:str):
+        msgObj = json.loads(message)
+        trader = msgObj["trader"]
+        msgObj.pop("trader")
+        self._sink.on_trade(trader, msgObj)
+
+    def __on_order__(self, message:str):
+        msgObj = json.loads(message)
+        trader = msgObj["trader"]
+        msgObj.pop("trader")
+        self._sink.on_order(trader, msgObj)
+
+    def __on_notify__(self, message:str):
+        msgObj = json.loads(message)
+        trader = msgObj["trader"]
+        self._sink.on_notify(trader, msgObj["message"])
+
+    def __on_log__(self, message:str):
+        msgObj = json.loads(message)
+        self._sink.on_log(msgObj["tag"], msgObj["time"], msgObj["message"])
+
+    def __on_timeout__(self, message:str):
+        self._sink.on_timeout()
+
+    def on_mq_message(self, topic:bytes, message, dataLen:int):
+        if self._sink is None:
+            return
+
+        handler = self._handlers.get(topic)
+        if handler is None:
+            return
 
-    def on_mq_message(self, topic:str, message:str, dataLen:int):
-        topic = decode_bytes(topic)
         if dataLen > 0:
-            message = decode_bytes(message[:dataLen])
+            message = self._decoder.decode(message[:dataLen])
         else:
             message = None
-            
-        if self._sink is not None:
-            if topic == TOPIC_RT_TRADE:
-                msgObj = json.loads(message)
-                trader = msgObj["trader"]
-                msgObj.pop("trader")
-                self._sink.on_trade(trader, msgObj)
-            elif topic == TOPIC_RT_ORDER:
-                msgObj = json.loads(message)
-                trader = msgObj["trader"]
-                msgObj.pop("trader")
-                self._sink.on_order(trader, msgObj)
-            elif topic == TOPIC_RT_NOTIFY:
-                msgObj = json.loads(message)
-                trader = msgObj["trader"]
-                self._sink.on_notify(trader, msgObj["message"])
-            elif topic == TOPIC_RT_LOG:
-                msgObj = json.loads(message)
-                self._sink.on_log(msgObj["tag"], msgObj["time"], msgObj["message"])
-            elif topic == TOPIC_TIMEOUT:
-                self._sink.on_timeout()
+
+        handler(message)
 
     def run(self):
         self.start()
@@ -97,6 +159,11 @@ TOPIC_BT_EVENT  = "BT_EVENT"    # 回测环境下的事件，主要通知回测
 TOPIC_BT_STATE  = "BT_STATE"    # 回测的状态
 TOPIC_BT_FUND   = "BT_FUND"     # 每日资金变化
 
+# 按原始字节分发用的topic
+TOPIC_BT_EVENT_B = TOPIC_BT_EVENT.encode()
+TOPIC_BT_STATE_B = TOPIC_BT_STATE.encode()
+TOPIC_BT_FUND_B = TOPIC_BT_FUND.encode()
+
 class BtEventSink:
     def __init__(self):
         pass
@@ -128,22 +195,23 @@ class BtEventReceiver(WtMQClient):
         self._stopped = False
         self._worker = None
         self._sink = sink
-
-    def on_mq_message(self, topic:str, message:str, dataLen:int):
-        topic = decode_bytes(topic)
-        message = decode_bytes(message[:dataLen])
-        if self._sink is not None:
-            if topic == TOPIC_BT_EVENT:
-                if message == 'BT_START':
-                    self._sink.on_begin()
-                else:
-                    self._sink.on_finish()
-            elif topic == TOPIC_BT_STATE:
-                msgObj = json.loads(message)
-                self._sink.on_state(msgObj)
-            elif topic == TOPIC_BT_FUND:
-                msgObj = json.loads(message)
-                self._sink.on_fund(msgObj)
+        self._decoder = MsgDecoder()
+
+    def on_mq_message(self, topic:bytes, message, dataLen:int):
+        if self._sink is None:
+            return
+
+        if topic == TOPIC_BT_EVENT_B:
+            if message[:dataLen] == b'BT_START':
+                self._sink.on_begin()
+            else:
+                self._sink.on_finish()
+        elif topic == TOPIC_BT_STATE_B:
+            msgObj = json.loads(self._decoder.decode(message[:dataLen]))
+            self._sink.on_state(msgObj)
+        elif topic == TOPIC_BT_FUND_B:
+            msgObj = json.loads(self._decoder.decode(message[:dataLen]))
+            self._sink.on_fund(msgObj)
 
     def run(self):
         self.start()
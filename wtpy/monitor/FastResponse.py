@@ -0,0 +1,187 @@
+'''
+数据接口的响应工具
+1、列式数据: 每个字段一个数组, 不用每一行都重复一遍字段名
+2、快速序列化: 装了orjson就用orjson, 可以直接序列化numpy数组
+3、响应压缩: 客户端支持br并且装了brotli就用brotli, 否则用gzip
+orjson和brotli都是可选依赖, 没有安装的时候退回到json和gzip
+'''
+import json
+
+import numpy as np
+from fastapi.middleware.gzip import GZipMiddleware
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.responses import JSONResponse
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+def to_columns(rows:list, fields:list = None) -> dict:
+    '''
+    把逐行的字典列表转成列式数据
+    @rows   逐行的数据, 每一行是一个字典
+    @fields 要输出的字段, 为None则用第一行的全部字段
+    @return {字段名: 数组}
+    '''
+    if rows is None:
+        return None
+
+    if fields is None:
+        fields = list(rows[0].keys()) if len(rows) > 0 else []
+
+    return {field: [row[field] for row in rows] for field in fields}
+
+def pack_rows(rows:list, columnar:bool = False):
+    '''
+    按请求的格式输出逐行的数据
+    @rows       逐行的数据, 每一行是一个字典
+    @columnar   是否转成列式数据
+    '''
+    return to_columns(rows) if columnar else rows
+
+def np_to_columns(data:np.ndarray, fields:list = None) -> dict:
+    '''
+    结构化数组转成列式数据\n
+    结构化数组的单个字段是带步长的视图, orjson只能序列化连续的数组, 所以每一列都拷贝成连续数组
+    @data   numpy结构化数组
+    @fields 要输出的字段, 为None则输出全部字段
+    '''
+    if fields is None:
+        fields = data.dtype.names
+    return {field: np.ascontiguousarray(data[field]) for field in fields}
+
+def np_to_rows(data:np.ndarray, fields:list = None) -> list:
+    '''
+    结构化数组转成逐行的字典列表
+    @data   numpy结构化数组
+    @fields 要输出的字段, 为None则输出全部字段
+    '''
+    if fields is None:
+        fields = data.dtype.names
+    else:
+        data = data[list(fields)]
+    return [dict(zip(fields, item)) for item in data.tolist()]
+
+def json_default(obj):
+    '''
+    标准json库处理不了的numpy类型
+    '''
+    if isinstance(obj, np.ndarray):
+        return obj.tolist()
+    if isinstance(obj, np.generic):
+        return obj.item()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+class FastJSONResponse(JSONResponse):
+    '''
+    JSON响应, 装了orjson就用orjson序列化, 数据里可以直接放numpy数组\n
+    接口直接返回这个对象的时候, fastapi不会再对数据逐个做jsonable_encoder, 大数据量的时候差别很明显
+    '''
+
+    def render(self, content) -> bytes:
+        if orjson is not None:
+            # 不连续的数组orjson会交给default处理
+            return orjson.dumps(content, option=orjson.OPT_SERIALIZE_NUMPY|orjson.OPT_NON_STR_KEYS, default=json_default)
+
+        return json.dumps(content, ensure_ascii=False, allow_nan=False, separators=(",", ":"), default=json_default).encode("utf-8")
+
+class CompressMiddleware:
+    '''
+    响应压缩中间件\n
+    客户端支持br并且装了brotli的时候用brotli压缩, 其他情况交给GZipMiddleware
+    '''
+
+    # 已经压缩过的内容不再压缩
+    EXCLUDED_TYPES = ("image/", "audio/", "video/", "font/", "application/zip", "application/gzip", "text/event-stream")
+
+    def __init__(self, app, minimum_size:int = 1000, gzip_level:int = 6, brotli_quality:int = 5):
+        '''
+        @minimum_size   小于这个长度的响应不压缩
+        @gzip_level     gzip压缩级别
+        @brotli_quality brotli压缩质量, 0-11, 越大越慢
+        '''
+        self.app = app
+        self.minimum_size = minimum_size
+        self.brotli_quality = brotli_quality
+        self.gzip = GZipMiddleware(app, minimum_size=minimum_size, compresslevel=gzip_level)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or brotli is None or "br" not in Headers(scope=scope).get("Accept-Encoding", ""):
+            await self.gzip(scope, receive, send)
+            return
+
+        responder = BrotliResponder(send, self.minimum_size, self.brotli_quality)
+        await self.app(scope, receive, responder.send)
+
+class BrotliResponder:
+    '''
+    单个请求的brotli压缩, 整块的响应一次压缩, 流式的响应边发送边压缩
+    '''
+
+    def __init__(self, send, minimum_size:int, quality:int):
+        self.__send__ = send
+        self.minimum_size = minimum_size
+        self.quality = quality
+        self.start_message = None
+        self.bypass = False
+        self.started = False
+        self.compressor = None
+
+    async def send(self, message):
+        msgType = message["type"]
+        if msgType == "http.response.start":
+            # 先不发送, 等看到响应体再决定头部怎么改
+            self.start_message = message
+            headers = Headers(raw=message["headers"])
+            contentType = headers.get("content-type", "")
+            self.bypass = "content-encoding" in headers or message["status"] == 206 or contentType.startswith(CompressMiddleware.EXCLUDED_TYPES)
+            if self.bypass:
+                await self.__send__(message)
+            return
+
+        if msgType != "http.response.body" or self.bypass:
+            if not self.started and self.start_message is not None and not self.bypass:
+                self.started = True
+                await self.__send__(self.start_message)
+            await self.__send__(message)
+            return
+
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+        if not self.started:
+            self.started = True
+            headers = MutableHeaders(raw=self.start_message["headers"])
+            headers.add_vary_header("Accept-Encoding")
+            if not more_body and len(body) < self.minimum_size:
+                await self.__send__(self.start_message)
+                await self.__send__(message)
+                return
+
+            headers["Content-Encoding"] = "br"
+            if more_body:
+                del headers["Content-Length"]
+                self.compressor = brotli.Compressor(quality=self.quality)
+                message["body"] = self.compressor.process(body) + self.compressor.flush()
+            else:
+                message["body"] = brotli.compress(body, quality=self.quality)
+                headers["Content-Length"] = str(len(message["body"]))
+            await self.__send__(self.start_message)
+            await self.__send__(message)
+            return
+
+        if self.compressor is None:
+            # 首块没有压缩, 后面的也原样发送
+            await self.__send__(message)
+            return
+
+        if more_body:
+            message["body"] = self.compressor.process(body) + self.compressor.flush()
+        else:
+            message["body"] = self.compressor.process(body) + self.compressor.finish()
+        await self.__send__(message)
@@ -4,39 +4,93 @@ from .WtLogger import WtLogger
 import asyncio
 import json
 import threading
-import time
+from collections import deque
+
+class PushClient:
+    '''
+    推送连接\n
+    每个websocket连接有一个有界的发送队列和一个发送协程, 慢的连接只会丢自己的消息, 不会拖慢其他连接
+    '''
+
+    def __init__(self, ws:WebSocket, max_pending:int = 1000):
+        self.ws = ws
+        self.max_pending = max_pending
+        self.pending = deque()
+        self.dropped = 0
+        self.event = asyncio.Event()
+        self.task:asyncio.Task = None
+
+    def push(self, msgType:str, text:str):
+        '''
+        放入发送队列, 队列满了优先丢弃最早的日志消息
+        '''
+        self.pending.append((msgType, text))
+        if len(self.pending) > self.max_pending:
+            for idx, item in enumerate(self.pending):
+                if item[0] == "gplog":
+                    del self.pending[idx]
+                    break
+            else:
+                self.pending.popleft()
+            self.dropped += 1
+        self.event.set()
+
+    async def run(self):
+        try:
+            while True:
+                await self.event.wait()
+                self.event.clear()
+                while len(self.pending) > 0:
+                    msgType, text = self.pending.popleft()
+                    await self.ws.send_text(text)
+        except asyncio.CancelledError:
+            pass
+        except Exception:
+            # 连接已经断开, 由接收端负责清理
+            pass
 
 class PushServer:
 
-    def __init__(self, app:FastAPI, dataMgr, logger:WtLogger = None):
+    def __init__(self, app:FastAPI, dataMgr, logger:WtLogger = None, max_pending:int = 1000):
+        '''
+        @max_pending    每个连接最多缓存的待发送消息数, 超过以后丢弃最早的日志
+        '''
         self.app = app
         self.dataMgr = dataMgr
         self.logger = logger
         self.ready = False
+        self.max_pending = max_pending
 
-        self.active_connections = list()
-
-        self.lock = threading.Lock()
+        self.active_connections = dict()    # ws -> PushClient
+        self.svr_loop:asyncio.AbstractEventLoop = None
 
         self.mutex = threading.Lock()
         self.messages = list()
-        self.worker:threading.Thread = None
-        self.stopped = False
+        self.flush_pending = False
 
     async def connect(self, ws: WebSocket):
         # 等待连接
         await ws.accept()
 
+        # 推送都在服务的事件循环里完成
+        self.svr_loop = asyncio.get_running_loop()
+
         if "tokeninfo" in ws.session:
             tInfo = ws.session["tokeninfo"]
             if tInfo is not None:
                 self.logger.info(f"{tInfo['loginid']} connected")
-            # 存储ws连接对象
-            self.active_connections.append(ws)
+            # 存储ws连接对象, 并启动发送协程
+            client = PushClient(ws, self.max_pending)
+            client.task = asyncio.create_task(client.run())
+            self.active_connections[ws] = client
 
     def disconnect(self, ws: WebSocket):
         # 关闭时 移除ws对象
-        self.active_connections.remove(ws)
+        client = self.active_connections.pop(ws, None)
+        if client is not None:
+            client.task.cancel()
+            if client.dropped > 0 and self.logger is not None:
+                self.logger.info(f"{client.dropped} messages dropped for slow connection")
         if "tokeninfo" in ws.session:
             tInfo = ws.session["tokeninfo"]
             if tInfo is not None:
@@ -47,31 +101,65 @@ class PushServer:
         # 发送个人消息
         await ws.send_json(data)
 
+    @staticmethod
+    def dumps(data:dict) -> str:
+        # 和WebSocket.send_json的格式保持一致
+        return json.dumps(data, separators=(",", ":"), ensure_ascii=False)
+
     def broadcast(self, data: dict, groupid:str=""):
-        self.lock.acquire()
+        '''
+        广播消息, 可以在任意线程调用, 消息会交给服务的事件循环发送
+        '''
+        if self.svr_loop is None or len(self.active_connections) == 0:
+            return
 
-        loop = None
+        self.mutex.acquire()
+        self.messages.append((data, groupid))
+        bNeedFlush = not self.flush_pending
+        self.flush_pending = True
+        self.mutex.release()
+
+        # 已经有一次flush在排队了, 这条消息会跟着一起发出去
+        if bNeedFlush:
+            asyncio.run_coroutine_threadsafe(self.flush(), self.svr_loop)
+
+    async def flush(self):
+        '''
+        在服务的事件循环里把积压的消息分发到各个连接的发送队列\n
+        单条消息出错只丢弃这一条, 无论怎么退出都会复位flush_pending, 后续的广播才能再次触发flush
+        '''
         try:
-            loop = asyncio.get_event_loop()
-        except:
-            loop = None
-        
-        if loop is None or loop.is_closed():
-            loop = asyncio.new_event_loop()
-            asyncio.set_event_loop(loop)
-
-        tasks = []
-        # 广播消息
-        for ws in self.active_connections:
-            if len(groupid)!=0 and "groupid" in ws.session and ws.session["groupid"]!=groupid:
-                continue
-            tasks.append(asyncio.ensure_future(ws.send_json(data)))
-        
-        if len(tasks) > 0:            
-            loop.run_until_complete(asyncio.gather(*tasks))
-
-        loop.close()
-        self.lock.release()
+            while True:
+                self.mutex.acquire()
+                messages = self.messages
+                self.messages = list()
+                if len(messages) == 0:
+                    self.flush_pending = False
+                self.mutex.release()
+
+                if len(messages) == 0:
+                    return
+
+                for idx, (data, groupid) in enumerate(messages):
+                    try:
+                        # 每条消息只序列化一次
+                        text = self.dumps(data)
+                        for ws, client in list(self.active_connections.items()):
+                            if len(groupid)!=0 and "groupid" in ws.session and ws.session["groupid"]!=groupid:
+                                continue
+                            client.push(data["type"], text)
+                    except Exception as e:
+                        if self.logger is not None:
+                            self.logger.error(f"failed to push message {data!r}: {e}")
+
+                    # 消息很多的时候让出事件循环, 让各连接的发送协程有机会发送
+                    if idx % 64 == 63:
+                        await asyncio.sleep(0)
+        finally:
+            # 异常退出(比如被取消)时也要复位, 没发完的消息留给下一次flush
+            self.mutex.acquire()
+            self.flush_pending = False
+            self.mutex.release()
 
     def on_subscribe_group(self, ws:WebSocket, data:dict):
         if ws not in self.active_connections:
@@ -84,6 +172,15 @@ class PushServer:
         ws.session["groupid"] = data["groupid"]
         self.logger.info("{}@{} subscribed group {}".format(tokenInfo["loginid"], tokenInfo["loginip"] , data["groupid"]))
 
+    async def reply(self, ws:WebSocket, data:dict):
+        # 注册过的连接回复也走发送队列, 避免和广播同时写一个连接
+        # 没有登录信息的连接不接收广播, 没有发送队列, 直接发送
+        client = self.active_connections.get(ws)
+        if client is not None:
+            client.push(data.get("type", ""), self.dumps(data))
+        else:
+            await self.send_personal_message(data, ws)
+
     def run(self):
         app = self.app
         @app.websocket("/")
@@ -97,9 +194,9 @@ class PushServer:
                         tp = req["type"]
                         if tp == 'subscribe':
                             self.on_subscribe_group(ws,req)
-                            await self.send_personal_message(req, ws)
+                            await self.reply(ws, req)
                         elif tp == 'heartbeat':
-                            await self.send_personal_message({"type":"heartbeat", "message":"pong"}, ws)
+                            await self.reply(ws, {"type":"heartbeat", "message":"pong"})
                     except:
                         continue
 
@@ -107,46 +204,20 @@ class PushServer:
                 self.disconnect(ws)
         self.ready = True
 
-        self.worker = threading.Thread(target=self.loop, daemon=True)
-        self.worker.start()
-
-    def loop(self):
-        while not self.stopped:
-            if len(self.messages) == 0:
-                time.sleep(1)
-                continue
-            
-            self.mutex.acquire()
-            messages = self.messages.copy()
-            self.messages = []
-            self.mutex.release()
-
-            for msg in messages:
-                if msg["type"] == "gplog":
-                    self.broadcast(msg, msg["groupid"])
-                else:
-                    self.broadcast(msg)
-
     def notifyGrpLog(self, groupid, tag:str, time:int, message):
         if not self.ready:
             return
 
-        self.mutex.acquire()
-        self.messages.append({"type":"gplog", "groupid":groupid, "tag":tag, "time":time, "message":message})
-        self.mutex.release()
+        self.broadcast({"type":"gplog", "groupid":groupid, "tag":tag, "time":time, "message":message}, groupid)
 
     def notifyGrpEvt(self, groupid, evttype):
         if not self.ready:
             return
 
-        self.mutex.acquire()
-        self.messages.append({"type":"gpevt", "groupid":groupid, "evttype":evttype})
-        self.mutex.release()
+        self.broadcast({"type":"gpevt", "groupid":groupid, "evttype":evttype})
 
     def notifyGrpChnlEvt(self, groupid, chnlid, evttype, data):
         if not self.ready:
             return
 
-        self.mutex.acquire()
-        self.messages.append({"type":"chnlevt", "groupid":groupid, "channel":chnlid, "data":data, "evttype":evttype})
-        self.mutex.release()
\ No newline at end of file
+        self.broadcast({"type":"chnlevt", "groupid":groupid, "channel":chnlid, "data":data, "evttype":evttype})
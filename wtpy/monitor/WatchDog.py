@@ -47,6 +47,83 @@ class WatcherSink:
         pass
 
 
+class ProcScanner:
+    '''
+    进程扫描器\n
+    只读取新出现的进程的命令行, 按pid和创建时间缓存, 进程退出以后再清理\n
+    每一轮最多扫描一次, 并且只有应用需要挂载进程的时候才扫描
+    '''
+    # 刚创建的进程可能还没exec, 命令行还是父进程的, 这段时间内不缓存
+    FRESH_SPAN = 5
+
+    def __init__(self):
+        self.__procs__ = dict()     # pid -> (create_time, 大写的命令行)
+        self.__expired__ = True
+
+    def expire(self):
+        '''
+        进入新的一轮, 下次查找时重新扫描
+        '''
+        self.__expired__ = True
+
+    def __refresh__(self):
+        pids = set(psutil.pids())
+        for pid in list(self.__procs__.keys()):
+            if pid not in pids:
+                self.__procs__.pop(pid)
+
+        now = time.time()
+        for pid in pids:
+            try:
+                pInfo = psutil.Process(pid)
+                createTime = pInfo.create_time()
+            except psutil.Error:
+                pInfo = None
+                createTime = 0
+
+            # 创建时间没变就是同一个进程, 不用再读命令行, 变了说明pid被复用了, 要重新读取
+            cached = self.__procs__.get(pid)
+            if cached is not None and cached[0] == createTime:
+                continue
+
+            if createTime != 0 and now - createTime < self.FRESH_SPAN:
+                self.__procs__.pop(pid, None)
+                continue
+
+            try:
+                cmdLine = ' '.join(pInfo.cmdline()).upper() if pInfo is not None else ''
+            except psutil.Error:
+                # 没有权限的系统进程, 缓存为空命令行, 创建时间不变就不再读取
+                cmdLine = ''
+            self.__procs__[pid] = (createTime, cmdLine)
+
+        self.__expired__ = False
+
+    def find(self, cmdLine:str) -> psutil.Process:
+        '''
+        按命令行查找进程
+        @cmdLine    命令行, 不区分大小写
+        @return     进程句柄, 找不到返回None
+        '''
+        if self.__expired__:
+            self.__refresh__()
+
+        cmdLine = cmdLine.upper()
+        for pid, (createTime, procCmd) in list(self.__procs__.items()):
+            if procCmd != cmdLine:
+                continue
+
+            try:
+                pInfo = psutil.Process(pid)
+                if pInfo.create_time() == createTime:
+                    return pInfo
+            except psutil.Error:
+                pass
+
+            # 进程已经退出或者pid被复用了, 缓存作废, 下次扫描时重新读取
+            self.__procs__.pop(pid)
+        return None
+
 class ActionType(Enum):
     '''
     操作类型
@@ -68,7 +145,10 @@ class AppState(Enum):
     AS_Closing      = 905
 
 class AppInfo(EventSink):
-    def __init__(self, appConf:dict, sink:WatcherSink = None, logger:WtLogger=None):
+    def __init__(self, appConf:dict, sink:WatcherSink = None, logger:WtLogger=None, mem_span:int = 10):
+        '''
+        @mem_span   内存占用的采样间隔, 单位秒
+        '''
         self.__info__ = appConf
 
         self._cmd_line = None
@@ -76,6 +156,7 @@ class AppInfo(EventSink):
         self.__logger__ = logger
 
         self._lock = threading.Lock()
+        self._exit_lock = threading.Lock()
         self._id = appConf["id"]
         self._check_span = appConf["span"]
         self._guard = appConf["guard"]
@@ -90,8 +171,11 @@ class AppInfo(EventSink):
         self._ticks = 0
         self._state = AppState.AS_NotRunning
         self._procid = None
+        self._proc = None       # 进程句柄, psutil.Process
         self._sink = sink
         self._mem = 0
+        self._mem_span = mem_span
+        self._mem_time = 0
 
         self._evt_receiver = None
 
@@ -134,45 +218,75 @@ class AppInfo(EventSink):
             self._cmd_line = (self.__info__["path"] + " " + fullPath) if fullPath != "" else self.__info__["path"]
         return self._cmd_line
 
-    def is_running(self, pids) -> bool:
+    def __sample_memory__(self, force:bool = False):
+        now = time.time()
+        if not force and now - self._mem_time < self._mem_span:
+            return
+
+        self._mem_time = now
+        try:
+            self._mem = self._proc.memory_info().rss
+        except psutil.Error:
+            pass
+
+    def __wait_proc__(self, proc:subprocess.Popen, pInfo:psutil.Process):
+        '''
+        等待子进程退出, 退出以后马上更新状态, 不用等下一次检查
+        '''
+        proc.wait()
+        self.__on_exited__(pInfo)
+
+    def __on_exited__(self, pInfo:psutil.Process):
+        with self._exit_lock:
+            # 等待线程和定时检查可能同时发现进程退出, 只处理一次
+            if self._proc is not pInfo or self._state != AppState.AS_Running:
+                return
+
+            self._state = AppState.AS_NotRunning
+            self._procid = None
+            self._proc = None
+            self._mem = 0
+
+        self.__logger__.info("应用%s的已停止" % (self._id))
+        if self._sink is not None:
+            self._sink.on_stop(self._id, True)
+
+    def is_running(self, scanner:ProcScanner) -> bool:
         if self._state == AppState.AS_Closing:
             return True
 
         if self._state == AppState.AS_Closed:
             return False
-            
-        bNeedCheck = (self._procid is None) or (not psutil.pid_exists(self._procid))
-        if bNeedCheck:
-            for pid in pids:
-                try:
-                    pInfo = psutil.Process(pid)
-                    cmdLine = pInfo.cmdline()
-                    if len(cmdLine) == 0:
-                        continue
-                    # print(cmdLine)
-                    cmdLine = ' '.join(cmdLine)
-                    if self.cmd_line.upper() == cmdLine.upper():
-                        self._procid = pid
-                        self._mem = pInfo.memory_info().rss
-                        self.__logger__.info("应用%s挂载成功，进程ID: %d" % (self._id, self._procid))
-     
-                        if self._mq_url != '':
-                            # 如果事件接收器为空或者url发生了改变，则需要重新创建
-                            bNeedCreate = self._evt_receiver is None or self._evt_receiver.url != self._mq_url
-                            if bNeedCreate:
-                                if self._evt_receiver is not None:
-                                    self._evt_receiver.release()
-                                self._evt_receiver = EventReceiver(url=self._mq_url, logger=self.__logger__, sink=self)
-                                self._evt_receiver.run()
-                                self.__logger__.info("应用%s开始接收%s的通知信息" % (self._id, self._mq_url))
-                        return True
-                except:
-                    pass
+
+        # 已经有进程句柄的, 只检查这一个进程, is_running会比较创建时间, pid被复用也能识别
+        pInfo = self._proc
+        if pInfo is not None:
+            try:
+                if pInfo.is_running() and pInfo.status() != psutil.STATUS_ZOMBIE:
+                    self.__sample_memory__()
+                    return True
+            except psutil.Error:
+                pass
+            return False
+
+        pInfo = scanner.find(self.cmd_line)
+        if pInfo is None:
             return False
-        else:
-            pInfo = psutil.Process(self._procid)
-            self._mem = pInfo.memory_info().rss
 
+        self._proc = pInfo
+        self._procid = pInfo.pid
+        self.__sample_memory__(True)
+        self.__logger__.info("应用%s挂载成功，进程ID: %d" % (self._id, self._procid))
+
+        if self._mq_url != '':
+            # 如果事件接收器为空或者url发生了改变，则需要重新创建
+            bNeedCreate = self._evt_receiver is None or self._evt_receiver.url != self._mq_url
+            if bNeedCreate:
+                if self._evt_receiver is not None:
+                    self._evt_receiver.release()
+                self._evt_receiver = EventReceiver(url=self._mq_url, logger=self.__logger__, sink=self)
+                self._evt_receiver.run()
+                self.__logger__.info("应用%s开始接收%s的通知信息" % (self._id, self._mq_url))
         return True
 
     def run(self):
@@ -193,11 +307,15 @@ class AppInfo(EventSink):
             args.insert(0, self.__info__["path"])
 
             if isWindows():
-                self._procid = subprocess.Popen(args,
-                                cwd=self.__info__["folder"], creationflags=subprocess.CREATE_NEW_CONSOLE).pid
+                proc = subprocess.Popen(args,
+                                cwd=self.__info__["folder"], creationflags=subprocess.CREATE_NEW_CONSOLE)
             else:
-                self._procid = subprocess.Popen(args, 
-                                cwd=self.__info__["folder"]).pid
+                proc = subprocess.Popen(args, 
+                                cwd=self.__info__["folder"])
+            self._procid = proc.pid
+            self._proc = psutil.Process(proc.pid)
+            self._mem_time = 0
+            threading.Thread(target=self.__wait_proc__, args=(proc, self._proc), daemon=True).start()
             
             self._cmd_line = (self.__info__["path"] + " " + self.__info__["param"]) if self.__info__["param"] != "" else self.__info__["path"]
             self.__logger__.info(f"cmdline: {self._cmd_line}, cwd:{self.__info__['folder']}")
@@ -216,11 +334,13 @@ class AppInfo(EventSink):
 
         self._state = AppState.AS_Closing
         try:
-            if isWindows():
+            if self._proc is not None:
+                self._proc.kill()
+            elif isWindows():
                 os.system("taskkill /f /pid " + str(self._procid))
             else:
                 os.system("kill -9 " + str(self._procid))
-        except SystemError as e:
+        except (SystemError, psutil.Error) as e:
             self.__logger__.error("关闭异常: {}" % (e))
             pass
 
@@ -229,6 +349,8 @@ class AppInfo(EventSink):
         if self._sink is not None:
             self._sink.on_stop(self._id, False)
         self._procid = None
+        self._proc = None
+        self._mem = 0
 
     def restart(self):
         if self._procid is not None:
@@ -236,22 +358,17 @@ class AppInfo(EventSink):
         
         self.run()
 
-    def update_state(self, pids):
-        if self.is_running(pids):
+    def update_state(self, scanner:ProcScanner):
+        if self.is_running(scanner):
             self._state = AppState.AS_Running
         elif self._state == AppState.AS_Running:
-            self._state = AppState.AS_NotRunning
-            self.__logger__.info("应用%s的已停止" % (self._id))
-            self._procid = None
-            self._mem = 0
-            if self._sink is not None:
-                self._sink.on_stop(self._id, True)
+            self.__on_exited__(self._proc)
 
-    def tick(self, pids):
+    def tick(self, scanner:ProcScanner):
         self._ticks += 1
 
         if self._ticks == self._check_span:
-            self.update_state(pids)
+            self.update_state(scanner)
             if self._state == AppState.AS_NotRunning and self._guard:
                 self.__logger__.info("应用%s未启动，正在自动重启" % (self._id))
                 thrd = threading.Thread(target=self.run, daemon=True)
@@ -353,7 +470,10 @@ class AppInfo(EventSink):
 
 class WatchDog:
 
-    def __init__(self, db, sink:WatcherSink = None, logger:WtLogger=None):
+    def __init__(self, db, sink:WatcherSink = None, logger:WtLogger=None, mem_span:int = 10):
+        '''
+        @mem_span   应用内存占用的采样间隔, 单位秒
+        '''
         self.__db_conn__ = db
         self.__apps__ = dict()
         self.__app_conf__ = dict()
@@ -361,6 +481,8 @@ class WatchDog:
         self.__worker__ = None
         self.__sinks__ = sink
         self.__logger__ = logger
+        self.__mem_span__ = mem_span
+        self.__scanner__ = ProcScanner()
 
         mq = WtMsgQue(logger)
 
@@ -388,17 +510,18 @@ class WatchDog:
             appConf["schedule"]["tasks"].append(json.loads(row[16]))
             appConf["schedule"]["tasks"].append(json.loads(row[17]))
             self.__app_conf__[appConf["id"]] = appConf
-            self.__apps__[appConf["id"]] = AppInfo(appConf, sink, self.__logger__)
+            self.__apps__[appConf["id"]] = AppInfo(appConf, sink, self.__logger__, self.__mem_span__)
 
 
     def __watch_impl__(self):
         while not self.__stopped__:
             time.sleep(1)
-            pids = psutil.pids()
-            for appid in self.__apps__:
+            # 进程列表不再每秒全量扫描, 只有应用需要挂载进程的时候才扫描, 并且只读取新进程的命令行
+            self.__scanner__.expire()
+            for appid in list(self.__apps__.keys()):
                 appInfo = self.__apps__[appid]
 
-                appInfo.tick(pids)
+                appInfo.tick(self.__scanner__)
 
     def get_apps(self):
         ret = {}
@@ -494,7 +617,7 @@ class WatchDog:
         isNewApp = False
         if appid not in self.__apps__:
             isNewApp = True
-            self.__apps__[appid] = AppInfo(appConf, self.__sinks__, self.__logger__)
+            self.__apps__[appid] = AppInfo(appConf, self.__sinks__, self.__logger__, self.__mem_span__)
         else:
             appInst = self.__apps__[appid]
             appInst.applyConf(appConf)
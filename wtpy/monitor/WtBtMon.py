@@ -10,6 +10,7 @@ import shutil
 import json
 import threading
 import time
+import numpy as np
 
 from wtpy import WtDtServo
 from .WtLogger import WtLogger
@@ -635,6 +636,9 @@ class WtBtMon(BtTaskSink):
         thisBts[btid]["state"] = stateObj
 
     def get_bt_kline(self, user:str, straid:str, btid:str) -> list:
+        '''
+        读取回测的K线
+        '''
         if self.dt_servo is None:
             return None
 
@@ -658,23 +662,21 @@ class WtBtMon(BtTaskSink):
             if barList is None:
                 return None
 
-            bars = list()
-            for realBar in barList:
-                bar = dict()
-                if period[0] == 'd':
-                    bar["time"] = realBar.date
-                else:
-                    bar["time"] = 1990*100000000 + realBar.time
-                    bar["bartime"] = bar["time"]
-                    bar["open"] = realBar.open
-                    bar["high"] = realBar.high
-                    bar["low"] = realBar.low
-                    bar["close"] = realBar.close
-                    bar["volume"] = realBar.volume
-                bars.append(bar)
-            thisBts[btid]["kline"] = bars
-
-        return thisBts[btid]["kline"]
+            # 缓存列式数据, 每列拷贝一份连续的数组, 不引用数据伺服返回的内存
+            npBars = barList.ndarray
+            columns = dict()
+            if period[0] == 'd':
+                columns["time"] = npBars["date"].astype(np.int64)
+            else:
+                columns["time"] = 1990*100000000 + npBars["time"].astype(np.int64)
+                columns["bartime"] = columns["time"]
+            for field in ["open", "high", "low", "close", "volume"]:
+                columns[field] = np.ascontiguousarray(npBars[field])
+            thisBts[btid]["kline"] = columns
+
+        columns = thisBts[btid]["kline"]
+        fields = list(columns.keys())
+        return [dict(zip(fields, item)) for item in zip(*[col.tolist() for col in columns.values()])]
 
     def run_backtest(self, user:str, straid:str, fromTime:int, endTime:int, capital:float, slippage:int=0) -> dict:
         if user not in self.user_bts:
@@ -6,13 +6,94 @@ import pytz
 from fastapi import FastAPI, Body
 from starlette.responses import RedirectResponse
 from fastapi.staticfiles import StaticFiles
-from fastapi.middleware.gzip import GZipMiddleware
 from starlette.middleware.sessions import SessionMiddleware
 import uvicorn
 import pandas as pd
 import numpy as np
 
 from wtpy import WtDtServo
+from .FastResponse import FastJSONResponse, CompressMiddleware, pack_rows
+from .Downsample import clip_bars, downsample_bars, align_marks, align_index, downsample_curve
+
+# 回测图表用到的文件, 任意一个修改过, 缓存的图表数据就失效
+CHART_FILES = ("btenv.json", "btchart.json", "marks.csv", "indice.csv")
+
+def get_mtime(filename:str) -> float:
+    return os.path.getmtime(filename) if os.path.exists(filename) else None
+
+def read_chart_csv(filename:str, names:list, dtype:dict) -> pd.DataFrame:
+    '''
+    读取回测输出的图表数据, 第一行是表头, 最后一行可能还没有写完, 也不要
+    '''
+    if not os.path.exists(filename):
+        return None
+
+    df = pd.read_csv(filename, header=None, skiprows=1, names=names, usecols=range(len(names)), dtype=dtype, skipinitialspace=True)
+    if len(df) < 2:
+        return None
+    return df.iloc[:-1]
+
+def load_chart_marks(filename:str) -> list:
+    '''
+    读取marks.csv
+    '''
+    df = read_chart_csv(filename, ["bartime", "price", "icon", "tag"], {"bartime":np.int64, "price":np.float64, "icon":str, "tag":str})
+    if df is None:
+        return None
+
+    # 空的icon和tag读出来是NaN, 要和原来一样输出空字符串
+    df = df.fillna({"icon":"", "tag":""})
+    fields = list(df.columns)
+    return [dict(zip(fields, item)) for item in zip(*[df[col].tolist() for col in fields])]
+
+def load_chart_indice(filename:str) -> dict:
+    '''
+    读取indice.csv, 一次性按(指标, 指标线)分组
+    @return {(指标名, 指标线名): (bartime数组, 数值数组)}
+    '''
+    df = read_chart_csv(filename, ["bartime", "index", "line", "value"], {"bartime":np.int64, "index":str, "line":str, "value":np.float64})
+    if df is None:
+        return dict()
+
+    series = dict()
+    for key, grp in df.groupby(["index", "line"], sort=False):
+        series[key] = (grp["bartime"].to_numpy(), grp["value"].to_numpy())
+    return series
+
+def align_chart_index(index:list, series:dict, bartimes:np.ndarray) -> list:
+    '''
+    把指标线的数值按bartime对齐到K线上, 没有数值的K线填None\n
+    bartime一个都对不上的时候, 按原来的顺序原样输出
+    @index      btchart.json中定义的指标
+    @series     load_chart_indice读到的数值
+    @bartimes   K线的bartime, 升序
+    '''
+    if index is None:
+        return None
+
+    count = len(bartimes)
+    ret = list()
+    for iInfo in index:
+        iInfo = dict(iInfo)
+        lines = list()
+        for lInfo in iInfo.get("lines", []):
+            lInfo = dict(lInfo)
+            key = (iInfo["name"], lInfo["name"])
+            if key in series:
+                times, values = series[key]
+                pos = np.searchsorted(bartimes, times)
+                found = pos < count
+                found[found] = (bartimes[pos[found]] == times[found])
+                if found.any():
+                    aligned = np.full(count, np.nan)
+                    aligned[pos[found]] = values[found]
+                    lInfo["values"] = np.where(np.isnan(aligned), None, aligned).tolist()
+                else:
+                    lInfo["values"] = values.tolist()
+            lines.append(lInfo)
+        iInfo["lines"] = lines
+        ret.append(iInfo)
+    return ret
 
 
 def do_trading_analyze(df_closes, df_funds):
@@ -112,6 +193,7 @@ class WtBtSnooper:
         self.path = ""
         self.dt_servo = dtServo
         self.workspaces = list()
+        self.__chart_cache__ = dict()   # 策略目录 -> K线、指标和标记
 
         self.static_folders = list()
 
@@ -156,8 +238,8 @@ class WtBtSnooper:
             {"name":"Backtest APIs","description":"回测查探器接口"}
         ]
 
-        app = FastAPI(title="WtBtSnooper", description="A simple http api of WtBtSnooper", openapi_tags=tags_info, redoc_url=None, version="1.0.0")
-        app.add_middleware(GZipMiddleware, minimum_size=1000)
+        app = FastAPI(title="WtBtSnooper", description="A simple http api of WtBtSnooper", openapi_tags=tags_info, redoc_url=None, version="1.0.0", default_response_class=FastJSONResponse)
+        app.add_middleware(CompressMiddleware, minimum_size=1000)
         app.add_middleware(SessionMiddleware, secret_key='!@#$%^&*()', max_age=25200, session_cookie='WtBtSnooper_sid')
 
         if len(self.static_folders) > 0:
@@ -265,7 +347,11 @@ class WtBtSnooper:
         @app.post("/bt/qrybars", tags=["Backtest APIs"], description="获取K线")
         async def qry_bt_bars(
             wsid:str = Body(..., title="工作空间ID", embed=True),
-            straid:str = Body(..., title="策略ID", embed=True)
+            straid:str = Body(..., title="策略ID", embed=True),
+            columnar:bool = Body(False, title="是否返回列式数据", embed=True),
+            max_points:int = Body(0, title="最多返回的K线条数, 0为不限制", embed=True),
+            stime:int = Body(None, title="视口开始时间", embed=True),
+            etime:int = Body(None, title="视口结束时间", embed=True)
         ):
             path = self.get_workspace_path(wsid)
             if len(path) == 0:
@@ -274,7 +360,7 @@ class WtBtSnooper:
                     "message":"Invalid workspace"
                 }
 
-            code, bars, index, marks = self.get_bt_kline(path, straid)
+            code, bars, index, marks = self.get_bt_kline(path, straid, columnar, max_points, stime, etime)
             if bars is None:
                 ret = {
                     "result":-2,
@@ -293,16 +379,17 @@ class WtBtSnooper:
                     ret["index"] = index
 
                 if marks is not None:
-                    ret["marks"] = marks
+                    ret["marks"] = pack_rows(marks, columnar)
 
-            return ret
+            return FastJSONResponse(ret)
 
     
         # 获取策略回测信号
         @app.post("/bt/qrybtsigs", tags=["Backtest APIs"], description="读取信号明细")
         def qry_stra_bt_signals(
             wsid:str = Body(..., title="工作空间ID", embed=True),
-            straid:str = Body(..., title="策略ID", embed=True)
+            straid:str = Body(..., title="策略ID", embed=True),
+            columnar:bool = Body(False, title="是否返回列式数据", embed=True)
         ):
             path = self.get_workspace_path(wsid)
             if len(path) == 0:
@@ -314,16 +401,17 @@ class WtBtSnooper:
             ret = {
                 "result":0,
                 "message":"OK",
-                "signals":self.get_bt_signals(path, straid)
+                "signals":pack_rows(self.get_bt_signals(path, straid), columnar)
             }
                     
-            return ret
+            return FastJSONResponse(ret)
 
         # 获取策略回测成交
         @app.post("/bt/qrybttrds", tags=["Backtest APIs"], description="读取成交明细")
         def qry_stra_bt_trades(
             wsid:str = Body(..., title="工作空间ID", embed=True),
-            straid:str = Body(..., title="策略ID", embed=True)
+            straid:str = Body(..., title="策略ID", embed=True),
+            columnar:bool = Body(False, title="是否返回列式数据", embed=True)
         ):
             path = self.get_workspace_path(wsid)
             if len(path) == 0:
@@ -335,16 +423,18 @@ class WtBtSnooper:
             ret = {
                 "result":0,
                 "message":"OK",
-                "trades":self.get_bt_trades(path, straid)
+                "trades":pack_rows(self.get_bt_trades(path, straid), columnar)
             }
                     
-            return ret
+            return FastJSONResponse(ret)
 
         # 获取策略回测资金
         @app.post("/bt/qrybtfunds", tags=["Backtest APIs"], description="读取资金明细")
         def qry_stra_bt_funds(
             wsid:str = Body(..., title="工作空间ID", embed=True),
-            straid:str = Body(..., title="策略ID", embed=True)
+            straid:str = Body(..., title="策略ID", embed=True),
+            columnar:bool = Body(False, title="是否返回列式数据", embed=True),
+            max_points:int = Body(0, title="最多返回的点数, 0为不限制", embed=True)
         ):
             path = self.get_workspace_path(wsid)
             if len(path) == 0:
@@ -356,16 +446,17 @@ class WtBtSnooper:
             ret = {
                 "result":0,
                 "message":"OK",
-                "funds":self.get_bt_funds(path, straid)
+                "funds":pack_rows(downsample_curve(self.get_bt_funds(path, straid), "dynbalance", max_points), columnar)
             }
                     
-            return ret
+            return FastJSONResponse(ret)
 
         # 获取策略回测回合
         @app.post("/bt/qrybtrnds", tags=["Backtest APIs"], description="读取回合明细")
         def qry_stra_bt_rounds(
             wsid:str = Body(..., title="工作空间ID", embed=True),
-            straid:str = Body(..., title="策略ID", embed=True)
+            straid:str = Body(..., title="策略ID", embed=True),
+            columnar:bool = Body(False, title="是否返回列式数据", embed=True)
         ):
             path = self.get_workspace_path(wsid)
             if len(path) == 0:
@@ -377,9 +468,9 @@ class WtBtSnooper:
             ret = {
                 "result":0,
                 "message":"OK",
-                "rounds":self.get_bt_rounds(path, straid)
+                "rounds":pack_rows(self.get_bt_rounds(path, straid), columnar)
             }
-            return ret
+            return FastJSONResponse(ret)
 
         # 获取策略回测回合
         @app.post("/bt/qrybtinfo", tags=["Backtest APIs"], description="读取回合明细")
@@ -755,12 +846,18 @@ class WtBtSnooper:
         
         return items
 
-    def get_bt_kline(self, path:str, straid:str) -> list:
-        if self.dt_servo is None:
-            return None
-
-        filename = f"{straid}/btenv.json"
-        filename = os.path.join(path, filename)
+    def __load_chart__(self, path:str, straid:str) -> dict:
+        '''
+        读取回测的K线、指标和标记, 按策略目录缓存\n
+        btenv.json、btchart.json、marks.csv、indice.csv任意一个修改过就重新读取
+        '''
+        folder = os.path.join(path, straid)
+        stamps = tuple(get_mtime(os.path.join(folder, name)) for name in CHART_FILES)
+        chart = self.__chart_cache__.get(folder)
+        if chart is not None and chart["stamps"] == stamps:
+            return chart
+
+        filename = os.path.join(folder, "btenv.json")
         if not os.path.exists(filename):
             return None
 
@@ -776,11 +873,9 @@ class WtBtSnooper:
         etime = btState["etime"]
 
         index = None
-        marks = None
 
         #如果有btchart，就用btchart定义的K线
-        filename = f"{straid}/btchart.json"
-        filename = os.path.join(path, filename)
+        filename = os.path.join(folder, "btchart.json")
         if os.path.exists(filename):
             f = open(filename, "r")
             content = f.read()
@@ -793,66 +888,68 @@ class WtBtSnooper:
             if "index" in btchart:
                 index = btchart["index"]
 
-        filename = f"{straid}/marks.csv"
-        filename = os.path.join(path, filename)
-        if os.path.exists(filename):
-            f = open(filename, "r")
-            lines = f.readlines()
-            f.close()
-
-            if len(lines) > 2:
-                marks = []
-                for line in lines[1:-1]:
-                    items = line.split(",")
-                    marks.append({
-                        "bartime": int(items[0]),
-                        "price": float(items[1]),
-                        "icon": items[2],
-                        "tag": items[3]
-                    })
-
-        filename = f"{straid}/indice.csv"
-        filename = os.path.join(path, filename)
-        if os.path.exists(filename):
-            f = open(filename, "r")
-            lines = f.readlines()
-            f.close()
-
-            if len(lines) > 2:
-                for line in lines[1:-1]:
-                    items = line.split(",")
-                    index_name = items[1]
-                    line_name = items[2]
-                    index_val = float(items[3])
-                    for iInfo in index:
-                        if iInfo["name"] != index_name:
-                            continue
-
-                        for lInfo in iInfo["lines"]:
-                            if lInfo["name"] != line_name:
-                                continue
+        barList = self.dt_servo.get_bars(stdCode=code, period=period, fromTime=stime, endTime=etime)
+        if barList is None:
+            return None
 
-                            if "values" not in lInfo:
-                                lInfo["values"] = list()
+        # 按列整体取出, 不再逐条构造
+        # 每列拷贝一份连续的数组, 缓存不引用数据伺服返回的内存
+        npBars = barList.ndarray
+        columns = {
+            "bartime": barList.bartimes.astype(np.int64),
+            "open": np.ascontiguousarray(npBars["open"]),
+            "high": np.ascontiguousarray(npBars["high"]),
+            "low": np.ascontiguousarray(npBars["low"]),
+            "close": np.ascontiguousarray(npBars["close"]),
+            "volume": np.ascontiguousarray(npBars["volume"]),
+            "turnover": np.ascontiguousarray(npBars["turnover"])
+        }
 
-                            lInfo["values"].append(index_val)
+        series = load_chart_indice(os.path.join(folder, "indice.csv"))
+        chart = {
+            "stamps": stamps,
+            "code": code,
+            "columns": columns,
+            "index": align_chart_index(index, series, columns["bartime"]),
+            "marks": load_chart_marks(os.path.join(folder, "marks.csv"))
+        }
+        self.__chart_cache__[folder] = chart
+        return chart
+
+    def get_bt_kline(self, path:str, straid:str, columnar:bool = False, max_points:int = 0, fromTime:int = None, endTime:int = None) -> list:
+        '''
+        读取回测的K线、指标和标记
+        @columnar   是否返回列式数据
+        @max_points 最多返回的K线条数, 超过了就合并K线, 指标和标记也对齐到合并后的K线上, 为0则不合并
+        @fromTime   视口开始时间, 格式同bartime, 为None则从头开始
+        @endTime    视口结束时间, 格式同bartime, 为None则到最后
+        '''
+        if self.dt_servo is None:
+            return None
 
-        barList = self.dt_servo.get_bars(stdCode=code, period=period, fromTime=stime, endTime=etime)
-        if barList is None:
+        chart = self.__load_chart__(path, straid)
+        if chart is None:
             return None
 
-        isDay = period[0]=='d'
-
-        bars = list()
-        for realBar in barList:
-            bars.append(dict(
-                bartime = int(realBar['date'] if isDay else 199000000000 + realBar['time']),
-                open = realBar['open'],
-                high = realBar['high'],
-                low = realBar['low'],
-                close = realBar['close'],
-                volume = realBar['volume'],
-                turnover = realBar['turnover']
-            ))
+        code = chart["code"]
+        columns = chart["columns"]
+        index = chart["index"]
+        marks = chart["marks"]
+
+        # 先截取视口, 再按图表的点数合并
+        count = len(columns["bartime"])
+        columns, mask = clip_bars(columns, fromTime, endTime)
+        columns, ends = downsample_bars(columns, max_points)
+        index = align_index(index, count, mask, ends)
+        if marks is not None and (mask is not None or ends is not None):
+            if mask is not None:
+                marks = [mark for mark in marks if (fromTime is None or mark["bartime"] >= fromTime) and (endTime is None or mark["bartime"] <= endTime)]
+            marks = align_marks(marks, columns["bartime"])
+
+        if columnar:
+            bars = columns
+        else:
+            fields = list(columns.keys())
+            bars = [dict(zip(fields, item)) for item in zip(*[col.tolist() for col in columns.values()])]
 
         return code, bars, index, marks
@@ -1,6 +1,5 @@
 from fastapi import FastAPI, Body, Request
 from fastapi.staticfiles import StaticFiles
-from fastapi.middleware.gzip import GZipMiddleware
 from starlette.middleware.sessions import SessionMiddleware
 from starlette.responses import RedirectResponse, FileResponse
 import uvicorn
@@ -20,6 +19,8 @@ from .DataMgr import DataMgr, backup_file
 from .PushSvr import PushServer
 from .WatchDog import WatchDog, WatcherSink
 from .WtBtMon import WtBtMon
+from .FastResponse import FastJSONResponse, CompressMiddleware, pack_rows, np_to_columns, np_to_rows
+from .Downsample import downsample_bars, downsample_curve
 from wtpy import WtDtServo
 import signal
 import platform
@@ -329,8 +330,8 @@ class WtMonSvr(WatcherSink):
         # 看门狗模块，主要用于调度各个组合启动关闭
         self._dog = WatchDog(sink=self, db=self.__data_mgr__.get_db(), logger=self.logger)
 
-        app = FastAPI(title="WtMonSvr", description="A http api of WtMonSvr", redoc_url=None, version="1.0.0")
-        app.add_middleware(GZipMiddleware, minimum_size=1000)
+        app = FastAPI(title="WtMonSvr", description="A http api of WtMonSvr", redoc_url=None, version="1.0.0", default_response_class=FastJSONResponse)
+        app.add_middleware(CompressMiddleware, minimum_size=1000)
         app.add_middleware(SessionMiddleware, secret_key='!@#$%^&*()', max_age=25200, session_cookie='WtMonSvr_sid')
         app.add_middleware(
             CORSMiddleware,
@@ -396,7 +397,9 @@ class WtMonSvr(WatcherSink):
             period: str = Body(..., title="K线周期", embed=True),
             stime: int = Body(None, title="开始时间", embed=True),
             etime: int = Body(..., title="结束时间", embed=True),
-            count: int = Body(None, title="数据条数", embed=True)
+            count: int = Body(None, title="数据条数", embed=True),
+            columnar: bool = Body(False, title="是否返回列式数据", embed=True),
+            max_points: int = Body(0, title="最多返回的K线条数, 超过则合并K线, 0为不限制", embed=True)
         ):
             bSucc, userInfo = check_auth(request, token, self.__sec_key__)
             if not bSucc:
@@ -431,15 +434,24 @@ class WtMonSvr(WatcherSink):
                     "message": "Data not found"
                 }
             else:
-                bar_list = [curBar.to_dict() for curBar in bars]
+                # 列式数据直接引用numpy数组, 不用逐条转换
+                if max_points > 0 and len(bars) > max_points:
+                    columns, ends = downsample_bars(np_to_columns(bars.ndarray), max_points)
+                    if columnar:
+                        barsData = columns
+                    else:
+                        fields = list(columns.keys())
+                        barsData = [dict(zip(fields, item)) for item in zip(*[col.tolist() for col in columns.values()])]
+                else:
+                    barsData = np_to_columns(bars.ndarray) if columnar else np_to_rows(bars.ndarray)
 
                 ret = {
                     "result": 0,
                     "message": "Ok",
-                    "bars": bar_list
+                    "bars": barsData
                 }
 
-            return ret
+            return FastJSONResponse(ret)
 
         # 拉取用户策略列表
         @app.post("/bt/qrystras", tags=["回测管理接口"])
@@ -719,7 +731,8 @@ class WtMonSvr(WatcherSink):
                 request: Request,
                 token: str = Body(None, title="访问令牌", embed=True),
                 straid: str = Body(..., title="策略ID", embed=True),
-                btid: str = Body(..., title="回测ID", embed=True)
+                btid: str = Body(..., title="回测ID", embed=True),
+                columnar: bool = Body(False, title="是否返回列式数据", embed=True)
         ):
             bSucc, userInfo = check_auth(request, token, self.__sec_key__)
             if not bSucc:
@@ -756,10 +769,10 @@ class WtMonSvr(WatcherSink):
                     ret = {
                         "result": 0,
                         "message": "OK",
-                        "signals": self.__bt_mon__.get_bt_signals(user, straid, btid)
+                        "signals": pack_rows(self.__bt_mon__.get_bt_signals(user, straid, btid), columnar)
                     }
 
-            return ret
+            return FastJSONResponse(ret)
 
         # 删除策略回测列表
         @app.post("/bt/delstrabt", tags=["回测管理接口"])
@@ -808,7 +821,8 @@ class WtMonSvr(WatcherSink):
                 request: Request,
                 token: str = Body(None, title="访问令牌", embed=True),
                 straid: str = Body(..., title="策略ID", embed=True),
-                btid: str = Body(..., title="回测ID", embed=True)
+                btid: str = Body(..., title="回测ID", embed=True),
+                columnar: bool = Body(False, title="是否返回列式数据", embed=True)
         ):
             bSucc, userInfo = check_auth(request, token, self.__sec_key__)
             if not bSucc:
@@ -845,10 +859,10 @@ class WtMonSvr(WatcherSink):
                     ret = {
                         "result": 0,
                         "message": "OK",
-                        "trades": self.__bt_mon__.get_bt_trades(user, straid, btid)
+                        "trades": pack_rows(self.__bt_mon__.get_bt_trades(user, straid, btid), columnar)
                     }
 
-            return ret
+            return FastJSONResponse(ret)
 
         # 获取策略回测资金
         @app.post("/bt/qrybtfunds", tags=["回测管理接口"])
@@ -856,7 +870,9 @@ class WtMonSvr(WatcherSink):
                 request: Request,
                 token: str = Body(None, title="访问令牌", embed=True),
                 straid: str = Body(..., title="策略ID", embed=True),
-                btid: str = Body(..., title="回测ID", embed=True)
+                btid: str = Body(..., title="回测ID", embed=True),
+                columnar: bool = Body(False, title="是否返回列式数据", embed=True),
+                max_points: int = Body(0, title="最多返回的点数, 0为不限制", embed=True)
         ):
             bSucc, userInfo = check_auth(request, token, self.__sec_key__)
             if not bSucc:
@@ -893,10 +909,10 @@ class WtMonSvr(WatcherSink):
                     ret = {
                         "result": 0,
                         "message": "OK",
-                        "funds": self.__bt_mon__.get_bt_funds(user, straid, btid)
+                        "funds": pack_rows(downsample_curve(self.__bt_mon__.get_bt_funds(user, straid, btid), "dynbalance", max_points), columnar)
                     }
 
-            return ret
+            return FastJSONResponse(ret)
 
         # 获取策略回测回合
         @app.post("/bt/qrybtrnds", tags=["回测管理接口"])
@@ -904,7 +920,8 @@ class WtMonSvr(WatcherSink):
                 request: Request,
                 token: str = Body(None, title="访问令牌", embed=True),
                 straid: str = Body(..., title="策略ID", embed=True),
-                btid: str = Body(..., title="回测ID", embed=True)
+                btid: str = Body(..., title="回测ID", embed=True),
+                columnar: bool = Body(False, title="是否返回列式数据", embed=True)
         ):
             bSucc, userInfo = check_auth(request, token, self.__sec_key__)
             if not bSucc:
@@ -941,10 +958,10 @@ class WtMonSvr(WatcherSink):
                     ret = {
                         "result": 0,
                         "message": "OK",
-                        "rounds": self.__bt_mon__.get_bt_rounds(user, straid, btid)
+                        "rounds": pack_rows(self.__bt_mon__.get_bt_rounds(user, straid, btid), columnar)
                     }
 
-            return ret
+            return FastJSONResponse(ret)
 
         # 启动策略回测
         @app.post("/bt/runstrabt", tags=["回测管理接口"])
@@ -1680,7 +1697,8 @@ class WtMonSvr(WatcherSink):
                 request: Request,
                 token: str = Body(None, title="访问令牌", embed=True),
                 groupid: str = Body(..., title="组合ID", embed=True),
-                strategyid: str = Body(..., title="策略ID", embed=True)
+                strategyid: str = Body(..., title="策略ID", embed=True),
+                columnar: bool = Body(False, title="是否返回列式数据", embed=True)
         ):
             bSucc, usrInfo = check_auth(request, token, self.__sec_key__)
             if not bSucc:
@@ -1698,10 +1716,10 @@ class WtMonSvr(WatcherSink):
                 ret = {
                     "result": 0,
                     "message": "",
-                    "trades": self.__data_mgr__.get_trades(gid, sid)
+                    "trades": pack_rows(self.__data_mgr__.get_trades(gid, sid), columnar)
                 }
 
-            return ret
+            return FastJSONResponse(ret)
 
         # 查询策略信号
         @app.post("/mgr/qrysigs", tags=["策略管理接口"])
@@ -1709,7 +1727,8 @@ class WtMonSvr(WatcherSink):
                 request: Request,
                 token: str = Body(None, title="访问令牌", embed=True),
                 groupid: str = Body(..., title="组合ID", embed=True),
-                strategyid: str = Body(..., title="策略ID", embed=True)
+                strategyid: str = Body(..., title="策略ID", embed=True),
+                columnar: bool = Body(False, title="是否返回列式数据", embed=True)
         ):
             bSucc, usrInfo = check_auth(request, token, self.__sec_key__)
             if not bSucc:
@@ -1727,10 +1746,10 @@ class WtMonSvr(WatcherSink):
                 ret = {
                     "result": 0,
                     "message": "",
-                    "signals": self.__data_mgr__.get_signals(gid, sid)
+                    "signals": pack_rows(self.__data_mgr__.get_signals(gid, sid), columnar)
                 }
 
-            return ret
+            return FastJSONResponse(ret)
 
         # 查询策略回合
         @app.post("/mgr/qryrnds", tags=["策略管理接口"])
@@ -1738,7 +1757,8 @@ class WtMonSvr(WatcherSink):
                 request: Request,
                 token: str = Body(None, title="访问令牌", embed=True),
                 groupid: str = Body(..., title="组合ID", embed=True),
-                strategyid: str = Body(..., title="策略ID", embed=True)
+                strategyid: str = Body(..., title="策略ID", embed=True),
+                columnar: bool = Body(False, title="是否返回列式数据", embed=True)
         ):
             bSucc, usrInfo = check_auth(request, token, self.__sec_key__)
             if not bSucc:
@@ -1756,10 +1776,10 @@ class WtMonSvr(WatcherSink):
                 ret = {
                     "result": 0,
                     "message": "",
-                    "rounds": self.__data_mgr__.get_rounds(gid, sid)
+                    "rounds": pack_rows(self.__data_mgr__.get_rounds(gid, sid), columnar)
                 }
 
-            return ret
+            return FastJSONResponse(ret)
 
         # 查询策略持仓
         @app.post("/mgr/qrypos", tags=["策略管理接口"])
@@ -1796,7 +1816,8 @@ class WtMonSvr(WatcherSink):
                 request: Request,
                 token: str = Body(None, title="访问令牌", embed=True),
                 groupid: str = Body(..., title="组合ID", embed=True),
-                strategyid: str = Body(..., title="策略ID", embed=True)
+                strategyid: str = Body(..., title="策略ID", embed=True),
+                columnar: bool = Body(False, title="是否返回列式数据", embed=True)
         ):
             bSucc, usrInfo = check_auth(request, token, self.__sec_key__)
             if not bSucc:
@@ -1814,10 +1835,10 @@ class WtMonSvr(WatcherSink):
                 ret = {
                     "result": 0,
                     "message": "",
-                    "funds": self.__data_mgr__.get_funds(gid, sid)
+                    "funds": pack_rows(self.__data_mgr__.get_funds(gid, sid), columnar)
                 }
 
-            return ret
+            return FastJSONResponse(ret)
 
         # 查询通道订单
         @app.post("/mgr/qrychnlords", tags=["交易通道管理接口"])
@@ -1825,7 +1846,8 @@ class WtMonSvr(WatcherSink):
                 request: Request,
                 token: str = Body(None, title="访问令牌", embed=True),
                 groupid: str = Body(..., title="组合ID", embed=True),
-                channelid: str = Body(..., title="通道ID", embed=True)
+                channelid: str = Body(..., title="通道ID", embed=True),
+                columnar: bool = Body(False, title="是否返回列式数据", embed=True)
         ):
             bSucc, usrInfo = check_auth(request, token, self.__sec_key__)
             if not bSucc:
@@ -1843,10 +1865,10 @@ class WtMonSvr(WatcherSink):
                 ret = {
                     "result": 0,
                     "message": "",
-                    "orders": self.__data_mgr__.get_channel_orders(gid, cid)
+                    "orders": pack_rows(self.__data_mgr__.get_channel_orders(gid, cid), columnar)
                 }
 
-            return ret
+            return FastJSONResponse(ret)
 
         # 查询通道成交
         @app.post("/mgr/qrychnltrds", tags=["交易通道管理接口"])
@@ -1854,7 +1876,8 @@ class WtMonSvr(WatcherSink):
                 request: Request,
                 token: str = Body(None, title="访问令牌", embed=True),
                 groupid: str = Body(..., title="组合ID", embed=True),
-                channelid: str = Body(..., title="通道ID", embed=True)
+                channelid: str = Body(..., title="通道ID", embed=True),
+                columnar: bool = Body(False, title="是否返回列式数据", embed=True)
         ):
             bSucc, usrInfo = check_auth(request, token, self.__sec_key__)
             if not bSucc:
@@ -1872,10 +1895,10 @@ class WtMonSvr(WatcherSink):
                 ret = {
                     "result": 0,
                     "message": "",
-                    "trades": self.__data_mgr__.get_channel_trades(gid, cid)
+                    "trades": pack_rows(self.__data_mgr__.get_channel_trades(gid, cid), columnar)
                 }
 
-            return ret
+            return FastJSONResponse(ret)
 
         # 查询通道持仓
         @app.post("/mgr/qrychnlpos", tags=["交易通道管理接口"])
@@ -7,8 +7,9 @@ from wtpy.WtCoreDefs import FUNC_LOAD_HISBARS, FUNC_LOAD_HISTICKS, FUNC_LOAD_ADJ
 from wtpy.WtCoreDefs import EVENT_ENGINE_INIT, EVENT_SESSION_BEGIN, EVENT_SESSION_END, EVENT_ENGINE_SCHDL, EVENT_BACKTEST_END
 from wtpy.WtCoreDefs import WTSTickStruct, WTSBarStruct, WTSOrdQueStruct, WTSOrdDtlStruct, WTSTransStruct
 from .PlatformHelper import PlatformHelper as ph
-from wtpy.WtUtilDefs import singleton
+from wtpy.WtUtilDefs import singleton, CodeCache
 from wtpy.WtDataDefs import WtNpKline, WtNpOrdDetails, WtNpOrdQueues, WtNpTicks, WtNpTransactions
+import numpy as np
 import os
 
 # Python对接C接口的库
@@ -104,6 +105,19 @@ class WtBtWrapper:
 
         self.api.get_raw_stdcode.restype = c_char_p
 
+        # 合约代码、周期等字符串的编解码缓存
+        self.__codes__ = CodeCache()
+        self.__encode__ = self.__codes__.encode
+        self.__decode__ = self.__codes__.decode
+
+        # 主动拉取数据的回调只创建一次, 不用每次调用都新建一个
+        self.cb_stra_get_bar = CB_STRATEGY_GET_BAR(self.on_stra_get_bar)
+        self.cb_stra_get_tick = CB_STRATEGY_GET_TICK(self.on_stra_get_tick)
+        self.cb_stra_get_position = CB_STRATEGY_GET_POSITION(self.on_stra_get_position)
+        self.cb_hftstra_get_ordque = CB_HFTSTRA_GET_ORDQUE(self.on_hftstra_get_order_queue)
+        self.cb_hftstra_get_orddtl = CB_HFTSTRA_GET_ORDDTL(self.on_hftstra_get_order_detail)
+        self.cb_hftstra_get_trans = CB_HFTSTRA_GET_TRANS(self.on_hftstra_get_transaction)
+
     def on_engine_event(self, evtid:int, evtDate:int, evtTime:int):
         engine = self._engine
         if evtid == EVENT_ENGINE_INIT:
@@ -154,14 +168,14 @@ class WtBtWrapper:
         ctx = engine.get_context(id)
 
         if ctx is not None:
-            ctx.on_tick(bytes.decode(stdCode), newTick)
+            ctx.on_tick(self.__decode__(stdCode), newTick)
         return
     
     def on_stra_bar(self, id:int, stdCode:str, period:str, newBar:POINTER(WTSBarStruct)):
         engine = self._engine
         ctx = engine.get_context(id)
         if ctx is not None:
-            ctx.on_bar(bytes.decode(stdCode), bytes.decode(period), newBar)
+            ctx.on_bar(self.__decode__(stdCode), self.__decode__(period), newBar)
         return
 
     def on_stra_get_bar(self, id:int, stdCode:str, period:str, curBar:POINTER(WTSBarStruct), count:int, isLast:bool):
@@ -175,14 +189,14 @@ class WtBtWrapper:
         '''
         engine = self._engine
         ctx = engine.get_context(id)
-        period = bytes.decode(period)
+        period = self.__decode__(period)
         isDay = period[0]=='d'
 
         npBars = WtNpKline(isDay)
         npBars.set_data(curBar, count)
 
         if ctx is not None:
-            ctx.on_getbars(bytes.decode(stdCode), period, npBars)
+            ctx.on_getbars(self.__decode__(stdCode), period, npBars)
 
     def on_stra_get_tick(self, id:int, stdCode:str, curTick:POINTER(WTSTickStruct), count:int, isLast:bool):
         '''
@@ -199,20 +213,20 @@ class WtBtWrapper:
         npTicks.set_data(curTick, count)
 
         if ctx is not None:
-            ctx.on_getticks(bytes.decode(stdCode), npTicks)
+            ctx.on_getticks(self.__decode__(stdCode), npTicks)
         return
 
     def on_stra_get_position(self, id:int, stdCode:str, qty:float, isLast:bool):
         engine = self._engine
         ctx = engine.get_context(id)
         if ctx is not None:
-            ctx.on_getpositions(bytes.decode(stdCode), qty, isLast)
+            ctx.on_getpositions(self.__decode__(stdCode), qty, isLast)
 
     def on_stra_cond_triggerd(self, id:int, stdCode:str, target:float, price:float, usertag:str):
         engine = self._engine
         ctx = engine.get_context(id)
         if ctx is not None:
-            ctx.on_condition_triggered(bytes.decode(stdCode), target, price, bytes.decode(usertag))
+            ctx.on_condition_triggered(self.__decode__(stdCode), target, price, self.__decode__(usertag))
 
     def on_hftstra_channel_evt(self, id:int, trader:str, evtid:int):
         engine = self._engine
@@ -225,7 +239,7 @@ class WtBtWrapper:
             ctx.on_channel_lost()
 
     def on_hftstra_order(self, id:int, localid:int, stdCode:str, isBuy:bool, totalQty:float, leftQty:float, price:float, isCanceled:bool, userTag:str):
-        stdCode = bytes.decode(stdCode)
+        stdCode = self.__decode__(stdCode)
         userTag = bytes.decode(userTag,"gbk")
         engine = self._engine
         ctx = engine.get_context(id)
@@ -233,7 +247,7 @@ class WtBtWrapper:
             ctx.on_order(localid, stdCode, isBuy, totalQty, leftQty, price, isCanceled, userTag)
 
     def on_hftstra_trade(self, id:int, localid:int, stdCode:str, isBuy:bool, qty:float, price:float, userTag:str):
-        stdCode = bytes.decode(stdCode)
+        stdCode = self.__decode__(stdCode)
         userTag = bytes.decode(userTag,"gbk")
         engine = self._engine
         ctx = engine.get_context(id)
@@ -241,7 +255,7 @@ class WtBtWrapper:
             ctx.on_trade(localid, stdCode, isBuy, qty, price, userTag)
 
     def on_hftstra_entrust(self, id:int, localid:int, stdCode:str, bSucc:bool, message:str, userTag:str):
-        stdCode = bytes.decode(stdCode)
+        stdCode = self.__decode__(stdCode)
         message = bytes.decode(message, "gbk")
         userTag = bytes.decode(userTag, "gbk")
         engine = self._engine
@@ -250,7 +264,7 @@ class WtBtWrapper:
             ctx.on_entrust(localid, stdCode, bSucc, message, userTag)
 
     def on_hftstra_order_queue(self, id:int, stdCode:str, newOrdQue:POINTER(WTSOrdQueStruct)):
-        stdCode = bytes.decode(stdCode)
+        stdCode = self.__decode__(stdCode)
         engine = self._engine
         ctx = engine.get_context(id)
       
@@ -265,10 +279,10 @@ class WtBtWrapper:
         npHftData.set_data(newOrdQue, count)
 
         if ctx is not None:
-            ctx.on_get_order_queue(bytes.decode(stdCode), npHftData)
+            ctx.on_get_order_queue(self.__decode__(stdCode), npHftData)
 
     def on_hftstra_order_detail(self, id:int, stdCode:str, newOrdDtl:POINTER(WTSOrdDtlStruct)):
-        stdCode = bytes.decode(stdCode)
+        stdCode = self.__decode__(stdCode)
         engine = self._engine
         ctx = engine.get_context(id)
         
@@ -283,10 +297,10 @@ class WtBtWrapper:
         npHftData.set_data(newOrdDtl, count)
             
         if ctx is not None:
-            ctx.on_get_order_detail(bytes.decode(stdCode), npHftData)
+            ctx.on_get_order_detail(self.__decode__(stdCode), npHftData)
 
     def on_hftstra_transaction(self, id:int, stdCode:str, newTrans:POINTER(WTSTransStruct)):
-        stdCode = bytes.decode(stdCode)
+        stdCode = self.__decode__(stdCode)
         engine = self._engine
         ctx = engine.get_context(id)
         
@@ -301,7 +315,7 @@ class WtBtWrapper:
         npHftData.set_data(newTrans, count)
             
         if ctx is not None:
-            ctx.on_get_transaction(bytes.decode(stdCode), npHftData)
+            ctx.on_get_transaction(self.__decode__(stdCode), npHftData)
 
     def on_load_fnl_his_bars(self, stdCode:str, period:str) -> bool:
         engine = self._engine
@@ -309,7 +323,7 @@ class WtBtWrapper:
         if loader is None:
             return False
 
-        return loader.load_final_his_bars(bytes.decode(stdCode), bytes.decode(period), self.api.feed_raw_bars)
+        return loader.load_final_his_bars(self.__decode__(stdCode), self.__decode__(period), self.api.feed_raw_bars)
 
     def on_load_raw_his_bars(self, stdCode:str, period:str) -> bool:
         engine = self._engine
@@ -317,15 +331,27 @@ class WtBtWrapper:
         if loader is None:
             return False
 
-        return loader.load_raw_his_bars(bytes.decode(stdCode), bytes.decode(period), self.api.feed_raw_bars)
+        return loader.load_raw_his_bars(self.__decode__(stdCode), self.__decode__(period), self.api.feed_raw_bars)
 
-    def feed_adj_factors(self, stdCode:str, dates:list, factors:list):
-        stdCode = bytes(stdCode, encoding="utf8")
+    def feed_adj_factors(self, stdCode:str, dates, factors):
         '''
-        TODO 这里类型要转一下! 底层接口是传数组的
+        向底层提交复权因子
         feed_adj_factors(WtString stdCode, WtUInt32* dates, double* factors, WtUInt32 count)
+        @stdCode    合约代码
+        @dates      日期, list或者numpy数组, 已经是连续的uint32数组时不拷贝
+        @factors    复权因子, list或者numpy数组, 已经是连续的float64数组时不拷贝
         '''
-        self.api.feed_adj_factors(stdCode, dates, factors, len(dates))
+        dates = np.ascontiguousarray(dates, dtype=np.uint32)
+        factors = np.ascontiguousarray(factors, dtype=np.float64)
+        if len(dates) != len(factors):
+            raise ValueError("length of dates and factors mismatch: %d vs %d" % (len(dates), len(factors)))
+
+        count = len(dates)
+        if count == 0:
+            return
+
+        self.api.feed_adj_factors(bytes(stdCode, encoding="utf8"), dates.ctypes.data_as(POINTER(c_uint32)),
+            factors.ctypes.data_as(POINTER(c_double)), c_uint32(count))
 
     def on_load_adj_factors(self, stdCode:str) -> bool:
         engine = self._engine
@@ -333,7 +359,7 @@ class WtBtWrapper:
         if loader is None:
             return False
 
-        stdCode = bytes.decode(stdCode)
+        stdCode = self.__decode__(stdCode)
         return loader.load_adj_factors(stdCode, self.feed_adj_factors)
 
     def on_load_his_ticks(self, stdCode:str, uDate:int) -> bool:
@@ -343,7 +369,7 @@ class WtBtWrapper:
             return False
         
         # feed_raw_ticks(WTSTickStruct* ticks, WtUInt32 count);
-        return loader.load_his_ticks(bytes.decode(stdCode), uDate, self.api.feed_raw_ticks)
+        return loader.load_his_ticks(self.__decode__(stdCode), uDate, self.api.feed_raw_ticks)
 
     def write_log(self, level, message:str, catName:str = ""):
         self.api.write_log(level, ph.auto_encode(message), bytes(catName, encoding = "utf8"))
@@ -377,7 +403,7 @@ class WtBtWrapper:
         self.api.clear_cache()
 
     def get_raw_stdcode(self, stdCode:str):
-        return bytes.decode(self.api.get_raw_stdcode(bytes(stdCode, encoding = "utf8")))
+        return bytes.decode(self.api.get_raw_stdcode(self.__encode__(stdCode)))
 
     def config_backtest(self, cfgfile:str = 'config.yaml', isFile:bool = True):
         self.api.config_backtest(bytes(cfgfile, encoding = "utf8"), isFile)
@@ -478,7 +504,7 @@ class WtBtWrapper:
         @stdCode    合约代码
         @qty        手数, 大于等于0
         '''
-        self.api.cta_enter_long(id, bytes(stdCode, encoding = "utf8"), qty, bytes(usertag, encoding = "utf8"), limitprice, stopprice)
+        self.api.cta_enter_long(id, self.__encode__(stdCode), qty, self.__encode__(usertag), limitprice, stopprice)
 
     def cta_exit_long(self, id:int, stdCode:str, qty:float, usertag:str, limitprice:float = 0.0, stopprice:float = 0.0):
         '''
@@ -487,7 +513,7 @@ class WtBtWrapper:
         @stdCode    合约代码
         @qty        手数, 大于等于0
         '''
-        self.api.cta_exit_long(id, bytes(stdCode, encoding = "utf8"), qty, bytes(usertag, encoding = "utf8"), limitprice, stopprice)
+        self.api.cta_exit_long(id, self.__encode__(stdCode), qty, self.__encode__(usertag), limitprice, stopprice)
 
     def cta_enter_short(self, id:int, stdCode:str, qty:float, usertag:str, limitprice:float = 0.0, stopprice:float = 0.0):
         '''
@@ -496,7 +522,7 @@ class WtBtWrapper:
         @stdCode    合约代码
         @qty        手数, 大于等于0
         '''
-        self.api.cta_enter_short(id, bytes(stdCode, encoding = "utf8"), qty, bytes(usertag, encoding = "utf8"), limitprice, stopprice)
+        self.api.cta_enter_short(id, self.__encode__(stdCode), qty, self.__encode__(usertag), limitprice, stopprice)
 
     def cta_exit_short(self, id:int, stdCode:str, qty:float, usertag:str, limitprice:float = 0.0, stopprice:float = 0.0):
         '''
@@ -505,7 +531,7 @@ class WtBtWrapper:
         @stdCode    合约代码
         @qty        手数, 大于等于0
         '''
-        self.api.cta_exit_short(id, bytes(stdCode, encoding = "utf8"), qty, bytes(usertag, encoding = "utf8"), limitprice, stopprice)
+        self.api.cta_exit_short(id, self.__encode__(stdCode), qty, self.__encode__(usertag), limitprice, stopprice)
     
     def cta_get_bars(self, id:int, stdCode:str, period:str, count:int, isMain:bool):
         '''
@@ -516,7 +542,7 @@ class WtBtWrapper:
         @count      条数
         @isMain     是否主K线
         '''
-        return self.api.cta_get_bars(id, bytes(stdCode, encoding = "utf8"), bytes(period, encoding = "utf8"), count, isMain, CB_STRATEGY_GET_BAR(self.on_stra_get_bar))
+        return self.api.cta_get_bars(id, self.__encode__(stdCode), self.__encode__(period), count, isMain, self.cb_stra_get_bar)
     
     def cta_get_ticks(self, id:int, stdCode:str, count:int):
         '''
@@ -525,7 +551,7 @@ class WtBtWrapper:
         @stdCode    合约代码
         @count      条数
         '''
-        return self.api.cta_get_ticks(id, bytes(stdCode, encoding = "utf8"), count, CB_STRATEGY_GET_TICK(self.on_stra_get_tick))
+        return self.api.cta_get_ticks(id, self.__encode__(stdCode), count, self.cb_stra_get_tick)
 
     def cta_get_position_profit(self, id:int, stdCode:str):
         '''
@@ -534,7 +560,7 @@ class WtBtWrapper:
         @stdCode    合约代码
         @return     指定合约的浮动盈亏
         '''
-        return self.api.cta_get_position_profit(id, bytes(stdCode, encoding = "utf8"))
+        return self.api.cta_get_position_profit(id, self.__encode__(stdCode))
 
     def cta_get_position_avgpx(self, id:int, stdCode:str):
         '''
@@ -543,14 +569,14 @@ class WtBtWrapper:
         @stdCode    合约代码
         @return     指定合约的持仓均价
         '''
-        return self.api.cta_get_position_avgpx(id, bytes(stdCode, encoding = "utf8"))
+        return self.api.cta_get_position_avgpx(id, self.__encode__(stdCode))
 
     def cta_get_all_position(self, id:int):
         '''
         获取全部持仓
         @id     策略id
         '''
-        return self.api.cta_get_all_position(id, CB_STRATEGY_GET_POSITION(self.on_stra_get_position))
+        return self.api.cta_get_all_position(id, self.cb_stra_get_position)
     
     def cta_get_position(self, id:int, stdCode:str, bonlyvalid:bool = False, usertag:str = ""):
         '''
@@ -560,7 +586,7 @@ class WtBtWrapper:
         @usertag    进场标记, 如果为空则获取该合约全部持仓
         @return 指定合约的持仓手数, 正为多, 负为空
         '''
-        return self.api.cta_get_position(id, bytes(stdCode, encoding = "utf8"), bonlyvalid, bytes(usertag, encoding = "utf8"))
+        return self.api.cta_get_position(id, self.__encode__(stdCode), bonlyvalid, self.__encode__(usertag))
 
     def cta_get_fund_data(self, id:int, flag:int) -> float:
         '''
@@ -576,7 +602,7 @@ class WtBtWrapper:
         @stdCode   合约代码
         @return     指定合约的最新价格 
         '''
-        return self.api.cta_get_price(bytes(stdCode, encoding = "utf8"))
+        return self.api.cta_get_price(self.__encode__(stdCode))
 
     def cta_get_day_price(self, stdCode:str, flag:int = 0) -> float:
         '''
@@ -585,7 +611,7 @@ class WtBtWrapper:
         @flag       价格标记, 0-开盘价, 1-最高价, 2-最低价, 3-最新价
         @return     指定合约的价格 
         '''
-        return self.api.cta_get_day_price(bytes(stdCode, encoding = "utf8"), flag)
+        return self.api.cta_get_day_price(self.__encode__(stdCode), flag)
 
     def cta_set_position(self, id:int, stdCode:str, qty:float, usertag:str = "", limitprice:float = 0.0, stopprice:float = 0.0):
         '''
@@ -594,7 +620,35 @@ class WtBtWrapper:
         @stdCode    合约代码
         @qty        目标仓位, 正为多, 负为空
         '''
-        self.api.cta_set_position(id, bytes(stdCode, encoding = "utf8"), qty, bytes(usertag, encoding = "utf8"), limitprice, stopprice)
+        self.api.cta_set_position(id, self.__encode__(stdCode), qty, self.__encode__(usertag), limitprice, stopprice)
+
+    def cta_get_positions(self, id:int, codes:list, bonlyvalid:bool = False, usertag:str = "") -> np.ndarray:
+        '''
+        批量获取持仓
+        @id         策略id
+        @codes      合约代码列表
+        @bonlyvalid 只读可用持仓, 默认为False
+        @usertag    进场标记, 如果为空则获取该合约全部持仓
+        @return     和codes一一对应的持仓手数, 正为多, 负为空
+        '''
+        # 底层没有批量接口, 只能逐个调用, 把函数查找和标记编码都提到循环外面
+        func = self.api.cta_get_position
+        encode = self.__encode__
+        tag = encode(usertag)
+        return np.fromiter((func(id, encode(code), bonlyvalid, tag) for code in codes), dtype=np.float64, count=len(codes))
+
+    def cta_set_positions(self, id:int, codes:list, qtys:list, usertag:str = "", limitprice:float = 0.0, stopprice:float = 0.0):
+        '''
+        批量设置目标仓位
+        @id         策略id
+        @codes      合约代码列表
+        @qtys       和codes一一对应的目标仓位, 正为多, 负为空
+        '''
+        func = self.api.cta_set_position
+        encode = self.__encode__
+        tag = encode(usertag)
+        for code, qty in zip(codes, qtys):
+            func(id, encode(code), qty, tag, limitprice, stopprice)
 
     def cta_get_tdate(self) -> int:
         '''
@@ -623,7 +677,7 @@ class WtBtWrapper:
         @stdCode    合约代码
         @return     进场时间, 格式如201907260932 
         '''
-        return self.api.cta_get_first_entertime(id, bytes(stdCode, encoding = "utf8"))
+        return self.api.cta_get_first_entertime(id, self.__encode__(stdCode))
 
     def cta_get_last_entertime(self, id:int, stdCode:str) -> int:
         '''
@@ -631,7 +685,7 @@ class WtBtWrapper:
         @stdCode    合约代码
         @return     进场时间, 格式如201907260932 
         '''
-        return self.api.cta_get_last_entertime(id, bytes(stdCode, encoding = "utf8"))
+        return self.api.cta_get_last_entertime(id, self.__encode__(stdCode))
 
     def cta_get_last_entertag(self, id:int, stdCode:str) -> str:
         '''
@@ -639,7 +693,7 @@ class WtBtWrapper:
         @stdCode    合约代码
         @return     进场标记 
         '''
-        return bytes.decode(self.api.cta_get_last_entertag(id, bytes(stdCode, encoding = "utf8")))
+        return self.__decode__(self.api.cta_get_last_entertag(id, self.__encode__(stdCode)))
 
     def cta_get_last_exittime(self, id:int, stdCode:str) -> int:
         '''
@@ -647,7 +701,7 @@ class WtBtWrapper:
         @stdCode    合约代码
         @return     进场时间, 格式如201907260932 
         '''
-        return self.api.cta_get_last_exittime(id, bytes(stdCode, encoding = "utf8"))
+        return self.api.cta_get_last_exittime(id, self.__encode__(stdCode))
 
     def cta_log_text(self, id:int, level:int, message:str):
         '''
@@ -666,7 +720,7 @@ class WtBtWrapper:
         @usertag    进场标记
         @return     进场时间, 格式如201907260932 
         '''
-        return self.api.cta_get_detail_entertime(id, bytes(stdCode, encoding = "utf8"), bytes(usertag, encoding = "utf8")) 
+        return self.api.cta_get_detail_entertime(id, self.__encode__(stdCode), self.__encode__(usertag)) 
 
     def cta_get_detail_cost(self, id:int, stdCode:str, usertag:str) -> float:
         '''
@@ -676,7 +730,7 @@ class WtBtWrapper:
         @usertag    进场标记
         @return     开仓价 
         '''
-        return self.api.cta_get_detail_cost(id, bytes(stdCode, encoding = "utf8"), bytes(usertag, encoding = "utf8")) 
+        return self.api.cta_get_detail_cost(id, self.__encode__(stdCode), self.__encode__(usertag)) 
 
     def cta_get_detail_profit(self, id:int, stdCode:str, usertag:str, flag:int):
         '''
@@ -687,7 +741,7 @@ class WtBtWrapper:
         @flag       盈亏记号, 0-浮动盈亏, 1-最大浮盈, -1-最大亏损（负数）, 2-最大浮盈价格， -2-最大浮亏价格
         @return     盈亏 
         '''
-        return self.api.cta_get_detail_profit(id, bytes(stdCode, encoding = "utf8"), bytes(usertag, encoding = "utf8"), flag) 
+        return self.api.cta_get_detail_profit(id, self.__encode__(stdCode), self.__encode__(usertag), flag) 
 
     def cta_save_user_data(self, id:int, key:str, val:str):
         '''
@@ -714,7 +768,7 @@ class WtBtWrapper:
         @id         策略id
         @stdCode    品种代码
         '''
-        self.api.cta_sub_ticks(id, bytes(stdCode, encoding = "utf8"))
+        self.api.cta_sub_ticks(id, self.__encode__(stdCode))
 
     def cta_sub_bar_events(self, id:int, stdCode:str, period:str):
         '''
@@ -723,7 +777,7 @@ class WtBtWrapper:
         @stdCode    品种代码
         @period     周期
         '''
-        self.api.cta_sub_bar_events(id, bytes(stdCode, encoding = "utf8"), bytes(period, encoding = "utf8"))
+        self.api.cta_sub_bar_events(id, self.__encode__(stdCode), self.__encode__(period))
 
     def cta_step(self, id:int) -> bool:
         '''
@@ -738,7 +792,7 @@ class WtBtWrapper:
         @stdCode    合约代码
         @period     K线周期
         '''
-        self.api.cta_set_chart_kline(id, bytes(stdCode, encoding = "utf8"), bytes(period, encoding = "utf8"))
+        self.api.cta_set_chart_kline(id, self.__encode__(stdCode), self.__encode__(period))
 
     def cta_add_chart_mark(self, id:int, price:float, icon:str, tag:str = 'Notag'):
         '''
@@ -794,7 +848,7 @@ class WtBtWrapper:
         @period 周期, 如m1/m3/d1等
         @count  条数
         '''
-        return self.api.sel_get_bars(id, bytes(stdCode, encoding = "utf8"), bytes(period, encoding = "utf8"), count, CB_STRATEGY_GET_BAR(self.on_stra_get_bar))
+        return self.api.sel_get_bars(id, self.__encode__(stdCode), self.__encode__(period), count, self.cb_stra_get_bar)
     
     def sel_get_ticks(self, id:int, stdCode:str, count:int):
         '''
@@ -803,7 +857,7 @@ class WtBtWrapper:
         @stdCode   合约代码
         @count  条数
         '''
-        return self.api.sel_get_ticks(id, bytes(stdCode, encoding = "utf8"), count, CB_STRATEGY_GET_TICK(self.on_stra_get_tick))
+        return self.api.sel_get_ticks(id, self.__encode__(stdCode), count, self.cb_stra_get_tick)
 
     def sel_save_user_data(self, id:int, key:str, val:str):
         '''
@@ -829,7 +883,7 @@ class WtBtWrapper:
         获取全部持仓
         @id     策略id
         '''
-        return self.api.sel_get_all_position(id, CB_STRATEGY_GET_POSITION(self.on_stra_get_position))
+        return self.api.sel_get_all_position(id, self.cb_stra_get_position)
 
     def sel_get_position(self, id:int, stdCode:str, bonlyvalid:bool = False, usertag:str = ""):
         '''
@@ -839,14 +893,14 @@ class WtBtWrapper:
         @usertag    进场标记, 如果为空则获取该合约全部持仓
         @return 指定合约的持仓手数, 正为多, 负为空
         '''
-        return self.api.sel_get_position(id, bytes(stdCode, encoding = "utf8"), bonlyvalid, bytes(usertag, encoding = "utf8"))
+        return self.api.sel_get_position(id, self.__encode__(stdCode), bonlyvalid, self.__encode__(usertag))
 
     def sel_get_price(self, stdCode:str):
         '''
         @stdCode   合约代码
         @return 指定合约的最新价格 
         '''
-        return self.api.sel_get_price(bytes(stdCode, encoding = "utf8"))
+        return self.api.sel_get_price(self.__encode__(stdCode))
 
     def sel_set_position(self, id:int, stdCode:str, qty:float, usertag:str = ""):
         '''
@@ -855,8 +909,35 @@ class WtBtWrapper:
         @stdCode   合约代码
         @qty    目标仓位, 正为多, 负为空
         '''
-        self.api.sel_set_position(id, bytes(stdCode, encoding = "utf8"), qty, bytes(usertag, encoding = "utf8"))
-    
+        self.api.sel_set_position(id, self.__encode__(stdCode), qty, self.__encode__(usertag))
+
+    def sel_get_positions(self, id:int, codes:list, bonlyvalid:bool = False, usertag:str = "") -> np.ndarray:
+        '''
+        批量获取持仓
+        @id         策略id
+        @codes      合约代码列表
+        @usertag    进场标记, 如果为空则获取该合约全部持仓
+        @return     和codes一一对应的持仓手数, 正为多, 负为空
+        '''
+        # 底层没有批量接口, 只能逐个调用, 把函数查找和标记编码都提到循环外面
+        func = self.api.sel_get_position
+        encode = self.__encode__
+        tag = encode(usertag)
+        return np.fromiter((func(id, encode(code), bonlyvalid, tag) for code in codes), dtype=np.float64, count=len(codes))
+
+    def sel_set_positions(self, id:int, codes:list, qtys:list, usertag:str = ""):
+        '''
+        批量设置目标仓位
+        @id         策略id
+        @codes      合约代码列表
+        @qtys       和codes一一对应的目标仓位, 正为多, 负为空
+        '''
+        func = self.api.sel_set_position
+        encode = self.__encode__
+        tag = encode(usertag)
+        for code, qty in zip(codes, qtys):
+            func(id, encode(code), qty, tag)
+
     def sel_get_tdate(self) -> int:
         '''
         获取当前交易日
@@ -893,7 +974,7 @@ class WtBtWrapper:
         @id         策略id
         @stdCode    品种代码
         '''
-        self.api.sel_sub_ticks(id, bytes(stdCode, encoding = "utf8"))
+        self.api.sel_sub_ticks(id, self.__encode__(stdCode))
 
     def sel_get_day_price(self, stdCode:str, flag:int = 0) -> float:
         '''
@@ -902,7 +983,7 @@ class WtBtWrapper:
         @flag       价格标记, 0-开盘价, 1-最高价, 2-最低价, 3-最新价
         @return     指定合约的价格 
         '''
-        return self.api.sel_get_day_price(bytes(stdCode, encoding = "utf8"), flag)
+        return self.api.sel_get_day_price(self.__encode__(stdCode), flag)
 
     def sel_get_fund_data(self, id:int, flag:int) -> float:
         '''
@@ -920,7 +1001,7 @@ class WtBtWrapper:
         @stdCode    合约代码
         @return     指定合约的浮动盈亏
         '''
-        return self.api.sel_get_position_profit(id, bytes(stdCode, encoding = "utf8"))
+        return self.api.sel_get_position_profit(id, self.__encode__(stdCode))
 
     def sel_get_position_avgpx(self, id:int, stdCode:str):
         '''
@@ -929,7 +1010,7 @@ class WtBtWrapper:
         @stdCode    合约代码
         @return     指定合约的持仓均价
         '''
-        return self.api.sel_get_position_avgpx(id, bytes(stdCode, encoding = "utf8"))
+        return self.api.sel_get_position_avgpx(id, self.__encode__(stdCode))
 
     def sel_get_first_entertime(self, id:int, stdCode:str) -> int:
         '''
@@ -937,7 +1018,7 @@ class WtBtWrapper:
         @stdCode    合约代码
         @return     进场时间, 格式如201907260932 
         '''
-        return self.api.sel_get_first_entertime(id, bytes(stdCode, encoding = "utf8"))
+        return self.api.sel_get_first_entertime(id, self.__encode__(stdCode))
 
     def sel_get_last_entertime(self, id:int, stdCode:str) -> int:
         '''
@@ -945,7 +1026,7 @@ class WtBtWrapper:
         @stdCode    合约代码
         @return     进场时间, 格式如201907260932 
         '''
-        return self.api.sel_get_last_entertime(id, bytes(stdCode, encoding = "utf8"))
+        return self.api.sel_get_last_entertime(id, self.__encode__(stdCode))
 
     def sel_get_last_entertag(self, id:int, stdCode:str) -> str:
         '''
@@ -953,7 +1034,7 @@ class WtBtWrapper:
         @stdCode    合约代码
         @return     进场标记 
         '''
-        return bytes.decode(self.api.sel_get_last_entertag(id, bytes(stdCode, encoding = "utf8")))
+        return self.__decode__(self.api.sel_get_last_entertag(id, self.__encode__(stdCode)))
 
     def sel_get_last_exittime(self, id:int, stdCode:str) -> int:
         '''
@@ -961,7 +1042,7 @@ class WtBtWrapper:
         @stdCode    合约代码
         @return     进场时间, 格式如201907260932 
         '''
-        return self.api.sel_get_last_exittime(id, bytes(stdCode, encoding = "utf8"))
+        return self.api.sel_get_last_exittime(id, self.__encode__(stdCode))
 
     def sel_get_detail_entertime(self, id:int, stdCode:str, usertag:str) -> int:
         '''
@@ -971,7 +1052,7 @@ class WtBtWrapper:
         @usertag    进场标记
         @return     进场时间, 格式如201907260932 
         '''
-        return self.api.sel_get_detail_entertime(id, bytes(stdCode, encoding = "utf8"), bytes(usertag, encoding = "utf8")) 
+        return self.api.sel_get_detail_entertime(id, self.__encode__(stdCode), self.__encode__(usertag)) 
 
     def sel_get_detail_cost(self, id:int, stdCode:str, usertag:str) -> float:
         '''
@@ -981,7 +1062,7 @@ class WtBtWrapper:
         @usertag    进场标记
         @return     开仓价 
         '''
-        return self.api.sel_get_detail_cost(id, bytes(stdCode, encoding = "utf8"), bytes(usertag, encoding = "utf8")) 
+        return self.api.sel_get_detail_cost(id, self.__encode__(stdCode), self.__encode__(usertag)) 
 
     def sel_get_detail_profit(self, id:int, stdCode:str, usertag:str, flag:int):
         '''
@@ -992,7 +1073,7 @@ class WtBtWrapper:
         @flag       盈亏记号, 0-浮动盈亏, 1-最大浮盈, -1-最大亏损（负数）, 2-最大浮盈价格， -2-最大浮亏价格
         @return     盈亏 
         '''
-        return self.api.sel_get_detail_profit(id, bytes(stdCode, encoding = "utf8"), bytes(usertag, encoding = "utf8"), flag) 
+        return self.api.sel_get_detail_profit(id, self.__encode__(stdCode), self.__encode__(usertag), flag) 
 
 
     ''''''''''''''''''''''''''''''''''''''''''''''''''''''''''''''''''''''''''''''''''''''''''''''''''''''''''''
@@ -1005,7 +1086,7 @@ class WtBtWrapper:
         @period 周期, 如m1/m3/d1等
         @count  条数
         '''
-        return self.api.hft_get_bars(id, bytes(stdCode, encoding = "utf8"), bytes(period, encoding = "utf8"), count, CB_STRATEGY_GET_BAR(self.on_stra_get_bar))
+        return self.api.hft_get_bars(id, self.__encode__(stdCode), self.__encode__(period), count, self.cb_stra_get_bar)
     
     def hft_get_ticks(self, id:int, stdCode:str, count:int):
         '''
@@ -1014,7 +1095,7 @@ class WtBtWrapper:
         @stdCode   合约代码
         @count  条数
         '''
-        return self.api.hft_get_ticks(id, bytes(stdCode, encoding = "utf8"), count, CB_STRATEGY_GET_TICK(self.on_stra_get_tick))
+        return self.api.hft_get_ticks(id, self.__encode__(stdCode), count, self.cb_stra_get_tick)
 
     def hft_get_ordque(self, id:int, stdCode:str, count:int):
         '''
@@ -1023,7 +1104,7 @@ class WtBtWrapper:
         @stdCode   合约代码
         @count     条数
         '''
-        return self.api.hft_get_ordque(id, bytes(stdCode, encoding = "utf8"), count, CB_HFTSTRA_GET_ORDQUE(self.on_hftstra_get_order_queue))
+        return self.api.hft_get_ordque(id, self.__encode__(stdCode), count, self.cb_hftstra_get_ordque)
 
     def hft_get_orddtl(self, id:int, stdCode:str, count:int):
         '''
@@ -1032,7 +1113,7 @@ class WtBtWrapper:
         @stdCode   合约代码
         @count     条数
         '''
-        return self.api.hft_get_orddtl(id, bytes(stdCode, encoding = "utf8"), count, CB_HFTSTRA_GET_ORDDTL(self.on_hftstra_get_order_detail))
+        return self.api.hft_get_orddtl(id, self.__encode__(stdCode), count, self.cb_hftstra_get_orddtl)
 
     def hft_get_trans(self, id:int, stdCode:str, count:int):
         '''
@@ -1041,7 +1122,7 @@ class WtBtWrapper:
         @stdCode   合约代码
         @count     条数
         '''
-        return self.api.hft_get_trans(id, bytes(stdCode, encoding = "utf8"), count, CB_HFTSTRA_GET_TRANS(self.on_hftstra_get_transaction))
+        return self.api.hft_get_trans(id, self.__encode__(stdCode), count, self.cb_hftstra_get_trans)
 
     def hft_save_user_data(self, id:int, key:str, val:str):
         '''
@@ -1069,7 +1150,7 @@ class WtBtWrapper:
         @stdCode   合约代码
         @return 指定合约的持仓手数, 正为多, 负为空
         '''
-        return self.api.hft_get_position(id, bytes(stdCode, encoding = "utf8"), bonlyvalid)
+        return self.api.hft_get_position(id, self.__encode__(stdCode), bonlyvalid)
 
     def hft_get_position_profit(self, id:int, stdCode:str):
         '''
@@ -1078,7 +1159,7 @@ class WtBtWrapper:
         @stdCode   合约代码
         @return 指定持仓的浮动盈亏
         '''
-        return self.api.hft_get_position_profit(id, bytes(stdCode, encoding = "utf8"))
+        return self.api.hft_get_position_profit(id, self.__encode__(stdCode))
 
     def hft_get_position_avgpx(self, id:int, stdCode:str):
         '''
@@ -1087,7 +1168,7 @@ class WtBtWrapper:
         @stdCode   合约代码
         @return 指定持仓的浮动盈亏
         '''
-        return self.api.hft_get_position_avgpx(id, bytes(stdCode, encoding = "utf8"))
+        return self.api.hft_get_position_avgpx(id, self.__encode__(stdCode))
 
     def hft_get_undone(self, id:int, stdCode:str):
         '''
@@ -1096,14 +1177,14 @@ class WtBtWrapper:
         @stdCode   合约代码
         @return 指定合约的持仓手数, 正为多, 负为空
         '''
-        return self.api.hft_get_undone(id, bytes(stdCode, encoding = "utf8"))
+        return self.api.hft_get_undone(id, self.__encode__(stdCode))
 
     def hft_get_price(self, stdCode:str):
         '''
         @stdCode   合约代码
         @return 指定合约的最新价格 
         '''
-        return self.api.hft_get_price(bytes(stdCode, encoding = "utf8"))
+        return self.api.hft_get_price(self.__encode__(stdCode))
 
     def hft_get_date(self):
         '''
@@ -1141,7 +1222,7 @@ class WtBtWrapper:
         @id         策略ID
         @stdCode    品种代码
         '''
-        self.api.hft_sub_ticks(id, bytes(stdCode, encoding = "utf8"))
+        self.api.hft_sub_ticks(id, self.__encode__(stdCode))
 
     def hft_sub_order_queue(self, id:int, stdCode:str):
         '''
@@ -1149,7 +1230,7 @@ class WtBtWrapper:
         @id         策略ID
         @stdCode    品种代码
         '''
-        self.api.hft_sub_order_queue(id, bytes(stdCode, encoding = "utf8"))
+        self.api.hft_sub_order_queue(id, self.__encode__(stdCode))
 
     def hft_sub_order_detail(self, id:int, stdCode:str):
         '''
@@ -1157,7 +1238,7 @@ class WtBtWrapper:
         @id         策略ID
         @stdCode    品种代码
         '''
-        self.api.hft_sub_order_detail(id, bytes(stdCode, encoding = "utf8"))
+        self.api.hft_sub_order_detail(id, self.__encode__(stdCode))
 
     def hft_sub_transaction(self, id:int, stdCode:str):
         '''
@@ -1165,7 +1246,7 @@ class WtBtWrapper:
         @id         策略ID
         @stdCode    品种代码
         '''
-        self.api.hft_sub_transaction(id, bytes(stdCode, encoding = "utf8"))
+        self.api.hft_sub_transaction(id, self.__encode__(stdCode))
 
     def hft_cancel(self, id:int, localid:int):
         '''
@@ -1182,7 +1263,7 @@ class WtBtWrapper:
         @stdCode    品种代码
         @isBuy      买入or卖出
         '''
-        ret = self.api.hft_cancel_all(id, bytes(stdCode, encoding = "utf8"), isBuy)
+        ret = self.api.hft_cancel_all(id, self.__encode__(stdCode), isBuy)
         return bytes.decode(ret)
 
     def hft_buy(self, id:int, stdCode:str, price:float, qty:float, userTag:str, flag:int):
@@ -1193,7 +1274,7 @@ class WtBtWrapper:
         @price      买入价格, 0为市价
         @qty        买入数量
         '''
-        ret = self.api.hft_buy(id, bytes(stdCode, encoding = "utf8"), price, qty, bytes(userTag, encoding = "utf8"), flag)
+        ret = self.api.hft_buy(id, self.__encode__(stdCode), price, qty, self.__encode__(userTag), flag)
         return bytes.decode(ret)
 
     def hft_sell(self, id:int, stdCode:str, price:float, qty:float, userTag:str, flag:int):
@@ -1204,7 +1285,7 @@ class WtBtWrapper:
         @price      卖出价格, 0为市价
         @qty        卖出数量
         '''
-        ret = self.api.hft_sell(id, bytes(stdCode, encoding = "utf8"), price, qty, bytes(userTag, encoding = "utf8"), flag)
+        ret = self.api.hft_sell(id, self.__encode__(stdCode), price, qty, self.__encode__(userTag), flag)
         return bytes.decode(ret)
 
     def hft_step(self, id:int):
@@ -1245,4 +1326,4 @@ class WtBtWrapper:
         @return    系统内策略ID 
         '''
         return self.api.init_sel_mocker(bytes(name, encoding = "utf8"), date, time, 
-            bytes(period, encoding = "utf8"), bytes(trdtpl, encoding = "utf8"), bytes(session, encoding = "utf8"), slippage, isRatioSlp)
+            self.__encode__(period), bytes(trdtpl, encoding = "utf8"), bytes(session, encoding = "utf8"), slippage, isRatioSlp)
@@ -194,13 +194,17 @@ class WtDataHelper:
         class DataCache:
             def __init__(self):
                 self.records:WtNpOrdDetails = None
+                self.total_count = 0
 
             def on_read_data(self, firstItem:POINTER(WTSOrdDtlStruct), count:int, isLast:bool):
-                self.records = WtNpOrdDetails(forceCopy=True)
+                if self.records is None:
+                    self.records = WtNpOrdDetails(forceCopy=True, capacity=self.total_count)
                 self.records.set_data(firstItem, count)
 
             def on_data_count(self, count:int):
-                pass
+                self.total_count = count
+                if self.records is not None:
+                    self.records.reserve(count)
         
         data_cache = DataCache()
         if 0 == self.api.read_dsb_order_details(bytes(dataFile, encoding="utf8"), CB_DTHELPER_ORDDTL(data_cache.on_read_data), CB_DTHELPER_COUNT(data_cache.on_data_count), self.cb_dthelper_log):
@@ -217,13 +221,17 @@ class WtDataHelper:
         class DataCache:
             def __init__(self):
                 self.records:WtNpOrdQueues = None
+                self.total_count = 0
 
             def on_read_data(self, firstItem:POINTER(WTSOrdQueStruct), count:int, isLast:bool):
-                self.records = WtNpOrdQueues(forceCopy=True)
+                if self.records is None:
+                    self.records = WtNpOrdQueues(forceCopy=True, capacity=self.total_count)
                 self.records.set_data(firstItem, count)
 
             def on_data_count(self, count:int):
-                pass
+                self.total_count = count
+                if self.records is not None:
+                    self.records.reserve(count)
         
         data_cache = DataCache()
         if 0 == self.api.read_dsb_order_queues(bytes(dataFile, encoding="utf8"), CB_DTHELPER_ORDQUE(data_cache.on_read_data), CB_DTHELPER_COUNT(data_cache.on_data_count), self.cb_dthelper_log):
@@ -240,13 +248,17 @@ class WtDataHelper:
         class DataCache:
             def __init__(self):
                 self.records:WtNpTransactions = None
+                self.total_count = 0
 
             def on_read_data(self, firstItem:POINTER(WTSTransStruct), count:int, isLast:bool):
-                self.records = WtNpTransactions(forceCopy=True)
+                if self.records is None:
+                    self.records = WtNpTransactions(forceCopy=True, capacity=self.total_count)
                 self.records.set_data(firstItem, count)
 
             def on_data_count(self, count:int):
-                pass
+                self.total_count = count
+                if self.records is not None:
+                    self.records.reserve(count)
         
         data_cache = DataCache()
         if 0 == self.api.read_dsb_transactions(bytes(dataFile, encoding="utf8"), CB_DTHELPER_TRANS(data_cache.on_read_data), CB_DTHELPER_COUNT(data_cache.on_data_count), self.cb_dthelper_log):
@@ -116,7 +116,7 @@ class WtDtWrapper:
         fullCode = bytes.decode(fullCode)
         period = bytes.decode(period)
 
-        return dumper.dump_his_bars(fullCode, period, bars, count)
+        return dumper.on_dump_his_bars(fullCode, period, bars, count)
 
     def dump_his_ticks(self, id:str, fullCode:str, uDate:int, ticks:POINTER(WTSTickStruct), count:int) -> bool:
         id = bytes.decode(id)
@@ -127,4 +127,4 @@ class WtDtWrapper:
 
         fullCode = bytes.decode(fullCode)
 
-        return dumper.dump_his_ticks(fullCode, uDate, ticks, count)
+        return dumper.on_dump_his_ticks(fullCode, uDate, ticks, count)
@@ -9,8 +9,9 @@ from wtpy.WtCoreDefs import FUNC_LOAD_HISBARS, FUNC_LOAD_HISTICKS, FUNC_LOAD_ADJ
 from wtpy.WtCoreDefs import EVENT_ENGINE_INIT, EVENT_SESSION_BEGIN, EVENT_SESSION_END, EVENT_ENGINE_SCHDL
 from wtpy.WtCoreDefs import WTSTickStruct, WTSBarStruct, WTSOrdQueStruct, WTSOrdDtlStruct, WTSTransStruct
 from wtpy.WtDataDefs import WtNpKline, WtNpOrdDetails, WtNpOrdQueues, WtNpTicks, WtNpTransactions
-from wtpy.WtUtilDefs import singleton
+from wtpy.WtUtilDefs import singleton, CodeCache
 from .PlatformHelper import PlatformHelper as ph
+import numpy as np
 import os
 
 # Python对接C接口的库
@@ -104,6 +105,19 @@ class WtWrapper:
 
         self.api.get_raw_stdcode.restype = c_char_p
 
+        # 合约代码、周期等字符串的编解码缓存
+        self.__codes__ = CodeCache()
+        self.__encode__ = self.__codes__.encode
+        self.__decode__ = self.__codes__.decode
+
+        # 主动拉取数据的回调只创建一次, 不用每次调用都新建一个
+        self.cb_stra_get_bar = CB_STRATEGY_GET_BAR(self.on_stra_get_bar)
+        self.cb_stra_get_tick = CB_STRATEGY_GET_TICK(self.on_stra_get_tick)
+        self.cb_stra_get_position = CB_STRATEGY_GET_POSITION(self.on_stra_get_position)
+        self.cb_hftstra_get_ordque = CB_HFTSTRA_GET_ORDQUE(self.on_hftstra_get_order_queue)
+        self.cb_hftstra_get_orddtl = CB_HFTSTRA_GET_ORDDTL(self.on_hftstra_get_order_detail)
+        self.cb_hftstra_get_trans = CB_HFTSTRA_GET_TRANS(self.on_hftstra_get_transaction)
+
     def on_engine_event(self, evtid:int, evtDate:int, evtTime:int):
         engine = self._engine
         if evtid == EVENT_ENGINE_INIT:
@@ -146,14 +160,14 @@ class WtWrapper:
         ctx = engine.get_context(id)
 
         if ctx is not None:
-            ctx.on_tick(bytes.decode(stdCode), newTick)
+            ctx.on_tick(self.__decode__(stdCode), newTick)
         return
     
     def on_stra_bar(self, id:int, stdCode:str, period:str, newBar:POINTER(WTSBarStruct)):
         engine = self._engine
         ctx = engine.get_context(id)
         if ctx is not None:
-            ctx.on_bar(bytes.decode(stdCode), bytes.decode(period), newBar)
+            ctx.on_bar(self.__decode__(stdCode), self.__decode__(period), newBar)
         return
     
     def on_stra_get_bar(self, id:int, stdCode:str, period:str, curBar:POINTER(WTSBarStruct), count:int, isLast:bool):
@@ -167,14 +181,14 @@ class WtWrapper:
         '''
         engine = self._engine
         ctx = engine.get_context(id)
-        period = bytes.decode(period)
+        period = self.__decode__(period)
         isDay = period[0]=='d'
 
         npBars = WtNpKline(isDay, forceCopy=False)
         npBars.set_data(curBar, count)
 
         if ctx is not None:
-            ctx.on_getbars(bytes.decode(stdCode), period, npBars)
+            ctx.on_getbars(self.__decode__(stdCode), period, npBars)
 
     def on_stra_get_tick(self, id:int, stdCode:str, curTick:POINTER(WTSTickStruct), count:int, isLast:bool):
         '''
@@ -191,20 +205,20 @@ class WtWrapper:
         npTicks.set_data(curTick, count)
 
         if ctx is not None:
-            ctx.on_getticks(bytes.decode(stdCode), npTicks)
+            ctx.on_getticks(self.__decode__(stdCode), npTicks)
         return
 
     def on_stra_get_position(self, id:int, stdCode:str, qty:float, frozen:float):
         engine = self._engine
         ctx = engine.get_context(id)
         if ctx is not None:
-            ctx.on_getpositions(bytes.decode(stdCode), qty, frozen)
+            ctx.on_getpositions(self.__decode__(stdCode), qty, frozen)
 
     def on_stra_cond_triggerd(self, id:int, stdCode:str, target:float, price:float, usertag:str):
         engine = self._engine
         ctx = engine.get_context(id)
         if ctx is not None:
-            ctx.on_condition_triggered(bytes.decode(stdCode), target, price, bytes.decode(usertag))
+            ctx.on_condition_triggered(self.__decode__(stdCode), target, price, self.__decode__(usertag))
 
     def on_hftstra_channel_evt(self, id:int, trader:str, evtid:int):
         engine = self._engine
@@ -216,35 +230,35 @@ class WtWrapper:
             ctx.on_channel_lost()
 
     def on_hftstra_order(self, id:int, localid:int, stdCode:str, isBuy:bool, totalQty:float, leftQty:float, price:float, isCanceled:bool, userTag:str):
-        stdCode = bytes.decode(stdCode)
-        userTag = bytes.decode(userTag)
+        stdCode = self.__decode__(stdCode)
+        userTag = self.__decode__(userTag)
         engine = self._engine
         ctx = engine.get_context(id)
         ctx.on_order(localid, stdCode, isBuy, totalQty, leftQty, price, isCanceled, userTag)
 
     def on_hftstra_trade(self, id:int, localid:int, stdCode:str, isBuy:bool, qty:float, price:float, userTag:str):
-        stdCode = bytes.decode(stdCode)
-        userTag = bytes.decode(userTag)
+        stdCode = self.__decode__(stdCode)
+        userTag = self.__decode__(userTag)
         engine = self._engine
         ctx = engine.get_context(id)
         ctx.on_trade(localid, stdCode, isBuy, qty, price, userTag)
 
     def on_hftstra_entrust(self, id:int, localid:int, stdCode:str, bSucc:bool, message:str, userTag:str):
-        stdCode = bytes.decode(stdCode)
+        stdCode = self.__decode__(stdCode)
         message = bytes.decode(message, "gbk")
-        userTag = bytes.decode(userTag)
+        userTag = self.__decode__(userTag)
         engine = self._engine
         ctx = engine.get_context(id)
         ctx.on_entrust(localid, stdCode, bSucc, message, userTag)
 
     def on_hftstra_position(self, id:int, stdCode:str, isLong:bool, prevol:float, preavail:float, newvol:float, newavail:float):
-        stdCode = bytes.decode(stdCode)
+        stdCode = self.__decode__(stdCode)
         engine = self._engine
         ctx = engine.get_context(id)
         ctx.on_position(stdCode, isLong, prevol, preavail, newvol, newavail)
 
     def on_hftstra_order_queue(self, id:int, stdCode:str, newOrdQue:POINTER(WTSOrdQueStruct)):
-        stdCode = bytes.decode(stdCode)
+        stdCode = self.__decode__(stdCode)
         engine = self._engine
         ctx = engine.get_context(id)
 
@@ -258,14 +272,14 @@ class WtWrapper:
         npHftData.set_data(newOrdQue, count)
 
         if ctx is not None:
-            ctx.on_get_order_queue(bytes.decode(stdCode), npHftData)
+            ctx.on_get_order_queue(self.__decode__(stdCode), npHftData)
 
     def on_hftstra_order_detail(self, id:int, stdCode:str, newOrdDtl:POINTER(WTSOrdDtlStruct)):
         engine = self._engine
         ctx = engine.get_context(id)
         
         if ctx is not None:
-            ctx.on_order_detail(stdCode, newOrdDtl)
+            ctx.on_order_detail(self.__decode__(stdCode), newOrdDtl)
 
     def on_hftstra_get_order_detail(self, id:int, stdCode:str, newOrdDtl:POINTER(WTSOrdDtlStruct), count:int, isLast:bool):
         engine = self._engine
@@ -275,16 +289,16 @@ class WtWrapper:
         npHftData.set_data(newOrdDtl, count)
             
         if ctx is not None:
-            ctx.on_get_order_detail(bytes.decode(stdCode), npHftData)
+            ctx.on_get_order_detail(self.__decode__(stdCode), npHftData)
 
     def on_hftstra_transaction(self, id:int, stdCode:str, newTrans:POINTER(WTSTransStruct)):
         engine = self._engine
         ctx = engine.get_context(id)
         
         if ctx is not None:
-            ctx.on_transaction(stdCode, newTrans)
+            ctx.on_transaction(self.__decode__(stdCode), newTrans)
         
-    def on_hftstra_get_transaction(self, d:int, stdCode:str, newTrans:POINTER(WTSTransStruct), count:int, isLast:bool):
+    def on_hftstra_get_transaction(self, id:int, stdCode:str, newTrans:POINTER(WTSTransStruct), count:int, isLast:bool):
         engine = self._engine
         ctx = engine.get_context(id)
         
@@ -292,7 +306,7 @@ class WtWrapper:
         npHftData.set_data(newTrans, count)
             
         if ctx is not None:
-            ctx.on_get_transaction(bytes.decode(stdCode), npHftData)
+            ctx.on_get_transaction(self.__decode__(stdCode), npHftData)
 
     def on_parser_event(self, evtId:int, id:str):
         id = bytes.decode(id)
@@ -338,7 +352,7 @@ class WtWrapper:
         if executer is None:
             return
 
-        executer.set_position(bytes.decode(stdCode), targetPos)
+        executer.set_position(self.__decode__(stdCode), targetPos)
 
     def on_load_fnl_his_bars(self, stdCode:str, period:str):
         engine = self._engine
@@ -347,7 +361,7 @@ class WtWrapper:
             return False
 
         # feed_raw_bars(WTSBarStruct* bars, WtUInt32 count);
-        loader.load_final_his_bars(bytes.decode(stdCode), bytes.decode(period), self.api.feed_raw_bars)
+        loader.load_final_his_bars(self.__decode__(stdCode), self.__decode__(period), self.api.feed_raw_bars)
 
     def on_load_raw_his_bars(self, stdCode:str, period:str):
         engine = self._engine
@@ -356,15 +370,27 @@ class WtWrapper:
             return False
 
         # feed_raw_bars(WTSBarStruct* bars, WtUInt32 count);
-        loader.load_raw_his_bars(bytes.decode(stdCode), bytes.decode(period), self.api.feed_raw_bars)
+        loader.load_raw_his_bars(self.__decode__(stdCode), self.__decode__(period), self.api.feed_raw_bars)
 
-    def feed_adj_factors(self, stdCode:str, dates:list, factors:list):
-        stdCode = bytes(stdCode, encoding="utf8")
+    def feed_adj_factors(self, stdCode:str, dates, factors):
         '''
-        TODO 这里类型要转一下! 底层接口是传数组的
+        向底层提交复权因子
         feed_adj_factors(WtString stdCode, WtUInt32* dates, double* factors, WtUInt32 count)
+        @stdCode    合约代码
+        @dates      日期, list或者numpy数组, 已经是连续的uint32数组时不拷贝
+        @factors    复权因子, list或者numpy数组, 已经是连续的float64数组时不拷贝
         '''
-        self.api.feed_adj_factors(stdCode, dates, factors, len(dates))
+        dates = np.ascontiguousarray(dates, dtype=np.uint32)
+        factors = np.ascontiguousarray(factors, dtype=np.float64)
+        if len(dates) != len(factors):
+            raise ValueError("length of dates and factors mismatch: %d vs %d" % (len(dates), len(factors)))
+
+        count = len(dates)
+        if count == 0:
+            return
+
+        self.api.feed_adj_factors(bytes(stdCode, encoding="utf8"), dates.ctypes.data_as(POINTER(c_uint32)),
+            factors.ctypes.data_as(POINTER(c_double)), c_uint32(count))
 
     def on_load_adj_factors(self, stdCode:str) -> bool:
         engine = self._engine
@@ -372,7 +398,7 @@ class WtWrapper:
         if loader is None:
             return False
 
-        stdCode = bytes.decode(stdCode)
+        stdCode = self.__decode__(stdCode)
         return loader.load_adj_factors(stdCode, self.feed_adj_factors)
 
     def on_load_his_ticks(self, stdCode:str, uDate:int):
@@ -382,7 +408,7 @@ class WtWrapper:
             return False
 
         # feed_raw_ticks(WTSTickStruct* ticks, WtUInt32 count);
-        loader.load_his_ticks(bytes.decode(stdCode), uDate, self.api.feed_raw_ticks)
+        loader.load_his_ticks(self.__decode__(stdCode), uDate, self.api.feed_raw_ticks)
 
     def write_log(self, level, message:str, catName:str = ""):
         self.api.write_log(level, bytes(message, encoding = "utf8"), bytes(catName, encoding = "utf8"))
@@ -398,7 +424,7 @@ class WtWrapper:
         self.api.config_porter(bytes(cfgfile, encoding = "utf8"), isFile)
 
     def get_raw_stdcode(self, stdCode:str):
-        return bytes.decode(self.api.get_raw_stdcode(bytes(stdCode, encoding = "utf8")))
+        return bytes.decode(self.api.get_raw_stdcode(self.__encode__(stdCode)))
 
     def create_extended_parser(self, id:str) -> bool:
         return self.api.create_ext_parser(bytes(id, encoding = "utf8"))
@@ -511,7 +537,7 @@ class WtWrapper:
         @stdCode    合约代码
         @qty        手数, 大于等于0
         '''
-        self.api.cta_enter_long(id, bytes(stdCode, encoding = "utf8"), qty, bytes(usertag, encoding = "utf8"), limitprice, stopprice)
+        self.api.cta_enter_long(id, self.__encode__(stdCode), qty, self.__encode__(usertag), limitprice, stopprice)
 
     def cta_exit_long(self, id:int, stdCode:str, qty:float, usertag:str, limitprice:float = 0.0, stopprice:float = 0.0):
         '''
@@ -520,7 +546,7 @@ class WtWrapper:
         @stdCode    合约代码
         @qty        手数, 大于等于0
         '''
-        self.api.cta_exit_long(id, bytes(stdCode, encoding = "utf8"), qty, bytes(usertag, encoding = "utf8"), limitprice, stopprice)
+        self.api.cta_exit_long(id, self.__encode__(stdCode), qty, self.__encode__(usertag), limitprice, stopprice)
 
     def cta_enter_short(self, id:int, stdCode:str, qty:float, usertag:str, limitprice:float = 0.0, stopprice:float = 0.0):
         '''
@@ -529,7 +555,7 @@ class WtWrapper:
         @stdCode    合约代码
         @qty        手数, 大于等于0
         '''
-        self.api.cta_enter_short(id, bytes(stdCode, encoding = "utf8"), qty, bytes(usertag, encoding = "utf8"), limitprice, stopprice)
+        self.api.cta_enter_short(id, self.__encode__(stdCode), qty, self.__encode__(usertag), limitprice, stopprice)
 
     def cta_exit_short(self, id:int, stdCode:str, qty:float, usertag:str, limitprice:float = 0.0, stopprice:float = 0.0):
         '''
@@ -538,7 +564,7 @@ class WtWrapper:
         @stdCode    合约代码
         @qty        手数, 大于等于0
         '''
-        self.api.cta_exit_short(id, bytes(stdCode, encoding = "utf8"), qty, bytes(usertag, encoding = "utf8"), limitprice, stopprice)
+        self.api.cta_exit_short(id, self.__encode__(stdCode), qty, self.__encode__(usertag), limitprice, stopprice)
     
     def cta_get_bars(self, id:int, stdCode:str, period:str, count:int, isMain:bool):
         '''
@@ -549,7 +575,7 @@ class WtWrapper:
         @count      条数
         @isMain     是否主K线
         '''
-        return self.api.cta_get_bars(id, bytes(stdCode, encoding = "utf8"), bytes(period, encoding = "utf8"), count, isMain, CB_STRATEGY_GET_BAR(self.on_stra_get_bar))
+        return self.api.cta_get_bars(id, self.__encode__(stdCode), self.__encode__(period), count, isMain, self.cb_stra_get_bar)
     
     def cta_get_ticks(self, id:int, stdCode:str, count:int):
         '''
@@ -558,7 +584,7 @@ class WtWrapper:
         @stdCode    合约代码
         @count      条数
         '''
-        return self.api.cta_get_ticks(id, bytes(stdCode, encoding = "utf8"), count, CB_STRATEGY_GET_TICK(self.on_stra_get_tick))
+        return self.api.cta_get_ticks(id, self.__encode__(stdCode), count, self.cb_stra_get_tick)
 
     def cta_get_position_profit(self, id:int, stdCode:str):
         '''
@@ -567,7 +593,7 @@ class WtWrapper:
         @stdCode    合约代码
         @return     指定合约的浮动盈亏
         '''
-        return self.api.cta_get_position_profit(id, bytes(stdCode, encoding = "utf8"))
+        return self.api.cta_get_position_profit(id, self.__encode__(stdCode))
 
     def cta_get_position_avgpx(self, id:int, stdCode:str):
         '''
@@ -576,14 +602,14 @@ class WtWrapper:
         @stdCode    合约代码
         @return     指定合约的持仓均价
         '''
-        return self.api.cta_get_position_avgpx(id, bytes(stdCode, encoding = "utf8"))
+        return self.api.cta_get_position_avgpx(id, self.__encode__(stdCode))
 
     def cta_get_all_position(self, id:int):
         '''
         获取全部持仓
         @id     策略id
         '''
-        return self.api.cta_get_all_position(id, CB_STRATEGY_GET_POSITION(self.on_stra_get_position))
+        return self.api.cta_get_all_position(id, self.cb_stra_get_position)
     
     def cta_get_position(self, id:int, stdCode:str, bonlyvalid:bool = False, usertag:str = ""):
         '''
@@ -594,7 +620,7 @@ class WtWrapper:
         @usertag    进场标记, 如果为空则获取该合约全部持仓
         @return 指定合约的持仓手数, 正为多, 负为空
         '''
-        return self.api.cta_get_position(id, bytes(stdCode, encoding = "utf8"), bonlyvalid, bytes(usertag, encoding = "utf8"))
+        return self.api.cta_get_position(id, self.__encode__(stdCode), bonlyvalid, self.__encode__(usertag))
 
     def cta_get_fund_data(self, id:int, flag:int) -> float:
         '''
@@ -611,7 +637,7 @@ class WtWrapper:
         @stdCode    合约代码
         @return     指定合约的最新价格 
         '''
-        return self.api.cta_get_price(bytes(stdCode, encoding = "utf8"))
+        return self.api.cta_get_price(self.__encode__(stdCode))
 
     def cta_get_day_price(self, stdCode:str, flag:int = 0) -> float:
         '''
@@ -620,7 +646,7 @@ class WtWrapper:
         @flag       价格标记, 0-开盘价, 1-最高价, 2-最低价, 3-最新价
         @return     指定合约的价格 
         '''
-        return self.api.cta_get_day_price(bytes(stdCode, encoding = "utf8"), flag)
+        return self.api.cta_get_day_price(self.__encode__(stdCode), flag)
 
     def cta_set_position(self, id:int, stdCode:str, qty:float, usertag:str = "", limitprice:float = 0.0, stopprice:float = 0.0):
         '''
@@ -629,7 +655,35 @@ class WtWrapper:
         @stdCode    合约代码
         @qty        目标仓位, 正为多, 负为空
         '''
-        self.api.cta_set_position(id, bytes(stdCode, encoding = "utf8"), qty, bytes(usertag, encoding = "utf8"), limitprice, stopprice)
+        self.api.cta_set_position(id, self.__encode__(stdCode), qty, self.__encode__(usertag), limitprice, stopprice)
+
+    def cta_get_positions(self, id:int, codes:list, bonlyvalid:bool = False, usertag:str = "") -> np.ndarray:
+        '''
+        批量获取持仓
+        @id         策略id
+        @codes      合约代码列表
+        @bonlyvalid 只读可用持仓, 默认为False
+        @usertag    进场标记, 如果为空则获取该合约全部持仓
+        @return     和codes一一对应的持仓手数, 正为多, 负为空
+        '''
+        # 底层没有批量接口, 只能逐个调用, 把函数查找和标记编码都提到循环外面
+        func = self.api.cta_get_position
+        encode = self.__encode__
+        tag = encode(usertag)
+        return np.fromiter((func(id, encode(code), bonlyvalid, tag) for code in codes), dtype=np.float64, count=len(codes))
+
+    def cta_set_positions(self, id:int, codes:list, qtys:list, usertag:str = "", limitprice:float = 0.0, stopprice:float = 0.0):
+        '''
+        批量设置目标仓位
+        @id         策略id
+        @codes      合约代码列表
+        @qtys       和codes一一对应的目标仓位, 正为多, 负为空
+        '''
+        func = self.api.cta_set_position
+        encode = self.__encode__
+        tag = encode(usertag)
+        for code, qty in zip(codes, qtys):
+            func(id, encode(code), qty, tag, limitprice, stopprice)
 
     def cta_get_tdate(self) -> int:
         '''
@@ -658,7 +712,7 @@ class WtWrapper:
         @stdCode    合约代码
         @return     进场时间, 格式如201907260932 
         '''
-        return self.api.cta_get_first_entertime(id, bytes(stdCode, encoding = "utf8"))
+        return self.api.cta_get_first_entertime(id, self.__encode__(stdCode))
 
     def cta_get_last_entertag(self, id:int, stdCode:str) -> str:
         '''
@@ -666,7 +720,7 @@ class WtWrapper:
         @stdCode    合约代码
         @return     进场标记 
         '''
-        return bytes.decode(self.api.cta_get_last_entertag(id, bytes(stdCode, encoding = "utf8")))
+        return self.__decode__(self.api.cta_get_last_entertag(id, self.__encode__(stdCode)))
 
     def cta_get_last_entertime(self, id:int, stdCode:str) -> int:
         '''
@@ -674,7 +728,7 @@ class WtWrapper:
         @stdCode    合约代码
         @return     进场时间, 格式如201907260932 
         '''
-        return self.api.cta_get_last_entertime(id, bytes(stdCode, encoding = "utf8"))
+        return self.api.cta_get_last_entertime(id, self.__encode__(stdCode))
 
     def cta_get_last_exittime(self, id:int, stdCode:str) -> int:
         '''
@@ -682,7 +736,7 @@ class WtWrapper:
         @stdCode    合约代码
         @return     进场时间, 格式如201907260932 
         '''
-        return self.api.cta_get_last_exittime(id, bytes(stdCode, encoding = "utf8"))
+        return self.api.cta_get_last_exittime(id, self.__encode__(stdCode))
 
     def cta_log_text(self, id:int, level:int, message:str):
         '''
@@ -701,7 +755,7 @@ class WtWrapper:
         @usertag    进场标记
         @return     进场时间, 格式如201907260932 
         '''
-        return self.api.cta_get_detail_entertime(id, bytes(stdCode, encoding = "utf8"), bytes(usertag, encoding = "utf8")) 
+        return self.api.cta_get_detail_entertime(id, self.__encode__(stdCode), self.__encode__(usertag)) 
 
     def cta_get_detail_cost(self, id:int, stdCode:str, usertag:str) -> float:
         '''
@@ -711,7 +765,7 @@ class WtWrapper:
         @usertag    进场标记
         @return     开仓价 
         '''
-        return self.api.cta_get_detail_cost(id, bytes(stdCode, encoding = "utf8"), bytes(usertag, encoding = "utf8")) 
+        return self.api.cta_get_detail_cost(id, self.__encode__(stdCode), self.__encode__(usertag)) 
 
     def cta_get_detail_profit(self, id:int, stdCode:str, usertag:str, flag:int):
         '''
@@ -722,7 +776,7 @@ class WtWrapper:
         @flag       盈亏记号, 0-浮动盈亏, 1-最大浮盈, 2-最大亏损（负数）
         @return     盈亏 
         '''
-        return self.api.cta_get_detail_profit(id, bytes(stdCode, encoding = "utf8"), bytes(usertag, encoding = "utf8"), flag) 
+        return self.api.cta_get_detail_profit(id, self.__encode__(stdCode), self.__encode__(usertag), flag) 
 
     def cta_save_user_data(self, id:int, key:str, val:str):
         '''
@@ -749,7 +803,7 @@ class WtWrapper:
         @id         策略id
         @stdCode    品种代码
         '''
-        self.api.cta_sub_ticks(id, bytes(stdCode, encoding = "utf8"))
+        self.api.cta_sub_ticks(id, self.__encode__(stdCode))
 
     def cta_sub_bar_events(self, id:int, stdCode:str, period:str):
         '''
@@ -758,7 +812,7 @@ class WtWrapper:
         @stdCode    品种代码
         @period     周期
         '''
-        self.api.cta_sub_bar_events(id, bytes(stdCode, encoding = "utf8"), bytes(period, encoding = "utf8"))
+        self.api.cta_sub_bar_events(id, self.__encode__(stdCode), self.__encode__(period))
 
     def cta_set_chart_kline(self, id:int, stdCode:str, period:str):
         '''
@@ -766,7 +820,7 @@ class WtWrapper:
         @stdCode    合约代码
         @period     K线周期
         '''
-        self.api.cta_set_chart_kline(id, bytes(stdCode, encoding = "utf8"), bytes(period, encoding = "utf8"))
+        self.api.cta_set_chart_kline(id, self.__encode__(stdCode), self.__encode__(period))
 
     def cta_add_chart_mark(self, id:int, price:float, icon:str, tag:str = 'Notag'):
         '''
@@ -822,7 +876,7 @@ class WtWrapper:
         @count      条数
         @isMain     是否主K线
         '''
-        return self.api.sel_get_bars(id, bytes(stdCode, encoding = "utf8"), bytes(period, encoding = "utf8"), count, isMain, CB_STRATEGY_GET_BAR(self.on_stra_get_bar))
+        return self.api.sel_get_bars(id, self.__encode__(stdCode), self.__encode__(period), count, isMain, self.cb_stra_get_bar)
     
     def sel_get_ticks(self, id:int, stdCode:str, count:int):
         '''
@@ -831,7 +885,7 @@ class WtWrapper:
         @stdCode    合约代码
         @count      条数
         '''
-        return self.api.sel_get_ticks(id, bytes(stdCode, encoding = "utf8"), count, CB_STRATEGY_GET_TICK(self.on_stra_get_tick))
+        return self.api.sel_get_ticks(id, self.__encode__(stdCode), count, self.cb_stra_get_tick)
 
     def sel_save_user_data(self, id:int, key:str, val:str):
         '''
@@ -857,7 +911,7 @@ class WtWrapper:
         获取全部持仓
         @id     策略id
         '''
-        return self.api.sel_get_all_position(id, CB_STRATEGY_GET_POSITION(self.on_stra_get_position))
+        return self.api.sel_get_all_position(id, self.cb_stra_get_position)
 
     def sel_get_position(self, id:int, stdCode:str, bonlyvalid:bool = False, usertag:str = ""):
         '''
@@ -867,14 +921,14 @@ class WtWrapper:
         @usertag    进场标记, 如果为空则获取该合约全部持仓
         @return 指定合约的持仓手数, 正为多, 负为空
         '''
-        return self.api.sel_get_position(id, bytes(stdCode, encoding = "utf8"), bonlyvalid, bytes(usertag, encoding = "utf8"))
+        return self.api.sel_get_position(id, self.__encode__(stdCode), bonlyvalid, self.__encode__(usertag))
 
     def sel_get_price(self, stdCode:str):
         '''
         @stdCode   合约代码
         @return 指定合约的最新价格 
         '''
-        return self.api.sel_get_price(bytes(stdCode, encoding = "utf8"))
+        return self.api.sel_get_price(self.__encode__(stdCode))
 
     def sel_set_position(self, id:int, stdCode:str, qty:float, usertag:str = ""):
         '''
@@ -883,7 +937,34 @@ class WtWrapper:
         @stdCode   合约代码
         @qty    目标仓位, 正为多, 负为空
         '''
-        self.api.sel_set_position(id, bytes(stdCode, encoding = "utf8"), qty, bytes(usertag, encoding = "utf8"))
+        self.api.sel_set_position(id, self.__encode__(stdCode), qty, self.__encode__(usertag))
+
+    def sel_get_positions(self, id:int, codes:list, bonlyvalid:bool = False, usertag:str = "") -> np.ndarray:
+        '''
+        批量获取持仓
+        @id         策略id
+        @codes      合约代码列表
+        @usertag    进场标记, 如果为空则获取该合约全部持仓
+        @return     和codes一一对应的持仓手数, 正为多, 负为空
+        '''
+        # 底层没有批量接口, 只能逐个调用, 把函数查找和标记编码都提到循环外面
+        func = self.api.sel_get_position
+        encode = self.__encode__
+        tag = encode(usertag)
+        return np.fromiter((func(id, encode(code), bonlyvalid, tag) for code in codes), dtype=np.float64, count=len(codes))
+
+    def sel_set_positions(self, id:int, codes:list, qtys:list, usertag:str = ""):
+        '''
+        批量设置目标仓位
+        @id         策略id
+        @codes      合约代码列表
+        @qtys       和codes一一对应的目标仓位, 正为多, 负为空
+        '''
+        func = self.api.sel_set_position
+        encode = self.__encode__
+        tag = encode(usertag)
+        for code, qty in zip(codes, qtys):
+            func(id, encode(code), qty, tag)
 
     def sel_get_tdate(self) -> int:
         '''
@@ -921,7 +1002,7 @@ class WtWrapper:
         @id         策略id
         @stdCode    品种代码
         '''
-        self.api.sel_sub_ticks(id, bytes(stdCode, encoding = "utf8"))
+        self.api.sel_sub_ticks(id, self.__encode__(stdCode))
 
     def sel_get_day_price(self, stdCode:str, flag:int = 0) -> float:
         '''
@@ -930,7 +1011,7 @@ class WtWrapper:
         @flag       价格标记, 0-开盘价, 1-最高价, 2-最低价, 3-最新价
         @return     指定合约的价格 
         '''
-        return self.api.sel_get_day_price(bytes(stdCode, encoding = "utf8"), flag)
+        return self.api.sel_get_day_price(self.__encode__(stdCode), flag)
 
     def sel_get_fund_data(self, id:int, flag:int) -> float:
         '''
@@ -948,7 +1029,7 @@ class WtWrapper:
         @stdCode    合约代码
         @return     指定合约的浮动盈亏
         '''
-        return self.api.sel_get_position_profit(id, bytes(stdCode, encoding = "utf8"))
+        return self.api.sel_get_position_profit(id, self.__encode__(stdCode))
 
     def sel_get_position_avgpx(self, id:int, stdCode:str):
         '''
@@ -957,7 +1038,7 @@ class WtWrapper:
         @stdCode    合约代码
         @return     指定合约的持仓均价
         '''
-        return self.api.sel_get_position_avgpx(id, bytes(stdCode, encoding = "utf8"))
+        return self.api.sel_get_position_avgpx(id, self.__encode__(stdCode))
 
     def sel_get_first_entertime(self, id:int, stdCode:str) -> int:
         '''
@@ -965,7 +1046,7 @@ class WtWrapper:
         @stdCode    合约代码
         @return     进场时间, 格式如201907260932 
         '''
-        return self.api.sel_get_first_entertime(id, bytes(stdCode, encoding = "utf8"))
+        return self.api.sel_get_first_entertime(id, self.__encode__(stdCode))
 
     def sel_get_last_entertime(self, id:int, stdCode:str) -> int:
         '''
@@ -973,7 +1054,7 @@ class WtWrapper:
         @stdCode    合约代码
         @return     进场时间, 格式如201907260932 
         '''
-        return self.api.sel_get_last_entertime(id, bytes(stdCode, encoding = "utf8"))
+        return self.api.sel_get_last_entertime(id, self.__encode__(stdCode))
 
     def sel_get_last_entertag(self, id:int, stdCode:str) -> str:
         '''
@@ -981,7 +1062,7 @@ class WtWrapper:
         @stdCode    合约代码
         @return     进场标记 
         '''
-        return bytes.decode(self.api.sel_get_last_entertag(id, bytes(stdCode, encoding = "utf8")))
+        return self.__decode__(self.api.sel_get_last_entertag(id, self.__encode__(stdCode)))
 
     def sel_get_last_exittime(self, id:int, stdCode:str) -> int:
         '''
@@ -989,7 +1070,7 @@ class WtWrapper:
         @stdCode    合约代码
         @return     进场时间, 格式如201907260932 
         '''
-        return self.api.sel_get_last_exittime(id, bytes(stdCode, encoding = "utf8"))
+        return self.api.sel_get_last_exittime(id, self.__encode__(stdCode))
 
     def sel_get_detail_entertime(self, id:int, stdCode:str, usertag:str) -> int:
         '''
@@ -999,7 +1080,7 @@ class WtWrapper:
         @usertag    进场标记
         @return     进场时间, 格式如201907260932 
         '''
-        return self.api.sel_get_detail_entertime(id, bytes(stdCode, encoding = "utf8"), bytes(usertag, encoding = "utf8")) 
+        return self.api.sel_get_detail_entertime(id, self.__encode__(stdCode), self.__encode__(usertag)) 
 
     def sel_get_detail_cost(self, id:int, stdCode:str, usertag:str) -> float:
         '''
@@ -1009,7 +1090,7 @@ class WtWrapper:
         @usertag    进场标记
         @return     开仓价 
         '''
-        return self.api.sel_get_detail_cost(id, bytes(stdCode, encoding = "utf8"), bytes(usertag, encoding = "utf8")) 
+        return self.api.sel_get_detail_cost(id, self.__encode__(stdCode), self.__encode__(usertag)) 
 
     def sel_get_detail_profit(self, id:int, stdCode:str, usertag:str, flag:int):
         '''
@@ -1020,7 +1101,7 @@ class WtWrapper:
         @flag       盈亏记号, 0-浮动盈亏, 1-最大浮盈, -1-最大亏损（负数）, 2-最大浮盈价格,  -2-最大浮亏价格
         @return     盈亏 
         '''
-        return self.api.sel_get_detail_profit(id, bytes(stdCode, encoding = "utf8"), bytes(usertag, encoding = "utf8"), flag) 
+        return self.api.sel_get_detail_profit(id, self.__encode__(stdCode), self.__encode__(usertag), flag) 
 
     ''''''''''''''''''''''''''''''''''''''''''''''''''''''''''''''''''''''''''''''''''''''''''''''''''''''''''''
     '''HFT接口'''    
@@ -1032,7 +1113,7 @@ class WtWrapper:
         @period     周期, 如m1/m3/d1等
         @count      条数
         '''
-        return self.api.hft_get_bars(id, bytes(stdCode, encoding = "utf8"), bytes(period, encoding = "utf8"), count, CB_STRATEGY_GET_BAR(self.on_stra_get_bar))
+        return self.api.hft_get_bars(id, self.__encode__(stdCode), self.__encode__(period), count, self.cb_stra_get_bar)
     
     def hft_get_ticks(self, id:int, stdCode:str, count:int):
         '''
@@ -1041,7 +1122,7 @@ class WtWrapper:
         @stdCode    合约代码
         @count      条数
         '''
-        return self.api.hft_get_ticks(id, bytes(stdCode, encoding = "utf8"), count, CB_STRATEGY_GET_TICK(self.on_stra_get_tick))
+        return self.api.hft_get_ticks(id, self.__encode__(stdCode), count, self.cb_stra_get_tick)
 
     def hft_get_ordque(self, id:int, stdCode:str, count:int):
         '''
@@ -1050,7 +1131,7 @@ class WtWrapper:
         @stdCode   合约代码
         @count     条数
         '''
-        return self.api.hft_get_ordque(id, bytes(stdCode, encoding = "utf8"), count, CB_HFTSTRA_GET_ORDQUE(self.on_hftstra_get_order_queue))
+        return self.api.hft_get_ordque(id, self.__encode__(stdCode), count, self.cb_hftstra_get_ordque)
 
     def hft_get_orddtl(self, id:int, stdCode:str, count:int):
         '''
@@ -1059,7 +1140,7 @@ class WtWrapper:
         @stdCode   合约代码
         @count     条数
         '''
-        return self.api.hft_get_orddtl(id, bytes(stdCode, encoding = "utf8"), count, CB_HFTSTRA_GET_ORDDTL(self.on_hftstra_get_order_detail))
+        return self.api.hft_get_orddtl(id, self.__encode__(stdCode), count, self.cb_hftstra_get_orddtl)
 
     def hft_get_trans(self, id:int, stdCode:str, count:int):
         '''
@@ -1068,7 +1149,7 @@ class WtWrapper:
         @stdCode   合约代码
         @count     条数
         '''
-        return self.api.hft_get_trans(id, bytes(stdCode, encoding = "utf8"), count, CB_HFTSTRA_GET_TRANS(self.on_hftstra_get_transaction))
+        return self.api.hft_get_trans(id, self.__encode__(stdCode), count, self.cb_hftstra_get_trans)
 
     def hft_save_user_data(self, id:int, key:str, val:str):
         '''
@@ -1096,7 +1177,7 @@ class WtWrapper:
         @stdCode   合约代码
         @return 指定合约的持仓手数, 正为多, 负为空
         '''
-        return self.api.hft_get_position(id, bytes(stdCode, encoding = "utf8"), bonlyvalid)
+        return self.api.hft_get_position(id, self.__encode__(stdCode), bonlyvalid)
 
     def hft_get_position_profit(self, id:int, stdCode:str):
         '''
@@ -1105,7 +1186,7 @@ class WtWrapper:
         @stdCode   合约代码
         @return 指定持仓的浮动盈亏
         '''
-        return self.api.hft_get_position_profit(id, bytes(stdCode, encoding = "utf8"))
+        return self.api.hft_get_position_profit(id, self.__encode__(stdCode))
 
     def hft_get_position_avgpx(self, id:int, stdCode:str):
         '''
@@ -1114,7 +1195,7 @@ class WtWrapper:
         @stdCode   合约代码
         @return 指定持仓的浮动盈亏
         '''
-        return self.api.hft_get_position_avgpx(id, bytes(stdCode, encoding = "utf8"))
+        return self.api.hft_get_position_avgpx(id, self.__encode__(stdCode))
 
     def hft_get_undone(self, id:int, stdCode:str):
         '''
@@ -1123,14 +1204,14 @@ class WtWrapper:
         @stdCode   合约代码
         @return 指定合约的持仓手数, 正为多, 负为空
         '''
-        return self.api.hft_get_undone(id, bytes(stdCode, encoding = "utf8"))
+        return self.api.hft_get_undone(id, self.__encode__(stdCode))
 
     def hft_get_price(self, stdCode:str):
         '''
         @stdCode   合约代码
         @return 指定合约的最新价格 
         '''
-        return self.api.hft_get_price(bytes(stdCode, encoding = "utf8"))
+        return self.api.hft_get_price(self.__encode__(stdCode))
 
     def hft_get_date(self):
         '''
@@ -1168,7 +1249,7 @@ class WtWrapper:
         @id         策略ID
         @stdCode    品种代码
         '''
-        self.api.hft_sub_ticks(id, bytes(stdCode, encoding = "utf8"))
+        self.api.hft_sub_ticks(id, self.__encode__(stdCode))
 
     def hft_sub_order_queue(self, id:int, stdCode:str):
         '''
@@ -1176,7 +1257,7 @@ class WtWrapper:
         @id         策略ID
         @stdCode    品种代码
         '''
-        self.api.hft_sub_order_queue(id, bytes(stdCode, encoding = "utf8"))
+        self.api.hft_sub_order_queue(id, self.__encode__(stdCode))
 
     def hft_sub_order_detail(self, id:int, stdCode:str):
         '''
@@ -1184,7 +1265,7 @@ class WtWrapper:
         @id         策略ID
         @stdCode    品种代码
         '''
-        self.api.hft_sub_order_detail(id, bytes(stdCode, encoding = "utf8"))
+        self.api.hft_sub_order_detail(id, self.__encode__(stdCode))
 
     def hft_sub_transaction(self, id:int, stdCode:str):
         '''
@@ -1192,7 +1273,7 @@ class WtWrapper:
         @id         策略ID
         @stdCode    品种代码
         '''
-        self.api.hft_sub_transaction(id, bytes(stdCode, encoding = "utf8"))
+        self.api.hft_sub_transaction(id, self.__encode__(stdCode))
 
     def hft_cancel(self, id:int, localid:int):
         '''
@@ -1209,7 +1290,7 @@ class WtWrapper:
         @stdCode    品种代码
         @isBuy      买入or卖出
         '''
-        ret = self.api.hft_cancel_all(id, bytes(stdCode, encoding = "utf8"), isBuy)
+        ret = self.api.hft_cancel_all(id, self.__encode__(stdCode), isBuy)
         return bytes.decode(ret)
 
     def hft_buy(self, id:int, stdCode:str, price:float, qty:float, userTag:str, flag:int):
@@ -1221,7 +1302,7 @@ class WtWrapper:
         @qty        买入数量
         @flag       下单标志, 0-normal, 1-fak, 2-fok
         '''
-        ret = self.api.hft_buy(id, bytes(stdCode, encoding = "utf8"), price, qty, bytes(userTag, encoding = "utf8"), flag)
+        ret = self.api.hft_buy(id, self.__encode__(stdCode), price, qty, self.__encode__(userTag), flag)
         return bytes.decode(ret)
 
     def hft_sell(self, id:int, stdCode:str, price:float, qty:float, userTag:str, flag:int):
@@ -1233,7 +1314,7 @@ class WtWrapper:
         @qty        卖出数量
         @flag       下单标志, 0-normal, 1-fak, 2-fok
         '''
-        ret = self.api.hft_sell(id, bytes(stdCode, encoding = "utf8"), price, qty, bytes(userTag, encoding = "utf8"), flag)
+        ret = self.api.hft_sell(id, self.__encode__(stdCode), price, qty, self.__encode__(userTag), flag)
         return bytes.decode(ret)
 
     ''''''''''''''''''''''''''''''''''''''''''''''''''''''''''''''''''''''''''''''''''''''''''''''''''''''''''''
@@ -1266,7 +1347,7 @@ class WtWrapper:
         @return     系统内策略ID 
         '''
         return self.api.create_sel_context(bytes(name, encoding = "utf8"), date, time, 
-            bytes(period, encoding = "utf8"), bytes(trdtpl, encoding = "utf8"), bytes(session, encoding = "utf8"), slippage)
+            self.__encode__(period), bytes(trdtpl, encoding = "utf8"), bytes(session, encoding = "utf8"), slippage)
 
     def reg_cta_factories(self, factFolder:str):
         return self.api.reg_cta_factories(bytes(factFolder, encoding = "utf8") )